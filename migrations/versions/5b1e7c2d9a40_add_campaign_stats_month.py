@@ -0,0 +1,42 @@
+"""Add campaign stats month and campaign modified
+
+Revision ID: 5b1e7c2d9a40
+Revises: cca13d9ec018
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+import sqlalchemy as sa
+import sqlalchemy_utc
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5b1e7c2d9a40"
+down_revision = "cca13d9ec018"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "campaign_stats_month",
+        sa.Column("month", sa.Date(), nullable=False),
+        sa.Column("metric", sa.String(), nullable=False),
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("value", sa.BigInteger(), nullable=False),
+        sa.Column(
+            "refreshed",
+            sqlalchemy_utc.sqltypes.UtcDateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("month", "metric", "key"),
+    )
+    op.add_column(
+        "campaign",
+        sa.Column("modified", sqlalchemy_utc.sqltypes.UtcDateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_column("campaign", "modified")
+    op.drop_table("campaign_stats_month")
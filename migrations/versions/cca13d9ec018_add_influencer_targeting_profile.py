@@ -0,0 +1,91 @@
+"""Add influencer targeting profile
+
+Revision ID: cca13d9ec018
+Revises:
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+import sqlalchemy as sa
+import sqlalchemy_utc
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+from core.common.sqla import UUIDString
+
+# revision identifiers, used by Alembic.
+revision = "cca13d9ec018"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "influencer_targeting_profile",
+        sa.Column("influencer_id", UUIDString(), nullable=False),
+        sa.Column(
+            "refreshed",
+            sqlalchemy_utc.sqltypes.UtcDateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column("state", sa.String(), nullable=False),
+        sa.Column("birthday", sa.Date(), nullable=True),
+        sa.Column("gender", sa.String(), nullable=True),
+        sa.Column("followers", sa.Integer(), nullable=True),
+        sa.Column("region_ids", postgresql.ARRAY(UUIDString()), nullable=True),
+        sa.Column(
+            "interest_ids",
+            postgresql.ARRAY(UUIDString()),
+            server_default="{}",
+            nullable=False,
+        ),
+        sa.Column("hair_type_id", UUIDString(), nullable=True),
+        sa.Column("hair_colour_id", UUIDString(), nullable=True),
+        sa.Column("eye_colour_id", UUIDString(), nullable=True),
+        sa.Column("glasses", sa.Boolean(), nullable=True),
+        sa.Column("languages", postgresql.ARRAY(sa.String()), nullable=True),
+        sa.Column("tag_ids", postgresql.ARRAY(UUIDString()), nullable=True),
+        sa.Column("children_count", sa.Integer(), nullable=True),
+        sa.Column("child_birthdays", postgresql.ARRAY(sa.Date()), nullable=True),
+        sa.Column("child_genders", postgresql.ARRAY(sa.String()), nullable=True),
+        sa.Column("oldest_child_birthday", sa.Date(), nullable=True),
+        sa.Column("youngest_child_birthday", sa.Date(), nullable=True),
+        sa.ForeignKeyConstraint(["influencer_id"], ["influencer.id"], ondelete="cascade"),
+        sa.PrimaryKeyConstraint("influencer_id"),
+    )
+    op.create_index(
+        "ix_influencer_targeting_profile_state_followers",
+        "influencer_targeting_profile",
+        ["state", "followers"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_influencer_targeting_profile_birthday",
+        "influencer_targeting_profile",
+        ["birthday"],
+        unique=False,
+    )
+    for column in ("region_ids", "interest_ids", "languages", "tag_ids"):
+        op.create_index(
+            f"ix_influencer_targeting_profile_{column}",
+            "influencer_targeting_profile",
+            [column],
+            unique=False,
+            postgresql_using="gin",
+        )
+
+
+def downgrade():
+    for column in ("tag_ids", "languages", "interest_ids", "region_ids"):
+        op.drop_index(
+            f"ix_influencer_targeting_profile_{column}", table_name="influencer_targeting_profile"
+        )
+    op.drop_index(
+        "ix_influencer_targeting_profile_birthday", table_name="influencer_targeting_profile"
+    )
+    op.drop_index(
+        "ix_influencer_targeting_profile_state_followers",
+        table_name="influencer_targeting_profile",
+    )
+    op.drop_table("influencer_targeting_profile")
@@ -17,6 +17,7 @@ from werkzeug.routing import UUIDConverter
 from core.config import MissingEnvironmentVariables
 
 from takumi.error_codes import MAINTENANCE_MODE
+from takumi.rate_limiter import get_rate_limit_headers
 from takumi.roles.permissions import see_request_cost
 from takumi.tokens import InvalidToken, InvalidTokenHeader, TokenExpired, get_jwt_session
 from takumi.utils import get_cost_headers
@@ -114,6 +115,8 @@ class MarshmallowFlask(Flask):
         if see_request_cost.can():
             for header in get_cost_headers():
                 response.headers.add(*header)
+        for header in get_rate_limit_headers():
+            response.headers.set(*header)
         return response
 
 
@@ -156,6 +159,10 @@ def create_app(testing=False, tasks_context=False, debug=False):
 
     configure_extensions(app)
 
+    from .session_hooks import register_session_hooks
+
+    register_session_hooks()
+
     from .views.blueprint import api, tasks, webhooks
 
     cors_options = {"supports_credentials": True, "max_age": 600}
@@ -1,19 +1,317 @@
+"""A two tier cache, with a bounded in process LRU in front of redis
+
+Values are looked up in the process first, then in redis, and are only
+computed by one worker at a time when they're missing from both, the others
+wait for the value instead of recomputing it (see `Cache.get_or_set`).
+
+Entries can be tagged, for example with "campaign:<id>", and invalidated by
+tag. Commits of the models in `TAGGED_TABLES` invalidate the tag of every
+changed instance. The in process tier of other processes isn't invalidated,
+which is why it only keeps values for `LOCAL_TTL`.
+
+Hits, misses and latencies are sent to statsd, tagged with the cache name.
+"""
+import base64
 import datetime as dt
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
 
 from takumi.extensions import redis
+from takumi.session_hooks import SessionHook
+
+DEFAULT_TTL = int(dt.timedelta(minutes=10).total_seconds())
+LOCAL_TTL = 30
+LOCAL_SIZE = 1000
+LOCK_TIMEOUT = 60
+LOCK_WAIT = 10
+# Tags outlive the entries, so an entry with a short ttl doesn't expire the
+# tag of an entry with a longer one
+TAG_TTL = int(dt.timedelta(days=1).total_seconds())
+
+SESSION_CACHE_TAGS_KEY = "cache_tags"
+# Changes to instances of these tables invalidate their "<table>:<id>" tag
+TAGGED_TABLES = {"advertiser", "campaign", "gig", "influencer", "offer", "post"}
+
+_MISSING = object()
+
+
+class PickleSerializer:
+    """Pickles values, base64 encoded as the redis connection decodes responses"""
+
+    @staticmethod
+    def dumps(value):
+        return base64.b64encode(pickle.dumps(value)).decode("ascii")
+
+    @staticmethod
+    def loads(value):
+        return pickle.loads(base64.b64decode(value))
+
+
+class StringSerializer:
+    """Stores strings as they are"""
+
+    @staticmethod
+    def dumps(value):
+        return value
+
+    @staticmethod
+    def loads(value):
+        return value
+
 
+class LocalCache:
+    """A thread safe LRU with expiring entries"""
 
-class RedisCache:
-    def __init__(self, name, default_ttl=int(dt.timedelta(minutes=10).total_seconds())):
-        self.cache_prefix = "CACHED:" + name + ":"
-        self.default_ttl = default_ttl
+    def __init__(self, maxsize=LOCAL_SIZE, ttl=LOCAL_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
 
     def get(self, key):
-        conn = redis.get_connection()
-        return conn.get(self.cache_prefix + key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
 
     def set(self, key, value, ttl=None):
-        if not ttl:
-            ttl = self.default_ttl
-        conn = redis.get_connection()
-        conn.setex(self.cache_prefix + key, ttl, value)
+        ttl = min(ttl or self.ttl, self.ttl)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_cache = LocalCache()
+
+
+def _tag_key(tag):
+    return "CACHE_TAG:" + tag
+
+
+def _statsd():
+    return current_app.config["statsd"]
+
+
+class Cache:
+    """A named cache, with entries stored under `prefix`
+
+    Args:
+        name (str): The name of the cache, used in the metrics
+        ttl (int): The default time to live of entries in seconds
+        serializer: How values are stored, pickled by default
+        prefix (str): The prefix of the keys, defaults to "CACHE:<name>:"
+        local (bool): Whether to keep the values in the process as well
+    """
+
+    def __init__(self, name, ttl=DEFAULT_TTL, serializer=PickleSerializer, prefix=None, local=True):
+        self.name = name
+        self.ttl = ttl
+        self.serializer = serializer
+        self.prefix = prefix if prefix is not None else f"CACHE:{name}:"
+        self.local = local
+
+    def _metric(self, metric, **kwargs):
+        tags = [f"cache:{self.name}"] + [f"{key}:{value}" for key, value in kwargs.items()]
+        _statsd().increment(f"takumi.cache.{metric}", tags=tags)
+
+    def _get(self, key):
+        """Get the serialized value of a key, or `_MISSING`"""
+        full_key = self.prefix + key
+        if self.local:
+            value = local_cache.get(full_key)
+            if value is not _MISSING:
+                self._metric("hit", tier="local")
+                return value
+
+        start = time.monotonic()
+        value = redis.get_connection().get(full_key)
+        _statsd().timing(
+            "takumi.cache.redis.get",
+            (time.monotonic() - start) * 1000,
+            tags=[f"cache:{self.name}"],
+        )
+        if value is None:
+            self._metric("miss")
+            return _MISSING
+
+        self._metric("hit", tier="redis")
+        if self.local:
+            local_cache.set(full_key, value)
+        return value
+
+    def get(self, key, default=None):
+        value = self._get(key)
+        if value is _MISSING:
+            return default
+        return self.serializer.loads(value)
+
+    def get_many(self, keys):
+        """Get the values of many keys, with a single redis round trip for the
+        keys missing from the process, leaving out the missing keys
+        """
+        values = {}
+        missing = []
+        for key in keys:
+            value = local_cache.get(self.prefix + key) if self.local else _MISSING
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                values[key] = value
+
+        if missing:
+            found = redis.get_connection().mget([self.prefix + key for key in missing])
+            for key, value in zip(missing, found):
+                if value is None:
+                    continue
+                values[key] = value
+                if self.local:
+                    local_cache.set(self.prefix + key, value)
+
+        return {key: self.serializer.loads(value) for key, value in values.items()}
+
+    def set(self, key, value, ttl=None, tags=()):
+        full_key = self.prefix + key
+        ttl = int(ttl or self.ttl)
+        serialized = self.serializer.dumps(value)
+
+        pipeline = redis.get_connection().pipeline()
+        pipeline.setex(full_key, ttl, serialized)
+        for tag in tags:
+            pipeline.sadd(_tag_key(tag), full_key)
+            pipeline.expire(_tag_key(tag), max(ttl, TAG_TTL))
+        pipeline.execute()
+
+        if self.local:
+            local_cache.set(full_key, serialized, ttl)
+
+    def set_many(self, values, ttl=None):
+        """Set many values at once, with a single redis round trip"""
+        ttl = int(ttl or self.ttl)
+        serialized = {
+            self.prefix + key: self.serializer.dumps(value) for key, value in values.items()
+        }
+
+        pipeline = redis.get_connection().pipeline()
+        for full_key, value in serialized.items():
+            pipeline.setex(full_key, ttl, value)
+        pipeline.execute()
+
+        if self.local:
+            for full_key, value in serialized.items():
+                local_cache.set(full_key, value, ttl)
+
+    def delete(self, key):
+        full_key = self.prefix + key
+        redis.get_connection().delete(full_key)
+        local_cache.delete(full_key)
+
+    def get_or_set(self, key, func, ttl=None, tags=()):
+        """Get the value of a key, or compute it with `func` and set it
+
+        Only one worker computes a missing value at a time, holding a redis
+        lock for the key. The others wait for the lock and then read the value
+        that was set. If the lock can't be acquired in time, the value is
+        computed anyway.
+        """
+        value = self._get(key)
+        if value is not _MISSING:
+            return self.serializer.loads(value)
+
+        lock = redis.get_connection().lock(
+            "CACHE_LOCK:" + self.prefix + key, timeout=LOCK_TIMEOUT, blocking_timeout=LOCK_WAIT
+        )
+        acquired = lock.acquire()
+        try:
+            if acquired:
+                # Another worker might have set the value while we waited
+                value = redis.get_connection().get(self.prefix + key)
+                if value is not None:
+                    self._metric("hit", tier="single_flight")
+                    if self.local:
+                        local_cache.set(self.prefix + key, value)
+                    return self.serializer.loads(value)
+            else:
+                self._metric("lock_timeout")
+
+            start = time.monotonic()
+            result = func()
+            _statsd().timing(
+                "takumi.cache.compute",
+                (time.monotonic() - start) * 1000,
+                tags=[f"cache:{self.name}"],
+            )
+            self.set(key, result, ttl=ttl, tags=tags)
+            return result
+        finally:
+            if acquired:
+                lock.release()
+
+
+def invalidate_tags(*tags):
+    """Delete every entry tagged with any of the tags"""
+    if not tags:
+        return
+
+    conn = redis.get_connection()
+    pipeline = conn.pipeline()
+    for tag in tags:
+        pipeline.smembers(_tag_key(tag))
+    keys = set().union(*pipeline.execute())
+
+    pipeline = conn.pipeline()
+    if keys:
+        pipeline.delete(*keys)
+    pipeline.delete(*[_tag_key(tag) for tag in tags])
+    pipeline.execute()
+
+    local_cache.delete(*keys)
+
+
+def model_tag(instance):
+    return f"{instance.__tablename__}:{instance.id}"
+
+
+class RedisCache(Cache):
+    """A cache of strings, for clients that serialize their own values"""
+
+    def __init__(self, name, default_ttl=DEFAULT_TTL):
+        super().__init__(
+            name, ttl=default_ttl, serializer=StringSerializer, prefix="CACHED:" + name + ":"
+        )
+
+
+def collect_cache_tag(session, instance, tags):
+    if getattr(instance, "__tablename__", None) in TAGGED_TABLES:
+        tags.add(model_tag(instance))
+
+
+cache_tags = SessionHook(
+    SESSION_CACHE_TAGS_KEY,
+    on_commit=lambda tags: invalidate_tags(*tags),
+    collect=collect_cache_tag,
+    default=set,
+)
@@ -0,0 +1,257 @@
+"""Set-based computation of the `CampaignMetric` rows
+
+`Campaign` computes its reach, impressions and engagement rates in Python by
+walking posts, gigs and their latest insights, which lazy loads every object
+on the way. This computes the same values for many campaigns at once with a
+handful of aggregate queries, and upserts the results in bulk.
+"""
+from collections import defaultdict
+
+from sqlalchemy import and_, case, exists, func, or_
+from sqlalchemy.dialects.postgresql import insert
+
+from takumi.extensions import db
+from takumi.models import (
+    Campaign,
+    CampaignEvent,
+    CampaignMetric,
+    Gig,
+    InstagramPost,
+    InstagramPostInsight,
+    InstagramStory,
+    InstagramStoryFrameInsight,
+    Offer,
+    Post,
+    StoryFrame,
+)
+from takumi.models.offer import STATES as OFFER_STATES
+from takumi.models.post import PostTypes
+from takumi.utils import uuid4_str
+
+STATIC_POST_TYPES = (PostTypes.standard, PostTypes.video)
+BATCH_SIZE = 500
+
+
+def _latest_post_insights():
+    return (
+        db.session.query(
+            InstagramPostInsight.instagram_post_id,
+            InstagramPostInsight.reach,
+            InstagramPostInsight.impressions,
+            InstagramPostInsight.engagement,
+        )
+        .distinct(InstagramPostInsight.instagram_post_id)
+        .order_by(InstagramPostInsight.instagram_post_id, InstagramPostInsight.created.desc())
+        .subquery()
+    )
+
+
+def _latest_frame_insights():
+    return (
+        db.session.query(
+            InstagramStoryFrameInsight.story_frame_id,
+            InstagramStoryFrameInsight.reach,
+            InstagramStoryFrameInsight.impressions,
+            InstagramStoryFrameInsight.replies,
+        )
+        .distinct(InstagramStoryFrameInsight.story_frame_id)
+        .order_by(
+            InstagramStoryFrameInsight.story_frame_id, InstagramStoryFrameInsight.created.desc()
+        )
+        .subquery()
+    )
+
+
+def _static_totals(campaign_ids):
+    insight = _latest_post_insights()
+    is_static = Post.post_type.in_(STATIC_POST_TYPES)
+    return (
+        db.session.query(
+            Post.campaign_id,
+            func.sum(case([(is_static, func.coalesce(insight.c.reach, 0))], else_=0)),
+            func.sum(case([(is_static, func.coalesce(insight.c.impressions, 0))], else_=0)),
+            func.sum(func.coalesce(insight.c.engagement, 0)),
+        )
+        .join(Gig, Gig.post_id == Post.id)
+        .join(InstagramPost, InstagramPost.gig_id == Gig.id)
+        .outerjoin(insight, insight.c.instagram_post_id == InstagramPost.id)
+        .filter(Post.campaign_id.in_(campaign_ids), ~Post.archived)
+        .group_by(Post.campaign_id)
+    )
+
+
+def _story_totals(campaign_ids):
+    insight = _latest_frame_insights()
+    is_story = Post.post_type == PostTypes.story
+    return (
+        db.session.query(
+            Post.campaign_id,
+            func.sum(case([(is_story, func.coalesce(insight.c.reach, 0))], else_=0)),
+            func.sum(case([(is_story, func.coalesce(insight.c.impressions, 0))], else_=0)),
+            func.sum(func.coalesce(insight.c.replies, 0)),
+        )
+        .join(Gig, Gig.post_id == Post.id)
+        .join(InstagramStory, InstagramStory.gig_id == Gig.id)
+        .join(StoryFrame, StoryFrame.instagram_story_id == InstagramStory.id)
+        .outerjoin(insight, insight.c.story_frame_id == StoryFrame.id)
+        .filter(Post.campaign_id.in_(campaign_ids), ~Post.archived)
+        .group_by(Post.campaign_id)
+    )
+
+
+def _accepted_followers(campaign_ids):
+    return (
+        db.session.query(Offer.campaign_id, func.sum(Offer.followers_influencer))
+        .filter(Offer.campaign_id.in_(campaign_ids), Offer.state == OFFER_STATES.ACCEPTED)
+        .group_by(Offer.campaign_id)
+    )
+
+
+def _engagement_rate(engagements, followers):
+    try:
+        return engagements / followers * 100
+    except ZeroDivisionError:
+        return 0
+
+
+def compute_campaign_metrics(campaign_ids):
+    """Compute the metric values for the given campaigns
+
+    Returns a dict of campaign id to the values of the `CampaignMetric`
+    columns, the same ones that the `Campaign` properties compute.
+    """
+    campaign_ids = list(campaign_ids)
+    if not campaign_ids:
+        return {}
+
+    totals = defaultdict(lambda: defaultdict(int))
+    for campaign_id, reach, impressions, engagements in _static_totals(campaign_ids):
+        totals[campaign_id]["reach"] += reach or 0
+        totals[campaign_id]["impressions"] += impressions or 0
+        totals[campaign_id]["static_engagements"] += engagements or 0
+    for campaign_id, reach, impressions, engagements in _story_totals(campaign_ids):
+        totals[campaign_id]["reach"] += reach or 0
+        totals[campaign_id]["impressions"] += impressions or 0
+        totals[campaign_id]["story_engagements"] += engagements or 0
+    followers = dict(_accepted_followers(campaign_ids))
+    units = dict(
+        db.session.query(Campaign.id, Campaign.units).filter(Campaign.id.in_(campaign_ids))
+    )
+
+    metrics = {}
+    for campaign_id, assets in units.items():
+        campaign_totals = totals[campaign_id]
+        accepted_followers = followers.get(campaign_id) or 0
+        engagement_rate_static = _engagement_rate(
+            campaign_totals["static_engagements"], accepted_followers
+        )
+        engagement_rate_story = _engagement_rate(
+            campaign_totals["story_engagements"], accepted_followers
+        )
+        metrics[campaign_id] = dict(
+            engagement_rate_total=engagement_rate_story + engagement_rate_static,
+            engagement_rate_static=engagement_rate_static,
+            engagement_rate_story=engagement_rate_story,
+            impressions_total=int(campaign_totals["impressions"]),
+            reach_total=int(campaign_totals["reach"]),
+            assets=assets,
+        )
+    return metrics
+
+
+def _inputs_changed_since(timestamp):
+    """An expression for whether anything a campaign's metrics are computed
+    from has changed since `timestamp`
+    """
+
+    def _changed(model):
+        return func.coalesce(model.modified, model.created) > timestamp
+
+    campaign_posts = and_(Post.campaign_id == Campaign.id, ~Post.archived)
+    return or_(
+        exists().where(and_(Offer.campaign_id == Campaign.id, _changed(Offer))),
+        exists().where(and_(campaign_posts, _changed(Post))),
+        exists().where(and_(campaign_posts, Gig.post_id == Post.id, _changed(Gig))),
+        exists().where(
+            and_(
+                campaign_posts,
+                Gig.post_id == Post.id,
+                InstagramPost.gig_id == Gig.id,
+                InstagramPostInsight.instagram_post_id == InstagramPost.id,
+                _changed(InstagramPostInsight),
+            )
+        ),
+        exists().where(
+            and_(
+                campaign_posts,
+                Gig.post_id == Post.id,
+                InstagramStory.gig_id == Gig.id,
+                StoryFrame.instagram_story_id == InstagramStory.id,
+                InstagramStoryFrameInsight.story_frame_id == StoryFrame.id,
+                _changed(InstagramStoryFrameInsight),
+            )
+        ),
+        exists().where(
+            and_(CampaignEvent.campaign_id == Campaign.id, CampaignEvent.created > timestamp)
+        ),
+    )
+
+
+def get_campaigns_to_update(campaign_ids=None, only_changed=True):
+    """Campaigns that need their metrics created or updated
+
+    Campaigns without metrics always get them created, but existing metrics
+    are only kept up to date while the campaign is launched. With
+    `only_changed`, launched campaigns whose inputs haven't changed since
+    their metrics were last written are skipped.
+    """
+    last_written = func.coalesce(CampaignMetric.modified, CampaignMetric.created)
+    needs_update = Campaign.state == Campaign.STATES.LAUNCHED
+    if only_changed:
+        needs_update = and_(needs_update, _inputs_changed_since(last_written))
+
+    query = (
+        db.session.query(Campaign.id)
+        .outerjoin(CampaignMetric, CampaignMetric.campaign_id == Campaign.id)
+        .filter(or_(CampaignMetric.id == None, needs_update))  # noqa: E711
+    )
+    if campaign_ids is not None:
+        query = query.filter(Campaign.id.in_(campaign_ids))
+    return [campaign_id for (campaign_id,) in query]
+
+
+def upsert_campaign_metrics(metrics):
+    """Insert or update the metrics for many campaigns in one statement"""
+    if not metrics:
+        return
+
+    statement = insert(CampaignMetric.__table__)
+    db.session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[CampaignMetric.campaign_id],
+            set_=dict(
+                modified=func.now(),
+                **{
+                    column: statement.excluded[column]
+                    for column in next(iter(metrics.values())).keys()
+                },
+            ),
+        ),
+        [
+            dict(id=uuid4_str(), campaign_id=campaign_id, **values)
+            for campaign_id, values in metrics.items()
+        ],
+    )
+
+
+def update_campaign_metrics(campaign_ids=None, only_changed=True, batch_size=BATCH_SIZE):
+    """Create or update the metrics for the campaigns that need it, in
+    batches of `batch_size` campaigns. Returns the ids of the campaigns that
+    were updated.
+    """
+    campaign_ids = get_campaigns_to_update(campaign_ids, only_changed=only_changed)
+    for start in range(0, len(campaign_ids), batch_size):
+        batch = campaign_ids[start : start + batch_size]
+        upsert_campaign_metrics(compute_campaign_metrics(batch))
+        db.session.commit()
+    return campaign_ids
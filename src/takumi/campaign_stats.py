@@ -1,11 +1,13 @@
 import datetime as dt
+from collections import defaultdict
 
-from sqlalchemy import distinct, func
+from sqlalchemy import Date, cast, distinct, func
 
 from takumi.extensions import db
 from takumi.models import (
     Campaign,
     CampaignEvent,
+    CampaignStatsMonth,
     Currency,
     Gig,
     Influencer,
@@ -27,6 +29,26 @@ from takumi.models.campaign import STATES as CAMPAIGN_STATES
 POUNDS_TO_A_DOLLAR = 0.8
 POUNDS_TO_A_EURO = 0.9
 
+# The monthly metrics kept in the `CampaignStatsMonth` rollup, per region
+REGION_METRICS = {
+    "budget": "_budget_by_month_query",
+    "margin": "_margin_by_month_query",
+    "campaigns": "_campaigns_by_month_query",
+    "gigs": "_gigs_by_month_query",
+    "new_participants": "_new_participants_by_month_query",
+    "unique_participants": "_unique_participants_by_month_query",
+    "instagram_post_impressions": "_instagram_post_impressions_by_month_query",
+    "instagram_story_impressions": "_instagram_story_impressions_by_month_query",
+}
+# Payments are rolled up per currency instead
+PAYMENTS_METRIC = "payments"
+
+# Months that are always refreshed, as they are still collecting activity
+ROLLUP_TRAILING_MONTHS = 3
+# Overlap with the previous refresh, to pick up changes from transactions
+# that were still open while it ran
+ROLLUP_REFRESH_OVERLAP = dt.timedelta(hours=1)
+
 
 def _quarter(year, quarternum):
     def gen_date(day, month, year=year):
@@ -43,6 +65,12 @@ def _quarter(year, quarternum):
     raise Exception(f"INVALID QUARTERNUM {quarternum}")
 
 
+def _in_months(month, months):
+    if months is None:
+        return True
+    return cast(month, Date).in_(months)
+
+
 def _get_years():
     first_year = (
         db.session.query(func.min(Campaign.started))
@@ -86,7 +114,7 @@ class CampaignStats:
 
         return inner
 
-    def _budget_by_month_query(self, region):
+    def _budget_by_month_query(self, region, months=None):
         month = func.date_trunc("month", Post.opened)
         return (
             db.session.query(month, func.sum(Campaign.price))
@@ -95,11 +123,12 @@ class CampaignStats:
             .filter(~Campaign.state.in_(("draft", "stashed")))
             .filter(Targeting.is_under_region(region))
             .filter(Post.opened != None)
+            .filter(_in_months(month, months))
             .group_by(month)
             .order_by(month)
         )
 
-    def _margin_by_month_query(self, region):
+    def _margin_by_month_query(self, region, months=None):
         month = func.date_trunc("month", Post.opened)
         return (
             db.session.query(month, func.sum(Campaign.margin))
@@ -107,21 +136,23 @@ class CampaignStats:
             .join(Targeting)
             .filter(Targeting.is_under_region(region))
             .filter(Post.opened != None)
+            .filter(_in_months(month, months))
             .group_by(month)
             .order_by(month)
         )
 
-    def _payments_by_month_query(self, currency):
+    def _payments_by_month_query(self, currency, months=None):
         month = func.date_trunc("month", Payment.created)
         return (
             db.session.query(month, func.sum(Payment.amount))
             .filter(Payment.currency == currency)
             .filter(Payment.is_successful)
+            .filter(_in_months(month, months))
             .group_by(month)
             .order_by(month)
         )
 
-    def _campaigns_by_month_query(self, region):
+    def _campaigns_by_month_query(self, region, months=None):
         month = func.date_trunc("month", Post.opened)
         return (
             db.session.query(month, func.count(distinct(Campaign.id)))
@@ -130,11 +161,12 @@ class CampaignStats:
             .filter(Targeting.is_under_region(region))
             .filter(Post.opened != None)
             .filter(~Campaign.state.in_(("draft", "stashed")))
+            .filter(_in_months(month, months))
             .group_by(month)
             .order_by(month)
         )
 
-    def _gigs_by_month_query(self, region):
+    def _gigs_by_month_query(self, region, months=None):
         month = func.date_trunc("month", Gig.created)
         return (
             db.session.query(month, func.count(Gig.id))
@@ -142,11 +174,12 @@ class CampaignStats:
             .join(Campaign)
             .join(Targeting)
             .filter(Targeting.is_under_region(region))
+            .filter(_in_months(month, months))
             .group_by(month)
             .order_by(month)
         )
 
-    def _new_participants_by_month_query(self, region):
+    def _new_participants_by_month_query(self, region, months=None):
         month = func.date_trunc("month", Offer.created)
         return (
             db.session.query(month, func.count(distinct(Offer.influencer_id)))
@@ -154,11 +187,12 @@ class CampaignStats:
             .join(Targeting)
             .filter(Offer.is_influencers_first_accepted_offer)
             .filter(Targeting.is_under_region(region))
+            .filter(_in_months(month, months))
             .group_by(month)
             .order_by(month)
         )
 
-    def _unique_participants_by_month_query(self, region):
+    def _unique_participants_by_month_query(self, region, months=None):
         month = func.date_trunc("month", Offer.created)
         return (
             db.session.query(month, func.count(distinct(Offer.influencer_id)))
@@ -166,11 +200,12 @@ class CampaignStats:
             .join(Targeting)
             .filter(Offer.state == "accepted")
             .filter(Targeting.is_under_region(region))
+            .filter(_in_months(month, months))
             .group_by(month)
             .order_by(month)
         )
 
-    def _instagram_post_impressions_by_month_query(self, region):
+    def _instagram_post_impressions_by_month_query(self, region, months=None):
         month = func.date_trunc("month", InstagramPostInsight.created)
         return (
             db.session.query(month, func.sum(distinct(InstagramPostInsight.impressions)))
@@ -181,11 +216,12 @@ class CampaignStats:
             .join(Targeting)
             .filter(Offer.is_claimable)
             .filter(Targeting.is_under_region(region))
+            .filter(_in_months(month, months))
             .group_by(month)
             .order_by(month)
         )
 
-    def _instagram_story_impressions_by_month_query(self, region):
+    def _instagram_story_impressions_by_month_query(self, region, months=None):
         month = func.date_trunc("month", InstagramStoryFrameInsight.created)
         return (
             db.session.query(month, func.sum(distinct(InstagramStoryFrameInsight.impressions)))
@@ -200,6 +236,7 @@ class CampaignStats:
             .join(Targeting)
             .filter(Offer.is_claimable)
             .filter(Targeting.is_under_region(region))
+            .filter(_in_months(month, months))
             .group_by(month)
             .order_by(month)
         )
@@ -278,99 +315,109 @@ class CampaignStats:
         return {label: getattr(result, label) for label in labels}
 
     @property
-    def budget_by_month(self):
+    def currencies(self):
+        return list({region.market.currency for region in self.regions})
+
+    @property
+    def uses_rollup(self):
+        """The monthly rollup only covers the supported top level regions"""
+        return all(region.path is None and region.supported for region in self.regions)
+
+    def _rollup(self, metric, keys):
+        result = defaultdict(dict)
+        rows = (
+            db.session.query(
+                CampaignStatsMonth.key, CampaignStatsMonth.month, CampaignStatsMonth.value
+            )
+            .filter(CampaignStatsMonth.metric == metric, CampaignStatsMonth.key.in_(keys))
+            .order_by(CampaignStatsMonth.month)
+        )
+        for key, month, value in rows:
+            result[key][dt.date.strftime(month, "%Y-%m")] = value
+        return result
+
+    def _by_month(self, metric):
+        """Returns the values of a monthly metric by region id, read from the
+        rollup when it covers the regions
+        """
+        if self.uses_rollup:
+            return self._rollup(metric, [region.id for region in self.regions])
+        query = getattr(self, REGION_METRICS[metric])
         return {
-            region.name: {
-                dt.date.strftime(r[0], "%Y-%m"): Currency(
-                    amount=r[1], currency=region.market.currency
-                )
-                for r in self._budget_by_month_query(region)
-            }
+            region.id: {dt.date.strftime(r[0], "%Y-%m"): r[1] for r in query(region)}
             for region in self.regions
         }
 
-    @property
-    def payments_by_month(self):
-        currencies = list({region.market.currency for region in self.regions})
+    def _payments_by_month(self):
+        if self.uses_rollup:
+            return self._rollup(PAYMENTS_METRIC, self.currencies)
         return {
             currency: {
-                dt.date.strftime(r[0], "%Y-%m"): Currency(amount=r[1], currency=currency)
+                dt.date.strftime(r[0], "%Y-%m"): r[1]
                 for r in self._payments_by_month_query(currency)
             }
-            for currency in currencies
+            for currency in self.currencies
         }
 
+    def _region_results(self, metric):
+        by_month = self._by_month(metric)
+        return {region.name: by_month.get(region.id, {}) for region in self.regions}
+
     @property
-    def margin_by_month(self):
+    def budget_by_month(self):
+        by_month = self._by_month("budget")
         return {
             region.name: {
-                dt.date.strftime(r[0], "%Y-%m"): Currency(
-                    amount=int(r[1]), currency=region.market.currency
-                )
-                for r in self._margin_by_month_query(region)
-                if r[1] is not None and int(r[1]) > 0
+                month: Currency(amount=value, currency=region.market.currency)
+                for month, value in by_month.get(region.id, {}).items()
             }
             for region in self.regions
         }
 
     @property
-    def campaigns_by_month(self):
+    def payments_by_month(self):
         return {
-            region.name: {
-                dt.date.strftime(r[0], "%Y-%m"): r[1]
-                for r in self._campaigns_by_month_query(region)
+            currency: {
+                month: Currency(amount=value, currency=currency) for month, value in results.items()
             }
-            for region in self.regions
+            for currency, results in self._payments_by_month().items()
         }
 
     @property
-    def gigs_by_month(self):
+    def margin_by_month(self):
+        by_month = self._by_month("margin")
         return {
             region.name: {
-                dt.date.strftime(r[0], "%Y-%m"): r[1] for r in self._gigs_by_month_query(region)
+                month: Currency(amount=int(value), currency=region.market.currency)
+                for month, value in by_month.get(region.id, {}).items()
+                if value is not None and int(value) > 0
             }
             for region in self.regions
         }
 
+    @property
+    def campaigns_by_month(self):
+        return self._region_results("campaigns")
+
+    @property
+    def gigs_by_month(self):
+        return self._region_results("gigs")
+
     @property
     def instagram_post_impressions_by_month(self):
-        return {
-            region.name: {
-                dt.date.strftime(r[0], "%Y-%m"): r[1]
-                for r in self._instagram_post_impressions_by_month_query(region)
-            }
-            for region in self.regions
-        }
+        return self._region_results("instagram_post_impressions")
 
     @property
     def instagram_story_impressions_by_month(self):
-        return {
-            region.name: {
-                dt.date.strftime(r[0], "%Y-%m"): r[1]
-                for r in self._instagram_story_impressions_by_month_query(region)
-            }
-            for region in self.regions
-        }
+        return self._region_results("instagram_story_impressions")
 
     @property
     def unique_participants_by_month(self):
-        return {
-            region.name: {
-                dt.date.strftime(r[0], "%Y-%m"): r[1]
-                for r in self._unique_participants_by_month_query(region)
-            }
-            for region in self.regions
-        }
+        return self._region_results("unique_participants")
 
     @property
     def new_participants_by_month(self):
-        return {
-            region.name: {
-                dt.date.strftime(r[0], "%Y-%m"): r[1]
-                for r in self._new_participants_by_month_query(region)
-            }
-            for region in self.regions
-        }
+        return self._region_results("new_participants")
 
     @property
     def campaign_reward_model_distribution(self):
@@ -477,3 +524,95 @@ class CampaignStats:
             .filter(Post.deadline < max_deadline)
             .distinct(Campaign.id)
         )
+
+
+def _month_start(date):
+    return dt.date(date.year, date.month, 1)
+
+
+def _trailing_months(today, count=ROLLUP_TRAILING_MONTHS):
+    year, month = today.year, today.month
+    months = []
+    for _ in range(count):
+        months.append(dt.date(year, month, 1))
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+    return months
+
+
+def get_rollup_watermark():
+    """When the campaign stats rollup was last refreshed, or `None` if it
+    has never been populated
+    """
+    return db.session.query(func.max(CampaignStatsMonth.refreshed)).scalar()
+
+
+def get_changed_months(since):
+    """Months with campaign activity since `since`, along with the trailing
+    months which are always considered changed
+    """
+    months = set(_trailing_months(dt.datetime.now(dt.timezone.utc).date()))
+
+    campaign_month = cast(func.date_trunc("month", Post.opened), Date)
+    queries = [
+        db.session.query(campaign_month).filter(Post.modified >= since),
+        db.session.query(campaign_month)
+        .join(Campaign, Post.id == Campaign.first_post_id)
+        .filter(Campaign.modified >= since),
+        db.session.query(campaign_month)
+        .join(Campaign, Post.id == Campaign.first_post_id)
+        .join(Offer)
+        .filter(Offer.modified >= since),
+        db.session.query(campaign_month)
+        .join(Campaign, Post.id == Campaign.first_post_id)
+        .join(Offer)
+        .join(Payment)
+        .filter(Payment.modified >= since),
+    ]
+    for date, modified in (
+        (Offer.created, Offer.modified),
+        (Gig.created, Gig.modified),
+        (Payment.created, Payment.modified),
+        (InstagramPostInsight.created, InstagramPostInsight.modified),
+        (InstagramStoryFrameInsight.created, InstagramStoryFrameInsight.modified),
+    ):
+        queries.append(
+            db.session.query(cast(func.date_trunc("month", date), Date)).filter(modified >= since)
+        )
+
+    for query in queries:
+        months.update(month for (month,) in query.distinct() if month is not None)
+    return sorted(months)
+
+
+def _rollup_rows(metric, key, results):
+    return [
+        dict(month=_month_start(month), metric=metric, key=key, value=int(value))
+        for month, value in results
+        if value is not None
+    ]
+
+
+def refresh_campaign_stats_rollup(months=None):
+    """Recompute the monthly campaign stats rollup for `months`, or for all
+    of history if no months are given. Returns the number of rows written.
+    """
+    stats = CampaignStats()
+    rows = []
+    for region in stats.regions:
+        for metric, query in REGION_METRICS.items():
+            rows.extend(_rollup_rows(metric, region.id, getattr(stats, query)(region, months)))
+    for currency in stats.currencies:
+        rows.extend(
+            _rollup_rows(
+                PAYMENTS_METRIC, currency, stats._payments_by_month_query(currency, months)
+            )
+        )
+
+    stale = CampaignStatsMonth.query
+    if months is not None:
+        stale = stale.filter(CampaignStatsMonth.month.in_(months))
+    stale.delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(CampaignStatsMonth, rows)
+    db.session.commit()
+
+    return len(rows)
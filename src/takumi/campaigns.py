@@ -2,7 +2,7 @@ from contextlib import contextmanager
 from typing import TYPE_CHECKING, Iterator
 
 from takumi.events.campaign import CampaignLog
-from takumi.extensions import db, redis
+from takumi.extensions import db
 
 if TYPE_CHECKING:
     from takumi.models import Campaign
@@ -10,20 +10,26 @@ if TYPE_CHECKING:
 
 @contextmanager
 def campaign_reserve_state(campaign: "Campaign") -> Iterator[bool]:
-    with redis.get_lock(f"campaign-{campaign.id}"):
-        reserved: bool = campaign.is_fully_reserved()
+    """Log the campaign becoming fully reserved, or not, in the block
 
-        yield reserved
+    Reservations are claimed atomically in the fund's reservation ledger, and
+    reading whether the campaign is fully reserved is a constant time read of
+    the ledger, so concurrent reservations don't need to hold a lock on the
+    campaign.
+    """
+    reserved: bool = campaign.is_fully_reserved()
 
-        was_reserved = reserved
-        is_reserved = campaign.is_fully_reserved()
-        if was_reserved != is_reserved:
-            log = CampaignLog(campaign)
-            if is_reserved:
-                # Is now fully reserved
-                log.add_event("full")
-            else:
-                # Is now not reserved
-                log.add_event("not_full")
-            db.session.add(campaign)
-            db.session.commit()
+    yield reserved
+
+    was_reserved = reserved
+    is_reserved = campaign.is_fully_reserved()
+    if was_reserved != is_reserved:
+        log = CampaignLog(campaign)
+        if is_reserved:
+            # Is now fully reserved
+            log.add_event("full")
+        else:
+            # Is now not reserved
+            log.add_event("not_full")
+        db.session.add(campaign)
+        db.session.commit()
@@ -0,0 +1,125 @@
+"""Bulk loading of everything the finance report needs
+
+Computing the cells of the report one campaign and one offer at a time fires
+a query for every lazy relationship and every `hybrid_property_subquery`,
+tens of thousands of them for a busy month. `ReportPrefetch` instead loads
+the campaigns with their advertisers, posts and regions, the per campaign
+aggregates and the offers with their influencers and payments in a fixed
+number of set-based queries, however many campaigns and offers there are.
+The cells are then computed in memory.
+"""
+import datetime as dt
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import sqlalchemy as sa
+from sqlalchemy.orm import joinedload, selectinload
+
+from takumi.extensions import db
+from takumi.models import Campaign, Gig, Offer, Post, Submission, Targeting
+from takumi.models.campaign import CampaignEvent
+
+OFFER_BATCH_SIZE = 500
+
+
+@dataclass
+class CampaignAggregates:
+    """The aggregates of a campaign, which are subqueries on the model"""
+
+    earliest_live_post_date: Optional[dt.datetime] = None
+    earliest_submitted_and_claimed: Optional[dt.datetime] = None
+    completed: Optional[dt.datetime] = None
+    total_posts: int = 0
+    accepted_offers: int = 0
+
+
+class ReportPrefetch:
+    def __init__(self, campaigns: List[Campaign]) -> None:
+        self.campaigns = self._load_campaigns([campaign.id for campaign in campaigns])
+        self.aggregates: Dict[str, CampaignAggregates] = {
+            campaign.id: CampaignAggregates() for campaign in self.campaigns
+        }
+        if self.campaigns:
+            self._load_aggregates(list(self.aggregates))
+
+    def _load_campaigns(self, campaign_ids: List[str]) -> List[Campaign]:
+        if not campaign_ids:
+            return []
+        return (
+            Campaign.query.filter(Campaign.id.in_(campaign_ids))
+            .options(
+                joinedload(Campaign.advertiser),
+                selectinload(Campaign.posts),
+                selectinload(Campaign.targeting).selectinload(Targeting.regions),
+            )
+            .order_by(Campaign.created, Campaign.id)
+            .all()
+        )
+
+    def _set(self, name: str, rows) -> None:
+        for campaign_id, value in rows:
+            setattr(self.aggregates[campaign_id], name, value)
+
+    def _load_aggregates(self, campaign_ids: List[str]) -> None:
+        self._set(
+            "earliest_live_post_date",
+            db.session.query(Post.campaign_id, sa.func.min(Gig.posted))
+            .join(Gig, Gig.post_id == Post.id)
+            .filter(Post.campaign_id.in_(campaign_ids))
+            .group_by(Post.campaign_id),
+        )
+        self._set(
+            "earliest_submitted_and_claimed",
+            db.session.query(Post.campaign_id, sa.func.min(Submission.created))
+            .join(Gig, Gig.post_id == Post.id)
+            .join(Submission, Submission.gig_id == Gig.id)
+            .join(Offer, Offer.id == Gig.offer_id)
+            .filter(
+                Post.campaign_id.in_(campaign_ids),
+                Offer.claimed != None,
+                Gig.posted == None,
+            )
+            .group_by(Post.campaign_id),
+        )
+        self._set(
+            "completed",
+            db.session.query(CampaignEvent.campaign_id, sa.func.max(CampaignEvent.created))
+            .filter(CampaignEvent.campaign_id.in_(campaign_ids), CampaignEvent.type == "complete")
+            .group_by(CampaignEvent.campaign_id),
+        )
+        self._set(
+            "total_posts",
+            db.session.query(Offer.campaign_id, sa.func.count(Gig.id))
+            .join(Gig, Gig.offer_id == Offer.id)
+            .filter(
+                Offer.campaign_id.in_(campaign_ids),
+                Offer.state == Offer.STATES.ACCEPTED,
+                Gig.is_posted,
+            )
+            .group_by(Offer.campaign_id),
+        )
+        self._set(
+            "accepted_offers",
+            db.session.query(Offer.campaign_id, sa.func.count(Offer.id))
+            .filter(Offer.campaign_id.in_(campaign_ids), Offer.state == Offer.STATES.ACCEPTED)
+            .group_by(Offer.campaign_id),
+        )
+
+    def iter_accepted_offers(self, campaigns: List[Campaign]) -> Iterator[Tuple[Campaign, Offer]]:
+        """Iterate the accepted offers of the campaigns, in the order of the
+        campaigns, with a server side cursor, loading the influencers and
+        payments for each batch of offers
+        """
+        if not campaigns:
+            return
+
+        by_id = {campaign.id: campaign for campaign in campaigns}
+        offers = (
+            Offer.query.join(Campaign, Campaign.id == Offer.campaign_id)
+            .filter(Offer.campaign_id.in_(by_id), Offer.state == Offer.STATES.ACCEPTED)
+            .options(selectinload(Offer.influencer), selectinload(Offer.payments))
+            .order_by(Campaign.created, Campaign.id, Offer.created, Offer.id)
+            .yield_per(OFFER_BATCH_SIZE)
+        )
+        for offer in offers:
+            yield by_id[offer.campaign_id], offer
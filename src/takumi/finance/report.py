@@ -1,16 +1,14 @@
 import csv
 import datetime as dt
-from contextlib import contextmanager
-from functools import lru_cache
-from io import StringIO
-from typing import Iterator, List, Optional, Union, cast
+from typing import Dict, Iterator, List, Optional, Union, cast
 
 import sqlalchemy as sa
 from dateutil.parser import parse as date_parse
 from dateutil.relativedelta import relativedelta
 
-from takumi.extensions import db
-from takumi.models import Campaign, Gig, Offer
+from takumi.finance.prefetch import CampaignAggregates, ReportPrefetch
+from takumi.models import Campaign, Offer
+from takumi.utils.streaming import stream_csv
 
 CAMPAIGN_COLUMNS = {
     "name": "Campaign name",
@@ -106,44 +104,17 @@ def _default(prop: str, obj: Union[Campaign, Offer]) -> str:
     return cell
 
 
-def _get_completion(campaign: Campaign) -> Optional[dt.datetime]:
+def _get_completion(campaign: Campaign, aggregates: CampaignAggregates) -> Optional[dt.datetime]:
     if campaign.state == Campaign.STATES.COMPLETED:
-        event = next((event for event in campaign.events[::-1] if event.type == "complete"), None)
-        if event:
-            return event.created
+        return aggregates.completed
     return None
 
 
-def _get_total_posts(campaign: Campaign) -> str:
-    return str(
-        db.session.query(sa.func.count(Gig.id))
-        .join(Offer)
-        .filter(
-            Offer.campaign_id == campaign.id,
-            Offer.state == Offer.STATES.ACCEPTED,
-            Gig.is_posted,
-        )
-        .scalar()
-    )
-
-
-def _get_expected_posts(campaign: Campaign) -> str:
-    accepted_offers = (
-        db.session.query(sa.func.count(Offer.id))
-        .filter(
-            Offer.campaign_id == campaign.id,
-            Offer.state == Offer.STATES.ACCEPTED,
-        )
-        .scalar()
-    )
-    post_count = len(campaign.posts)
-    return str(accepted_offers * post_count)
+def _get_expected_posts(campaign: Campaign, aggregates: CampaignAggregates) -> str:
+    return str(aggregates.accepted_offers * len(campaign.posts))
 
 
-@lru_cache
-def _get_campaign_cells(campaign_id: str) -> List[str]:
-    campaign: Campaign = Campaign.query.get(campaign_id)
-
+def _get_campaign_cells(campaign: Campaign, aggregates: CampaignAggregates) -> List[str]:
     cells: List[str] = []
 
     for prop in CAMPAIGN_COLUMNS.keys():
@@ -151,20 +122,22 @@ def _get_campaign_cells(campaign_id: str) -> List[str]:
         if prop == "FIRST_POST_DATE":
             cell = cast(
                 dt.datetime,
-                campaign.earliest_live_post_date or campaign.earliest_submitted_and_claimed or None,
+                aggregates.earliest_live_post_date
+                or aggregates.earliest_submitted_and_claimed
+                or None,
             )
         elif prop == "DEADLINE":
             cell = min(post.deadline for post in campaign.posts)
         elif prop == "COMPLETION":
-            cell = _get_completion(campaign)
+            cell = _get_completion(campaign, aggregates)
         elif prop == "COUNTRY":
             cell = ",".join({region.country for region in campaign.targeting.regions})
         elif prop == "PLATFORMS":
             cell = ", ".join({post.post_type.title() for post in campaign.posts})
         elif prop == "TOTAL_POSTS":
-            cell = _get_total_posts(campaign)
+            cell = str(aggregates.total_posts)
         elif prop == "EXPECTED_POSTS":
-            cell = _get_expected_posts(campaign)
+            cell = _get_expected_posts(campaign, aggregates)
         else:
             cell = _default(prop, campaign)
 
@@ -209,40 +182,41 @@ def _get_offer_cells(offer: Offer) -> List[str]:
     return cells
 
 
-def get_row(campaign: Campaign, offer: Offer) -> List[str]:
-    offer_cells = _get_offer_cells(offer)
-    campaign_cells = _get_campaign_cells(campaign.id)
-
-    return offer_cells + campaign_cells
-
-
 def get_rows(campaigns: List[Campaign]) -> Iterator[List[str]]:
     def _iter() -> Iterator[List[str]]:
-        campaign: Campaign
-        for campaign in campaigns:
-            if campaign.targeting.regions and campaign.targeting.regions[0].name == "Takumiland":
-                continue
+        prefetch = ReportPrefetch(campaigns)
+        reported_campaigns = [
+            campaign
+            for campaign in prefetch.campaigns
+            if not (
+                campaign.targeting.regions and campaign.targeting.regions[0].name == "Takumiland"
+            )
+        ]
 
-            offer: Offer
-            for offer in Offer.query.filter(
-                Offer.campaign_id == campaign.id, Offer.state == Offer.STATES.ACCEPTED
-            ):
-                yield get_row(campaign, offer)
+        # Only kept for the duration of the export
+        campaign_cells: Dict[str, List[str]] = {}
+
+        campaign: Campaign
+        offer: Offer
+        for campaign, offer in prefetch.iter_accepted_offers(reported_campaigns):
+            if campaign.id not in campaign_cells:
+                campaign_cells[campaign.id] = _get_campaign_cells(
+                    campaign, prefetch.aggregates[campaign.id]
+                )
+            yield _get_offer_cells(offer) + campaign_cells[campaign.id]
 
     return _iter()
 
 
-@contextmanager
 def get_campaign_month_report_csv(month: str) -> Iterator[str]:
-    data = StringIO()
-    writer = csv.writer(data, delimiter=";", quotechar="|", quoting=csv.QUOTE_MINIMAL)
-    writer.writerow(get_headers())
+    """Stream the finance report of the campaigns begun in a month as csv
 
-    campaigns = get_campaigns_begun_in_month(month)
-    row_iter = get_rows(campaigns)
-    for row in row_iter:
-        writer.writerow(row)
+    Nothing is queried until the header has been sent.
+    """
 
-    yield data.getvalue()
+    def rows() -> Iterator[List[str]]:
+        yield from get_rows(get_campaigns_begun_in_month(month))
 
-    data.close()
+    return stream_csv(
+        rows(), header=get_headers(), delimiter=";", quotechar="|", quoting=csv.QUOTE_MINIMAL
+    )
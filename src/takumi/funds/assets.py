@@ -1,13 +1,15 @@
 from flask import current_app
-from sqlalchemy import case, func
+from sqlalchemy import and_, func
 
 from takumi.extensions import db
-from takumi.models import Offer
+from takumi.models import Campaign, Offer
 
 from .fund import Fund
 
 
 class AssetsFund(Fund):
+    reservation_slack = 0
+
     def is_reservable(self):
         return self.reserved_offer_count < self.campaign.units
 
@@ -16,7 +18,16 @@ class AssetsFund(Fund):
             return False
         return self.reserved_offer_count + units <= self.campaign.units
 
-    def is_fulfilled(self):
+    @classmethod
+    def get_fulfilment(cls, campaigns, now):
+        return dict(
+            db.session.query(Campaign.id, func.count(Offer.id) >= Campaign.units)
+            .outerjoin(Offer, and_(Offer.campaign_id == Campaign.id, Offer.is_claimable))
+            .filter(Campaign.id.in_([campaign.id for campaign in campaigns]))
+            .group_by(Campaign.id)
+        )
+
+    def _is_fulfilled_in_memory(self):
         claimable_offers = [o for o in self.campaign.offers if o.is_claimable]
         return len(claimable_offers) >= self.campaign.units
 
@@ -24,22 +35,6 @@ class AssetsFund(Fund):
     def min_followers(self):
         return current_app.config["MINIMUM_FOLLOWERS"]
 
-    def get_progress(self):
-        count_offers = lambda column: func.coalesce(
-            func.sum(case([((column == True), 1)], else_=0)), 0
-        )
-        reserved_count, submitted_count = (
-            db.session.query(
-                count_offers(Offer.is_reserved), count_offers(Offer.is_submitted)
-            ).filter(Offer.campaign_id == self.campaign.id, Offer.is_reserved)
-        ).first()
-
-        return {
-            "total": self.campaign.units,
-            "reserved": reserved_count,
-            "submitted": submitted_count,
-        }
-
     def get_reward(self, followers):
         campaign = self.campaign
 
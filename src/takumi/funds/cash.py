@@ -14,5 +14,12 @@ class CashFund(Fund):
     def min_followers(self):
         return current_app.config["MINIMUM_FOLLOWERS"]
 
-    def get_progress(self):
-        return {"total": 100, "reserved": 0, "submitted": 100}
+    @classmethod
+    def get_fulfilment(cls, campaigns, now):
+        return {campaign.id: True for campaign in campaigns}
+
+    @classmethod
+    def get_campaigns_progress(cls, campaigns):
+        return {
+            campaign.id: {"total": 100, "reserved": 0, "submitted": 100} for campaign in campaigns
+        }
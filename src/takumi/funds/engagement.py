@@ -6,9 +6,8 @@ from takumi.constants import (
     MILLE,
     PESSIMISTIC_ENGAGEMENT_RATE,
 )
-from takumi.extensions import db
 from takumi.funds.reach import ReachFund
-from takumi.models import Offer
+from takumi.models import InstagramPost, Offer
 
 
 def _sum_engagement(column):
@@ -18,16 +17,17 @@ def _sum_engagement(column):
 
 
 class EngagementFund(ReachFund):
-    def _get_engagement(self, column):
-        return (
-            db.session.query(_sum_engagement(column)).filter(Offer.campaign_id == self.campaign.id)
-        ).scalar()
+    def get_reserved_units(self, offer):
+        return offer.engagements_progress or 0
+
+    def _sum_reserved_units(self, column):
+        return _sum_engagement(column)
 
     def _reserved_engagement(self):
-        return self._get_engagement(Offer.is_reserved)
+        return self.ledger.read().reserved_units
 
     def _submitted_engagement(self):
-        return self._get_engagement(Offer.is_submitted)
+        return self.ledger.read().submitted_units
 
     def _remaining_engagement(self):
         return max(0, self.campaign.units - self._reserved_engagement())
@@ -62,7 +62,11 @@ class EngagementFund(ReachFund):
 
         return self._remaining_engagement() + MAX_FOLLOWERS_BEYOND_REWARD_POOL - units >= 0
 
-    def is_fulfilled(self):
+    @classmethod
+    def _claimable_units(cls):
+        return func.coalesce(InstagramPost.likes, 0) + func.coalesce(InstagramPost.comments, 0)
+
+    def _is_fulfilled_in_memory(self):
         for post in self.campaign.posts:
             post_claimable_engagement = [
                 (g.instagram_post.likes + g.instagram_post.comments)
@@ -73,18 +77,9 @@ class EngagementFund(ReachFund):
                 return False
         return True
 
-    def get_progress(self):
-        reserved_engagement, submitted_engagement = (
-            db.session.query(
-                _sum_engagement(Offer.is_reserved), _sum_engagement(Offer.is_submitted)
-            ).filter(Offer.campaign_id == self.campaign.id, Offer.is_reserved)
-        ).first()
-
-        return {
-            "total": self.campaign.units,
-            "reserved": reserved_engagement,
-            "submitted": submitted_engagement,
-        }
+    @classmethod
+    def _sum_progress_units(cls, column):
+        return _sum_engagement(column)
 
     @property
     def unit_mille(self):
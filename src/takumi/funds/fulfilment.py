@@ -0,0 +1,148 @@
+"""Set-based evaluation of the fulfilment and progress of campaigns
+
+Checking whether a campaign is fulfilled one post and one gig at a time
+loads the content, insight, offer and campaign of every gig to check its
+claimability in Python. The funds instead sum the claimable units of every
+post with a single aggregate query, with the claimability of the gigs
+expressed in SQL by `claimable_gig`.
+
+`get_fulfilment` and `get_progress` evaluate many campaigns at once, with
+one query per type of fund, for the scheduled tasks.
+"""
+import datetime as dt
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, case, func, or_
+
+from takumi.constants import NEW_EXTENDED_CLAIM_HOURS_DATE, WAIT_BEFORE_CLAIM_HOURS
+from takumi.extensions import db
+from takumi.models import (
+    Campaign,
+    Gig,
+    Insight,
+    InstagramPost,
+    InstagramStory,
+    Offer,
+    Post,
+    TiktokPost,
+)
+from takumi.models.gig import STATES as GIG_STATES
+from takumi.models.insight import STATES as INSIGHT_STATES
+
+
+def join_gig_content(query):
+    """Outer join the content and insight of the gigs in a query on `Gig`"""
+    return (
+        query.outerjoin(InstagramStory, InstagramStory.gig_id == Gig.id)
+        .outerjoin(InstagramPost, InstagramPost.gig_id == Gig.id)
+        .outerjoin(TiktokPost, TiktokPost.gig_id == Gig.id)
+        .outerjoin(Insight, Insight.gig_id == Gig.id)
+    )
+
+
+def requires_insights():
+    """The SQL equivalent of `Gig.requires_insights`, for a query joined with the campaign"""
+    return and_(Campaign.require_insights, ~Gig.skip_insights)
+
+
+def missing_insights():
+    """The SQL equivalent of `Gig.is_missing_insights`, for a query joined
+    with the campaign and `join_gig_content`
+    """
+    return and_(
+        requires_insights(),
+        or_(Insight.id == None, Insight.state == INSIGHT_STATES.REQUIRES_RESUBMIT),
+    )
+
+
+def claimable_gig(now: dt.datetime):
+    """The SQL equivalent of `Gig.is_claimable` at `now`, for a query joined
+    with the campaign and `join_gig_content`
+    """
+    passed_review_period = case(
+        [
+            (InstagramStory.id != None, InstagramStory.posted < now - dt.timedelta(hours=24)),
+            (InstagramPost.id != None, InstagramPost.posted < now - dt.timedelta(hours=48)),
+        ],
+        else_=Gig.created < now,
+    )
+    claimable_from = case(
+        [
+            (InstagramStory.posted != None, InstagramStory.posted),
+            (InstagramPost.posted != None, InstagramPost.posted),
+        ],
+        else_=TiktokPost.posted,
+    )
+    claimable_before = case(
+        [
+            (
+                or_(Campaign.started == None, Campaign.started > NEW_EXTENDED_CLAIM_HOURS_DATE),
+                now - dt.timedelta(hours=WAIT_BEFORE_CLAIM_HOURS),
+            )
+        ],
+        else_=now - dt.timedelta(days=30),
+    )
+    has_valid_insights = or_(~requires_insights(), Insight.state == INSIGHT_STATES.APPROVED)
+
+    return or_(
+        Gig.state == GIG_STATES.REJECTED,
+        and_(
+            Gig.is_live, passed_review_period, claimable_from < claimable_before, has_valid_insights
+        ),
+    )
+
+
+def get_post_fulfilment(units, campaign_ids: List[str], now: dt.datetime) -> Dict[str, bool]:
+    """Whether the claimable units of every post of the campaigns reach the
+    campaign units, summing `units` over the claimable gigs of each post
+
+    Campaigns without posts are left out.
+    """
+    claimable_units = func.coalesce(func.sum(case([(claimable_gig(now), units)], else_=0)), 0)
+    posts = (
+        join_gig_content(
+            db.session.query(
+                Post.campaign_id.label("campaign_id"),
+                (claimable_units >= Campaign.units).label("fulfilled"),
+            )
+            .select_from(Post)
+            .join(Campaign, Campaign.id == Post.campaign_id)
+            .outerjoin(Gig, Gig.post_id == Post.id)
+            .outerjoin(Offer, Offer.id == Gig.offer_id)
+        )
+        .filter(Post.campaign_id.in_(campaign_ids), ~Post.archived)
+        .group_by(Post.campaign_id, Post.id, Campaign.units)
+        .subquery()
+    )
+    return dict(
+        db.session.query(posts.c.campaign_id, func.bool_and(posts.c.fulfilled)).group_by(
+            posts.c.campaign_id
+        )
+    )
+
+
+def _group_by_fund(campaigns: List[Campaign]):
+    groups = defaultdict(list)
+    for campaign in campaigns:
+        groups[type(campaign.fund)].append(campaign)
+    return groups.items()
+
+
+def get_fulfilment(campaigns: List[Campaign], now: Optional[dt.datetime] = None) -> Dict[str, bool]:
+    """Whether each of the campaigns is fulfilled, keyed by campaign id"""
+    if now is None:
+        now = dt.datetime.now(dt.timezone.utc)
+
+    fulfilment: Dict[str, bool] = {}
+    for fund, fund_campaigns in _group_by_fund(campaigns):
+        fulfilment.update(fund.get_fulfilment(fund_campaigns, now))
+    return fulfilment
+
+
+def get_progress(campaigns: List[Campaign]) -> Dict[str, dict]:
+    """The progress of each of the campaigns, keyed by campaign id"""
+    progress: Dict[str, dict] = {}
+    for fund, fund_campaigns in _group_by_fund(campaigns):
+        progress.update(fund.get_campaigns_progress(fund_campaigns))
+    return progress
@@ -1,22 +1,89 @@
-from takumi.constants import MILLE
+from sqlalchemy import case, func, inspect
+
+from takumi.constants import MAX_FOLLOWERS_BEYOND_REWARD_POOL, MILLE
+from takumi.extensions import db
+from takumi.models import Offer
+
+from . import fulfilment
+from .ledger import ReservationLedger
+
+
+def _count_offers(column):
+    return func.coalesce(func.sum(case([((column == True), 1)], else_=0)), 0)
 
 
 class Fund:
     def __init__(self, campaign):
         self.campaign = campaign
 
+    @property
+    def ledger(self):
+        return ReservationLedger(self)
+
     def get_progress(self):
-        raise NotImplementedError()
+        return self.get_campaigns_progress([self.campaign])[self.campaign.id]
+
+    @classmethod
+    def _sum_progress_units(cls, column):
+        return _count_offers(column)
+
+    @classmethod
+    def get_campaigns_progress(cls, campaigns):
+        """The progress of many campaigns of this fund type, keyed by campaign id"""
+        totals = dict.fromkeys((campaign.id for campaign in campaigns), (0, 0))
+        totals.update(
+            (campaign_id, (reserved, submitted))
+            for campaign_id, reserved, submitted in db.session.query(
+                Offer.campaign_id,
+                cls._sum_progress_units(Offer.is_reserved),
+                cls._sum_progress_units(Offer.is_submitted),
+            )
+            .filter(Offer.campaign_id.in_(list(totals)), Offer.is_reserved)
+            .group_by(Offer.campaign_id)
+        )
+        return {
+            campaign.id: {
+                "total": campaign.units,
+                "reserved": totals[campaign.id][0],
+                "submitted": totals[campaign.id][1],
+            }
+            for campaign in campaigns
+        }
 
     def is_reservable(self):
         raise NotImplementedError()
 
     def is_fulfilled(self):
+        if not inspect(self.campaign).has_identity:
+            # Campaigns that aren't in the database can only be evaluated in memory
+            return self._is_fulfilled_in_memory()
+        return fulfilment.get_fulfilment([self.campaign])[self.campaign.id]
+
+    def _is_fulfilled_in_memory(self):
+        raise NotImplementedError()
+
+    @classmethod
+    def _claimable_units(cls):
+        """The units of a claimable gig towards the fulfilment of its post, in a
+        query joined with the gig content
+        """
         raise NotImplementedError()
 
+    @classmethod
+    def get_fulfilment(cls, campaigns, now):
+        """Whether many campaigns of this fund type are fulfilled, keyed by campaign id"""
+        fulfilled = fulfilment.get_post_fulfilment(
+            cls._claimable_units(), [campaign.id for campaign in campaigns], now
+        )
+        return {campaign.id: fulfilled.get(campaign.id, True) for campaign in campaigns}
+
     @property
     def reserved_offer_count(self):
-        return len(self.campaign.reserved_offers)
+        return self.ledger.read().reserved_offers
+
+    @property
+    def minimum_reservations(self):
+        return 0
 
     @property
     def min_followers(self):
@@ -41,3 +108,43 @@ class Fund:
 
     def get_remaining_reach(self):
         raise NotImplementedError()
+
+    def get_reserved_units(self, offer):
+        """The units an offer takes up in the reservation ledger while reserved"""
+        return 1
+
+    def _sum_reserved_units(self, column):
+        return _count_offers(column)
+
+    def get_reserved_totals(self):
+        """The reserved units, reserved offer count and submitted units of the
+        campaign, from the database
+        """
+        return (
+            db.session.query(
+                self._sum_reserved_units(Offer.is_reserved),
+                _count_offers(Offer.is_reserved),
+                self._sum_reserved_units(Offer.is_submitted),
+            ).filter(Offer.campaign_id == self.campaign.id, Offer.is_reserved)
+        ).first()
+
+    @property
+    def reservation_slack(self):
+        return MAX_FOLLOWERS_BEYOND_REWARD_POOL
+
+    def claim_reservation(self, offer, units=None, force=False):
+        """Atomically check that the campaign is reservable, and that there
+        are `units` remaining if given, and claim the units of the offer until
+        the end of the transaction
+
+        Returns whether the reservation was claimed. Forced reservations are
+        always claimed, to keep the ledger in sync.
+        """
+        return self.ledger.claim(
+            self.get_reserved_units(offer),
+            self.campaign.units,
+            self.minimum_reservations,
+            self.reservation_slack,
+            check_units=units,
+            force=force,
+        )
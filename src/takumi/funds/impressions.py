@@ -1,6 +1,7 @@
 import math
 
-from sqlalchemy import case, func, select
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.orm import joinedload
 
 from takumi.constants import (
     IMPRESSIONS_PER_ASSET,
@@ -9,30 +10,45 @@ from takumi.constants import (
     MILLE,
     MIN_INSTAGRAM_FOLLOWERS_REACH,
 )
-from takumi.extensions import db
-from takumi.models import Influencer, Offer
+from takumi.models import Influencer, Insight, Offer, Post
+from takumi.models.helpers import prefetch_hybrids
+from takumi.models.post import PostTypes
 
+from .fulfilment import missing_insights
 from .fund import Fund
 
 # Campaign.units -> Impressions -> 250k for a 1 million "reach" campaign
 
 
+def _estimated_impressions():
+    return (
+        select([Influencer.estimated_impressions])
+        .where(Influencer.id == Offer.influencer_id)
+        .label("estimated_impressions")
+    )
+
+
 def _sum_estimated_impressions(column):
-    return func.coalesce(
-        func.sum(
-            case(
-                [
-                    (
-                        (column == True),
-                        select([Influencer.estimated_impressions])
-                        .where(Influencer.id == Offer.influencer_id)
-                        .label("estimated_impressions"),
-                    )
-                ],
-                else_=0,
-            )
+    return func.coalesce(func.sum(case([((column == True), _estimated_impressions())], else_=0)), 0)
+
+
+def _insight_impressions():
+    # The columns of the insight table, as the subclass attributes would
+    # restrict the query to a single type of insight
+    insight = Insight.__table__.c
+    return case(
+        [
+            (Post.post_type == PostTypes.story, insight.impressions),
+            (insight.promoted == True, insight.total_impressions),
+        ],
+        else_=(
+            func.coalesce(insight.from_hashtags_impressions, 0)
+            + func.coalesce(insight.from_home_impressions, 0)
+            + func.coalesce(insight.from_profile_impressions, 0)
+            + func.coalesce(insight.from_other_impressions, 0)
+            + func.coalesce(insight.from_explore_impressions, 0)
+            + func.coalesce(insight.from_location_impressions, 0)
         ),
-        0,
     )
 
 
@@ -41,9 +57,24 @@ class ImpressionsFund(Fund):
     def minimum_reservations(self):
         return math.ceil(self.campaign.units / IMPRESSIONS_PER_ASSET)
 
+    def get_reserved_units(self, offer):
+        return offer.impressions or 0
+
+    def get_reserved_totals(self):
+        # The impressions of an offer come from the insights of its gigs, which
+        # can't be summed in SQL
+        reserved_offers = Offer.query.filter(
+            Offer.campaign_id == self.campaign.id, Offer.is_reserved
+        ).all()
+        return (
+            sum(self.get_reserved_units(offer) for offer in reserved_offers),
+            len(reserved_offers),
+            sum(self.get_reserved_units(offer) for offer in reserved_offers if offer.is_submitted),
+        )
+
     @property
     def _reserved_impressions(self):
-        return sum(o.impressions for o in self.campaign.reserved_offers)
+        return self.ledger.read().reserved_units
 
     @property
     def _remaining_impressions(self):
@@ -68,10 +99,25 @@ class ImpressionsFund(Fund):
 
         return self._remaining_impressions + MAX_FOLLOWERS_BEYOND_REWARD_POOL - units >= 0
 
-    def is_fulfilled(self):
-        for post in self.campaign.posts:
+    @classmethod
+    def _claimable_units(cls):
+        impressions = _insight_impressions()
+        return case(
+            [(and_(~missing_insights(), impressions > 0), impressions)],
+            else_=func.coalesce(_estimated_impressions(), 0),
+        )
+
+    def _is_fulfilled_in_memory(self):
+        claimable_gigs = {
+            post: [gig for gig in post.gigs if gig.is_claimable] for post in self.campaign.posts
+        }
+        prefetch_hybrids(
+            [gig.offer.influencer for gigs in claimable_gigs.values() for gig in gigs],
+            ["estimated_impressions"],
+        )
+        for post, gigs in claimable_gigs.items():
             claimable_impressions = 0
-            for gig in [g for g in post.gigs if g.is_claimable]:
+            for gig in gigs:
                 if not gig.is_missing_insights and gig.insight.impressions > 0:
                     claimable_impressions += gig.insight.impressions
                 else:
@@ -81,19 +127,9 @@ class ImpressionsFund(Fund):
                 return False
         return True
 
-    def get_progress(self):
-        reserved_impressions, submitted_impressions = (
-            db.session.query(
-                _sum_estimated_impressions(Offer.is_reserved),
-                _sum_estimated_impressions(Offer.is_submitted),
-            ).filter(Offer.campaign_id == self.campaign.id, Offer.is_reserved)
-        ).first()
-
-        return {
-            "total": self.campaign.units,
-            "reserved": reserved_impressions,
-            "submitted": submitted_impressions,
-        }
+    @classmethod
+    def _sum_progress_units(cls, column):
+        return _sum_estimated_impressions(column)
 
     @property
     def unit_mille(self):
@@ -103,11 +139,15 @@ class ImpressionsFund(Fund):
         return offer.influencer.estimated_impressions
 
     def get_remaining_reach(self):
-        reserved_offers = Offer.query.filter(
-            Offer.campaign_id == self.campaign.id, Offer.is_reserved
+        reserved_offers = (
+            Offer.query.filter(Offer.campaign_id == self.campaign.id, Offer.is_reserved)
+            .options(joinedload(Offer.influencer))
+            .all()
         )
+        influencers = [offer.influencer for offer in reserved_offers]
+        prefetch_hybrids(influencers, ["estimated_impressions"])
 
-        reserved_units = sum([offer.influencer.estimated_impressions for offer in reserved_offers])
+        reserved_units = sum([influencer.estimated_impressions for influencer in influencers])
         remaining_units = max(0, self.campaign.units - reserved_units) / MEDIAN_IMPRESSIONS_RATIO
 
         return remaining_units
@@ -0,0 +1,461 @@
+"""A ledger of the reservations of each campaign, kept in redis
+
+Checking whether a campaign is reservable used to aggregate every offer of the
+campaign, under a lock on the campaign, twice per reservation. When a popular
+campaign launches, thousands of influencers reserving at once serialized
+behind that lock. The ledger instead keeps the totals the funds need in a
+redis hash per campaign:
+
+    RESERVATION_LEDGER:v<LEDGER_VERSION>:<campaign_id>
+        reserved_units: The units of the reserved offers, in the fund's unit
+        reserved_offers: The number of reserved offers
+        submitted_units: The units of the reserved offers with all gigs live
+        pending_units: The units claimed by reservations not committed yet
+        pending_offers: The number of reservations not committed yet
+        version: Incremented every time committed changes are applied
+        generation: A token replaced every time the totals are rebuilt
+        epoch: A token set when the ledger is created, which the pending
+            claims belong to
+
+Reading the ledger is a single `HMGET`, and reserving is a single lua script,
+which atomically checks that the campaign has room for the offer and claims
+its units. The claims are pending until the end of the transaction, when the
+offers that changed state in the transaction are applied to the totals and
+the claims are released, in a single script.
+
+Changes the ledger can't follow incrementally, such as the impressions of a
+gig's insight, discard the totals, which are then rebuilt from the database
+on the next read.
+
+A transaction is committed to the database before its changes are applied
+to the ledger, so totals rebuilt in between may already include them. Each
+transaction notes the generation of the totals before it commits, and if the
+totals have been rebuilt since, its changes discard them instead of being
+added to them. Its claims are only released from the epoch they were made
+in, since claims made before the ledger expired went with it.
+
+The whole ledger also expires every `LEDGER_TTL`, bounding the drift of the
+units which change over time, such as the engagements of an offer once its
+gigs have been live for a while. A ledger whose pending claims have drifted
+below zero is deleted as soon as it's read, and rebuilt in a new epoch.
+
+If redis is unavailable, the totals are read from the database instead,
+without the atomicity of the claims.
+"""
+import datetime as dt
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Optional
+
+from redis.exceptions import RedisError
+from sentry_sdk import capture_exception
+from sqlalchemy import inspect
+
+from takumi.extensions import db, redis
+from takumi.models import Gig, Insight, Offer, Post
+from takumi.models.offer import STATES as OFFER_STATES
+from takumi.session_hooks import SessionHook
+from takumi.utils import uuid4_str
+
+if TYPE_CHECKING:
+    from takumi.funds import Fund
+
+LEDGER_VERSION = 2
+LEDGER_TTL = int(dt.timedelta(minutes=15).total_seconds())
+
+SESSION_LEDGER_CHANGES_KEY = "reservation_ledger_changes"
+
+# The offer columns the units of a reserved offer are computed from
+OFFER_UNIT_COLUMNS = (
+    "followers_per_post",
+    "engagements_per_post",
+    "estimated_engagements_per_post",
+    "live_since",
+)
+
+_CLAIM_SCRIPT = """
+local units = tonumber(ARGV[1])
+local total = tonumber(ARGV[2])
+local minimum = tonumber(ARGV[3])
+local slack = tonumber(ARGV[4])
+local ledger = redis.call(
+    "HMGET",
+    KEYS[1],
+    "reserved_units",
+    "reserved_offers",
+    "pending_units",
+    "pending_offers",
+    "epoch",
+    "generation"
+)
+if tonumber(ledger[3] or "0") < 0 or tonumber(ledger[4] or "0") < 0 then
+    -- More was released than claimed, the ledger has drifted
+    redis.call("DEL", KEYS[1])
+    return -1
+end
+if not ledger[1] then
+    return -1
+end
+if ARGV[6] ~= "1" then
+    local reserved = tonumber(ledger[1]) + tonumber(ledger[3] or "0")
+    local offers = tonumber(ledger[2]) + tonumber(ledger[4] or "0")
+    local remaining = math.max(total - reserved, 0)
+    if offers >= minimum and remaining <= 0 then
+        return 0
+    end
+    if ARGV[5] ~= "" and remaining + slack - tonumber(ARGV[5]) < 0 then
+        return 0
+    end
+end
+redis.call("HINCRBYFLOAT", KEYS[1], "pending_units", units)
+redis.call("HINCRBY", KEYS[1], "pending_offers", 1)
+return {1, ledger[5] or "", ledger[6] or ""}
+"""
+
+_APPLY_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    return 0
+end
+local ledger = redis.call("HMGET", KEYS[1], "epoch", "generation")
+local changed = tonumber(ARGV[1]) ~= 0 or tonumber(ARGV[2]) ~= 0 or tonumber(ARGV[3]) ~= 0
+if ARGV[6] == "1" or (changed and ledger[2] ~= ARGV[8]) then
+    -- Totals rebuilt after the generation the changes were made against
+    -- may already include them
+    redis.call("HDEL", KEYS[1], "reserved_units", "reserved_offers", "submitted_units")
+elseif changed and redis.call("HEXISTS", KEYS[1], "reserved_units") == 1 then
+    redis.call("HINCRBYFLOAT", KEYS[1], "reserved_units", ARGV[1])
+    redis.call("HINCRBY", KEYS[1], "reserved_offers", ARGV[2])
+    redis.call("HINCRBYFLOAT", KEYS[1], "submitted_units", ARGV[3])
+end
+if changed or ARGV[6] == "1" then
+    redis.call("HINCRBY", KEYS[1], "version", 1)
+end
+if tonumber(ARGV[5]) ~= 0 and ledger[1] == ARGV[7] then
+    redis.call("HINCRBYFLOAT", KEYS[1], "pending_units", -tonumber(ARGV[4]))
+    redis.call("HINCRBY", KEYS[1], "pending_offers", -tonumber(ARGV[5]))
+end
+return 1
+"""
+
+_REBUILD_SCRIPT = """
+if (redis.call("HGET", KEYS[1], "version") or "0") ~= ARGV[1] then
+    return 0
+end
+redis.call(
+    "HSET",
+    KEYS[1],
+    "reserved_units",
+    ARGV[2],
+    "reserved_offers",
+    ARGV[3],
+    "submitted_units",
+    ARGV[4],
+    "generation",
+    ARGV[6]
+)
+if redis.call("HEXISTS", KEYS[1], "epoch") == 0 then
+    redis.call("HSET", KEYS[1], "epoch", ARGV[6])
+end
+if redis.call("TTL", KEYS[1]) < 0 then
+    redis.call("EXPIRE", KEYS[1], ARGV[5])
+end
+return 1
+"""
+
+
+def _ledger_key(campaign_id: str) -> str:
+    return f"RESERVATION_LEDGER:v{LEDGER_VERSION}:{campaign_id}"
+
+
+@dataclass
+class LedgerTotals:
+    reserved_units: float = 0
+    reserved_offers: int = 0
+    submitted_units: float = 0
+
+
+@dataclass
+class LedgerChange:
+    """The changes to the ledger of a campaign made in a transaction"""
+
+    reserved_units: float = 0
+    reserved_offers: int = 0
+    submitted_units: float = 0
+    claimed_units: float = 0
+    claimed_offers: int = 0
+    invalidate: bool = False
+    # The epoch the claims were made in
+    epoch: Optional[str] = None
+    # The earliest generation of the totals seen before committing
+    generation: Optional[str] = None
+
+    def script_args(self, committed: bool):
+        versions = [self.epoch or "", self.generation or ""]
+        if not committed:
+            return [0, 0, 0, self.claimed_units, self.claimed_offers, 0, *versions]
+        return [
+            self.reserved_units,
+            self.reserved_offers,
+            self.submitted_units,
+            self.claimed_units,
+            self.claimed_offers,
+            int(self.invalidate),
+            *versions,
+        ]
+
+    def observe_generation(self, campaign_id: str) -> None:
+        """Note the generation of the totals the changes are made against,
+        unless an earlier one has been noted already
+        """
+        if self.generation is not None:
+            return
+        try:
+            self.generation = redis.get_connection().hget(_ledger_key(campaign_id), "generation")
+        except RedisError:
+            capture_exception()
+        # Unknown generations never match, so the changes discard the totals
+        self.generation = self.generation or ""
+
+
+def _float(value: Optional[str]) -> float:
+    return float(value) if value else 0
+
+
+class ReservationLedger:
+    def __init__(self, fund: "Fund") -> None:
+        self.fund = fund
+        self.campaign_id = fund.campaign.id
+        self.key = _ledger_key(self.campaign_id)
+
+    def _database_totals(self) -> LedgerTotals:
+        reserved_units, reserved_offers, submitted_units = self.fund.get_reserved_totals()
+        return LedgerTotals(float(reserved_units), int(reserved_offers), float(submitted_units))
+
+    def read(self) -> LedgerTotals:
+        """The totals of the campaign, counting the pending reservations as
+        reserved, rebuilding the totals if they've been discarded
+        """
+        try:
+            conn = redis.get_connection()
+            (
+                reserved_units,
+                reserved_offers,
+                submitted_units,
+                pending_units,
+                pending_offers,
+            ) = conn.hmget(
+                self.key,
+                "reserved_units",
+                "reserved_offers",
+                "submitted_units",
+                "pending_units",
+                "pending_offers",
+            )
+            pending_units, pending_offers = _float(pending_units), int(pending_offers or 0)
+            if pending_units < 0 or pending_offers < 0:
+                # More was released than claimed, the ledger has drifted
+                conn.delete(self.key)
+                reserved_units = None
+                pending_units, pending_offers = 0, 0
+
+            if reserved_units is None:
+                totals = self.rebuild()
+            else:
+                totals = LedgerTotals(
+                    _float(reserved_units), int(reserved_offers or 0), _float(submitted_units)
+                )
+        except RedisError:
+            capture_exception()
+            return self._database_totals()
+
+        totals.reserved_units += pending_units
+        totals.reserved_offers += pending_offers
+        return totals
+
+    def rebuild(self) -> LedgerTotals:
+        """Rebuild the committed totals from the database
+
+        The totals aren't stored if a transaction committed changes to the
+        ledger in the meantime, as they may not include them.
+        """
+        conn = redis.get_connection()
+        version = conn.hget(self.key, "version") or "0"
+        totals = self._database_totals()
+
+        # The current transaction's own changes are applied when it commits
+        change = ledger_changes.collected(db.session).get(self.campaign_id, LedgerChange())
+        totals.reserved_units -= change.reserved_units
+        totals.reserved_offers -= change.reserved_offers
+        totals.submitted_units -= change.submitted_units
+
+        if not change.invalidate:
+            conn.register_script(_REBUILD_SCRIPT)(
+                keys=[self.key],
+                args=[
+                    version,
+                    totals.reserved_units,
+                    totals.reserved_offers,
+                    totals.submitted_units,
+                    LEDGER_TTL,
+                    uuid4_str(),
+                ],
+            )
+        return totals
+
+    def claim(
+        self,
+        units: float,
+        total: float,
+        minimum_reservations: float,
+        slack: float,
+        check_units: Optional[float] = None,
+        force: bool = False,
+    ) -> bool:
+        """Atomically check that the campaign is reservable and claim `units`
+        for the rest of the transaction
+
+        The campaign is reservable while the minimum number of reservations
+        hasn't been met, or while there are units remaining. If `check_units`
+        is given, the remaining units, plus the slack, must also cover them.
+        Forced claims are counted regardless.
+        """
+        units = float(units or 0)
+        args = [
+            units,
+            total,
+            minimum_reservations,
+            slack,
+            "" if check_units is None else check_units,
+            int(force),
+        ]
+
+        try:
+            script = redis.get_connection().register_script(_CLAIM_SCRIPT)
+            result = script(keys=[self.key], args=args)
+            if result == -1:
+                self.rebuild()
+                result = script(keys=[self.key], args=args)
+        except RedisError:
+            capture_exception()
+            result = -1
+
+        if result == -1:
+            # No totals to claim against, check the database instead
+            return force or _has_room(
+                self._database_totals(), total, minimum_reservations, slack, check_units
+            )
+        if not result:
+            return False
+
+        _, epoch, generation = result
+        change = ledger_changes.collected(db.session).setdefault(self.campaign_id, LedgerChange())
+        if change.epoch != epoch:
+            # Claims made before the ledger expired went with it
+            change.epoch = epoch
+            change.claimed_units = change.claimed_offers = 0
+        change.claimed_units += units
+        change.claimed_offers += 1
+        if change.generation is None:
+            change.generation = generation
+        return True
+
+
+def _has_room(
+    totals: LedgerTotals,
+    total: float,
+    minimum_reservations: float,
+    slack: float,
+    check_units: Optional[float],
+) -> bool:
+    """The check of the claim script, for when redis is unavailable"""
+    remaining = max(total - totals.reserved_units, 0)
+    if totals.reserved_offers >= minimum_reservations and remaining <= 0:
+        return False
+    return check_units is None or remaining + slack - check_units >= 0
+
+
+def _apply_changes(changes: Dict[str, LedgerChange], committed: bool) -> None:
+    try:
+        conn = redis.get_connection()
+        script = conn.register_script(_APPLY_SCRIPT)
+        pipeline = conn.pipeline(transaction=False)
+        for campaign_id, change in changes.items():
+            script(
+                keys=[_ledger_key(campaign_id)],
+                args=change.script_args(committed),
+                client=pipeline,
+            )
+        pipeline.execute()
+    except RedisError:
+        # The ledger drifts until it expires
+        capture_exception()
+
+
+def _offer_totals(offer: Offer, reserved: bool):
+    if not reserved:
+        return 0, 0, 0
+    campaign = offer.campaign
+    units = campaign.fund.get_reserved_units(offer) or 0
+    submitted = units if offer.live_gig_count >= campaign.post_count else 0
+    return units, 1, submitted
+
+
+def _collect_offer(session, offer: Offer, changes: Dict[str, LedgerChange]) -> None:
+    state = inspect(offer)
+    history = state.attrs.state.history
+    if offer in session.new:
+        was_reserved = False
+    elif history.deleted:
+        was_reserved = history.deleted[0] == OFFER_STATES.ACCEPTED
+    else:
+        was_reserved = offer.state == OFFER_STATES.ACCEPTED
+    is_reserved = offer not in session.deleted and offer.state == OFFER_STATES.ACCEPTED
+
+    if was_reserved != is_reserved:
+        before = _offer_totals(offer, was_reserved)
+        after = _offer_totals(offer, is_reserved)
+        change = changes.setdefault(offer.campaign_id, LedgerChange())
+        change.observe_generation(offer.campaign_id)
+        change.reserved_units += after[0] - before[0]
+        change.reserved_offers += after[1] - before[1]
+        change.submitted_units += after[2] - before[2]
+    elif is_reserved and any(
+        state.attrs[column].history.has_changes() for column in OFFER_UNIT_COLUMNS
+    ):
+        changes.setdefault(offer.campaign_id, LedgerChange()).invalidate = True
+
+
+def _invalidate(changes: Dict[str, LedgerChange], campaign_id: Optional[str]) -> None:
+    if campaign_id is not None:
+        changes.setdefault(campaign_id, LedgerChange()).invalidate = True
+
+
+def collect_ledger_change(session, instance, changes: Dict[str, LedgerChange]) -> None:
+    if isinstance(instance, Offer):
+        _collect_offer(session, instance, changes)
+    elif isinstance(instance, Gig):
+        _invalidate(changes, instance.offer and instance.offer.campaign_id)
+    elif isinstance(instance, Insight):
+        gig = instance.gig
+        _invalidate(changes, gig and gig.offer and gig.offer.campaign_id)
+    elif isinstance(instance, Post):
+        _invalidate(changes, instance.campaign_id)
+
+
+def apply_ledger_changes(changes: Dict[str, LedgerChange]) -> None:
+    _apply_changes(changes, committed=True)
+
+
+def release_ledger_claims(changes: Dict[str, LedgerChange]) -> None:
+    claims = {
+        campaign_id: change for campaign_id, change in changes.items() if change.claimed_offers
+    }
+    if claims:
+        _apply_changes(claims, committed=False)
+
+
+ledger_changes = SessionHook(
+    SESSION_LEDGER_CHANGES_KEY,
+    on_commit=apply_ledger_changes,
+    collect=collect_ledger_change,
+    on_rollback=release_ledger_claims,
+)
@@ -8,8 +8,7 @@ from takumi.constants import (
     MIN_INSTAGRAM_FOLLOWERS_REACH,
     REACH_PER_ASSET,
 )
-from takumi.extensions import db
-from takumi.models import Offer
+from takumi.models import InstagramPost, InstagramStory, Offer, Post
 from takumi.models.post import PostTypes
 
 from .fund import Fund
@@ -24,18 +23,17 @@ class ReachFund(Fund):
     def _reach(self):
         return self.campaign.units
 
-    def _get_reach(self, column):
-        return (
-            db.session.query(_sum_reach(column))
-            .filter(Offer.campaign_id == self.campaign.id)
-            .scalar()
-        )
+    def get_reserved_units(self, offer):
+        return offer.followers_per_post or 0
+
+    def _sum_reserved_units(self, column):
+        return _sum_reach(column)
 
     def _reserved_reach(self):
-        return self._get_reach(Offer.is_reserved)
+        return self.ledger.read().reserved_units
 
     def _submitted_reach(self):
-        return self._get_reach(Offer.is_submitted)
+        return self.ledger.read().submitted_units
 
     def _remaining_reach(self):
         return max(0, self._reach - self._reserved_reach())
@@ -59,7 +57,21 @@ class ReachFund(Fund):
 
         return self._remaining_reach() + MAX_FOLLOWERS_BEYOND_REWARD_POOL - units >= 0
 
-    def is_fulfilled(self):
+    @classmethod
+    def _claimable_units(cls):
+        return case(
+            [
+                (
+                    Post.post_type == PostTypes.story,
+                    func.coalesce(
+                        func.nullif(InstagramStory.followers, 0), Offer.followers_per_post
+                    ),
+                )
+            ],
+            else_=func.coalesce(func.nullif(InstagramPost.followers, 0), Offer.followers_per_post),
+        )
+
+    def _is_fulfilled_in_memory(self):
         """Check if the claimable reach per post is above the campaign units"""
         for post in self.campaign.posts:
             if post.post_type == PostTypes.story:
@@ -87,14 +99,9 @@ class ReachFund(Fund):
     def min_followers(self):
         return MIN_INSTAGRAM_FOLLOWERS_REACH
 
-    def get_progress(self):
-        reserved_reach, submitted_reach = (
-            db.session.query(_sum_reach(Offer.is_reserved), _sum_reach(Offer.is_submitted)).filter(
-                Offer.campaign_id == self.campaign.id, Offer.is_reserved
-            )
-        ).first()
-
-        return {"total": self._reach, "reserved": reserved_reach, "submitted": submitted_reach}
+    @classmethod
+    def _sum_progress_units(cls, column):
+        return _sum_reach(column)
 
     @property
     def unit_mille(self):
@@ -0,0 +1,141 @@
+"""Parsed and validated GraphQL documents
+
+Clients send the same documents over and over, so the parsed and validated
+documents are kept in a per process LRU, keyed by schema and the sha256 hash
+of the document, and known documents aren't parsed or validated again.
+
+Clients can also send only the hash of a document instead of the full text,
+as an automatic persisted query:
+
+    {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": "<hash>"}}}
+
+If the server doesn't know the hash yet, it responds with a
+`PersistedQueryNotFound` error, and the client retries with both the hash and
+the document, which registers the document for every process. Only valid
+documents of at most `MAX_PERSISTED_QUERY_SIZE` characters are registered,
+larger ones are executed without being registered.
+"""
+import datetime as dt
+import hashlib
+import threading
+from collections import OrderedDict
+
+from graphql import Source, parse, validate
+
+from takumi.cache import RedisCache
+
+DOCUMENT_CACHE_SIZE = 1000
+PERSISTED_QUERY_TTL = int(dt.timedelta(days=30).total_seconds())
+MAX_PERSISTED_QUERY_SIZE = 20000  # characters
+
+PERSISTED_QUERY_NOT_FOUND = "PersistedQueryNotFound"
+PERSISTED_QUERY_NOT_SUPPORTED = "PersistedQueryNotSupported"
+PERSISTED_QUERY_HASH_MISMATCH = "provided sha does not match query"
+
+persisted_queries = RedisCache("gql_persisted_query", default_ttl=PERSISTED_QUERY_TTL)
+
+
+class PersistedQueryError(Exception):
+    pass
+
+
+class Document:
+    def __init__(self, ast, errors):
+        self.ast = ast
+        self.errors = errors
+
+    @property
+    def valid(self):
+        return not self.errors
+
+
+class DocumentCache:
+    """A thread safe LRU of validated documents, keyed by schema and hash"""
+
+    def __init__(self, maxsize=DOCUMENT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def get(self, schema, document_hash):
+        key = (schema, document_hash)
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+            return document
+
+    def set(self, schema, document_hash, document):
+        key = (schema, document_hash)
+        with self._lock:
+            self._documents[key] = document
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.maxsize:
+                self._documents.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+
+
+document_cache = DocumentCache()
+
+
+def hash_query(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def get_persisted_query_hash(extensions):
+    """Get the hash of the persisted query from the request extensions"""
+    persisted_query = (extensions or {}).get("persistedQuery")
+    if not persisted_query:
+        return None
+    if persisted_query.get("version") != 1 or not persisted_query.get("sha256Hash"):
+        raise PersistedQueryError(PERSISTED_QUERY_NOT_SUPPORTED)
+    return persisted_query["sha256Hash"]
+
+
+def register_persisted_query(query, document_hash):
+    """Register a valid document under its hash"""
+    if len(query) <= MAX_PERSISTED_QUERY_SIZE:
+        persisted_queries.set(document_hash, query)
+
+
+def get_document(schema, query=None, persisted_hash=None):
+    """Get the parsed and validated document for a query, or for the hash of a
+    persisted query
+
+    Returns the document and whether it was cached. Only valid documents are
+    cached, so arbitrary invalid queries can't push the known ones out.
+    Raises `PersistedQueryError` for unknown persisted queries, and
+    `GraphQLSyntaxError` if the query can't be parsed.
+    """
+    if persisted_hash is None:
+        document_hash = hash_query(query)
+    else:
+        document_hash = persisted_hash
+        if query is not None and hash_query(query) != document_hash:
+            raise PersistedQueryError(PERSISTED_QUERY_HASH_MISMATCH)
+    register = persisted_hash is not None and query is not None
+
+    document = document_cache.get(schema, document_hash)
+    if document is not None:
+        if register:
+            register_persisted_query(query, document_hash)
+        return document, True
+
+    if query is None:
+        query = persisted_queries.get(document_hash)
+        if query is None:
+            raise PersistedQueryError(PERSISTED_QUERY_NOT_FOUND)
+
+    ast = parse(Source(query, name="GraphQL request"))
+    document = Document(ast, validate(schema, ast))
+    if document.valid:
+        document_cache.set(schema, document_hash, document)
+        if register:
+            register_persisted_query(query, document_hash)
+    return document, False
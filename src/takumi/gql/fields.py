@@ -11,6 +11,7 @@ from graphene.utils.str_converters import to_camel_case, to_snake_case
 from graphql_relay.connection.arrayconnection import connection_from_list_slice
 
 from takumi.gql.exceptions import FieldException
+from takumi.gql.pagination import decode_cursor, get_sort_keys, paginate
 from takumi.roles.needs import (
     advertiser_admin_access,
     advertiser_member_access,
@@ -291,6 +292,8 @@ class ConnectionField(relay.ConnectionField):
     def __init__(self, type, *args, **kwargs):
         # Allow setting the max first for a connection field, defaulting to 100
         self._max_first = kwargs.pop("_max_first", 100)
+        # Page with keyset cursors when the resolver returns an ordered query
+        self._keyset = kwargs.pop("_keyset", False)
         kwargs.setdefault("all_results", Boolean())
         super().__init__(type, *args, **kwargs)
 
@@ -309,6 +312,15 @@ class ConnectionField(relay.ConnectionField):
         iterable = resolver(root, info, **resolver_args)
         if iterable is None:
             iterable = []
+
+        if self._keyset and "first" in args and not {"last", "before"} & args.keys():
+            keys = get_sort_keys(iterable)
+            after = decode_cursor(args["after"]) if "after" in args else None
+            if keys is not None and (after is not None or "after" not in args):
+                return self.keyset_connection_resolver(
+                    iterable, keys, connection, args["first"], after
+                )
+
         if type(iterable) == list:
             _len = len(iterable)
         else:
@@ -341,13 +353,56 @@ class ConnectionField(relay.ConnectionField):
         connection.count = _len
         return connection
 
+    def keyset_connection_resolver(self, query, keys, connection, first, after):
+        """Resolve a page of the connection after a keyset cursor
+
+        The count of the connection is only queried if it's requested.
+        """
+        page, has_next_page = paginate(query, keys, first, after)
+        edges = [connection.Edge(node=node, cursor=cursor) for node, cursor in page]
+
+        connection = connection(
+            edges=edges,
+            page_info=PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=after is not None,
+                has_next_page=has_next_page,
+            ),
+        )
+        connection.iterable = query
+        connection.count = query.count
+        return connection
+
     def get_resolver(self, parent_resolver):
         return partial(self.connection_resolver, parent_resolver, self.type)
 
 
 class InfluencerConnectionField(ConnectionField):
+    def _page_window(self, args):
+        """The offset and size of the page requested with `first` and
+        `after`, or None when the page depends on the total count
+        """
+        if args.get("all_results") or {"last", "before"} & args.keys():
+            return None
+        offset = 0
+        if "after" in args:
+            offset = int(base64.b64decode(args["after"]).decode().split(":", 1)[1]) + 1
+        return offset, args.get("first", self._max_first)
+
     def connection_resolver(self, resolver, connection, root, info, **args):
-        connection = super().connection_resolver(resolver, connection, root, info, **args)
+        from takumi.search.influencer import InfluencerSearch
+
+        window = self._page_window(args)
+
+        def page_resolver(root, info, **resolver_args):
+            # Fetch the page, count and aggregations of a search at once
+            iterable = resolver(root, info, **resolver_args)
+            if window is not None and isinstance(iterable, InfluencerSearch):
+                iterable.fetch_page(*window)
+            return iterable
+
+        connection = super().connection_resolver(page_resolver, connection, root, info, **args)
         aggregations = connection.iterable.aggregations() or {}
         count_by_fields = [
             k[len("count_by_") :] for k in aggregations.keys() if k.startswith("count_by_")
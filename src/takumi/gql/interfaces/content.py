@@ -4,6 +4,7 @@ from graphene import Interface
 from itp import itp
 
 from takumi.gql import fields
+from takumi.gql.loaders import load_relationship
 
 
 class ContentInterface(Interface):
@@ -15,10 +16,9 @@ class ContentInterface(Interface):
     hashtags = fields.List(fields.String, description="The hashtags in the caption")
 
     def resolve_media(content, info):
-        if len(content.media) > 1 or len(content.media) == 0:
-            return content.media
-
-        return content.media[0]
+        return load_relationship(content, "media").then(
+            lambda media: media if len(media) != 1 else media[0]
+        )
 
     def resolve_mentions(content, info):
         if content.caption:
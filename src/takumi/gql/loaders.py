@@ -0,0 +1,188 @@
+"""Request scoped batching of relationship loads for GraphQL resolvers
+
+Resolving a relationship on a list of objects lazy loads it one object at a
+time. `load_relationship` instead defers the load to a `DataLoader` for the
+relationship, which loads it for every object resolved at the same level of
+the query with a single `IN (...)` query. The loaded values are set on the
+objects, so later access to the relationship doesn't query again.
+
+The hybrid subquery attributes of the models query once per object as well.
+`load_hybrid` defers them to a `HybridLoader`, which evaluates them for every
+object resolved at the same level with a single query, through
+`prefetch_hybrids`.
+
+The suggested submission deadlines of posts are computed in working time,
+a period at a time. `load_submission_deadline` defers them to a
+`SubmissionDeadlineLoader`, which computes them for every post resolved at
+the same level at once, through `get_submission_deadlines`.
+
+The loaders are stored on `flask.g`, and their caches live for the request,
+or until the session commits, so that a mutation doesn't resolve the values
+that were loaded before it changed them. `clear_loaders_after_commit` is
+registered with the other session hooks by `register_session_hooks`.
+"""
+from collections import defaultdict
+
+from flask import g, has_app_context
+from promise import Promise
+from promise.dataloader import DataLoader
+from sqlalchemy import inspect
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.base import instance_state
+
+from takumi.extensions import db
+from takumi.models.helpers import get_hybrid_values
+from takumi.schedule import get_submission_deadlines
+
+
+class RelationshipLoader(DataLoader):
+    """Loads a relationship for many objects of the same model, keyed by the
+    primary key of the objects
+    """
+
+    def __init__(self, relationship):
+        super().__init__()
+        self.relationship = relationship
+
+    def batch_load_fn(self, keys):
+        relationship = self.relationship
+        parent = relationship.parent.class_
+        primary_key = relationship.parent.primary_key[0]
+
+        query = (
+            db.session.query(primary_key, relationship.mapper.class_)
+            .select_from(parent)
+            .join(getattr(parent, relationship.key))
+            .filter(primary_key.in_(keys))
+        )
+        if relationship.order_by:
+            query = query.order_by(*relationship.order_by)
+
+        results = defaultdict(list)
+        for key, value in query:
+            results[key].append(value)
+
+        if relationship.uselist:
+            return Promise.resolve([results[key] for key in keys])
+        return Promise.resolve([next(iter(results[key]), None) for key in keys])
+
+
+class HybridLoader(DataLoader):
+    """Evaluates a hybrid attribute for many objects of the same model, keyed
+    by the id of the objects
+
+    The values are memoized in the session rather than in the loader, so they
+    are evaluated again after a mutation flushes its changes.
+    """
+
+    def __init__(self, cls, name):
+        super().__init__(cache=False)
+        self.cls = cls
+        self.name = name
+
+    def batch_load_fn(self, keys):
+        return Promise.resolve(get_hybrid_values(self.cls, keys, self.name))
+
+
+class SubmissionDeadlineLoader(DataLoader):
+    """Computes the submission deadlines of many posts at once, keyed by the
+    posts
+    """
+
+    def batch_load_fn(self, posts):
+        deadlines = get_submission_deadlines(posts)
+        return Promise.resolve([deadlines.get(post.id) for post in posts])
+
+
+def _get_loader(key, factory):
+    if "gql_loaders" not in g:
+        g.gql_loaders = {}
+    if key not in g.gql_loaders:
+        g.gql_loaders[key] = factory()
+    return g.gql_loaders[key]
+
+
+def clear_loaders():
+    """Drop the loaders of the current request, with everything they cached"""
+    if has_app_context():
+        g.pop("gql_loaders", None)
+
+
+def clear_loaders_after_commit(session):
+    clear_loaders()
+
+
+def get_loader(relationship):
+    """Get the loader for a relationship property, for the current request"""
+    return _get_loader(relationship, lambda: RelationshipLoader(relationship))
+
+
+def get_hybrid_loader(cls, name):
+    """Get the loader for a hybrid attribute of a model, for the current request"""
+    return _get_loader((cls, name), lambda: HybridLoader(cls, name))
+
+
+def load_relationship(obj, name):
+    """Load the relationship `name` of `obj` through the request's loader
+
+    Falls back to plain attribute access for anything that isn't a persistent
+    model instance, such as the search results, and for relationships that
+    have already been loaded. Always returns a promise.
+    """
+    try:
+        state = instance_state(obj)
+    except AttributeError:
+        return Promise.resolve(getattr(obj, name, None))
+
+    relationship = inspect(type(obj)).relationships.get(name)
+    if relationship is None or not state.persistent or name not in state.unloaded:
+        return Promise.resolve(getattr(obj, name))
+
+    def _set_loaded(value):
+        set_committed_value(obj, name, value)
+        return value
+
+    return get_loader(relationship).load(state.identity[0]).then(_set_loaded)
+
+
+def relationship_resolver(name):
+    """A resolver that loads the relationship `name` of the root"""
+
+    def _relationship_resolver(root, info, **kwargs):
+        return load_relationship(root, name)
+
+    return _relationship_resolver
+
+
+def load_hybrid(obj, name):
+    """Evaluate the hybrid attribute `name` of `obj` through the request's loader
+
+    Falls back to plain attribute access for anything that isn't a persistent
+    model instance, such as the search results. Always returns a promise.
+    """
+    try:
+        state = instance_state(obj)
+    except AttributeError:
+        return Promise.resolve(getattr(obj, name, None))
+
+    if not state.persistent:
+        return Promise.resolve(getattr(obj, name))
+
+    return get_hybrid_loader(type(obj), name).load(state.identity[0])
+
+
+def hybrid_resolver(name):
+    """A resolver that evaluates the hybrid attribute `name` of the root"""
+
+    def _hybrid_resolver(root, info, **kwargs):
+        return load_hybrid(root, name)
+
+    return _hybrid_resolver
+
+
+def load_submission_deadline(post):
+    """The submission deadline of `post`, computed through the request's loader
+
+    Always returns a promise.
+    """
+    return _get_loader(SubmissionDeadlineLoader, SubmissionDeadlineLoader).load(post)
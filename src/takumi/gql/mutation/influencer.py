@@ -14,6 +14,12 @@ from takumi.i18n import locale_context
 from takumi.models import Address
 from takumi.models.offer import STATES as OFFER_STATES
 from takumi.roles import permissions
+from takumi.search.influencer import (
+    BACKFILL_WORKERS,
+    BULK_INDEXING_BATCH_SIZE,
+    migrate_influencer_index,
+    rebuild_influencer_index,
+)
 from takumi.services import InfluencerService, InstagramAccountService, OfferService, UserService
 from takumi.tokens import create_otp_token
 from takumi.utils.login import create_login_code
@@ -331,6 +337,71 @@ class GetOTPForInfluencer(Mutation):
         return GetOTPForInfluencer(token=token, login_code=login_code, url=url, ok=True)
 
 
+class RebuildInfluencerIndex(Mutation):
+    """Re-index every influencer in bulk
+
+    Progress and throughput are written to the indexing worker log
+    """
+
+    class Arguments:
+        batch_size = arguments.Int(
+            description="How many influencers to index per bulk request",
+            default_value=BULK_INDEXING_BATCH_SIZE,
+        )
+
+    @permissions.developer.require()
+    def mutate(root, info, batch_size: int = BULK_INDEXING_BATCH_SIZE) -> "RebuildInfluencerIndex":
+        if batch_size < 1:
+            raise MutationException("Batch size has to be positive")
+
+        rebuild_influencer_index.delay(batch_size=batch_size)
+
+        return RebuildInfluencerIndex(ok=True)
+
+
+class MigrateInfluencerIndex(Mutation):
+    """Build the next version of the influencer index with the current
+    mappings, and swap searches over to it once it's complete
+
+    Progress and throughput are written to the indexing worker log
+    """
+
+    class Arguments:
+        workers = arguments.Int(
+            description="How many bulk requests to send at the same time",
+            default_value=BACKFILL_WORKERS,
+        )
+        batch_size = arguments.Int(
+            description="How many influencers to index per bulk request",
+            default_value=BULK_INDEXING_BATCH_SIZE,
+        )
+        max_difference = arguments.Int(
+            description="How many documents the new index may be off by from the number of influencers",
+            default_value=0,
+        )
+
+    @permissions.developer.require()
+    def mutate(
+        root,
+        info,
+        workers: int = BACKFILL_WORKERS,
+        batch_size: int = BULK_INDEXING_BATCH_SIZE,
+        max_difference: int = 0,
+    ) -> "MigrateInfluencerIndex":
+        if workers < 1:
+            raise MutationException("Workers have to be positive")
+        if batch_size < 1:
+            raise MutationException("Batch size has to be positive")
+        if max_difference < 0:
+            raise MutationException("Max difference can't be negative")
+
+        migrate_influencer_index.delay(
+            workers=workers, batch_size=batch_size, max_difference=max_difference
+        )
+
+        return MigrateInfluencerIndex(ok=True)
+
+
 class InfluencerSignup(Mutation):
     class Arguments:
         full_name = arguments.String(required=True)
@@ -617,6 +688,8 @@ class InfluencerMutation:
     influencer_set_address = InfluencerSetAddress.Field()
     influencer_signup = InfluencerSignup.Field()
     message_influencer = MessageInfluencer.Field()
+    rebuild_influencer_index = RebuildInfluencerIndex.Field()
+    migrate_influencer_index = MigrateInfluencerIndex.Field()
     review_influencer = ReviewInfluencer.Field()
     schedule_influencer_deletion = ScheduleInfluencerDeletion.Field()
     set_influencer_email = SetInfluencerEmail.Field()
@@ -0,0 +1,147 @@
+"""Keyset pagination for connection fields
+
+Offset pagination counts the whole query and then has the database scan past
+every row before the page. Keyset pagination instead encodes the sort key of
+the last row of a page in the cursor, and filters the next page to the rows
+that sort after it, which is constant time with a matching index.
+
+The sort key is the `ORDER BY` of the query, with the primary key appended as
+a tie breaker. Nulls are compared the way postgres sorts them by default,
+last when ascending and first when descending.
+"""
+import base64
+import datetime as dt
+import json
+from decimal import Decimal
+
+from sqlalchemy import and_, false, inspect, or_
+from sqlalchemy.orm import Query
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import ColumnElement, UnaryExpression
+
+from takumi.gql.exceptions import QueryException
+
+CURSOR_PREFIX = "keyset:"
+
+
+def _encode_value(value):
+    if isinstance(value, dt.datetime):
+        return {"datetime": value.isoformat()}
+    if isinstance(value, dt.date):
+        return {"date": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"decimal": str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "datetime" in value:
+            return dt.datetime.fromisoformat(value["datetime"])
+        if "date" in value:
+            return dt.date.fromisoformat(value["date"])
+        if "decimal" in value:
+            return Decimal(value["decimal"])
+    return value
+
+
+def encode_cursor(values):
+    """Encode the sort key values of a row into an opaque cursor"""
+    payload = json.dumps([_encode_value(value) for value in values], separators=(",", ":"))
+    return base64.b64encode((CURSOR_PREFIX + payload).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Decode a cursor into the sort key values, or `None` if it isn't a
+    keyset cursor
+    """
+    try:
+        decoded = base64.b64decode(cursor).decode()
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not decoded.startswith(CURSOR_PREFIX):
+        return None
+    try:
+        values = json.loads(decoded[len(CURSOR_PREFIX) :])
+        if not isinstance(values, list):
+            raise ValueError("Cursor values aren't a list")
+        return [_decode_value(value) for value in values]
+    except (ValueError, TypeError):
+        raise QueryException("Invalid cursor")
+
+
+def get_sort_keys(query):
+    """Get the sort keys of a query, as a list of (expression, descending)
+
+    Returns `None` if the query can't be keyset paginated, that is if it
+    isn't a query for a single model or is ordered in a way that can't be
+    compared, such as with explicit nulls ordering.
+    """
+    if not isinstance(query, Query) or len(query.column_descriptions) != 1:
+        return None
+    entity = query.column_descriptions[0]["entity"]
+    if entity is None or query.column_descriptions[0]["type"] is not entity:
+        return None
+
+    keys = []
+    for clause in query._order_by or []:
+        descending = False
+        if isinstance(clause, UnaryExpression):
+            if clause.modifier is operators.desc_op:
+                descending = True
+            elif clause.modifier is not operators.asc_op:
+                return None
+            clause = clause.element
+        if not isinstance(clause, ColumnElement):
+            return None
+        keys.append((clause, descending))
+
+    primary_key = inspect(entity).primary_key[0]
+    if not any(primary_key.shares_lineage(key) for key, _ in keys):
+        keys.append((primary_key, False))
+    return keys
+
+
+def _beyond(key, descending, value):
+    if value is None:
+        return key.isnot(None) if descending else false()
+    if descending:
+        return key < value
+    return or_(key > value, key.is_(None))
+
+
+def _equal(key, value):
+    if value is None:
+        return key.is_(None)
+    return key == value
+
+
+def _after(keys, values):
+    return or_(
+        *[
+            and_(
+                *[_equal(key, value) for (key, _), value in zip(keys[:index], values[:index])],
+                _beyond(key, descending, values[index]),
+            )
+            for index, (key, descending) in enumerate(keys)
+        ]
+    )
+
+
+def paginate(query, keys, first, after=None):
+    """Get the page of `first` rows after the `after` cursor values
+
+    Returns a list of (object, cursor) and whether there's a next page.
+    """
+    if after is not None:
+        if len(after) != len(keys):
+            raise QueryException("Invalid cursor")
+        query = query.filter(_after(keys, after))
+
+    query = query.order_by(None).order_by(
+        *[key.desc() if descending else key.asc() for key, descending in keys]
+    )
+    rows = query.add_columns(*[key for key, _ in keys]).limit(first + 1).all()
+
+    page = [(row[0], encode_cursor(row[1:])) for row in rows[:first]]
+    return page, len(rows) > first
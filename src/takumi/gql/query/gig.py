@@ -35,10 +35,10 @@ class GigQuery:
         "posted": arguments.Boolean(),
     }
     gig = fields.Field("Gig", id=arguments.UUID(required=True))
-    gigs = fields.ConnectionField("GigConnection", **_filters)
+    gigs = fields.ConnectionField("GigConnection", _keyset=True, **_filters)
     gig_pagination = fields.Field("GigPagination", id=arguments.UUID(required=True), **_filters)
     gigs_for_influencer = fields.ConnectionField(
-        "GigConnection", username=arguments.String(), id=arguments.UUID()
+        "GigConnection", username=arguments.String(), id=arguments.UUID(), _keyset=True
     )
     gig_for_post = fields.Field(
         "Gig",
@@ -36,12 +36,19 @@ class OfferQuery:
         state=arguments.String(),
         awaiting_submission=arguments.Boolean(),
         answer=OfferAnswer(),
+        _keyset=True,
     )
     offers_for_influencer = fields.ConnectionField(
-        "OfferConnection", username=arguments.String(required=True), state=OfferFilteringStates()
+        "OfferConnection",
+        username=arguments.String(required=True),
+        state=OfferFilteringStates(),
+        _keyset=True,
     )
     offers_for_post = fields.ConnectionField(
-        "OfferConnection", id=arguments.UUID(required=True), submitted=arguments.Boolean()
+        "OfferConnection",
+        id=arguments.UUID(required=True),
+        submitted=arguments.Boolean(),
+        _keyset=True,
     )
     offer_for_influencer_in_campaign = fields.Field(
         "Offer", username=arguments.String(required=True), campaign_id=arguments.UUID(required=True)
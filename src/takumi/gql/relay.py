@@ -20,3 +20,9 @@ class Connection(relay.Connection):
         abstract = True
 
     count = graphene.Int()
+
+    def resolve_count(connection, info):
+        # Keyset paginated connections count lazily
+        if callable(connection.count):
+            return connection.count()
+        return connection.count
@@ -12,6 +12,7 @@ from takumi.gql.db import (
     filter_mine_campaigns,
     sort_campaigns_by_order,
 )
+from takumi.gql.loaders import hybrid_resolver
 from takumi.gql.relay import Connection, Node
 from takumi.gql.types.percent import Percent
 from takumi.gql.utils import get_brand_profile_user
@@ -275,9 +276,12 @@ class Campaign(ObjectType):
     report_summary = fields.AdvertiserField(fields.String)
 
     submission_deadline = fields.DateTime(
-        description="The earliest submission deadline in the campaign"
+        description="The earliest submission deadline in the campaign",
+        resolver=hybrid_resolver("submission_deadline"),
+    )
+    deadline = fields.DateTime(
+        description="The earliest deadline in the campaign", resolver=hybrid_resolver("deadline")
     )
-    deadline = fields.DateTime(description="The earliest deadline in the campaign")
     accessible_data = fields.Field(AccessibleData)
     total_creators = fields.Int(description="Amount of total creators")
     campaign_highlights = fields.Field(
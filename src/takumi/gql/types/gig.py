@@ -1,8 +1,10 @@
 from flask_login import current_user
 from graphene import ObjectType
+from promise import Promise
 
 from takumi.gql import fields
 from takumi.gql.history.interface import HistoryInterface
+from takumi.gql.loaders import load_relationship, relationship_resolver
 from takumi.gql.relay import Connection, Node
 from takumi.gql.utils import influencer_post_step
 from takumi.models import Currency
@@ -41,17 +43,15 @@ class Gig(ObjectType):
         "Currency", deprecation_reason="Reward is for the whole campaign. Use Offer.reward"
     )
 
-    influencer = fields.Field(
-        "Influencer", resolver=fields.deep_source_resolver("offer.influencer")
-    )
+    influencer = fields.Field("Influencer")
 
     reviewer = fields.ManageInfluencersField("User")
     review_date = fields.ManageInfluencersField(fields.DateTime)
     approver = fields.ManageInfluencersField("User")
     approve_date = fields.ManageInfluencersField(fields.DateTime)
 
-    post = fields.Field("Post")
-    offer = fields.Field("Offer")
+    post = fields.Field("Post", resolver=relationship_resolver("post"))
+    offer = fields.Field("Offer", resolver=relationship_resolver("offer"))
     submission = fields.Field("Submission")
 
     resubmit_reason = fields.String()
@@ -67,8 +67,9 @@ class Gig(ObjectType):
     instagram_post = fields.Field(
         "InstagramPost",
         deprecation_reason="Gigs can have either story or instagram posts. Use InstagramContentInterface",
+        resolver=relationship_resolver("instagram_post"),
     )
-    tiktok_post = fields.Field("TiktokPost")
+    tiktok_post = fields.Field("TiktokPost", resolver=relationship_resolver("tiktok_post"))
     insight = fields.Field("InsightInterface")
     skip_insights = fields.ManageInfluencersField(fields.Boolean)
     is_missing_insights = fields.ManageInfluencersField(fields.Boolean)
@@ -89,24 +90,30 @@ class Gig(ObjectType):
         else:
             return InsightStatus.submitted
 
+    def resolve_influencer(gig, info):
+        return load_relationship(gig, "offer").then(
+            lambda offer: offer and load_relationship(offer, "influencer")
+        )
+
+    def resolve_submission(gig, info):
+        return load_relationship(gig, "submissions").then(
+            lambda submissions: submissions[0] if submissions else None
+        )
+
     def resolve_insight(gig, info):
-        if (
-            permissions.manage_influencers.can()
-            or getattr(current_user, "influencer", None) == gig.offer.influencer
-        ):
+        if permissions.manage_influencers.can():
+            return load_relationship(gig, "insight")
+        if getattr(current_user, "influencer", None) == gig.offer.influencer:
             return gig.insight
 
     def resolve_instagram_content(gig, info):
-        if gig.instagram_post is not None:
-            return gig.instagram_post
-
-        if gig.instagram_story is not None:
-            return gig.instagram_story
-
-        if gig.tiktok_post is not None:
-            return gig.tiktok_post
-
-        return None
+        return Promise.all(
+            [
+                load_relationship(gig, "instagram_post"),
+                load_relationship(gig, "instagram_story"),
+                load_relationship(gig, "tiktok_post"),
+            ]
+        ).then(lambda contents: next((content for content in contents if content), None))
 
     def resolve_history(gig, info):
         from takumi.gql.history.gig import history_items
@@ -2,6 +2,12 @@ from graphene import ObjectType
 
 from takumi.gql import arguments, fields
 from takumi.gql.interfaces import InstagramUserInterface
+from takumi.gql.loaders import (
+    hybrid_resolver,
+    load_hybrid,
+    load_relationship,
+    relationship_resolver,
+)
 from takumi.gql.relay import Connection, Node
 from takumi.models import Currency
 from takumi.models.address import Address
@@ -59,7 +65,9 @@ class Influencer(ObjectType):
 
     # Read-only for sales
     is_signed_up = fields.ViewInfluencerInfoField(fields.Boolean, allow_self=True)
-    has_facebook_page = fields.ViewInfluencerInfoField(fields.Boolean)
+    has_facebook_page = fields.ViewInfluencerInfoField(
+        fields.Boolean, resolver=hybrid_resolver("has_facebook_page")
+    )
     has_tiktok_account = fields.ViewInfluencerInfoField(fields.Boolean, allow_self=True)
     has_interests = fields.ViewInfluencerInfoField(fields.Boolean, allow_self=True)
     has_youtube_channel = fields.ViewInfluencerInfoField(fields.Boolean, allow_self=True)
@@ -99,7 +107,9 @@ class Influencer(ObjectType):
     tiktok_username = fields.ViewInfluencerInfoField(fields.String, allow_self=True)
     youtube_channel_url = fields.ViewInfluencerInfoField(fields.String, allow_self=True)
 
-    social_accounts_chosen = fields.ViewInfluencerInfoField(fields.Boolean, allow_self=True)
+    social_accounts_chosen = fields.ViewInfluencerInfoField(
+        fields.Boolean, allow_self=True, resolver=hybrid_resolver("social_accounts_chosen")
+    )
 
     # Private fields
     email = fields.ManageInfluencersField(
@@ -108,10 +118,14 @@ class Influencer(ObjectType):
     address = fields.ManageInfluencersField("Address", allow_self=True)
     total_rewards = fields.ManageInfluencersField("Currency", allow_self=True)
     total_rewards_breakdown = fields.ManageInfluencersField("RewardBreakdown", allow_self=True)
-    current_region = fields.ManageInfluencersField("Region")
+    current_region = fields.ManageInfluencersField(
+        "Region", resolver=relationship_resolver("current_region")
+    )
     device = fields.ManageInfluencersField("Device")
 
-    information = fields.ViewInfluencerInfoField("InfluencerInformation", allow_self=True)
+    information = fields.ViewInfluencerInfoField(
+        "InfluencerInformation", allow_self=True, resolver=relationship_resolver("information")
+    )
 
     has_information = fields.Boolean()
     last_active = fields.DateTime(resolver=fields.deep_source_resolver("user.last_active"))
@@ -165,10 +179,14 @@ class Influencer(ObjectType):
         fields.List(FollowersHistory), deprecation_reason="Use instagramAccount"
     )
     estimated_impressions = fields.ViewInfluencerInfoField(
-        fields.Int, deprecation_reason="Use instagramAccount"
+        fields.Int,
+        resolver=hybrid_resolver("estimated_impressions"),
+        deprecation_reason="Use instagramAccount",
     )
     impressions_ratio = fields.ViewInfluencerInfoField(
-        "Percent", deprecation_reason="Use instagramAccount"
+        "Percent",
+        resolver=hybrid_resolver("impressions_ratio"),
+        deprecation_reason="Use instagramAccount",
     )
 
     # No longer relevant
@@ -215,11 +233,14 @@ class Influencer(ObjectType):
         return influencer.state == INFLUENCER_STATES.DISABLED
 
     def resolve_address(influencer, info):
-        if not influencer.address:
-            return dict(
-                **Address.get_default_address_data_for_influencer(influencer), id=uuid4_str()
-            )
-        return influencer.address
+        def _address_or_default(address):
+            if not address:
+                return dict(
+                    **Address.get_default_address_data_for_influencer(influencer), id=uuid4_str()
+                )
+            return address
+
+        return load_relationship(influencer, "address").then(_address_or_default)
 
     def resolve_participating_campaign_ids(influencer, info):
         if hasattr(influencer, "participating_campaign_ids"):
@@ -246,7 +267,7 @@ class Influencer(ObjectType):
         return influencer.engagement
 
     def resolve_gig_engagement(influencer, info):
-        return influencer.gig_engagement or 0
+        return load_hybrid(influencer, "gig_engagement").then(lambda value: value or 0)
 
     def resolve_invited_campaign_ids(influencer, info):
         if hasattr(influencer, "invited_campaign_ids"):
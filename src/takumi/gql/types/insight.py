@@ -2,6 +2,7 @@ from graphene import Interface, ObjectType
 from graphene.utils.str_converters import to_camel_case
 
 from takumi.gql import arguments, fields
+from takumi.gql.loaders import load_relationship, relationship_resolver
 from takumi.gql.relay import Connection
 from takumi.models.insight import TYPES
 from takumi.services.insight import InsightService
@@ -13,7 +14,7 @@ class InsightInterface(Interface):
     modified = fields.DateTime()
 
     media = fields.Field("MediaResult")
-    gig = fields.Field("Gig")
+    gig = fields.Field("Gig", resolver=relationship_resolver("gig"))
     processed = fields.Boolean()
     state = fields.String()
 
@@ -28,12 +29,14 @@ class InsightInterface(Interface):
     ocr_values = fields.GenericScalar()
 
     def resolve_media(insight, info):
-        media_length = len(insight.media)
-        if media_length > 1:
-            return insight.media
-        elif media_length == 1:
-            return insight.media[0]
-        return None
+        def _media_result(media):
+            if len(media) > 1:
+                return media
+            elif len(media) == 1:
+                return media[0]
+            return None
+
+        return load_relationship(insight, "media").then(_media_result)
 
     def resolve_type(insight, info):
         if insight.type == TYPES.STORY_INSIGHT:
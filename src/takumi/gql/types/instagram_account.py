@@ -4,6 +4,7 @@ from typing import List, Optional
 from graphene import ObjectType
 
 from takumi.gql import fields
+from takumi.gql.loaders import hybrid_resolver, load_hybrid, load_relationship
 
 
 class Stat(ObjectType):
@@ -94,7 +95,7 @@ class FollowersHistoryAnomaly(ObjectType):
 
 class InstagramAccount(ObjectType):
     id = fields.String(description="The ID of the account")
-    active = fields.Boolean()
+    active = fields.Boolean(resolver=hybrid_resolver("active"))
     username = fields.String(source="ig_username", description="The name of the account")
     followers = fields.Int()
     biography = fields.String(source="ig_biography", description="Biography of the account")
@@ -136,11 +137,11 @@ class InstagramAccount(ObjectType):
         return None
 
     def resolve_estimated_impressions(root, info):
-        if root.influencer:
-            return root.influencer.estimated_impressions
-        return None
+        return load_relationship(root, "influencer").then(
+            lambda influencer: influencer and load_hybrid(influencer, "estimated_impressions")
+        )
 
     def resolve_impressions_ratio(root, info):
-        if root.influencer:
-            return root.influencer.impressions_ratio
-        return None
+        return load_relationship(root, "influencer").then(
+            lambda influencer: influencer and load_hybrid(influencer, "impressions_ratio")
+        )
@@ -4,6 +4,7 @@ from flask_login import current_user
 from graphene import ObjectType
 
 from takumi.gql import arguments, fields
+from takumi.gql.loaders import relationship_resolver
 from takumi.gql.relay import Connection, Node
 from takumi.gql.utils import get_brand_profile_user
 from takumi.models import Currency
@@ -61,7 +62,7 @@ class Offer(ObjectType):
     is_selected = fields.Boolean()
     units = fields.Int()
 
-    gigs = fields.List("Gig")
+    gigs = fields.List("Gig", resolver=relationship_resolver("gigs"))
 
     answers = fields.List(CampaignAnswer)
     brand_visible_answers = fields.List(CampaignAnswer)
@@ -84,8 +85,8 @@ class Offer(ObjectType):
 
     comments = fields.AdvertiserField(fields.List("Comment"))
 
-    influencer = fields.Field("Influencer")
-    campaign = fields.Field("Campaign")
+    influencer = fields.Field("Influencer", resolver=relationship_resolver("influencer"))
+    campaign = fields.Field("Campaign", resolver=relationship_resolver("campaign"))
 
     claimed = fields.AuthenticatedField(fields.DateTime, needs=view_offer_reward_info)
     is_claimable = fields.AuthenticatedField(fields.Boolean, needs=view_offer_reward_info)
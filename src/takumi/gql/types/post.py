@@ -7,6 +7,7 @@ from graphene import Enum, ObjectType
 from takumi import models
 from takumi.gql import fields
 from takumi.gql.db import filter_gigs
+from takumi.gql.loaders import load_submission_deadline
 from takumi.gql.relay import Connection, Node
 from takumi.gql.types.percent import Percent
 from takumi.gql.utils import influencer_post_step
@@ -161,7 +162,9 @@ class Post(ObjectType):
         if not post.deadline:
             return None
 
-        return PostSchedule(post)
+        return load_submission_deadline(post).then(
+            lambda submission_deadline: PostSchedule(post, submission_deadline=submission_deadline)
+        )
 
     def resolve_brief(post, info):
         """Fallback to old instructions if brief is not set"""
@@ -1,13 +1,12 @@
 import datetime as dt
-import pickle
 from functools import wraps
 from uuid import UUID
 
 from flask import g
 
+from takumi.cache import Cache
 from takumi.constants import MINIMUM_CLIENT_VERSION
 from takumi.exceptions import client_version_is_lower_than_min_version
-from takumi.extensions import redis
 from takumi.gql.exceptions import GraphQLException
 from takumi.i18n import gettext as _
 from takumi.models import (
@@ -324,22 +323,26 @@ def get_public_campaign(campaign_id):
     return campaign
 
 
-def cached(ttl=dt.timedelta(hours=1)):
+resolver_cache = Cache("gql_resolver")
+
+
+def cached(ttl=dt.timedelta(hours=1), tags=None):
+    """Cache the result of a resolver by its path and arguments
+
+    `tags` is an optional function of the root and the arguments, returning
+    the tags to invalidate the result by, see `takumi.cache`.
+    """
+
     def decorator(func):
         @wraps(func)
         def wrapped(root, info, **kwargs):
-            key = "cached_resolver:" + "_".join(info.path) + str(kwargs)
-            conn = redis.get_connection()
-            cached_result = conn.get(key)
-            if cached_result is not None:
-                try:
-                    return pickle.loads(cached_result.encode("latin1"))
-                except pickle.UnpicklingError:
-                    pass
-            result = func(root, info, **kwargs)
-            pickled = pickle.dumps(result)
-            conn.setex(key, int(ttl.total_seconds()), pickled.decode("latin1"))
-            return result
+            key = "_".join(str(item) for item in info.path) + str(kwargs)
+            return resolver_cache.get_or_set(
+                key,
+                lambda: func(root, info, **kwargs),
+                ttl=ttl.total_seconds(),
+                tags=tags(root, **kwargs) if tags else (),
+            )
 
         return wrapped
 
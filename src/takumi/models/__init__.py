@@ -10,6 +10,7 @@ from .api_task import ApiTask
 from .audience_insight import AudienceInsight, AudienceInsightEvent, AudienceSection
 from .audit import Audit
 from .campaign import Campaign, CampaignEvent, CampaignMetric
+from .campaign_stats import CampaignStatsMonth
 from .children_targeting import ChildrenTargeting
 from .comment import Comment
 from .config import Config
@@ -28,6 +29,7 @@ from .influencer_prospect import (
     InfluencerProspect,
     RegionInfluencerProspect,
 )
+from .influencer_targeting_profile import InfluencerTargetingProfile
 from .insight import Insight, InsightEvent, PostInsight, StoryInsight
 from .instagram_account import InstagramAccount, InstagramAccountEvent
 from .instagram_audience_insight import InstagramAudienceInsight
@@ -61,6 +61,7 @@ class Campaign(db.Model):
 
     id = db.Column(UUIDString, primary_key=True, default=uuid4_str)
     created = db.Column(UtcDateTime, server_default=func.now())
+    modified = db.Column(UtcDateTime, onupdate=func.now())
     started = db.Column(UtcDateTime)
 
     candidates_submitted = db.Column(UtcDateTime)
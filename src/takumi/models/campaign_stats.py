@@ -0,0 +1,24 @@
+from sqlalchemy import func
+from sqlalchemy_utc import UtcDateTime
+
+from takumi.extensions import db
+
+
+class CampaignStatsMonth(db.Model):
+    """A monthly rollup of one of the campaign stats
+
+    `key` is the id of the region the value is for, except for payments,
+    which are rolled up per currency.
+    """
+
+    __tablename__ = "campaign_stats_month"
+
+    month = db.Column(db.Date, primary_key=True)
+    metric = db.Column(db.String, primary_key=True)
+    key = db.Column(db.String, primary_key=True)
+
+    value = db.Column(db.BigInteger, nullable=False)
+    refreshed = db.Column(UtcDateTime, server_default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<CampaignStatsMonth: {self.month:%Y-%m} {self.metric} {self.key} = {self.value}>"
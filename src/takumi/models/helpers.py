@@ -1,9 +1,17 @@
 import datetime as dt
-import pickle
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Sequence, Tuple, Union
 
+from sqlalchemy import inspect
 from sqlalchemy.ext.hybrid import hybrid_method, hybrid_property
+from sqlalchemy.orm.base import instance_state
+from sqlalchemy.sql.elements import Label
 
-from takumi.extensions import db, redis
+from takumi.cache import Cache, model_tag
+from takumi.extensions import db
+
+SESSION_HYBRID_VALUES_KEY = "hybrid_values"
+PREFETCH_BATCH_SIZE = 500
 
 
 def add_columns_as_attributes(table):
@@ -15,9 +23,7 @@ def add_columns_as_attributes(table):
 def hybrid_property_expression(func):
     @hybrid_property
     def wrapper(self):
-        cls = self.__class__
-        expression = getattr(self.__class__, func.__name__)
-        return db.session.query(expression).filter(cls.id == self.id).one_or_none()[0]
+        return _get_hybrid_value(self, func.__name__, ())
 
     @wrapper.expression
     def wrapper(cls):
@@ -29,9 +35,7 @@ def hybrid_property_expression(func):
 def hybrid_method_expression(func):
     @hybrid_method
     def wrapper(self, *args, **kwargs):
-        cls = self.__class__
-        expression = getattr(self.__class__, func.__name__)(*args, **kwargs)
-        return db.session.query(expression).filter(cls.id == self.id).one_or_none()[0]
+        return _get_hybrid_value(self, func.__name__, args, kwargs)
 
     @wrapper.expression
     def wrapper(cls, *args, **kwargs):
@@ -43,9 +47,7 @@ def hybrid_method_expression(func):
 def hybrid_property_subquery(func):
     @hybrid_property
     def wrapper(self):
-        cls = self.__class__
-        expression = getattr(self.__class__, func.__name__)
-        return db.session.query(expression).filter(cls.id == self.id).one_or_none()[0]
+        return _get_hybrid_value(self, func.__name__, ())
 
     @wrapper.expression
     def wrapper(cls):
@@ -57,9 +59,7 @@ def hybrid_property_subquery(func):
 def hybrid_method_subquery(func):
     @hybrid_method
     def wrapper(self, *args, **kwargs):
-        cls = self.__class__
-        expression = getattr(self.__class__, func.__name__)(*args, **kwargs)
-        return db.session.query(expression).filter(cls.id == self.id).one_or_none()[0]
+        return _get_hybrid_value(self, func.__name__, args, kwargs)
 
     @wrapper.expression
     def wrapper(cls, *args, **kwargs):
@@ -68,21 +68,153 @@ def hybrid_method_subquery(func):
     return wrapper
 
 
+def _hybrid_values() -> Dict[Tuple, Any]:
+    """The values of the hybrids evaluated in the current session, keyed by
+    the class, the id of the instance, the name of the hybrid and its arguments
+    """
+    return db.session.info.setdefault(SESSION_HYBRID_VALUES_KEY, {})
+
+
+def _flush_pending_changes() -> None:
+    """Autoflush like the query evaluating a hybrid would, so the values
+    memoized before any pending change are discarded
+    """
+    if db.session.autoflush:
+        db.session.flush()
+
+
+def _get_expression(cls, name: str, args: Tuple = (), kwargs: Dict = None):
+    descriptor = inspect(cls).all_orm_descriptors[name]
+    expression = getattr(cls, name)
+    if isinstance(descriptor, hybrid_method):
+        expression = expression(*args, **(kwargs or {}))
+    return expression
+
+
+def _get_hybrid_value(obj, name: str, args: Tuple, kwargs: Dict = None):
+    cls = obj.__class__
+    key = (cls, obj.id, name, args + tuple(sorted((kwargs or {}).items())))
+    try:
+        hash(key)
+    except TypeError:
+        key = None
+
+    if key is not None:
+        _flush_pending_changes()
+        values = _hybrid_values()
+        if key in values:
+            return values[key]
+
+    expression = _get_expression(cls, name, args, kwargs)
+    value = db.session.query(expression).filter(cls.id == obj.id).one_or_none()[0]
+    if key is not None:
+        _hybrid_values()[key] = value
+    return value
+
+
+HybridName = Union[str, Sequence]
+
+
+def _load_hybrid_values(cls, ids: List, hybrids: List[Tuple[str, Tuple]]) -> None:
+    """Evaluate the hybrids for the instances of `cls` with `ids` that haven't
+    been evaluated yet, with a single query per batch of ids
+    """
+    _flush_pending_changes()
+    values = _hybrid_values()
+    missing = [
+        (name, args)
+        for name, args in hybrids
+        if any((cls, id, name, args) not in values for id in ids)
+    ]
+    if not missing:
+        return
+    missing_ids = list(
+        dict.fromkeys(
+            id for id in ids if any((cls, id, name, args) not in values for name, args in missing)
+        )
+    )
+
+    columns = []
+    for index, (name, args) in enumerate(missing):
+        expression = _get_expression(cls, name, args)
+        if isinstance(expression, Label):
+            # Relabel, as a method evaluated with different arguments would
+            # otherwise be selected more than once under the same name
+            expression = expression.element
+        columns.append(expression.label(f"hybrid_{index}"))
+
+    for start in range(0, len(missing_ids), PREFETCH_BATCH_SIZE):
+        batch = missing_ids[start : start + PREFETCH_BATCH_SIZE]
+        for id, *row in db.session.query(cls.id, *columns).filter(cls.id.in_(batch)):
+            for (name, args), value in zip(missing, row):
+                values[(cls, id, name, args)] = value
+
+
+def _parse_hybrid_name(name: HybridName) -> Tuple[str, Tuple]:
+    if isinstance(name, str):
+        return name, ()
+    name, *args = name
+    return name, tuple(args)
+
+
+def get_hybrid_values(cls, ids: List, name: HybridName) -> List:
+    """The values of a hybrid for the instances of `cls` with `ids`, in the
+    order of the ids, evaluated in a single query for all of them
+    """
+    name, args = _parse_hybrid_name(name)
+    _load_hybrid_values(cls, ids, [(name, args)])
+    values = _hybrid_values()
+    return [values.get((cls, id, name, args)) for id in ids]
+
+
+def prefetch_hybrids(objects: Iterable, names: Iterable[HybridName]) -> None:
+    """Evaluate the `hybrid_*_expression` and `hybrid_*_subquery` attributes
+    `names` of all the objects, with one query per model and batch of objects
+
+    Methods are given as tuples of the name and the arguments, such as
+    `("notification_count", campaign)`. The values are memoized in the
+    session, so accessing the attributes on the objects afterwards doesn't
+    query again until the next flush or the end of the transaction:
+
+        prefetch_hybrids(campaigns, ["deadline", "submission_deadline"])
+        [campaign.deadline for campaign in campaigns]
+    """
+    hybrids = [_parse_hybrid_name(name) for name in names]
+    ids_by_class: Dict[type, List] = defaultdict(list)
+    for obj in objects:
+        identity = instance_state(obj).identity
+        if identity is not None:
+            ids_by_class[obj.__class__].append(identity[0])
+    for cls, ids in ids_by_class.items():
+        _load_hybrid_values(cls, ids, hybrids)
+
+
+def discard_hybrid_values_after_flush(session, flush_context):
+    session.info.pop(SESSION_HYBRID_VALUES_KEY, None)
+
+
+def discard_hybrid_values_after_bulk_change(context):
+    # Bulk updates and deletes don't flush, and change rows that the
+    # memoized values may have been evaluated from
+    context.session.info.pop(SESSION_HYBRID_VALUES_KEY, None)
+
+
+def discard_hybrid_values(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(SESSION_HYBRID_VALUES_KEY, None)
+
+
+property_cache = Cache("model_property")
+
+
 def cached_property(func, ttl=dt.timedelta(hours=1)):
+    """A property cached per instance, invalidated when the instance changes"""
+
     @property
-    def wrapper(self, *args, **kwargs):
-        cls = self.__class__
-        key = "CACHED_PROPERTY:" + cls.__name__ + "." + func.__name__ + ":" + self.id
-        conn = redis.get_connection()
-        cached_result = conn.get(key)
-        if cached_result is not None:
-            try:
-                return pickle.loads(cached_result.encode("latin1"))
-            except pickle.UnpicklingError:
-                pass
-        result = func(self, *args, **kwargs)
-        pickled = pickle.dumps(result)
-        conn.setex(key, int(ttl.total_seconds()), pickled.decode("latin1"))
-        return result
+    def wrapper(self):
+        key = self.__class__.__name__ + "." + func.__name__ + ":" + self.id
+        return property_cache.get_or_set(
+            key, lambda: func(self), ttl=ttl.total_seconds(), tags=[model_tag(self)]
+        )
 
     return wrapper
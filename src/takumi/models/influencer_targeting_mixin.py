@@ -148,7 +148,7 @@ class InfluencerTargetingMixin:
             cls.matches_min_followers(targeting.min_followers or targeting.absolute_min_followers),
             cls.matches_any_of_hair_types(targeting.hair_types),
             cls.matches_any_of_hair_colours(targeting.hair_colours),
-            cls.matches_any_of_eye_colours(targeting.hair_colours),
+            cls.matches_any_of_eye_colours(targeting.eye_colours),
             cls.matches_glasses(targeting.has_glasses),
             cls.matches_any_of_languages(targeting.languages),
             cls.matches_self_tags(targeting.self_tags),
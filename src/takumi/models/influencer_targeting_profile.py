@@ -0,0 +1,213 @@
+import datetime as dt
+
+from sqlalchemy import and_, exists, func, literal_column, or_, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.schema import Index
+from sqlalchemy_utc import UtcDateTime
+
+from core.common.sqla import UUIDString
+
+from takumi.extensions import db
+
+
+def _years_before(date: dt.date, years: int) -> dt.date:
+    try:
+        return date.replace(year=date.year - years)
+    except ValueError:
+        # Leap day
+        return date.replace(year=date.year - years, day=28)
+
+
+def _age_ranges(ages):
+    """Merge ages into ranges of consecutive ages"""
+    ranges = []
+    for age in sorted(set(ages)):
+        if ranges and ranges[-1][1] == age - 1:
+            ranges[-1][1] = age
+        else:
+            ranges.append([age, age])
+    return ranges
+
+
+def born_at_any_of_ages(birthday, ages, today: dt.date):
+    """Whether someone born on `birthday` is any of `ages` old on `today`, as
+    ranges of birthdays, which unlike an age can be indexed
+    """
+    filters = []
+    for youngest, oldest in _age_ranges(ages):
+        born_after = birthday > _years_before(today, oldest + 1)
+        if youngest == 0:
+            # The age of the unborn is counted as 0 years as well
+            filters.append(born_after)
+        else:
+            filters.append(and_(born_after, birthday <= _years_before(today, youngest)))
+    return or_(*filters)
+
+
+class InfluencerTargetingProfile(db.Model):
+    """Everything campaign targeting filters influencers on, denormalized into
+    one row per influencer, so matching a campaign is a flat predicate on a
+    single indexed table instead of a subquery per targeting filter
+
+    Ages are kept as birthdays, since they change without anything being
+    updated. The profiles are kept up to date by `takumi.targeting_profiles`.
+    """
+
+    __tablename__ = "influencer_targeting_profile"
+
+    influencer_id = db.Column(
+        UUIDString, db.ForeignKey("influencer.id", ondelete="cascade"), primary_key=True
+    )
+    refreshed = db.Column(UtcDateTime, server_default=func.now(), nullable=False)
+
+    state = db.Column(db.String, nullable=False)
+    birthday = db.Column(db.Date)
+    gender = db.Column(db.String)
+    followers = db.Column(db.Integer)
+
+    # The target region of the influencer and all the regions above it
+    region_ids = db.Column(ARRAY(UUIDString))
+    interest_ids = db.Column(ARRAY(UUIDString), nullable=False, server_default="{}")
+
+    hair_type_id = db.Column(UUIDString)
+    hair_colour_id = db.Column(UUIDString)
+    eye_colour_id = db.Column(UUIDString)
+    glasses = db.Column(db.Boolean)
+    languages = db.Column(ARRAY(db.String))
+    tag_ids = db.Column(ARRAY(UUIDString))
+
+    # Only set for influencers with information, like their children
+    children_count = db.Column(db.Integer)
+    child_birthdays = db.Column(ARRAY(db.Date))
+    child_genders = db.Column(ARRAY(db.String))
+    oldest_child_birthday = db.Column(db.Date)
+    youngest_child_birthday = db.Column(db.Date)
+
+    __table_args__ = (
+        Index("ix_influencer_targeting_profile_state_followers", "state", "followers"),
+        Index("ix_influencer_targeting_profile_birthday", "birthday"),
+        Index("ix_influencer_targeting_profile_region_ids", "region_ids", postgresql_using="gin"),
+        Index(
+            "ix_influencer_targeting_profile_interest_ids", "interest_ids", postgresql_using="gin"
+        ),
+        Index("ix_influencer_targeting_profile_languages", "languages", postgresql_using="gin"),
+        Index("ix_influencer_targeting_profile_tag_ids", "tag_ids", postgresql_using="gin"),
+    )
+
+    def __repr__(self):
+        return f"<InfluencerTargetingProfile: {self.influencer_id}>"
+
+    @classmethod
+    def matches_children_targeting(cls, children_targeting, today: dt.date):
+        min_children_count = children_targeting.min_children_count
+        max_children_count = children_targeting.max_children_count
+
+        filters = [cls.children_count >= (min_children_count or 0)]
+        if max_children_count is not None:
+            filters.append(cls.children_count <= max_children_count)
+        if children_targeting.ages:
+            child_birthday = func.unnest(cls.child_birthdays).alias("child_birthday")
+            filters.append(
+                exists(
+                    select([1])
+                    .select_from(child_birthday)
+                    .where(
+                        born_at_any_of_ages(
+                            literal_column("child_birthday"), children_targeting.ages, today
+                        )
+                    )
+                )
+            )
+        if children_targeting.child_gender:
+            filters.append(cls.child_genders.contains([children_targeting.child_gender]))
+        if children_targeting.has_unborn_child is not None:
+            has_unborn_child = func.coalesce(cls.youngest_child_birthday > today, False)
+            filters.append(has_unborn_child == children_targeting.has_unborn_child)
+        if children_targeting.has_born_child is not None:
+            has_born_child = func.coalesce(cls.oldest_child_birthday <= today, False)
+            filters.append(has_born_child == children_targeting.has_born_child)
+
+        return and_(*filters)
+
+    @classmethod
+    def matches_targeting(cls, targeting):
+        """The equivalent of `Influencer.matches_targeting`"""
+        today = dt.datetime.now(dt.timezone.utc).date()
+        filters = []
+
+        region_ids = [region.id for region in targeting.regions]
+        if region_ids:
+            filters.append(cls.region_ids.overlap(region_ids))
+        else:
+            filters.append(cls.region_ids != None)
+
+        if targeting.interest_ids:
+            filters.append(cls.interest_ids.overlap(targeting.interest_ids))
+        if targeting.ages:
+            filters.append(born_at_any_of_ages(cls.birthday, targeting.ages, today))
+        if targeting.gender:
+            filters.append(cls.gender == targeting.gender)
+        if targeting.max_followers:
+            filters.append(cls.followers <= targeting.max_followers)
+        filters.append(
+            cls.followers >= (targeting.min_followers or targeting.absolute_min_followers)
+        )
+
+        if targeting.hair_types:
+            filters.append(
+                cls.hair_type_id.in_([hair_type.id for hair_type in targeting.hair_types])
+            )
+        if targeting.hair_colours:
+            filters.append(
+                cls.hair_colour_id.in_([hair_colour.id for hair_colour in targeting.hair_colours])
+            )
+        if targeting.eye_colours:
+            filters.append(
+                cls.eye_colour_id.in_([eye_colour.id for eye_colour in targeting.eye_colours])
+            )
+        if targeting.has_glasses is not None:
+            filters.append(cls.glasses == targeting.has_glasses)
+        if targeting.languages:
+            filters.append(cls.languages.overlap(targeting.languages))
+        if targeting.self_tags:
+            filters.append(cls.tag_ids.contains([tag.id for tag in targeting.self_tags]))
+        if targeting.children_targeting:
+            filters.append(cls.matches_children_targeting(targeting.children_targeting, today))
+
+        return and_(*filters)
+
+    @classmethod
+    def matches_campaign(cls, campaign):
+        """The equivalent of `Influencer.matches_campaign`
+
+        The offers and advertiser cooldowns are excluded with uncorrelated
+        subqueries, which are evaluated once rather than for every influencer.
+        """
+        from takumi.models import Campaign, Offer
+        from takumi.models.influencer import STATES as INFLUENCER_STATES
+        from takumi.models.offer import STATES as OFFER_STATES
+
+        filters = [
+            cls.state.in_([INFLUENCER_STATES.VERIFIED, INFLUENCER_STATES.REVIEWED]),
+            ~cls.influencer_id.in_(
+                db.session.query(Offer.influencer_id).filter(Offer.campaign_id == campaign.id)
+            ),
+            cls.matches_targeting(campaign.targeting),
+        ]
+
+        cooldown = campaign.advertiser.influencer_cooldown
+        if cooldown:
+            cooldown_start = dt.datetime.now(dt.timezone.utc) - dt.timedelta(days=cooldown + 1)
+            filters.append(
+                ~cls.influencer_id.in_(
+                    db.session.query(Offer.influencer_id)
+                    .join(Campaign, Campaign.id == Offer.campaign_id)
+                    .filter(
+                        Campaign.advertiser_id == campaign.advertiser_id,
+                        Offer.state == OFFER_STATES.ACCEPTED,
+                        Offer.accepted > cooldown_start,
+                    )
+                )
+            )
+
+        return and_(*filters)
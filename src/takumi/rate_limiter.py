@@ -1,6 +1,27 @@
+"""Rate limits, checked atomically in redis
+
+Every check is a single lua script, so concurrent requests can't both read a
+count below the limit and both be let through, and it only costs one round
+trip to redis. Three algorithms are supported:
+
+    FIXED_WINDOW: At most `limit` requests per window, starting at the first
+        request of the window
+    SLIDING_WINDOW: At most `limit` requests in any `timeframe`, using a log
+        of the requests in the window
+    TOKEN_BUCKET: A bucket of `limit` tokens, refilled at `limit` tokens per
+        `timeframe`, allowing short bursts
+
+The results of the checks made while handling a request are used for the
+`X-RateLimit-*` response headers, see `get_rate_limit_headers`.
+"""
 import datetime as dt
+import math
+import uuid
 from contextlib import contextmanager
-from typing import Iterator, Type
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Sequence, Tuple, Type
+
+from flask import g, has_request_context
 
 from takumi.extensions import redis
 
@@ -11,6 +32,181 @@ class RateLimitReachedError(Exception):
 
 RATE_LIMIT_KEY_PREFIX = "RATE_LIMIT:"
 
+FIXED_WINDOW = "fixed_window"
+SLIDING_WINDOW = "sliding_window"
+TOKEN_BUCKET = "token_bucket"
+
+# All scripts take the key, the limit and the timeframe in milliseconds, and
+# return whether the request is allowed, the remaining quota, the milliseconds
+# until the quota is fully restored and the milliseconds until the next
+# request is allowed
+_SCRIPTS = {
+    FIXED_WINDOW: """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local count = tonumber(redis.call("GET", KEYS[1]) or "0")
+if count >= limit then
+    local ttl = math.max(redis.call("PTTL", KEYS[1]), 0)
+    return {0, 0, ttl, ttl}
+end
+count = redis.call("INCR", KEYS[1])
+if count == 1 then
+    redis.call("PEXPIRE", KEYS[1], window)
+end
+local ttl = math.max(redis.call("PTTL", KEYS[1]), 0)
+return {1, limit - count, ttl, 0}
+""",
+    SLIDING_WINDOW: """
+redis.replicate_commands()
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now - window)
+local count = redis.call("ZCARD", KEYS[1])
+local allowed = 0
+if count < limit then
+    redis.call("ZADD", KEYS[1], now, ARGV[3])
+    redis.call("PEXPIRE", KEYS[1], window)
+    count = count + 1
+    allowed = 1
+end
+local oldest = redis.call("ZRANGE", KEYS[1], 0, 0, "WITHSCORES")
+local newest = redis.call("ZRANGE", KEYS[1], -1, -1, "WITHSCORES")
+local reset = tonumber(newest[2]) + window - now
+local retry = 0
+if allowed == 0 then
+    retry = tonumber(oldest[2]) + window - now
+end
+return {allowed, limit - count, reset, retry}
+""",
+    TOKEN_BUCKET: """
+redis.replicate_commands()
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "timestamp")
+local tokens = tonumber(bucket[1]) or limit
+local timestamp = tonumber(bucket[2]) or now
+tokens = math.min(limit, tokens + math.max(now - timestamp, 0) * limit / window)
+local allowed = 0
+local retry = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry = math.ceil((1 - tokens) * window / limit)
+end
+redis.call("HMSET", KEYS[1], "tokens", tostring(tokens), "timestamp", now)
+redis.call("PEXPIRE", KEYS[1], window)
+return {allowed, math.floor(tokens), math.ceil((limit - tokens) * window / limit), retry}
+""",
+}
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    key: str
+    timeframe: dt.timedelta
+    limit: int
+    algorithm: str = FIXED_WINDOW
+
+    def __post_init__(self):
+        if self.algorithm not in _SCRIPTS:
+            raise ValueError(f"Unknown rate limit algorithm: {self.algorithm}")
+
+    @property
+    def prefixed_key(self) -> str:
+        # The fixed window keeps the counter of the checks made before they
+        # were scripted, so that the live windows carry over. The other
+        # algorithms store a different type under their own keys
+        if self.algorithm == FIXED_WINDOW:
+            return f"{RATE_LIMIT_KEY_PREFIX}{self.key}"
+        return f"{RATE_LIMIT_KEY_PREFIX}{self.algorithm}:{self.key}"
+
+    def script_args(self) -> Tuple:
+        # The unique member is only used by the sliding window log
+        window = max(int(self.timeframe.total_seconds() * 1000), 1)
+        return (self.limit, window, uuid.uuid4().hex)
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    key: str
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: float
+    retry_after: float
+
+    @classmethod
+    def from_response(cls, rate_limit: RateLimit, response: Sequence) -> "RateLimitResult":
+        allowed, remaining, reset, retry_after = response
+        return cls(
+            key=rate_limit.key,
+            allowed=bool(allowed),
+            limit=rate_limit.limit,
+            remaining=max(int(remaining), 0),
+            reset=int(reset) / 1000,
+            retry_after=int(retry_after) / 1000,
+        )
+
+
+def _record(result: RateLimitResult) -> None:
+    if has_request_context():
+        if not hasattr(g, "rate_limits"):
+            g.rate_limits = {}
+        g.rate_limits[result.key] = result
+
+
+def check(rate_limit: RateLimit) -> RateLimitResult:
+    """Count a request against a rate limit, in a single round trip"""
+    conn = redis.get_connection()
+    script = conn.register_script(_SCRIPTS[rate_limit.algorithm])
+    result = RateLimitResult.from_response(
+        rate_limit, script(keys=[rate_limit.prefixed_key], args=rate_limit.script_args())
+    )
+    _record(result)
+    return result
+
+
+def check_many(rate_limits: Sequence[RateLimit]) -> List[RateLimitResult]:
+    """Count a request against multiple rate limits, pipelined together"""
+    if not rate_limits:
+        return []
+
+    conn = redis.get_connection()
+    pipeline = conn.pipeline(transaction=False)
+    for rate_limit in rate_limits:
+        script = conn.register_script(_SCRIPTS[rate_limit.algorithm])
+        script(keys=[rate_limit.prefixed_key], args=rate_limit.script_args(), client=pipeline)
+
+    results = [
+        RateLimitResult.from_response(rate_limit, response)
+        for rate_limit, response in zip(rate_limits, pipeline.execute())
+    ]
+    for result in results:
+        _record(result)
+    return results
+
+
+def get_rate_limit_headers() -> List[Tuple[str, str]]:
+    """The quota headers of the most restrictive rate limit checked in the request"""
+    rate_limits: Dict[str, RateLimitResult] = getattr(g, "rate_limits", None) or {}
+    if not rate_limits:
+        return []
+
+    result = min(rate_limits.values(), key=lambda result: (result.allowed, result.remaining))
+    headers = [
+        ("X-RateLimit-Limit", str(result.limit)),
+        ("X-RateLimit-Remaining", str(result.remaining)),
+        ("X-RateLimit-Reset", str(math.ceil(result.reset))),
+    ]
+    if not result.allowed:
+        headers.append(("Retry-After", str(math.ceil(result.retry_after))))
+    return headers
+
 
 @contextmanager
 def check_rate_limit(
@@ -19,21 +215,13 @@ def check_rate_limit(
     timeframe: dt.timedelta = None,
     limit: int = None,
     exc: Type[Exception] = RateLimitReachedError,
+    algorithm: str = FIXED_WINDOW,
 ) -> Iterator:
 
     if not timeframe or not limit:
         yield
         return
 
-    prefixed_key = RATE_LIMIT_KEY_PREFIX + key
-
-    conn = redis.get_connection()
-    count = conn.get(prefixed_key)
-
-    if count is None:
-        conn.setex(prefixed_key, int(timeframe.total_seconds()), 1)
-    elif int(count) >= limit:
+    if not check(RateLimit(key, timeframe, limit, algorithm)).allowed:
         raise exc("Rate Limit Reached")
-    else:
-        conn.incr(prefixed_key)
     yield
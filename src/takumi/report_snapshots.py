@@ -0,0 +1,226 @@
+"""Precomputed snapshots of the public campaign reports
+
+Brands keep refreshing the report links of live campaigns, and computing the
+report means aggregating every comment of every post in the campaign. The
+report is instead stored as a JSON document in a redis hash per campaign,
+along with the stats of each post, an ETag and a version:
+
+    REPORT_SNAPSHOT:v<SNAPSHOT_VERSION>:<campaign_id>
+        body: The JSON document of the report
+        etag: The sha1 of the body
+        version: Incremented every time the snapshot is rebuilt
+        post:<post_id>: The JSON stats of each post
+
+Serving a report is a single `HMGET`. Commits of comments, instagram posts,
+gigs and posts enqueue a rebuild of the snapshots they're part of, which only
+recomputes the stats of the posts that changed. Snapshots are only rebuilt
+once they've been requested, campaigns without a report viewer cost nothing.
+"""
+import datetime as dt
+import hashlib
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from takumi.extensions import db, redis, tiger
+from takumi.models import Gig, InstagramPost, InstagramPostComment, Post
+from takumi.models.gig import STATES as GIG_STATES
+from takumi.session_hooks import SessionHook, delay_with_ids
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_TTL = int(dt.timedelta(days=30).total_seconds())
+TOP_VALUES_COUNT = 5
+
+SESSION_DIRTY_REPORTS_KEY = "dirty_report_snapshots"
+
+
+def _snapshot_key(campaign_id: str) -> str:
+    return f"REPORT_SNAPSHOT:v{SNAPSHOT_VERSION}:{campaign_id}"
+
+
+def _post_field(post_id: str) -> str:
+    return f"post:{post_id}"
+
+
+def _top_values(column, post_ids: List[str]) -> Dict[str, List[Dict]]:
+    """The most common values of an array column of the comments, per post"""
+    value = func.unnest(column).label("value")
+    values = (
+        db.session.query(Gig.post_id.label("post_id"), value)
+        .join(InstagramPost, InstagramPost.gig_id == Gig.id)
+        .join(InstagramPostComment, InstagramPostComment.instagram_post_id == InstagramPost.id)
+        .filter(Gig.post_id.in_(post_ids), Gig.state != GIG_STATES.REJECTED)
+    ).subquery()
+
+    count = func.count().label("count")
+    rank = (
+        func.row_number()
+        .over(partition_by=values.c.post_id, order_by=(func.count().desc(), values.c.value))
+        .label("rank")
+    )
+    counts = (
+        db.session.query(values.c.post_id, values.c.value, count, rank).group_by(
+            values.c.post_id, values.c.value
+        )
+    ).subquery()
+
+    result: Dict[str, List[Dict]] = {post_id: [] for post_id in post_ids}
+    for post_id, value, count in (
+        db.session.query(counts.c.post_id, counts.c.value, counts.c.count)
+        .filter(counts.c.rank <= TOP_VALUES_COUNT)
+        .order_by(counts.c.post_id, counts.c.rank)
+    ):
+        result[post_id].append({"value": value, "count": count})
+    return result
+
+
+def compute_post_stats(post_ids: List[str]) -> Dict[str, Dict]:
+    """The report stats of each post, equivalent to calling
+    `Post.average_sentiment` and `Post.comment_stat_count` for each of them,
+    but in four queries for all the posts
+    """
+    if not post_ids:
+        return {}
+
+    caption_sentiments = dict(
+        db.session.query(Gig.post_id, func.avg(InstagramPost.sentiment))
+        .join(InstagramPost, InstagramPost.gig_id == Gig.id)
+        .filter(Gig.post_id.in_(post_ids), Gig.state != GIG_STATES.REJECTED)
+        .group_by(Gig.post_id)
+    )
+    comment_sentiments = dict(
+        db.session.query(Gig.post_id, func.avg(InstagramPostComment.sentiment))
+        .join(InstagramPost, InstagramPost.gig_id == Gig.id)
+        .join(InstagramPostComment, InstagramPostComment.instagram_post_id == InstagramPost.id)
+        .filter(Gig.post_id.in_(post_ids), Gig.state != GIG_STATES.REJECTED)
+        .group_by(Gig.post_id)
+    )
+    emojis = _top_values(InstagramPostComment.emojis, post_ids)
+    hashtags = _top_values(InstagramPostComment.hashtags, post_ids)
+
+    return {
+        post_id: {
+            "caption_sentiment": {"value": caption_sentiments.get(post_id)},
+            "comment_sentiment": {"value": comment_sentiments.get(post_id)},
+            "hashtags": hashtags[post_id],
+            "emojis": emojis[post_id],
+        }
+        for post_id in post_ids
+    }
+
+
+def build_report_snapshot(
+    campaign_id: str, post_ids: Optional[Iterable[str]] = None
+) -> Tuple[str, str]:
+    """Build the report snapshot of a campaign
+
+    Only the stats of `post_ids`, and of posts that aren't in the snapshot
+    yet, are recomputed. Every post is recomputed if `post_ids` is None.
+
+    Returns the body and the ETag of the snapshot.
+    """
+    key = _snapshot_key(campaign_id)
+    campaign_post_ids = [
+        post_id
+        for (post_id,) in db.session.query(Post.id)
+        .filter(Post.campaign_id == campaign_id, ~Post.archived)
+        .order_by(Post.opened, Post.id)
+    ]
+    changed = None if post_ids is None else set(post_ids)
+
+    conn = redis.get_connection()
+    with redis.get_lock(f"report-snapshot-{campaign_id}"):
+        version, *stored = conn.hmget(
+            key, "version", *[_post_field(post_id) for post_id in campaign_post_ids]
+        )
+        stats = {
+            post_id: json.loads(post_stats)
+            for post_id, post_stats in zip(campaign_post_ids, stored)
+            if post_stats is not None and changed is not None and post_id not in changed
+        }
+        stats.update(
+            compute_post_stats([post_id for post_id in campaign_post_ids if post_id not in stats])
+        )
+
+        body = json.dumps(
+            {
+                "id": campaign_id,
+                "posts": [
+                    {"id": post_id, "stats": stats[post_id]} for post_id in campaign_post_ids
+                ],
+            }
+        )
+        etag = hashlib.sha1(body.encode()).hexdigest()
+
+        mapping = {"body": body, "etag": etag, "version": int(version or 0) + 1}
+        for post_id in campaign_post_ids:
+            mapping[_post_field(post_id)] = json.dumps(stats[post_id])
+
+        # Replace the whole hash, dropping the stats of archived posts
+        pipeline = conn.pipeline()
+        pipeline.delete(key)
+        pipeline.hset(key, mapping=mapping)
+        pipeline.expire(key, SNAPSHOT_TTL)
+        pipeline.execute()
+
+    return body, etag
+
+
+def get_report_snapshot(campaign_id: str) -> Tuple[str, str]:
+    """Get the body and the ETag of the report of a campaign, building it if
+    it doesn't exist yet
+    """
+    body, etag = redis.get_connection().hmget(_snapshot_key(campaign_id), "body", "etag")
+    if body is None or etag is None:
+        return build_report_snapshot(campaign_id)
+    return body, etag
+
+
+@tiger.task(unique=True)
+def refresh_report_snapshots(post_ids=(), gig_ids=(), instagram_post_ids=()):
+    """Rebuild the existing snapshots containing the posts, gigs or instagram posts"""
+    post_ids = set(post_ids)
+    if gig_ids:
+        post_ids.update(
+            post_id for (post_id,) in db.session.query(Gig.post_id).filter(Gig.id.in_(gig_ids))
+        )
+    if instagram_post_ids:
+        post_ids.update(
+            post_id
+            for (post_id,) in db.session.query(Gig.post_id)
+            .join(InstagramPost, InstagramPost.gig_id == Gig.id)
+            .filter(InstagramPost.id.in_(instagram_post_ids))
+        )
+    if not post_ids:
+        return
+
+    posts_by_campaign: Dict[str, List[str]] = {}
+    for post_id, campaign_id in db.session.query(Post.id, Post.campaign_id).filter(
+        Post.id.in_(post_ids)
+    ):
+        posts_by_campaign.setdefault(campaign_id, []).append(post_id)
+
+    conn = redis.get_connection()
+    for campaign_id, campaign_post_ids in posts_by_campaign.items():
+        if conn.exists(_snapshot_key(campaign_id)):
+            build_report_snapshot(campaign_id, campaign_post_ids)
+
+
+def collect_dirty_report(session, instance, dirty):
+    if isinstance(instance, InstagramPostComment):
+        dirty["instagram_post_ids"].add(instance.instagram_post_id)
+    elif isinstance(instance, InstagramPost):
+        dirty["gig_ids"].add(instance.gig_id)
+    elif isinstance(instance, Gig):
+        dirty["post_ids"].add(instance.post_id)
+    elif isinstance(instance, Post):
+        dirty["post_ids"].add(instance.id)
+
+
+dirty_reports = SessionHook(
+    SESSION_DIRTY_REPORTS_KEY,
+    on_commit=delay_with_ids(lambda: refresh_report_snapshots),
+    collect=collect_dirty_report,
+    default=lambda: {"post_ids": set(), "gig_ids": set(), "instagram_post_ids": set()},
+)
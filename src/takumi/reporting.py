@@ -1,14 +1,22 @@
-import csv
-from contextlib import contextmanager
-from io import StringIO
-
 from sqlalchemy import func
+from sqlalchemy.orm import selectinload
 
 from takumi.extensions import db
-from takumi.models import Gig, InstagramPost, InstagramPostComment, InstagramStory, Post
+from takumi.models import (
+    Gig,
+    InstagramPost,
+    InstagramPostComment,
+    InstagramStory,
+    Offer,
+    Post,
+    StoryFrame,
+)
 from takumi.models.gig import STATES as GIG_STATES
 from takumi.models.post import PostTypes
 from takumi.roles import permissions
+from takumi.utils.streaming import stream_dict_csv
+
+GIG_BATCH_SIZE = 100
 
 GIG_FIELDS = ("url", "posted", "reach")
 POST_FIELDS = ("comments", "likes", "engagement", "caption_sentiment", "comment_sentiment")
@@ -28,6 +36,11 @@ def _get_gig_posts_query(post):
         .filter(Gig.state.in_(visible_states), Gig.post == post)
         .group_by(Gig, InstagramPost.posted)
         .order_by(InstagramPost.posted)
+        .options(
+            selectinload(Gig.offer).selectinload(Offer.influencer),
+            selectinload(Gig.instagram_post).selectinload(InstagramPost.media),
+        )
+        .yield_per(GIG_BATCH_SIZE)
     )
 
 
@@ -43,6 +56,13 @@ def _get_gig_stories_query(post):
         .join(InstagramStory, InstagramStory.gig_id == Gig.id)
         .filter(Gig.state.in_(visible_states), Gig.post == post)
         .group_by(Gig)
+        .options(
+            selectinload(Gig.offer).selectinload(Offer.influencer),
+            selectinload(Gig.instagram_story)
+            .selectinload(InstagramStory.story_frames)
+            .selectinload(StoryFrame.media),
+        )
+        .yield_per(GIG_BATCH_SIZE)
     )
 
 
@@ -107,14 +127,8 @@ def _iter_gig_stats(posts):
             yield _insert_new_line()
 
 
-@contextmanager
 def get_posts_gigs_stats_csv(posts):
-    output = StringIO()
-
-    sheet = csv.DictWriter(output, fieldnames=("username",) + GIG_FIELDS + POST_FIELDS)
-    sheet.writeheader()
-
-    for row in _iter_gig_stats(posts):
-        sheet.writerow(row)
-    yield output.getvalue()
-    output.close()
+    """Stream the gig stats of the posts as csv"""
+    return stream_dict_csv(
+        _iter_gig_stats(posts), fieldnames=("username",) + GIG_FIELDS + POST_FIELDS
+    )
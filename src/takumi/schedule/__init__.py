@@ -1,3 +1,4 @@
 # flake8: noqa
+from .calendar import WorkingTimeCalendar, get_calendar
 from .period import DateTimePeriod, WorkingTimePeriod
-from .post import PostSchedule
+from .post import PostSchedule, get_submission_deadlines
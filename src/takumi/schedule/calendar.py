@@ -0,0 +1,131 @@
+"""Precomputed working-time calendars
+
+Working time is every hour of the working days of a locale, which excludes
+the weekends and the holidays. Evaluating the holiday rules of a locale is
+slow, so `WorkingTimeCalendar` evaluates them once per year, into a sorted
+list of the working days of every year used so far. Adding or subtracting
+working hours is then a binary search for the position of a moment in
+working time, and a lookup of the working day at the new position.
+
+The calendars are kept for the lifetime of the process by `get_calendar`.
+"""
+import datetime as dt
+import threading
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Iterable, List
+
+from core.workingday import WorkingDay
+
+DAY = dt.timedelta(days=1)
+
+
+def _is_working_day(working_day: WorkingDay, date: dt.date) -> bool:
+    # Half a working day from the start of a day only ends on the same day if
+    # the day is a working day, otherwise it's moved to the next one
+    midnight = dt.datetime.combine(date, dt.time())
+    return working_day.add_working_hours(midnight, 12) == midnight + DAY / 2
+
+
+def _midnight(moment: dt.datetime) -> dt.datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class WorkingTimeCalendar:
+    def __init__(self, locale: str) -> None:
+        self.locale = locale
+        self._lock = threading.Lock()
+        self._first_year = None
+        self._last_year = None
+        # The ordinals of the working days of every year from the first to
+        # the last, replaced as a whole when years are added
+        self._working_days: List[int] = []
+
+    def _working_days_of_year(self, year: int) -> List[int]:
+        working_day = WorkingDay(self.locale)
+        return [
+            ordinal
+            for ordinal in range(
+                dt.date(year, 1, 1).toordinal(), dt.date(year, 12, 31).toordinal() + 1
+            )
+            if _is_working_day(working_day, dt.date.fromordinal(ordinal))
+        ]
+
+    def cover(self, first_year: int, last_year: int) -> None:
+        """Evaluate the working days of the years, if they haven't been already"""
+        with self._lock:
+            if self._first_year is None:
+                self._first_year = self._last_year = first_year
+                self._working_days = self._working_days_of_year(first_year)
+            earlier = [
+                ordinal
+                for year in range(min(first_year, self._first_year), self._first_year)
+                for ordinal in self._working_days_of_year(year)
+            ]
+            later = [
+                ordinal
+                for year in range(self._last_year + 1, max(last_year, self._last_year) + 1)
+                for ordinal in self._working_days_of_year(year)
+            ]
+            if earlier or later:
+                self._working_days = earlier + self._working_days + later
+                self._first_year = min(first_year, self._first_year)
+                self._last_year = max(last_year, self._last_year)
+
+    def _shift(self, start: dt.datetime, delta: dt.timedelta) -> dt.datetime:
+        self.cover(start.year, start.year)
+        while True:
+            working_days = self._working_days
+            ordinal = start.toordinal()
+            index = bisect_left(working_days, ordinal)
+            position = index * DAY
+            if index < len(working_days) and working_days[index] == ordinal:
+                position += start - _midnight(start)
+
+            index, offset = divmod(position + delta, DAY)
+            if delta > dt.timedelta(0) and not offset and index:
+                # Adding ends as soon as the working hours have passed, at
+                # the end of a working day rather than the start of the next
+                index, offset = index - 1, DAY
+
+            if index < 0:
+                self.cover(self._first_year - 1, self._last_year)
+            elif index >= len(working_days):
+                self.cover(self._first_year, self._last_year + 1)
+            else:
+                day = dt.date.fromordinal(working_days[index])
+                return dt.datetime.combine(day, dt.time(), start.tzinfo) + offset
+
+    def add_working_hours(self, start: dt.datetime, hours: float) -> dt.datetime:
+        """The earliest moment `hours` working hours after `start`"""
+        return self._shift(start, dt.timedelta(hours=hours))
+
+    def subtract_working_hours(self, start: dt.datetime, hours: float) -> dt.datetime:
+        """The latest moment `hours` working hours before `start`"""
+        return self._shift(start, -dt.timedelta(hours=hours))
+
+    def add_working_hours_many(
+        self, starts: Iterable[dt.datetime], hours: float
+    ) -> List[dt.datetime]:
+        """`add_working_hours` for each of the starts"""
+        starts = list(starts)
+        if starts:
+            self.cover(min(start.year for start in starts), max(start.year for start in starts))
+        delta = dt.timedelta(hours=hours)
+        return [self._shift(start, delta) for start in starts]
+
+    def subtract_working_hours_many(
+        self, starts: Iterable[dt.datetime], hours: float
+    ) -> List[dt.datetime]:
+        """`subtract_working_hours` for each of the starts"""
+        starts = list(starts)
+        if starts:
+            self.cover(min(start.year for start in starts), max(start.year for start in starts))
+        delta = -dt.timedelta(hours=hours)
+        return [self._shift(start, delta) for start in starts]
+
+
+@lru_cache(maxsize=None)
+def get_calendar(locale: str) -> WorkingTimeCalendar:
+    """The working-time calendar of the locale, shared by the whole process"""
+    return WorkingTimeCalendar(locale)
@@ -1,6 +1,7 @@
 import datetime as dt
+from typing import Iterable, List
 
-from core.workingday import WorkingDay
+from .calendar import get_calendar
 
 
 class Period:
@@ -16,11 +17,29 @@ class Period:
         """
         raise NotImplementedError()
 
+    def after_many(self, starts: Iterable[dt.datetime]) -> List[dt.datetime]:
+        return [self.after(start) for start in starts]
+
+    def before_many(self, starts: Iterable[dt.datetime]) -> List[dt.datetime]:
+        return [self.before(start) for start in starts]
+
+    def _key(self):
+        raise NotImplementedError()
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash((type(self), self._key()))
+
 
 class DateTimePeriod(Period):
     def __init__(self, **kwargs):
         self.kwargs = kwargs
 
+    def _key(self):
+        return dt.timedelta(**self.kwargs)
+
     def after(self, start: dt.datetime) -> dt.datetime:
         return start + dt.timedelta(**self.kwargs)
 
@@ -33,8 +52,17 @@ class WorkingTimePeriod(Period):
         self.locale = locale
         self.hours = days * 24
 
+    def _key(self):
+        return self.locale, self.hours
+
     def after(self, start: dt.datetime) -> dt.datetime:
-        return WorkingDay(self.locale).add_working_hours(start, self.hours)
+        return get_calendar(self.locale).add_working_hours(start, self.hours)
 
     def before(self, start: dt.datetime) -> dt.datetime:
-        return WorkingDay(self.locale).subtract_working_hours(start, self.hours)
+        return get_calendar(self.locale).subtract_working_hours(start, self.hours)
+
+    def after_many(self, starts: Iterable[dt.datetime]) -> List[dt.datetime]:
+        return get_calendar(self.locale).add_working_hours_many(starts, self.hours)
+
+    def before_many(self, starts: Iterable[dt.datetime]) -> List[dt.datetime]:
+        return get_calendar(self.locale).subtract_working_hours_many(starts, self.hours)
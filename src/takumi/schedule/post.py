@@ -1,4 +1,6 @@
 import datetime as dt
+from collections import defaultdict
+from typing import Dict
 
 from .period import DateTimePeriod, WorkingTimePeriod
 
@@ -38,7 +40,10 @@ class NoReviewPeriod:
 
 
 class PostSchedule:
-    def __init__(self, post):
+    def __init__(self, post, submission_deadline=None):
+        """`submission_deadline` is the submission deadline of the post, if
+        it's already known, such as from `get_submission_deadlines`
+        """
         if not post.deadline:
             raise MissingPostDeadlineException(
                 "Can't create a PostSchedule for a post without a deadline"
@@ -47,7 +52,7 @@ class PostSchedule:
         self._start = post.campaign.started or dt.datetime.now(dt.timezone.utc)
         self._deadline = post.deadline
         self._shipping_required = post.campaign.shipping_required
-        self._submission_deadline = post.submission_deadline
+        self._submission_deadline = submission_deadline or post.submission_deadline
 
         if post.requires_review_before_posting:
             self.periods = Periods(
@@ -93,3 +98,35 @@ class PostSchedule:
                 self.periods.post_to_instagram_period.before(self.post_deadline)
             )
         )
+
+
+def get_submission_deadlines(posts) -> Dict[str, dt.datetime]:
+    """The submission deadline of each of the posts with a deadline, keyed by
+    post id
+
+    The suggested deadlines are computed one period at a time, for all the
+    posts sharing the same period at once, rather than post by post.
+    """
+    posts = [post for post in posts if post.deadline]
+    schedules = {post.id: PostSchedule(post) for post in posts}
+    deadlines = {post.id: post.submission_deadline for post in posts if post.submission_deadline}
+
+    suggested = {
+        post_id: schedule.post_deadline
+        for post_id, schedule in schedules.items()
+        if post_id not in deadlines
+    }
+    for period_name in (
+        "post_to_instagram_period",
+        "min_external_review_period",
+        "internal_review_period",
+    ):
+        by_period = defaultdict(list)
+        for post_id in suggested:
+            by_period[getattr(schedules[post_id].periods, period_name)].append(post_id)
+        for period, post_ids in by_period.items():
+            starts = period.before_many(suggested[post_id] for post_id in post_ids)
+            suggested.update(zip(post_ids, starts))
+
+    deadlines.update(suggested)
+    return deadlines
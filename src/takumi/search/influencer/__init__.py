@@ -1,2 +1,3 @@
 from .indexing import *  # noqa
 from .search import InfluencerSearch, TracedInfluencerSearch  # noqa
+from .versions import BACKFILL_WORKERS, migrate_influencer_index  # noqa
@@ -0,0 +1,740 @@
+"""Builds the influencer index documents straight from the database
+
+The documents are the same ones the `influencer` GraphQL query produces for
+the index, but instead of resolving the whole schema per influencer, a batch
+of influencers is loaded with a fixed set of eager-loaded and aggregate
+queries and serialized field by field. Scalars are serialized the same way
+graphene serializes them, so documents are interchangeable with the GraphQL
+ones (see `InfluencerIndex.get_source_document`).
+"""
+import datetime as dt
+from collections import defaultdict
+
+from sqlalchemy import Integer, func
+from sqlalchemy.orm import joinedload, selectinload
+
+from takumi.extensions import db
+from takumi.models import (
+    Audit,
+    AudienceInsight,
+    Currency,
+    Influencer,
+    InfluencerInformation,
+    InstagramAccountEvent,
+    InstagramAudienceInsight,
+    Offer,
+    Payment,
+    User,
+)
+from takumi.models.address import Address
+from takumi.models.influencer_information import EyeColour, HairColour, HairType, Tag
+from takumi.models.instagram_audience_insight import RegionInsightValue
+from takumi.models.offer import STATES as OFFER_STATES
+from takumi.serializers import InstagramAccountFollowersHistorySerializer
+from takumi.utils import uuid4_str
+
+INVITED_OFFER_STATES = (
+    OFFER_STATES.INVITED,
+    OFFER_STATES.PENDING,
+    OFFER_STATES.REQUESTED,
+    OFFER_STATES.REJECTED,
+    OFFER_STATES.REVOKED,
+    OFFER_STATES.REJECTED_BY_BRAND,
+)
+
+AUDIENCE_INSIGHT_EXPIRY = dt.timedelta(days=3 * 30)
+
+
+# *******
+# Scalars
+# *******
+
+
+def _bool(value):
+    return None if value is None else bool(value)
+
+
+def _int(value):
+    return None if value is None else int(value)
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+def _str(value):
+    return None if value is None else str(value)
+
+
+def _date(value):
+    return None if value is None else value.isoformat()
+
+
+def _percent(value):
+    if isinstance(value, dict):
+        value = value.get("value")
+    if value is None:
+        return None
+    return {"value": float(value), "formatted_value": "{:.2f}%".format(value * 100)}
+
+
+def _currency(currency):
+    return {
+        "value": currency.value,
+        "formatted_value": currency.formatted_value,
+        "symbol": currency.symbol,
+        "currency": currency.currency,
+    }
+
+
+def _percentage_to_float(percentage):
+    if isinstance(percentage, dict):
+        return percentage["value"]
+    return percentage
+
+
+def _sorted_by_value(items):
+    if items is None:
+        return None
+    return sorted(items, key=lambda x: _percentage_to_float(x["value"]), reverse=True)
+
+
+# *************
+# Nested values
+# *************
+
+
+def _device(device):
+    if device is None:
+        return None
+    return {
+        "id": _str(device.id),
+        "active": _bool(device.active),
+        "build_version": device.build_version,
+        "created": _date(device.created),
+        "device_model": device.device_model,
+        "last_used": _date(device.last_used),
+        "os_version": device.os_version,
+        "platform": device.platform,
+    }
+
+
+def _address(address):
+    fields = (
+        "name",
+        "address1",
+        "address2",
+        "city",
+        "postal_code",
+        "phonenumber",
+        "country",
+        "state",
+    )
+    if isinstance(address, dict):
+        return {
+            "id": address["id"],
+            **{field: address.get(field) for field in fields},
+            "is_commercial": None,
+            "is_pobox": None,
+        }
+    return {
+        "id": _str(address.id),
+        **{field: getattr(address, field) for field in fields},
+        "is_commercial": _bool(address.is_commercial),
+        "is_pobox": _bool(address.is_pobox),
+    }
+
+
+_BREAKDOWN_SERIALIZERS = {"name": _str, "country_code": _str, "value": _percent, "followers": _int}
+
+
+def _breakdown_items(items, keys):
+    if items is None:
+        return None
+    return [
+        {
+            key: _BREAKDOWN_SERIALIZERS[key](item.get(key))
+            for key in ("name", "country_code", "value", "followers")
+            if key in keys
+        }
+        for item in items
+    ]
+
+
+def _geography(geography):
+    if geography is None:
+        return None
+    return {
+        section: _breakdown_items(
+            _sorted_by_value(geography.get(section)), ("name", "value", "followers")
+        )
+        for section in ("cities", "countries", "states")
+    }
+
+
+def _audit(audit):
+    if audit is None:
+        return None
+    languages = ("country_code", "value", "followers")
+    breakdown = ("name", "value", "followers")
+    return {
+        "id": str(audit.id),
+        "created": _date(audit.created),
+        "modified": _date(audit.modified),
+        "pdf": audit.pdf,
+        "audience_quality_score": _float(audit.audience_quality_score),
+        "engagement_rate": _percent(audit.engagement_rate),
+        "ad_engagement_rate": _percent(audit.ad_engagement_rate),
+        "average_likes": _float(audit.average_likes),
+        "average_comments": _float(audit.average_comments),
+        "average_posts_per_week": _float(audit.average_posts_per_week),
+        "average_ad_posts_per_week": _float(audit.average_ad_posts_per_week),
+        "likes_spread": _float(audit.likes_spread),
+        "likes_comments_ratio": _float(audit.likes_comments_ratio),
+        "followers_languages": _breakdown_items(
+            _sorted_by_value(audit.followers_languages), languages
+        ),
+        "followers_quality": _float(audit.followers_quality),
+        "followers_reach": _breakdown_items(audit.followers_reach, breakdown),
+        "followers_reachability": _float(audit.followers_reachability),
+        "followers_geography": _geography(audit.followers_geography),
+        "followers_demography": _breakdown_items(audit.followers_demography, breakdown),
+        "likers_languages": _breakdown_items(_sorted_by_value(audit.likers_languages), languages),
+        "likers_quality": _float(audit.likers_quality),
+        "likers_reach": _breakdown_items(audit.likers_reach, breakdown),
+        "audience_thematics": _breakdown_items(
+            _sorted_by_value(audit.audience_thematics), ("name", "value")
+        ),
+        "followers_count": _int(audit.followers_count),
+        "followings_count": _int(audit.followings_count),
+    }
+
+
+def _information_object(cls, id, fields):
+    if id is None:
+        return None
+    obj = cls.get(id)
+    return {field: _str(getattr(obj, field, None)) for field in fields}
+
+
+def _information(information):
+    if information is None:
+        return None
+    today = dt.datetime.now(dt.timezone.utc).date()
+    return {
+        "hair_colour": _information_object(
+            HairColour, information.hair_colour_id, ("id", "name", "category", "hex")
+        ),
+        "eye_colour": _information_object(
+            EyeColour, information.eye_colour_id, ("id", "name", "hex")
+        ),
+        "hair_type": _information_object(HairType, information.hair_type_id, ("id", "name")),
+        "account_type": information.account_type,
+        "glasses": _bool(information.glasses),
+        "children": [
+            {
+                "id": _str(child.id),
+                "gender": child.gender,
+                "born": None if child.birthday is None else child.birthday <= today,
+                "birthday": _date(child.birthday),
+            }
+            for child in information.children
+        ],
+        "languages": information.languages,
+        "tags": None
+        if information.tag_ids is None
+        else [
+            {"id": tag.id, "name": str(tag.name)} for tag in Tag.get_from_ids(information.tag_ids)
+        ],
+    }
+
+
+def _split(counter):
+    total = sum(counter.values())
+    return [
+        {
+            "id": uuid4_str(),
+            "name": name,
+            "follower_count": value,
+            "follower_percentage": _percent(value / total if total > 0 else 0),
+        }
+        for name, value in counter.items()
+    ]
+
+
+# *******
+# Builder
+# *******
+
+
+class InfluencerDocumentBuilder:
+    """Build the index documents for a batch of influencers
+
+    Every relationship the document needs is loaded for the whole batch up
+    front, so building a batch costs the same handful of queries no matter
+    how many influencers are in it.
+    """
+
+    def __init__(self, influencer_ids):
+        self.influencer_ids = list(influencer_ids)
+        self._regions = {}
+
+    def load(self):
+        """Load the batch, returns the influencers that exist"""
+        if not self.influencer_ids:
+            return []
+
+        influencers = self._load_influencers()
+        self._hybrids = self._load_hybrids()
+        self._offers = self._load_offers()
+        self._payments = self._load_payments()
+        self._audits = self._load_audits()
+        self._followers_history = self._load_followers_history(
+            [i.instagram_account.id for i in influencers if i.instagram_account]
+        )
+        self._instagram_audience_insights = self._load_instagram_audience_insights(
+            [h.instagram_audience_insight_id for h in self._hybrids.values()]
+        )
+        self._audience_insights = self._load_audience_insights(
+            [h.audience_insight_id for h in self._hybrids.values()]
+        )
+        return influencers
+
+    def build(self):
+        """Returns a dict of influencer id to document, influencers that
+        don't exist are left out
+        """
+        return {influencer.id: self.build_document(influencer) for influencer in self.load()}
+
+    # *******
+    # Loading
+    # *******
+
+    def _load_influencers(self):
+        return (
+            Influencer.query.filter(Influencer.id.in_(self.influencer_ids))
+            .options(
+                joinedload(Influencer.user).joinedload(User.device),
+                joinedload(Influencer.current_region),
+                joinedload(Influencer.address),
+                joinedload(Influencer.information).selectinload(InfluencerInformation.children),
+            )
+            .all()
+        )
+
+    def _load_hybrids(self):
+        rows = db.session.query(
+            Influencer.id,
+            Influencer.has_facebook_page,
+            Influencer.social_accounts_chosen,
+            Influencer.gig_engagement,
+            Influencer.impressions_ratio,
+            Influencer.estimated_impressions,
+            Influencer.instagram_audience_insight_id,
+            Influencer.audience_insight_id,
+        ).filter(Influencer.id.in_(self.influencer_ids))
+        return {row.id: row for row in rows}
+
+    def _load_offers(self):
+        rows = (
+            db.session.query(Offer.influencer_id, Offer.campaign_id, Offer.state, Offer.is_paid)
+            .filter(Offer.influencer_id.in_(self.influencer_ids))
+            .order_by(Offer.created)
+        )
+        offers = defaultdict(list)
+        for row in rows:
+            offers[row.influencer_id].append(row)
+        return offers
+
+    def _load_payments(self):
+        rows = (
+            db.session.query(
+                Offer.influencer_id,
+                Payment.currency,
+                func.sum(Payment.amount).label("total"),
+                func.sum(Payment.amount / (1 + Offer.vat_percentage)).label("net"),
+            )
+            .select_from(Payment)
+            .join(Offer)
+            .filter(Offer.influencer_id.in_(self.influencer_ids), Payment.is_successful)
+            .group_by(Offer.influencer_id, Payment.currency)
+        )
+        payments = defaultdict(list)
+        for row in rows:
+            payments[row.influencer_id].append(row)
+        return payments
+
+    def _load_audits(self):
+        audits = (
+            Audit.query.filter(Audit.influencer_id.in_(self.influencer_ids))
+            .distinct(Audit.influencer_id)
+            .order_by(Audit.influencer_id, Audit.created.desc())
+        )
+        return {audit.influencer_id: audit for audit in audits}
+
+    def _load_followers_history(self, instagram_account_ids):
+        if not instagram_account_ids:
+            return {}
+        date = func.date(InstagramAccountEvent.created)
+        followers = InstagramAccountEvent.event["followers"].astext.cast(Integer)
+        rows = (
+            db.session.query(
+                InstagramAccountEvent.instagram_account_id,
+                date.label("date"),
+                func.min(followers).label("min"),
+                func.max(followers).label("max"),
+            )
+            .filter(
+                InstagramAccountEvent.type == "instagram-update",
+                InstagramAccountEvent.instagram_account_id.in_(instagram_account_ids),
+            )
+            .group_by(InstagramAccountEvent.instagram_account_id, date)
+            .order_by(InstagramAccountEvent.instagram_account_id, date)
+        )
+        history = defaultdict(list)
+        for instagram_account_id, *values in rows:
+            history[instagram_account_id].append(values)
+        return history
+
+    def _load_instagram_audience_insights(self, ids):
+        ids = [id for id in ids if id]
+        if not ids:
+            return {}
+        insights = InstagramAudienceInsight.query.filter(
+            InstagramAudienceInsight.id.in_(ids)
+        ).options(
+            selectinload(InstagramAudienceInsight.region_insights).joinedload(
+                RegionInsightValue.region
+            ),
+            selectinload(InstagramAudienceInsight.gender_age_insights),
+        )
+        return {insight.id: insight for insight in insights}
+
+    def _load_audience_insights(self, ids):
+        ids = [id for id in ids if id]
+        if not ids:
+            return {}
+        insights = AudienceInsight.query.filter(AudienceInsight.id.in_(ids)).options(
+            joinedload(AudienceInsight.top_locations),
+            joinedload(AudienceInsight.ages_men),
+            joinedload(AudienceInsight.ages_women),
+            joinedload(AudienceInsight.gender),
+        )
+        return {insight.id: insight for insight in insights}
+
+    # *************
+    # Serialization
+    # *************
+
+    def _region(self, region):
+        """Regions are shared between many influencers, so each one is only
+        serialized once per batch
+        """
+        if region is None:
+            return None
+        if region.id not in self._regions:
+            self._regions[region.id] = {
+                "id": region.id,
+                "country": region.country,
+                "country_code": region.country_code,
+                "locale_code": region.locale_code,
+                "name": region.name,
+                "supported": region.supported,
+                "targetable": region.targetable,
+                "path": region.path,
+                "market_slug": region.market_slug,
+                "is_leaf": region.is_leaf,
+            }
+        return self._regions[region.id]
+
+    def _instagram_audience_insight(self, insight):
+        if insight is None:
+            return None
+
+        region_insights = insight.region_insights
+        region_total = sum(i.follower_count for i in region_insights)
+        gender_age_insights = insight.gender_age_insights
+        gender_age_total = sum(i.follower_count for i in gender_age_insights)
+
+        genders = {"female": 0, "male": 0, "unknown": 0}
+        ages = {"13-17": 0, "18-24": 0, "25-34": 0, "35-44": 0, "45-54": 0, "55-64": 0, "65+": 0}
+        for value in gender_age_insights:
+            genders[value.gender] = genders.get(value.gender, 0) + value.follower_count
+            key = f"{value.age_from}+" if not value.age_to else f"{value.age_from}-{value.age_to}"
+            ages[key] = ages.get(key, 0) + value.follower_count
+
+        return {
+            "id": _str(insight.id),
+            "created": _date(insight.created),
+            "region_insights": [
+                {
+                    "id": _str(value.id),
+                    "follower_count": value.follower_count,
+                    "follower_percentage": _percent(value.follower_count / region_total),
+                    "region": self._region(value.region),
+                }
+                for value in region_insights
+            ],
+            "total_region_followers": region_total if region_insights else None,
+            "gender_age_insights": [
+                {
+                    "id": _str(value.id),
+                    "created": None,
+                    "gender": value.gender,
+                    "follower_count": value.follower_count,
+                    "age_from": value.age_from,
+                    "age_to": value.age_to,
+                    "follower_percentage": _percent(value.follower_count / gender_age_total)
+                    if gender_age_total
+                    else None,
+                }
+                for value in gender_age_insights
+            ],
+            "gender_split": _split({key.title(): value for key, value in genders.items()}),
+            "age_split": _split(ages),
+        }
+
+    def _audience_section(self, section, sort_key=None, reverse=False):
+        if section is None:
+            return None
+
+        values = None
+        if section.followers is not None or not section.ocr_values:
+            values = [
+                {
+                    "name": key,
+                    "value": result["value"],
+                    "confidence": result["confidence"],
+                    "followers": int(section.followers * result["value"] / 100),
+                }
+                for key, result in section.ocr_values.items()
+            ]
+            if sort_key:
+                values.sort(key=lambda item: item[sort_key], reverse=reverse)
+            values = [
+                dict(
+                    value,
+                    value=_percent(value["value"] / 100),
+                    confidence=_percent(value["confidence"] / 100),
+                )
+                for value in values
+            ]
+
+        return {
+            "id": _str(section.id),
+            "created": _date(section.created),
+            "url": f"https://takumi.imgix.net/{section.media_path}",
+            "boundary": section.boundary,
+            "values": values,
+            "errors": {
+                "type": section.errors.get("type"),
+                "message": section.errors.get("message"),
+            },
+            "has_errors": len(section.errors) > 0,
+        }
+
+    def _audience_insight(self, insight):
+        if insight is None:
+            return None
+        expired = None
+        if insight.created is not None:
+            expired = insight.created < dt.datetime.now(dt.timezone.utc) - AUDIENCE_INSIGHT_EXPIRY
+        return {
+            "id": _str(insight.id),
+            "created": _date(insight.created),
+            "expired": expired,
+            "state": insight.state,
+            "top_locations": self._audience_section(
+                insight.top_locations, sort_key="value", reverse=True
+            ),
+            "ages_men": self._audience_section(insight.ages_men, sort_key="name"),
+            "ages_women": self._audience_section(insight.ages_women, sort_key="name"),
+            "gender": self._audience_section(insight.gender),
+        }
+
+    def _rewards(self, influencer):
+        if influencer.target_region and influencer.target_region.market:
+            market_currency = influencer.target_region.market.currency
+        else:
+            market_currency = None
+
+        payments = self._payments[influencer.id]
+        if payments:
+            total_rewards = Currency(amount=payments[0].total, currency=payments[0].currency)
+        else:
+            total_rewards = Currency(amount=0, currency=market_currency or "USD")
+
+        currency = market_currency or "GBP"
+        payment = next((p for p in payments if p.currency == currency), None)
+        total = (payment.total or 0) if payment else 0
+        net = (payment.net or 0) if payment else 0
+        breakdown = {
+            "net_value": _currency(Currency(net, currency=currency, currency_digits=True)),
+            "vat_value": _currency(Currency(total - net, currency=currency, currency_digits=True)),
+            "total_value": _currency(Currency(total, currency=currency, currency_digits=True)),
+            "show_net_and_vat": bool(influencer.vat_number),
+        }
+        return _currency(total_rewards), breakdown
+
+    def build_document(self, influencer):
+        user = influencer.user
+        instagram_account = influencer.instagram_account
+        hybrids = self._hybrids[influencer.id]
+        offers = self._offers[influencer.id]
+
+        total_rewards, total_rewards_breakdown = self._rewards(influencer)
+
+        if influencer.address is not None:
+            address = _address(influencer.address)
+        else:
+            address = _address(
+                dict(**Address.get_default_address_data_for_influencer(influencer), id=uuid4_str())
+            )
+
+        followers_history = None
+        if instagram_account is not None:
+            followers_history = [
+                {
+                    "followers": _int(item["followers"]),
+                    "prev_followers": _int(item["prev_followers"]),
+                    "followers_diff": _int(item["followers_diff"]),
+                    "avg_followers_diff": _int(item["avg_followers_diff"]),
+                    "perc": _float(item["perc"]),
+                    "date": item["date"],
+                    "short_date": item["short_date"],
+                }
+                for item in InstagramAccountFollowersHistorySerializer(
+                    self._followers_history.get(instagram_account.id, [])
+                ).serialize()
+            ]
+
+        def _instagram(attribute):
+            return getattr(instagram_account, attribute) if instagram_account else None
+
+        def _user(attribute):
+            return getattr(user, attribute) if user else None
+
+        return {
+            "id": influencer.id,
+            "profile_picture": influencer.profile_picture,
+            "disabled": influencer.disabled,
+            "deletion_date": _date(influencer.deletion_date),
+            "has_accepted_latest_terms": influencer.has_accepted_latest_terms,
+            "has_accepted_latest_privacy": influencer.has_accepted_latest_privacy,
+            # Influencer info
+            "is_signed_up": influencer.is_signed_up,
+            "has_facebook_page": _bool(hybrids.has_facebook_page),
+            "has_tiktok_account": influencer.has_tiktok_account,
+            "has_interests": len(influencer.interests) > 0,
+            "has_youtube_channel": bool(user.youtube_channel_url) if user else None,
+            "vat_number": influencer.vat_number,
+            "is_vat_registered": influencer.is_vat_registered,
+            "last_login": _date(_user("last_login")),
+            "full_name": _user("full_name"),
+            "dashboard_full_name": _user("full_name"),
+            "gender": _user("gender"),
+            "birthday": _date(_user("birthday")),
+            "interests": [
+                {"id": interest.id, "name": interest.name} for interest in influencer.interests
+            ],
+            "participating_campaign_ids": [
+                str(offer.campaign_id)
+                for offer in offers
+                if offer.state not in INVITED_OFFER_STATES
+            ],
+            "invited_campaign_ids": [
+                str(offer.campaign_id) for offer in offers if offer.state in INVITED_OFFER_STATES
+            ],
+            "active_reservation_count": len(
+                [
+                    offer
+                    for offer in offers
+                    if offer.state == OFFER_STATES.ACCEPTED and not offer.is_paid
+                ]
+            ),
+            "target_region": self._region(influencer.target_region),
+            "state": influencer.state,
+            "cooldown_ends": _date(influencer.cooldown_ends),
+            "user_created": _date(_user("created")),
+            "has_device": user.device is not None if user else None,
+            "gig_engagement": _percent(hybrids.gig_engagement or 0),
+            "disabled_reason": influencer.disabled_reason,
+            "tiktok_username": influencer.tiktok_username,
+            "youtube_channel_url": _user("youtube_channel_url"),
+            "social_accounts_chosen": _bool(hybrids.social_accounts_chosen),
+            # Private fields
+            "email": _user("email"),
+            "address": address,
+            "total_rewards": total_rewards,
+            "total_rewards_breakdown": total_rewards_breakdown,
+            "current_region": self._region(influencer.current_region),
+            "device": _device(user.device) if user else None,
+            "information": _information(influencer.information),
+            "has_information": influencer.skip_self_tagging or influencer.information is not None,
+            "last_active": _date(_user("last_active")),
+            # Instagram account
+            "username": influencer.username,
+            "followers": _instagram("followers"),
+            "engagement": _percent(influencer.engagement),
+            "biography": _instagram("ig_biography"),
+            "is_private": _instagram("ig_is_private"),
+            "media_count": _instagram("media_count"),
+            "estimated_engagements_per_post": influencer.estimated_engagements_per_post,
+            "followers_history_anomalies": [
+                {
+                    "follower_increase": _int(anomaly.get("follower_increase")),
+                    "date": anomaly.get("date"),
+                    "ignore": _bool(anomaly.get("ignore")),
+                    "anomaly_factor": _float(anomaly.get("anomaly_factor")),
+                }
+                for anomaly in instagram_account.followers_history_anomalies
+            ]
+            if instagram_account
+            else None,
+            "is_business_account": _instagram("ig_is_business_account"),
+            "is_verified": _instagram("ig_is_verified"),
+            "boosted": _instagram("boosted"),
+            "instagram_audience_insight": self._instagram_audience_insight(
+                self._instagram_audience_insights.get(hybrids.instagram_audience_insight_id)
+            ),
+            "followers_history": followers_history,
+            "estimated_impressions": _int(hybrids.estimated_impressions),
+            "impressions_ratio": _percent(hybrids.impressions_ratio),
+            # Deprecated
+            "supports_insights": False,
+            "audit": _audit(self._audits.get(influencer.id)),
+            "audience_insight": self._audience_insight(
+                self._audience_insights.get(hybrids.audience_insight_id)
+            ),
+            "enable_audience_submit": False,
+            "audience_insight_expires": _date(influencer.audience_insight_expires),
+            "has_valid_audience_insight": influencer.has_valid_audience_insight,
+        }
+
+
+# **************
+# Derived fields
+# **************
+
+
+def add_derived_fields(document):
+    """Add the numeric fields that searches filter, sort and aggregate on,
+    derived from the rest of the document when it's indexed, instead of being
+    computed by a script for every matching document of every search
+
+    The year of birth is stored rather than the age, which would go stale in
+    the index without the influencer changing. Returns a new document.
+    """
+    birthday = document.get("birthday")
+    derived = dict(
+        document,
+        participating_campaign_count=len(document.get("participating_campaign_ids") or []),
+        invited_campaign_count=len(document.get("invited_campaign_ids") or []),
+        birth_year=int(birthday[:4]) if birthday else None,
+    )
+    if document.get("information") is not None:
+        information = document["information"]
+        derived["information"] = dict(
+            information, child_count=len(information.get("children") or [])
+        )
+    return derived
@@ -1,25 +1,72 @@
+import datetime as dt
 import sys
+import time
 
 from flask import current_app
 from graphene import Schema
 from sentry_sdk import capture_exception
-from sqlalchemy import event
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import object_session
 from tasktiger import RetryException, exponential
 
+from core.common.chunks import chunks
 from core.common.monitoring import TimingStats
 from core.elasticsearch import DictObject
 from core.tasktiger import MAIN_QUEUE_NAME
 
-from takumi.extensions import elasticsearch, tiger
+from takumi.extensions import db, elasticsearch, redis, tiger
 from takumi.gql.generator import QueryGenerator
 from takumi.models import Audit, FacebookPage, Influencer, InstagramAccount, Offer, User
 from takumi.roles import system_access
+from takumi.session_hooks import SessionHook
+from takumi.utils import is_uuid
 
 from .audit.indexing import AUDIT_MAPPING
+from .document import InfluencerDocumentBuilder, add_derived_fields
 from .information.indexing import INFORMATION_MAPPING
 
 INDEXING_QUEUE = f"{MAIN_QUEUE_NAME}.indexing"
 
+DIRTY_INFLUENCERS_KEY = "INDEXING:DIRTY_INFLUENCERS"
+FLUSH_SCHEDULED_KEY = "INDEXING:FLUSH_SCHEDULED"
+BULK_INDEXING_WINDOW = dt.timedelta(seconds=5)
+BULK_INDEXING_BATCH_SIZE = 200
+
+SESSION_DIRTY_INFLUENCERS_KEY = "dirty_influencers"
+
+# The index being built by `takumi.search.influencer.versions`, which every
+# update of the live index is written to as well while it's being built
+MIGRATION_INDEX_KEY = "INDEXING:MIGRATION_INDEX"
+
+# Columns that aren't part of the index document, updates that only touch
+# these don't need the influencer to be re-indexed
+UNINDEXED_COLUMNS = {
+    Audit: {"modified", "followers_chart", "following_chart", "growth_title", "growth_description"},
+    FacebookPage: {"modified", "events", "name", "page_access_token"},
+    Influencer: {"modified"},
+    InstagramAccount: {
+        "modified",
+        "token",
+        "recent_media",
+        "recent_media_updated",
+        "scraped_email",
+        "search_vector",
+        "search_vector_full",
+    },
+    Offer: {"modified", "scheduled_jobs", "answers", "tracking_code", "in_transit"},
+    User: {
+        "modified",
+        "settings",
+        "locale",
+        "timezone",
+        "email_notification_preference",
+        "revolut_counterparty_id",
+        "needs",
+        "search_vector",
+        "theme_id",
+    },
+}
+
 
 class InfluencerInfo(DictObject):
     """Currently this type only exists for GraphQL union-typing reasons, and
@@ -36,6 +83,34 @@ class IndexingError(Exception):
             self.errors = kwargs.pop("errors")
 
 
+class BulkIndexingResult:
+    """The outcome of a bulk indexing run
+
+    `errors` maps the id of every influencer that failed to index to the
+    reason it failed, either while building its source document or as
+    reported by elasticsearch for the individual bulk item.
+    """
+
+    def __init__(self, indexed=None, skipped=None, errors=None):
+        self.indexed = indexed or []
+        self.skipped = skipped or []
+        self.errors = errors or {}
+
+    def __iadd__(self, other):
+        self.indexed += other.indexed
+        self.skipped += other.skipped
+        self.errors.update(other.errors)
+        return self
+
+    def __len__(self):
+        return len(self.indexed) + len(self.skipped) + len(self.errors)
+
+    def __repr__(self):
+        return "<BulkIndexingResult: {} indexed, {} skipped, {} errors>".format(
+            len(self.indexed), len(self.skipped), len(self.errors)
+        )
+
+
 class InfluencerIndex:
     _doc = "influencer"
     _schema = None
@@ -52,11 +127,14 @@ class InfluencerIndex:
                     "email": {"type": "keyword", "boost": 2},
                     "participating_campaign_ids": {"type": "keyword"},
                     "invited_campaign_ids": {"type": "keyword"},
+                    "participating_campaign_count": {"type": "integer"},
+                    "invited_campaign_count": {"type": "integer"},
                     "gender": {"type": "keyword"},
                     "state": {"type": "keyword"},
                     "is_signed_up": {"type": "boolean"},
                     "has_facebook_page": {"type": "boolean"},
                     "birthday": {"type": "date", "format": "yyyy-MM-dd"},
+                    "birth_year": {"type": "integer"},
                     "user_created": {"type": "date", "format": "date_time"},
                     "last_login": {"type": "date", "format": "date_time"},
                     "last_active": {"type": "date", "format": "date_time"},
@@ -159,6 +237,22 @@ class InfluencerIndex:
 
     @classmethod
     def delete(cls, influencer_id):
+        """Delete the document of the influencer
+
+        The delete is versioned in the index being built, like the writes to
+        it, so a document built before the delete can't bring it back.
+        """
+        version = _document_version()
+        migration_index = get_migration_index()
+        if migration_index:
+            elasticsearch.delete(
+                index=migration_index,
+                doc_type=cls._doc,
+                id=influencer_id,
+                version=version,
+                version_type="external_gte",
+                ignore=[404, 409],
+            )
         return elasticsearch.delete(id=influencer_id)
 
     @classmethod
@@ -170,30 +264,331 @@ class InfluencerIndex:
         else:
             raise IndexingError("No data returned from GraphQL query!", errors=result.errors)
 
+    @classmethod
+    def get_source_documents(cls, influencer_ids):
+        """Build the source documents for a batch of influencers
+
+        Returns a tuple of the documents, keyed by influencer id, and the
+        errors for the influencers whose document couldn't be built. An
+        influencer that no longer exists maps to `None`.
+        """
+        errors = {
+            influencer_id: "badly formed influencer id"
+            for influencer_id in influencer_ids
+            if not is_uuid(influencer_id)
+        }
+        influencer_ids = [
+            influencer_id for influencer_id in influencer_ids if influencer_id not in errors
+        ]
+        if not influencer_ids:
+            return {}, errors
+
+        builder = InfluencerDocumentBuilder(influencer_ids)
+        documents = dict.fromkeys(influencer_ids)
+        for influencer in builder.load():
+            try:
+                documents[influencer.id] = builder.build_document(influencer)
+            except Exception as e:
+                errors[influencer.id] = str(e)
+                del documents[influencer.id]
+        return documents, errors
+
     @classmethod
     def update_from_source(cls, influencer_id):
-        doc = cls.get_source_document(influencer_id)
-        if doc.get("influencer") is not None:
-            elasticsearch.index(id=influencer_id, body=doc["influencer"])
+        if not is_uuid(influencer_id):
+            raise IndexingError(f"Badly formed influencer id: {influencer_id}")
+        version = _document_version()
+        doc = InfluencerDocumentBuilder([influencer_id]).build().get(influencer_id)
+        if doc is None:
+            return
+        doc = add_derived_fields(doc)
+        elasticsearch.index(id=influencer_id, body=doc)
+
+        migration_index = get_migration_index()
+        if migration_index:
+            elasticsearch.index(
+                index=migration_index,
+                doc_type=cls._doc,
+                id=influencer_id,
+                body=doc,
+                version=version,
+                version_type="external_gte",
+                ignore=409,
+            )
+
+    @classmethod
+    def _bulk_index(cls, documents, index, version=None):
+        """Send the documents to `index` in a single `_bulk` request, and
+        return the errors of the individual documents
+
+        Documents indexed with a `version` don't replace documents built more
+        recently, which isn't an error.
+        """
+        actions = []
+        for influencer_id, doc in documents.items():
+            if version is None:
+                actions.append({"index": {"_id": influencer_id}})
+            else:
+                actions.append(
+                    {
+                        "index": {
+                            "_id": influencer_id,
+                            "version": version,
+                            "version_type": "external_gte",
+                        }
+                    }
+                )
+            actions.append(doc)
+
+        response = elasticsearch.bulk(body=actions, index=index, doc_type=cls._doc)
+        return {
+            item["index"]["_id"]: item["index"]["error"]
+            for item in response["items"]
+            if "error" in item["index"] and item["index"].get("status") != 409
+        }
+
+    @classmethod
+    def bulk_update_from_source(cls, influencer_ids, index=None):
+        """Index a batch of influencers with a single `_bulk` request
+
+        The documents are indexed into `index` if given, and otherwise into the
+        live index, as well as into the index being built by a migration if
+        there is one. Documents are versioned by when they were built in the
+        index being built, so the backfill and the live updates writing to it
+        at the same time can't replace a document with an older one.
+        """
+        version = _document_version()
+        migration_index = get_migration_index()
+        documents, errors = cls.get_source_documents(influencer_ids)
+        result = BulkIndexingResult(errors=errors)
+
+        docs = {}
+        for influencer_id, doc in documents.items():
+            if doc is None:
+                result.skipped.append(influencer_id)
+            else:
+                docs[influencer_id] = add_derived_fields(doc)
+
+        if not docs:
+            return result
+
+        if index is None:
+            result.errors.update(
+                cls._bulk_index(docs, current_app.config["ELASTICSEARCH_INFLUENCER_INDEX"])
+            )
+            if migration_index:
+                result.errors.update(cls._bulk_index(docs, migration_index, version))
+        else:
+            result.errors.update(
+                cls._bulk_index(docs, index, version if index == migration_index else None)
+            )
+
+        result.indexed = [
+            influencer_id for influencer_id in docs if influencer_id not in result.errors
+        ]
+        return result
 
 
 @tiger.task(queue=INDEXING_QUEUE, debounce=5000)
-def update_influencer_info(influencer_id, source=None):
-    with TimingStats(
-        current_app.config["statsd"], "takumi.search.influencer.update_influencer_info"
-    ) as metric:
+def update_influencer_info(*influencer_ids, source=None):
+    metric_name = "takumi.search.influencer.update_influencer_info"
+    with TimingStats(current_app.config["statsd"], metric_name) as metric:
         try:
             metric.tags.append(f"source:{source}")
-            InfluencerIndex.update_from_source(influencer_id)
+            if len(influencer_ids) == 1:
+                InfluencerIndex.update_from_source(influencer_ids[0])
+            else:
+                result = InfluencerIndex.bulk_update_from_source(influencer_ids)
+                _report_bulk_indexing_result(result, metric_name)
+                if result.errors:
+                    raise IndexingError("Failed to index influencers", errors=result.errors)
         except Exception as e:
-            sys.stderr.write("Failed to update {}, exception: {}".format(influencer_id, str(e)))
+            sys.stderr.write(
+                "Failed to update {}, exception: {}".format(", ".join(influencer_ids), str(e))
+            )
             raise RetryException(
                 method=exponential(60, 2, 5), original_traceback=True, log_error=True
             )
 
 
+def _decode(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def _document_version():
+    """The version of documents built from the database from now on"""
+    return int(time.time() * 1000)
+
+
+def get_migration_index():
+    """The index being built by a migration, if one is running"""
+    return _decode(redis.get_connection().get(MIGRATION_INDEX_KEY))
+
+
+def _report_bulk_indexing_result(result, metric_name):
+    statsd = current_app.config["statsd"]
+    statsd.histogram(f"{metric_name}.indexed", len(result.indexed))
+    statsd.histogram(f"{metric_name}.errors", len(result.errors))
+    for influencer_id, error in result.errors.items():
+        sys.stderr.write("Failed to index {}, error: {}\n".format(influencer_id, error))
+
+
+def queue_influencer_update(*influencer_ids, source=None):
+    """Mark influencers as dirty to be indexed in bulk
+
+    Every influencer marked within `BULK_INDEXING_WINDOW` of the first one is
+    indexed by the same `flush_dirty_influencers` run, instead of spending a
+    task and a round trip to elasticsearch on each of them.
+    """
+    influencer_ids = [influencer_id for influencer_id in influencer_ids if influencer_id]
+    if not influencer_ids:
+        return
+
+    conn = redis.get_connection()
+    conn.sadd(DIRTY_INFLUENCERS_KEY, *influencer_ids)
+    current_app.config["statsd"].histogram(
+        "takumi.search.influencer.queue_influencer_update",
+        len(influencer_ids),
+        tags=[f"source:{source}"],
+    )
+
+    window = int(BULK_INDEXING_WINDOW.total_seconds())
+    if conn.set(FLUSH_SCHEDULED_KEY, 1, nx=True, ex=window):
+        tiger.tiger.delay(
+            flush_dirty_influencers, queue=INDEXING_QUEUE, unique=True, when=BULK_INDEXING_WINDOW
+        )
+
+
+@tiger.task(queue=INDEXING_QUEUE, unique=True)
+def flush_dirty_influencers():
+    conn = redis.get_connection()
+    metric_name = "takumi.search.influencer.flush_dirty_influencers"
+
+    with TimingStats(current_app.config["statsd"], metric_name):
+        while True:
+            influencer_ids = [
+                _decode(influencer_id)
+                for influencer_id in conn.spop(DIRTY_INFLUENCERS_KEY, BULK_INDEXING_BATCH_SIZE)
+                or []
+            ]
+            if not influencer_ids:
+                break
+
+            try:
+                result = InfluencerIndex.bulk_update_from_source(influencer_ids)
+            except Exception as e:
+                # Put the batch back so the retry picks it up again
+                conn.sadd(DIRTY_INFLUENCERS_KEY, *influencer_ids)
+                sys.stderr.write("Failed to flush dirty influencers, exception: {}".format(str(e)))
+                raise RetryException(
+                    method=exponential(60, 2, 5), original_traceback=True, log_error=True
+                )
+            finally:
+                db.session.expunge_all()
+
+            _report_bulk_indexing_result(result, metric_name)
+
+
+def log_indexing_progress(log, result, total, started):
+    elapsed = time.monotonic() - started
+    log(
+        "Indexed {}/{} influencers ({} errors) in {:.1f}s, {:.1f} docs/s".format(
+            len(result), total, len(result.errors), elapsed, len(result) / elapsed
+        )
+    )
+
+
+def reindex_influencers(influencer_ids, batch_size=BULK_INDEXING_BATCH_SIZE, log=None, index=None):
+    """Index the given influencers in bulk, batch by batch, into `index` if
+    given rather than the live index
+
+    Progress and throughput are reported to `log` after every batch.
+    """
+    total = len(influencer_ids)
+    result = BulkIndexingResult()
+    started = time.monotonic()
+
+    for batch in chunks(influencer_ids, batch_size):
+        result += InfluencerIndex.bulk_update_from_source(batch, index=index)
+        db.session.expunge_all()
+
+        if log is not None:
+            log_indexing_progress(log, result, total, started)
+
+    return result, time.monotonic() - started
+
+
+def all_influencer_ids():
+    return [
+        influencer_id
+        for (influencer_id,) in db.session.query(Influencer.id).order_by(Influencer.created)
+    ]
+
+
+def _reindex_all(metric_name, batch_size, index=None):
+    result, elapsed = reindex_influencers(
+        all_influencer_ids(), batch_size=batch_size, log=current_app.logger.info, index=index
+    )
+
+    _report_bulk_indexing_result(result, metric_name)
+    if elapsed:
+        current_app.config["statsd"].gauge(f"{metric_name}.docs_per_second", len(result) / elapsed)
+    return result
+
+
+@tiger.task(queue=INDEXING_QUEUE, unique=True)
+def rebuild_influencer_index(batch_size=BULK_INDEXING_BATCH_SIZE):
+    """Re-index every influencer with the bulk API"""
+    _reindex_all("takumi.search.influencer.rebuild_influencer_index", batch_size)
+
+
+def _has_indexed_changes(target):
+    state = inspect(target)
+    unindexed = UNINDEXED_COLUMNS.get(state.class_, ())
+    return any(
+        state.attrs[attr.key].history.has_changes()
+        for attr in state.mapper.column_attrs
+        if attr.key not in unindexed
+    )
+
+
+def on_indexed_update(cls):
+    """Register a trigger for `after_update` of `cls`, which is only called
+    when one of the columns that are part of the index document changed
+    """
+
+    def decorator(trigger):
+        @event.listens_for(cls, "after_update")
+        def after_update(mapper, connection, target):
+            if _has_indexed_changes(target):
+                trigger(mapper, connection, target)
+
+        return trigger
+
+    return decorator
+
+
+def mark_influencer_dirty(target, influencer_id, source):
+    """Collect an influencer to be indexed when the session of `target`
+    commits. Influencers marked more than once in the same transaction are
+    only indexed once.
+    """
+    session = object_session(target)
+    if session is None or influencer_id is None:
+        return
+    dirty_influencers.collected(session).setdefault(influencer_id, source)
+
+
+def enqueue_dirty_influencers(dirty):
+    source = "+".join(sorted(set(dirty.values())))
+    queue_influencer_update(*dirty, source=source)
+
+
+dirty_influencers = SessionHook(SESSION_DIRTY_INFLUENCERS_KEY, on_commit=enqueue_dirty_influencers)
+
+
 @event.listens_for(FacebookPage, "after_insert")
-@event.listens_for(FacebookPage, "after_update")
+@on_indexed_update(FacebookPage)
 @event.listens_for(FacebookPage, "after_delete")
 def trigger_influencer_info_update_for_facebook_page(mapper, connection, target):
     try:
@@ -201,53 +596,53 @@ def trigger_influencer_info_update_for_facebook_page(mapper, connection, target)
         if facebook_account.users:
             influencer = facebook_account.users[0].influencer
             if influencer:
-                update_influencer_info.delay(influencer.id, source="facebook_page")
+                mark_influencer_dirty(target, influencer.id, source="facebook_page")
     except AttributeError:
         capture_exception()
 
 
 @event.listens_for(Audit, "after_insert")
-@event.listens_for(Audit, "after_update")
+@on_indexed_update(Audit)
 def trigger_influencer_info_update_for_audit(mapper, connection, target):
     try:
         influencer = target.influencer
-        update_influencer_info.delay(influencer.id, source="audit")
+        mark_influencer_dirty(target, influencer.id, source="audit")
     except AttributeError:
         capture_exception()
 
 
 @event.listens_for(User, "after_insert")
-@event.listens_for(User, "after_update")
+@on_indexed_update(User)
 def trigger_influencer_info_update_for_user(mapper, connection, target):
     try:
         influencer = target.influencer
         if influencer:
-            update_influencer_info.delay(influencer.id, source="user")
+            mark_influencer_dirty(target, influencer.id, source="user")
     except AttributeError:
         capture_exception()
 
 
-@event.listens_for(Offer, "after_update")
+@on_indexed_update(Offer)
 def trigger_influencer_info_update_for_offer(mapper, connection, target):
     try:
         influencer = target.influencer
-        update_influencer_info.delay(influencer.id, source="offer")
+        mark_influencer_dirty(target, influencer.id, source="offer")
     except AttributeError:
         capture_exception()
 
 
-@event.listens_for(InstagramAccount, "after_update")
+@on_indexed_update(InstagramAccount)
 def trigger_influencer_info_update_for_instagram_account(mapper, connection, target):
     try:
         influencer = target.influencer
         if influencer is not None:
-            update_influencer_info.delay(influencer.id, source="instagram_account")
+            mark_influencer_dirty(target, influencer.id, source="instagram_account")
     except AttributeError:
         capture_exception()
 
 
 @event.listens_for(Influencer, "after_insert")
-@event.listens_for(Influencer, "after_update")
+@on_indexed_update(Influencer)
 def trigger_influencer_info_update(mapper, connection, target):
     influencer = target
-    update_influencer_info.delay(influencer.id, source="influencer")
+    mark_influencer_dirty(target, influencer.id, source="influencer")
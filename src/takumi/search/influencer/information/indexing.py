@@ -10,6 +10,7 @@ INFORMATION_MAPPING = {
         "glasses": {"type": "boolean"},
         "languages": {"type": "keyword"},
         "tags.id": {"type": "keyword"},
+        "child_count": {"type": "integer"},
         "children": {
             "type": "nested",
             "properties": {
@@ -69,13 +69,16 @@ class InformationSearchMixin:
         )
 
     def filter_information_child_count(self, min_count=None, max_count=None):
-        child_count = 'doc["information"]["children"].size()'
-        _self = self
+        child_count = {}
         if min_count:
-            _self = _self.filter({"script": {"script": f"{child_count} >= {min_count}"}})
+            child_count["gte"] = min_count
         if max_count:
-            _self = _self.filter({"script": {"script": f"{child_count} <= {max_count}"}})
-        return _self
+            child_count["lte"] = max_count
+        if not child_count:
+            return self
+        return self.filter(
+            "nested", path="information", query=Q("range", information__child_count=child_count)
+        )
 
     def filter_information_child_gender(self, gender):
         return self._filter_children(Q("term", information__children__gender=gender))
@@ -17,11 +17,43 @@ from .indexing import InfluencerInfo
 from .information.search import InformationSearchMixin
 
 
+AGE_RANGES = [(0, 20), (20, 25), (25, 30), (30, 35), (35, 40), (40, 50), (50, 60), (60, None)]
+
+
+def _age_range_key(age_from, age_to):
+    return f"{age_from:.1f}-{age_to:.1f}" if age_to is not None else f"{age_from:.1f}-*"
+
+
+def _order_count_by_age(aggregations):
+    """Put the age buckets back in the order of the ages, youngest first"""
+    if not aggregations or "count_by_age" not in aggregations:
+        return aggregations
+    order = [_age_range_key(age_from, age_to) for age_from, age_to in AGE_RANGES]
+    count_by_age = aggregations["count_by_age"]
+    buckets = sorted(count_by_age["buckets"], key=lambda bucket: order.index(bucket["key"]))
+    return {**aggregations, "count_by_age": {**count_by_age, "buckets": buckets}}
+
+
+def _total_hits(response):
+    total = response["hits"]["total"]
+    return total["value"] if isinstance(total, dict) else total
+
+
 class InfluencerSearch(Search, AuditSearchMixin, InformationSearchMixin):
+    # The memoized executions of this search, searches are immutable so
+    # every clone starts without them, but aggregations are added in place
+    # and forget them
+    _result_set = None
+    _page = None
+
     def __init__(self, *args, **kwargs):
         using = kwargs.pop("using", elasticsearch)
         return super().__init__(*args, using=using, **kwargs)
 
+    def _forget_executions(self):
+        self._result_set = None
+        self._page = None
+
     def filter_field_by_range(self, field, min_val, max_val):
         if min_val is None and max_val is None:
             return self
@@ -33,17 +65,7 @@ class InfluencerSearch(Search, AuditSearchMixin, InformationSearchMixin):
         return self.filter("range", **{field: range_filter})
 
     def filter_participating_campaign_count(self, min_count=None, max_count=None):
-        participating_campaign_id_size = 'doc["participating_campaign_ids"].size()'
-        _self = self
-        if min_count:
-            _self = _self.filter(
-                {"script": {"script": f"{participating_campaign_id_size} >= {min_count}"}}
-            )
-        if max_count:
-            _self = _self.filter(
-                {"script": {"script": f"{participating_campaign_id_size} <= {max_count}"}}
-            )
-        return _self
+        return self.filter_field_by_range("participating_campaign_count", min_count, max_count)
 
     def filter_followers_history_anomalies(self, min_val=None, max_val=None):
         if min_val is None and max_val is None:
@@ -315,15 +337,7 @@ class InfluencerSearch(Search, AuditSearchMixin, InformationSearchMixin):
         )
 
     def sort_by_participating_campaign_count(self, desc=False):
-        return self.sort(
-            {
-                "_script": dict(
-                    type="number",
-                    script=dict(lang="painless", source='doc["participating_campaign_ids"].size()'),
-                    order="desc" if desc else "asc",
-                )
-            }
-        )
+        return self.sort_by("participating_campaign_count", desc=desc)
 
     def sort_by_followers_history_anomalies(self, desc=False):
         return self.sort(
@@ -351,20 +365,23 @@ class InfluencerSearch(Search, AuditSearchMixin, InformationSearchMixin):
             "participating_campaign_count_histogram",
             "histogram",
             interval=10,
-            script=dict(lang="painless", source='doc["participating_campaign_ids"].size()'),
+            field="participating_campaign_count",
         )
 
     def add_statistics_aggregations(self):
+        self._forget_executions()
         self._add_participating_campaign_count_histogram()
         self.add_audit_statistics_aggregations()
 
     def add_count_by_aggregation(self, field):
+        self._forget_executions()
         self.aggs.bucket("count_by_" + field, "terms", field=field, size=1000).bucket(
             "sum_followers", "sum", field="followers"
         )
         return self
 
     def add_count_by_interests(self):
+        self._forget_executions()
         interests_bucket = self.aggs.bucket("count_by_interests", "nested", path="interests")
         interests_bucket.bucket("sub_bucket", "terms", field="interests.name", size=1000).bucket(
             "sub_bucket", "reverse_nested"
@@ -372,6 +389,7 @@ class InfluencerSearch(Search, AuditSearchMixin, InformationSearchMixin):
         return self
 
     def add_count_by_region(self):
+        self._forget_executions()
         region_bucket = self.aggs.bucket("count_by_target_region", "nested", path="target_region")
         region_bucket.bucket("sub_bucket", "terms", field="target_region.id", size=1000).bucket(
             "sub_bucket", "reverse_nested"
@@ -379,6 +397,7 @@ class InfluencerSearch(Search, AuditSearchMixin, InformationSearchMixin):
         return self
 
     def add_count_by_device_model(self):
+        self._forget_executions()
         device_bucket = self.aggs.bucket("count_by_device_model", "nested", path="device")
         device_bucket.bucket("sub_bucket", "terms", field="device.device_model", size=1000).bucket(
             "sub_bucket", "reverse_nested"
@@ -386,6 +405,7 @@ class InfluencerSearch(Search, AuditSearchMixin, InformationSearchMixin):
         return self
 
     def _add_count_by_ranges(self, field, ranges, field_val=None, date=False):
+        self._forget_executions()
         self.aggs.bucket(
             "count_by_" + field,
             "date_range" if date else "range",
@@ -513,29 +533,29 @@ class InfluencerSearch(Search, AuditSearchMixin, InformationSearchMixin):
         )
 
     def add_count_by_age(self):
+        # The ages are ranges of years of birth keyed by the age range, which
+        # elasticsearch orders by the year of birth, oldest first, until
+        # `aggregations` orders them by age again
         current_year = dt.datetime.now().year
-        self.aggs.bucket(
-            "count_by_age",
-            "range",
-            script=str(current_year) + "-doc['birthday'].date.year",
-            ranges=[
-                {"from": 0, "to": 20},
-                {"from": 20, "to": 25},
-                {"from": 25, "to": 30},
-                {"from": 30, "to": 35},
-                {"from": 35, "to": 40},
-                {"from": 40, "to": 50},
-                {"from": 50, "to": 60},
-                {"from": 60},
-            ],
-        ).bucket("sum_followers", "sum", field="followers")
+        ranges = []
+        for age_from, age_to in AGE_RANGES:
+            age_range = {"key": _age_range_key(age_from, age_to)}
+            if age_to is not None:
+                age_range["from"] = current_year - age_to + 1
+            age_range["to"] = current_year - age_from + 1
+            ranges.append(age_range)
+        self._forget_executions()
+        self.aggs.bucket("count_by_age", "range", field="birth_year", ranges=ranges).bucket(
+            "sum_followers", "sum", field="followers"
+        )
         return self
 
     def add_count_by_participating_campaign_count(self):
+        self._forget_executions()
         self.aggs.bucket(
             "count_by_participating_campaign_count",
             "range",
-            script='doc["participating_campaign_ids"].size()',
+            field="participating_campaign_count",
             ranges=[
                 {"from": 1, "to": 2},
                 {"from": 2, "to": 5},
@@ -558,9 +578,35 @@ class InfluencerSearch(Search, AuditSearchMixin, InformationSearchMixin):
         return self.filter("term", id=id).first()
 
     def execute(self):
-        return ResultSet(self, elasticsearch, result_cls=InfluencerInfo)
+        if self._result_set is None:
+            self._result_set = ResultSet(self, elasticsearch, result_cls=InfluencerInfo)
+        return self._result_set
+
+    def fetch_page(self, offset, limit):
+        """Fetch a page of hits along with the total and the aggregations,
+        with a single request
+
+        The response is kept, and used by `count`, `aggregations` and by
+        slicing the search within the page, instead of executing the search
+        again for each of them.
+        """
+        if self._page is None or self._page[:2] != (offset, limit):
+            body = {**self.to_dict(), "from": offset, "size": limit, "track_total_hits": True}
+            self._page = (offset, limit, elasticsearch.search(body=body))
+        return [InfluencerInfo(hit["_source"]) for hit in self._page[2]["hits"]["hits"]]
+
+    def __getitem__(self, n):
+        if isinstance(n, slice) and self._page is not None and n.step is None:
+            offset, limit, _ = self._page
+            start = n.start or 0
+            stop = n.stop if n.stop is not None else offset + limit
+            if offset <= start and stop <= offset + limit:
+                return self.fetch_page(offset, limit)[start - offset : stop - offset]
+        return super().__getitem__(n)
 
     def count(self):
+        if self._page is not None:
+            return _total_hits(self._page[2])
         return self.execute().count()
 
     def first(self):
@@ -577,26 +623,66 @@ class InfluencerSearch(Search, AuditSearchMixin, InformationSearchMixin):
     def sum(self, field, name=None):
         if name is None:
             name = f"sum_{field}"
+        self._forget_executions()
         self.aggs.bucket(name, "sum", field=field)
         return self
 
     def aggregations(self):
-        return self.execute().aggregations()
+        if self._page is not None:
+            return _order_count_by_age(self._page[2].get("aggregations"))
+        return _order_count_by_age(self.execute().aggregations())
 
 
 class TracedInfluencerSearch(InfluencerSearch):
+    """An influencer search that traces the funnel of its filters, how many
+    influencers are left after each `filter_*` step
+
+    Each step only records the cumulative query, the funnel is counted by
+    `tracing` with a single request, with a `filters` aggregation of a
+    bucket per step.
+    """
+
     def __init__(self, *args, **kwargs):
-        self.tracing = []
+        self._trace = []
+        self._funnel = None
         return super(InfluencerSearch, self).__init__(*args, **kwargs)
 
+    @property
+    def tracing(self):
+        """The name of each filter step with the number of influencers left"""
+        if not self._trace:
+            return []
+        if self._funnel is None or len(self._funnel) != len(self._trace):
+            response = elasticsearch.search(
+                body={
+                    "size": 0,
+                    "aggs": {
+                        "funnel": {
+                            "filters": {
+                                "filters": {
+                                    str(index): query
+                                    for index, (_, query) in enumerate(self._trace)
+                                }
+                            }
+                        }
+                    },
+                }
+            )
+            buckets = response["aggregations"]["funnel"]["buckets"]
+            self._funnel = [
+                (name, buckets[str(index)]["doc_count"])
+                for index, (name, _) in enumerate(self._trace)
+            ]
+        return self._funnel
+
     def __getattribute__(self, attr):
         attribute = object.__getattribute__(self, attr)
 
         def wrapped(*args, **kwargs):
             name, method = kwargs.pop("_original_method")
             filter_results = method(*args, **kwargs)
-            filter_results.tracing = self.tracing
-            self.tracing.append((name, filter_results.count()))
+            filter_results._trace = self._trace
+            self._trace.append((name, filter_results.to_dict().get("query", {"match_all": {}})))
             return filter_results
 
         traceable = inspect.ismethod(attribute) and attribute.__name__.startswith("filter_")
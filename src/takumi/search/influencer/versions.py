@@ -0,0 +1,172 @@
+"""Versioned influencer indices behind the influencer index alias
+
+Searches and live updates go through the alias (the configured
+`ELASTICSEARCH_INFLUENCER_INDEX`), which points at a single versioned index,
+`<alias>_v<N>`. Rolling out a mapping change is a migration to the next
+version, which searches don't notice:
+
+1. `<alias>_v<N+1>` is created with the current mappings, and live updates
+   are written to it as well as to the alias from then on
+2. every influencer is backfilled into it from the database, by several
+   workers sending bulk requests, with refreshes disabled while loading
+3. the number of documents is verified against the number of influencers
+4. the alias is swapped to the new index in a single atomic request, and
+   the indices it pointed at before are deleted
+"""
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from sqlalchemy import func
+
+from core.common.chunks import chunks
+
+from takumi.extensions import db, elasticsearch, redis, tiger
+from takumi.models import Influencer
+
+from .indexing import (
+    BULK_INDEXING_BATCH_SIZE,
+    INDEXING_QUEUE,
+    MIGRATION_INDEX_KEY,
+    BulkIndexingResult,
+    IndexingError,
+    InfluencerIndex,
+    _report_bulk_indexing_result,
+    all_influencer_ids,
+    log_indexing_progress,
+)
+
+BACKFILL_WORKERS = 4
+MIGRATION_TIMEOUT = 6 * 60 * 60  # seconds
+
+
+def _alias():
+    return current_app.config["ELASTICSEARCH_INFLUENCER_INDEX"]
+
+
+def influencer_index_name(version):
+    return f"{_alias()}_v{version}"
+
+
+def get_index_versions():
+    """The versions of the influencer indices that exist, in order"""
+    pattern = re.compile(r"^{}_v(\d+)$".format(re.escape(_alias())))
+    versions = []
+    for name in elasticsearch.indices.get(index=influencer_index_name("*")):
+        match = pattern.match(name)
+        if match:
+            versions.append(int(match.group(1)))
+    return sorted(versions)
+
+
+def create_influencer_index(index):
+    """Create an empty influencer index with the current mappings"""
+    elasticsearch.indices.create(
+        index=index, body={"mappings": {doc: mapping for doc, mapping in InfluencerIndex._mappings}}
+    )
+
+
+def backfill_influencer_index(
+    index, workers=BACKFILL_WORKERS, batch_size=BULK_INDEXING_BATCH_SIZE, log=None
+):
+    """Index every influencer into `index`, with `workers` threads each
+    sending a bulk request of `batch_size` influencers at a time
+
+    Refreshing the index is disabled while it's loaded, since nothing
+    searches it yet, and the index is refreshed once at the end.
+    """
+    app = current_app._get_current_object()
+    influencer_ids = all_influencer_ids()
+
+    def index_batch(batch):
+        with app.app_context():
+            return InfluencerIndex.bulk_update_from_source(batch, index=index)
+
+    elasticsearch.indices.put_settings(index=index, body={"index": {"refresh_interval": "-1"}})
+    result = BulkIndexingResult()
+    started = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for batch_result in executor.map(index_batch, chunks(influencer_ids, batch_size)):
+                result += batch_result
+                if log is not None:
+                    log_indexing_progress(log, result, len(influencer_ids), started)
+    finally:
+        elasticsearch.indices.put_settings(index=index, body={"index": {"refresh_interval": None}})
+        elasticsearch.indices.refresh(index=index)
+
+    return result, time.monotonic() - started
+
+
+def verify_influencer_index(index, max_difference=0):
+    """Check that `index` has a document for every influencer, give or take
+    `max_difference` influencers created or deleted while it was verified
+    """
+    expected = db.session.query(func.count(Influencer.id)).scalar()
+    indexed = elasticsearch.count(index=index, doc_type=InfluencerIndex._doc)["count"]
+    if abs(indexed - expected) > max_difference:
+        raise IndexingError(f"{index} has {indexed} documents, expected {expected}")
+
+
+def swap_influencer_index(index):
+    """Point the influencer index alias at `index` in a single atomic
+    request, and return the indices it pointed at before
+
+    An index named like the alias, from before the index was aliased, is
+    deleted in the same request, since it's in the way of the alias.
+    """
+    alias = _alias()
+    indices = elasticsearch.indices
+    previous = []
+    if indices.exists_alias(name=alias):
+        previous = list(indices.get_alias(name=alias))
+        actions = [{"remove": {"index": name, "alias": alias}} for name in previous]
+    elif indices.exists(index=alias):
+        actions = [{"remove_index": {"index": alias}}]
+    else:
+        actions = []
+    actions.append({"add": {"index": index, "alias": alias}})
+    indices.update_aliases(body={"actions": actions})
+    return [name for name in previous if name != index]
+
+
+@tiger.task(queue=INDEXING_QUEUE, unique=True, hard_timeout=MIGRATION_TIMEOUT)
+def migrate_influencer_index(
+    workers=BACKFILL_WORKERS, batch_size=BULK_INDEXING_BATCH_SIZE, max_difference=0
+):
+    """Build the next version of the influencer index and swap the alias to it
+
+    If the backfill or the verification fail, live updates stop being written
+    to the new index, which is left as it is to be looked into, and the alias
+    keeps pointing at the current one.
+    """
+    metric_name = "takumi.search.influencer.migrate_influencer_index"
+    conn = redis.get_connection()
+    index = influencer_index_name(max(get_index_versions(), default=0) + 1)
+
+    # Creating the index fails if another migration already created it, and
+    # it has to exist with its mappings before live updates are written to it
+    create_influencer_index(index)
+    conn.set(MIGRATION_INDEX_KEY, index, ex=MIGRATION_TIMEOUT)
+    previous = []
+    try:
+        result, elapsed = backfill_influencer_index(
+            index, workers=workers, batch_size=batch_size, log=current_app.logger.info
+        )
+        _report_bulk_indexing_result(result, metric_name)
+        if elapsed:
+            current_app.config["statsd"].gauge(
+                f"{metric_name}.docs_per_second", len(result) / elapsed
+            )
+        if result.errors:
+            raise IndexingError("Failed to index influencers", errors=result.errors)
+
+        verify_influencer_index(index, max_difference=max_difference)
+        previous = swap_influencer_index(index)
+    finally:
+        conn.delete(MIGRATION_INDEX_KEY)
+
+    for name in previous:
+        elasticsearch.indices.delete(index=name)
+    current_app.logger.info(f"Influencer index alias swapped to {index}, retired {previous}")
@@ -1,10 +1,29 @@
+"""Comment sentiment analysis with AWS Comprehend
+
+`SentimentAnalyser.analyse_batch` analyses many texts with the batch
+endpoints of Comprehend, up to `BATCH_SIZE` texts per call, and caches the
+detected language of each text by the hash of its normalized text, so
+reposted and repeated comments only have their language detected once.
+
+`FakeComprehendClient` answers like Comprehend without calling AWS, with an
+optional latency per call, to measure the throughput of the analysis offline:
+
+    analyser = SentimentAnalyser(client=FakeComprehendClient(latency=0.1))
+    analyser.analyse_batch(texts)
+"""
+import datetime as dt
+import hashlib
 import re
+import time
+from collections import defaultdict
 from dataclasses import dataclass
-from typing import Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from unicodedata import normalize
 
 from itp import itp
 
 from takumi._boto import connections
+from takumi.cache import Cache
 from takumi.utils.emojis import remove_emojis
 
 
@@ -24,6 +43,13 @@ class CommentTooShort(SentimentException):
     pass
 
 
+# The most texts the batch endpoints of Comprehend accept in one call
+BATCH_SIZE = 25
+
+LONG_SPACES = re.compile(r" {2,}")
+
+language_cache = Cache("sentiment_language", ttl=int(dt.timedelta(days=30).total_seconds()))
+
 COUNTRY_CODES = ["hi", "de", "zh-TW", "ko", "pt", "en", "it", "fr", "zh", "es", "ar", "ja"]
 
 
@@ -38,13 +64,35 @@ class Sentiment:
     mixed_score: float
 
 
+def text_hash(text: str) -> str:
+    """The hash of a text, ignoring case and whitespace"""
+    normalized = " ".join(normalize("NFC", text).casefold().split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def _chunks(items: list, size: int = BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
 class SentimentAnalyser:
     def __init__(
-        self, min_confidence: float = 0.75, min_comment_length: int = 5, ignore_emoji: bool = True
+        self,
+        min_confidence: float = 0.75,
+        min_comment_length: int = 5,
+        ignore_emoji: bool = True,
+        client=None,
     ) -> None:
         self.min_confidence = min_confidence
         self.min_comment_length = min_comment_length
         self.ignore_emoji = ignore_emoji
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            return connections.comprehend
+        return self._client
 
     def clean_up_text(self, text: str) -> str:
         """Clean up the text before analysis"""
@@ -58,10 +106,12 @@ class SentimentAnalyser:
         tags = {f"#{tag}" for tag in parsed.tags}
         mentions = {f"@{mention}" for mention in parsed.users}
 
-        text = re.sub("|".join(tags | mentions), "", text)
+        # Longest first, so a tag doesn't cut the start off a longer one
+        for token in sorted(tags | mentions, key=len, reverse=True):
+            text = text.replace(token, "")
 
         # Remove long spaces
-        text = re.sub(r" {2,}", " ", text)
+        text = LONG_SPACES.sub(" ", text)
 
         return text.strip()
 
@@ -78,25 +128,104 @@ class SentimentAnalyser:
         if language_code.lower() not in COUNTRY_CODES:
             raise UnsupportedLanguage(f"{language_code} is not supported")
 
-        client = connections.comprehend
+        response = self.client.detect_sentiment(Text=text, LanguageCode=language_code.lower())
+        return self._sentiment(text, language_code, response)
 
-        response = client.detect_sentiment(Text=text, LanguageCode=language_code.lower())  # type: ignore
-        scores = response["SentimentScore"]
+    @staticmethod
+    def _sentiment(text: str, language_code: str, result: dict) -> Sentiment:
+        scores = result["SentimentScore"]
 
         return Sentiment(
             text=text,
             language_code=language_code,
-            sentiment=response["Sentiment"],
+            sentiment=result["Sentiment"],
             positive_score=scores["Positive"],
             neutral_score=scores["Neutral"],
             negative_score=scores["Negative"],
             mixed_score=scores["Mixed"],
         )
 
-    def identify_language(self, text: str) -> Tuple[str, float]:
-        client = connections.comprehend
+    def analyse_batch(self, texts: List[str]) -> List[Union[Sentiment, SentimentException]]:
+        """Analyse many texts, with the sentiment or the reason it couldn't be
+        analysed for each of them, in the same order
+
+        Languages are detected with `identify_languages` and the sentiment of
+        the texts of each language is detected `BATCH_SIZE` texts at a time.
+        """
+        results: List[Union[Sentiment, SentimentException, None]] = [None] * len(texts)
+
+        cleaned = {}
+        for index, text in enumerate(texts):
+            text = self.clean_up_text(text)
+            if len(text) < self.min_comment_length:
+                results[index] = CommentTooShort(
+                    f"Comment has to be at least {self.min_comment_length} characters"
+                )
+            else:
+                cleaned[index] = text
+
+        languages = self.identify_languages(cleaned.values())
+
+        # The indices of each distinct text, by language
+        by_language: Dict[str, Dict[str, List[int]]] = defaultdict(lambda: defaultdict(list))
+        for index, text in cleaned.items():
+            if text not in languages:
+                # Comprehend failed to detect the language, which is worth retrying
+                results[index] = SentimentException("Failed to identify the language")
+                continue
+            language = languages[text]
+            if language is None:
+                results[index] = UnknownLanguage()
+            elif language[0].lower() not in COUNTRY_CODES:
+                results[index] = UnsupportedLanguage(f"{language[0]} is not supported")
+            else:
+                by_language[language[0]][text].append(index)
+
+        for language_code, indices_by_text in by_language.items():
+            for chunk in _chunks(list(indices_by_text)):
+                response = self.client.batch_detect_sentiment(
+                    TextList=chunk, LanguageCode=language_code.lower()
+                )
+                for result in response["ResultList"]:
+                    text = chunk[result["Index"]]
+                    sentiment = self._sentiment(text, language_code, result)
+                    for index in indices_by_text[text]:
+                        results[index] = sentiment
+                for error in response["ErrorList"]:
+                    text = chunk[error["Index"]]
+                    for index in indices_by_text[text]:
+                        results[index] = SentimentException(error["ErrorMessage"])
+
+        return results  # type: ignore
+
+    def identify_languages(self, texts: Iterable[str]) -> Dict[str, Optional[Tuple[str, float]]]:
+        """The primary language of each of the texts, or None if unknown
+
+        The languages are cached by `text_hash`, the rest are detected
+        `BATCH_SIZE` texts at a time. Texts that Comprehend fails to detect
+        the language of are left out.
+        """
+        hashes = {text: text_hash(text) for text in texts}
+        cached = language_cache.get_many(set(hashes.values()))
+
+        languages = {text: cached[key] for text, key in hashes.items() if key in cached}
+        detected = {}
+        for chunk in _chunks([text for text, key in hashes.items() if key not in cached]):
+            response = self.client.batch_detect_dominant_language(TextList=chunk)
+            for result in response["ResultList"]:
+                text = chunk[result["Index"]]
+                language = None
+                if result["Languages"]:
+                    primary_language = result["Languages"][0]
+                    language = (primary_language["LanguageCode"], primary_language["Score"])
+                languages[text] = detected[hashes[text]] = language
+
+        if detected:
+            language_cache.set_many(detected)
+        return languages
 
-        response = client.detect_dominant_language(Text=text)
+    def identify_language(self, text: str) -> Tuple[str, float]:
+        response = self.client.detect_dominant_language(Text=text)
 
         languages = response["Languages"]
         if not languages:
@@ -104,3 +233,79 @@ class SentimentAnalyser:
 
         primary_language = languages[0]
         return primary_language["LanguageCode"], primary_language["Score"]
+
+
+class FakeComprehendClient:
+    """A stand-in for the Comprehend client, for tests and offline benchmarks
+
+    Texts are English unless they contain a word of `languages`, and positive
+    or negative if they contain a word of `positive_words` or `negative_words`.
+    Every call sleeps for `latency` seconds and is counted in `calls`.
+    """
+
+    positive_words = {"love", "great", "amazing", "beautiful", "good"}
+    negative_words = {"hate", "awful", "ugly", "bad", "worst"}
+    languages = {"hola": "es", "bonjour": "fr", "hallo": "de", "ciao": "it", "hej": "sv"}
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.calls: Dict[str, int] = defaultdict(int)
+
+    def _call(self, operation: str) -> None:
+        self.calls[operation] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _language(self, text: str) -> dict:
+        words = set(text.lower().split())
+        for word, language_code in self.languages.items():
+            if word in words:
+                return {"LanguageCode": language_code, "Score": 0.99}
+        return {"LanguageCode": "en", "Score": 0.99}
+
+    def _sentiment(self, text: str) -> dict:
+        words = set(text.lower().split())
+        positive = bool(words & self.positive_words)
+        negative = bool(words & self.negative_words)
+        sentiment = {
+            (True, True): "MIXED",
+            (True, False): "POSITIVE",
+            (False, True): "NEGATIVE",
+            (False, False): "NEUTRAL",
+        }[(positive, negative)]
+        scores = {"Positive": 0.0, "Neutral": 0.0, "Negative": 0.0, "Mixed": 0.0}
+        scores[sentiment.capitalize()] = 1.0
+        return {"Sentiment": sentiment, "SentimentScore": scores}
+
+    def _check_batch(self, texts: List[str]) -> None:
+        if len(texts) > BATCH_SIZE:
+            raise ValueError(f"At most {BATCH_SIZE} texts are accepted per batch")
+
+    def detect_dominant_language(self, Text: str) -> dict:
+        self._call("detect_dominant_language")
+        return {"Languages": [self._language(Text)]}
+
+    def detect_sentiment(self, Text: str, LanguageCode: str) -> dict:
+        self._call("detect_sentiment")
+        return self._sentiment(Text)
+
+    def batch_detect_dominant_language(self, TextList: List[str]) -> dict:
+        self._check_batch(TextList)
+        self._call("batch_detect_dominant_language")
+        return {
+            "ResultList": [
+                {"Index": index, "Languages": [self._language(text)]}
+                for index, text in enumerate(TextList)
+            ],
+            "ErrorList": [],
+        }
+
+    def batch_detect_sentiment(self, TextList: List[str], LanguageCode: str) -> dict:
+        self._check_batch(TextList)
+        self._call("batch_detect_sentiment")
+        return {
+            "ResultList": [
+                {"Index": index, **self._sentiment(text)} for index, text in enumerate(TextList)
+            ],
+            "ErrorList": [],
+        }
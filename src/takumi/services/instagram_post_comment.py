@@ -1,5 +1,5 @@
 import datetime as dt
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from takumi.extensions import db
 from takumi.models import InstagramPostComment
@@ -66,6 +66,31 @@ class InstagramPostCommentService(Service):
         return instagram_post_comment
 
     # PUT
+    @staticmethod
+    def update_sentiments(sentiments: Dict[str, Optional[Sentiment]]) -> None:
+        """Set the sentiment of many comments, by comment id, with a bulk update
+
+        Comments without a sentiment are only marked as checked.
+        """
+        db.session.bulk_update_mappings(
+            InstagramPostComment,
+            [
+                {"id": comment_id, "sentiment_checked": True}
+                if sentiment is None
+                else {
+                    "id": comment_id,
+                    "sentiment_type": sentiment.sentiment,
+                    "sentiment_language_code": sentiment.language_code,
+                    "sentiment_positive_score": sentiment.positive_score,
+                    "sentiment_neutral_score": sentiment.neutral_score,
+                    "sentiment_negative_score": sentiment.negative_score,
+                    "sentiment_mixed_score": sentiment.mixed_score,
+                    "sentiment_checked": True,
+                }
+                for comment_id, sentiment in sentiments.items()
+            ],
+        )
+
     def update_sentiment(self, sentiment: Sentiment) -> None:
         self.instagram_post_comment.sentiment_type = sentiment.sentiment
         self.instagram_post_comment.sentiment_language_code = sentiment.language_code
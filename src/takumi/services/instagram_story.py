@@ -44,6 +44,53 @@ class InstagramStoryService(Service):
     def instagram_story(self):
         return self.subject
 
+    @staticmethod
+    def _build_story_frame(item, ig_id, influencer):
+        mentions = []
+        locations = []
+        hashtags = []
+        for tappable in item["tappable_objects"]:
+            if tappable["type"] == "mention":
+                mentions.append({"name": tappable["name"], "username": tappable["username"]})
+            elif tappable["type"] == "location":
+                locations.append({"id": tappable["id"], "name": tappable["short_name"]})
+            elif tappable["type"] == "hashtag":
+                hashtags.append({"id": tappable["id"], "name": tappable["name"]})
+
+        story_frame = StoryFrame(
+            id=uuid4_str(),
+            ig_story_id=ig_id,
+            swipe_up_link=item.get("swipe_up_url"),
+            influencer_id=influencer.id,
+            locations=locations,
+            mentions=mentions,
+            hashtags=hashtags,
+            posted=dateutil.parser.parse(
+                item.get("timestamp", item.get("taken_at_timestamp"))
+            ).replace(tzinfo=dt.timezone.utc),
+        )
+
+        if item.get("is_video") or item.get("media_type") == "VIDEO":
+            url = item.get("media_url", item.get("video_url"))
+            thumbnail = item.get("thumbnail_url", item.get("display_url"))
+
+            if url is None or url is not None and "\x00" in url:
+                # We only get the thumbnail, set the url as thumbnail
+                url = thumbnail
+
+            media = Video(
+                url=url, thumbnail=thumbnail, owner_id=story_frame.id, owner_type="story_frame"
+            )
+        else:
+            media = Image(
+                url=item.get("media_url", item.get("display_url")),
+                owner_id=story_frame.id,
+                owner_type="story_frame",
+            )
+
+        story_frame.media = media
+        return story_frame
+
     @staticmethod
     def _create_story_frames_from_download(story, influencer, update_insights=True):
         if "data" in story:
@@ -54,67 +101,32 @@ class InstagramStoryService(Service):
         import takumi.tasks.cdn as cdn_tasks
 
         story_frames = []
+        new_story_frames = []
         story_frame_ids = [s.get("ig_id", s["id"]) for s in items]
-        existing_frames = StoryFrame.query.filter(StoryFrame.ig_story_id.in_(story_frame_ids)).all()
+        existing_frames = {
+            frame.ig_story_id: frame
+            for frame in StoryFrame.query.filter(StoryFrame.ig_story_id.in_(story_frame_ids))
+        }
         for s in items:
             ig_id = s.get("ig_id", s["id"])
-            story_frame = next((f for f in existing_frames if f.ig_story_id == ig_id), None)
+            story_frame = existing_frames.get(ig_id)
 
             if not story_frame:
-                mentions = []
-                locations = []
-                hashtags = []
-                for tappable in s["tappable_objects"]:
-                    if tappable["type"] == "mention":
-                        mentions.append(
-                            {"name": tappable["name"], "username": tappable["username"]}
-                        )
-                    elif tappable["type"] == "location":
-                        locations.append({"id": tappable["id"], "name": tappable["short_name"]})
-                    elif tappable["type"] == "hashtag":
-                        hashtags.append({"id": tappable["id"], "name": tappable["name"]})
-
-                story_frame = StoryFrame(
-                    id=uuid4_str(),
-                    ig_story_id=ig_id,
-                    swipe_up_link=s.get("swipe_up_url"),
-                    influencer_id=influencer.id,
-                    locations=locations,
-                    mentions=mentions,
-                    hashtags=hashtags,
-                    posted=dateutil.parser.parse(
-                        s.get("timestamp", s.get("taken_at_timestamp"))
-                    ).replace(tzinfo=dt.timezone.utc),
+                story_frame = existing_frames[ig_id] = InstagramStoryService._build_story_frame(
+                    s, ig_id, influencer
                 )
+                new_story_frames.append(story_frame)
 
-                if s.get("is_video") or s.get("media_type") == "VIDEO":
-                    url = s.get("media_url", s.get("video_url"))
-                    thumbnail = s.get("thumbnail_url", s.get("display_url"))
-
-                    if url is None or url is not None and "\x00" in url:
-                        # We only get the thumbnail, set the url as thumbnail
-                        url = thumbnail
-
-                    media = Video(
-                        url=url,
-                        thumbnail=thumbnail,
-                        owner_id=story_frame.id,
-                        owner_type="story_frame",
-                    )
-                else:
-                    media = Image(
-                        url=s.get("media_url", s.get("display_url")),
-                        owner_id=story_frame.id,
-                        owner_type="story_frame",
-                    )
+            story_frames.append(story_frame)
 
-                story_frame.media = media
-                db.session.add(story_frame)
-                db.session.commit()
+        if new_story_frames:
+            # Insert the new frames and their media with a single flush
+            db.session.add_all(new_story_frames)
+            db.session.commit()
+            for story_frame in new_story_frames:
                 cdn_tasks.upload_story_media_to_cdn_and_update_story.delay(story_frame.id)
 
-            story_frames.append(story_frame)
-
+        for story_frame in story_frames:
             if (
                 update_insights
                 and influencer.instagram_account.facebook_page
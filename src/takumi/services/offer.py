@@ -371,6 +371,10 @@ class OfferService(Service):
                         OFFER_REWARD_CHANGED_ERROR_CODE,
                     )
             validate_answers(self.offer.campaign.prompts, answers)
+            if not self.offer.campaign.fund.claim_reservation(self.offer):
+                raise CampaignFullyReservedException(
+                    "Campaign is already fully reserved", CAMPAIGN_NOT_RESERVABLE_ERROR_CODE
+                )
             self.log.add_event("reserve", {"answers": answers})
 
         from takumi.tasks import audit as audit_tasks
@@ -404,6 +408,11 @@ class OfferService(Service):
             if any(post.deadline_passed for post in self.offer.campaign.posts):
                 raise OfferNotReservableException("Deadline has already passed in this campaign")
 
+            if not self.offer.campaign.fund.claim_reservation(self.offer):
+                raise CampaignFullyReservedException(
+                    "Campaign is already fully reserved", CAMPAIGN_NOT_RESERVABLE_ERROR_CODE
+                )
+
             if self.offer.campaign.shipping_required:
                 # Confirm the shipping address
                 address = self.offer.influencer.address
@@ -448,6 +457,12 @@ class OfferService(Service):
             if any(post.deadline_passed for post in self.offer.campaign.posts):
                 raise OfferNotReservableException("Deadline has already passed in this campaign")
 
+            if not self.offer.campaign.fund.claim_reservation(
+                self.offer, force=ignore_campaign_limits
+            ):
+                raise CampaignFullyReservedException(
+                    "Campaign is already fully reserved", CAMPAIGN_NOT_RESERVABLE_ERROR_CODE
+                )
             self.log.add_event("accept_requested_participation")
             if self.offer.influencer.has_device:
                 self.send_push_notification(
@@ -663,7 +678,7 @@ class OfferService(Service):
         elif previous_state == OFFER_STATES.ACCEPTED:
             campaign = self.offer.campaign
             units = campaign.fund.get_offer_units(self.offer)
-            if not campaign.fund.can_reserve_units(units):
+            if not campaign.fund.claim_reservation(self.offer, units=units):
                 raise ServiceException("Not enough space on the campaign to revert rejection")
 
         self.log.add_event("revert_rejection", {"state": previous_state})
@@ -0,0 +1,121 @@
+"""Work collected while a session flushes, and done once it commits
+
+Several parts of the app need to do something after the changes of a
+transaction are committed, such as enqueueing a task for the objects that
+changed. A `SessionHook` collects what changed into `session.info` when the
+session flushes, hands it over once the outermost transaction commits, and
+discards it if the transaction is rolled back instead.
+
+The hooks, and the plain listeners of other session lifecycle events, are
+registered on every session by `register_session_hooks`, which is called by
+the app factory.
+"""
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class SessionHook:
+    """Collects into `session.info[key]` and hands it to `on_commit`
+
+    `collect(session, instance, collected)` is called for every new, changed
+    and deleted instance when the session flushes, and can be left out for
+    hooks that are collected into some other way, through `collected`.
+    `on_rollback` is called with what was collected if the outermost
+    transaction ends without committing it.
+    """
+
+    def __init__(self, key, on_commit, collect=None, on_rollback=None, default=dict):
+        self.key = key
+        self.on_commit = on_commit
+        self.collect = collect
+        self.on_rollback = on_rollback
+        self.default = default
+        self._registered = False
+
+    def collected(self, session):
+        """What has been collected so far in the transaction of the session"""
+        return session.info.setdefault(self.key, self.default())
+
+    def after_flush(self, session, flush_context):
+        collected = self.collected(session)
+        for instance in [*session.new, *session.dirty, *session.deleted]:
+            self.collect(session, instance, collected)
+
+    def after_commit(self, session):
+        collected = session.info.pop(self.key, None)
+        if collected:
+            self.on_commit(collected)
+
+    def after_transaction_end(self, session, transaction):
+        # Anything still collected when the outermost transaction ends was
+        # rolled back
+        if transaction.parent is not None:
+            return
+        collected = session.info.pop(self.key, None)
+        if collected and self.on_rollback is not None:
+            self.on_rollback(collected)
+
+    def register(self):
+        if self._registered:
+            return
+        if self.collect is not None:
+            event.listen(Session, "after_flush", self.after_flush)
+        event.listen(Session, "after_commit", self.after_commit)
+        event.listen(Session, "after_transaction_end", self.after_transaction_end)
+        self._registered = True
+
+
+def delay_with_ids(get_task):
+    """An `on_commit` for hooks collecting a dict of sets of ids, which
+    delays the task returned by `get_task` with the ids as keyword
+    arguments, leaving out the empty sets
+
+    The task is looked up when the transaction commits rather than when the
+    hook is created, so that replacing the task, such as in tests, applies.
+    """
+
+    def on_commit(collected):
+        kwargs = {name: sorted(ids - {None}) for name, ids in collected.items() if ids - {None}}
+        if kwargs:
+            get_task().delay(**kwargs)
+
+    return on_commit
+
+
+def listen(identifier, fn):
+    """Listen to a session event with `fn`, once however many times the app
+    is created
+    """
+    if not event.contains(Session, identifier, fn):
+        event.listen(Session, identifier, fn)
+
+
+def register_session_hooks():
+    from takumi import cache, report_snapshots, targeting_profiles
+    from takumi.funds import ledger
+    from takumi.gql import loaders
+    from takumi.models import helpers
+    from takumi.search.influencer import indexing
+
+    for hook in (
+        # Invalidates the cached values tagged with the changed objects
+        cache.cache_tags,
+        # Keeps the public report snapshots up to date when comments, gigs and posts change
+        report_snapshots.dirty_reports,
+        # Keeps the reservation ledgers of the campaigns in sync with their offers
+        ledger.ledger_changes,
+        # Keeps the targeting profiles of the influencers up to date with their attributes
+        targeting_profiles.dirty_profiles,
+        # Indexes the influencers that changed
+        indexing.dirty_influencers,
+    ):
+        hook.register()
+
+    # Drops the cached GraphQL loaders, so that a mutation doesn't resolve the
+    # values that were loaded before it changed them
+    listen("after_commit", loaders.clear_loaders_after_commit)
+    # Discards the hybrid values memoized in the session once they may be stale
+    listen("after_flush", helpers.discard_hybrid_values_after_flush)
+    listen("after_bulk_update", helpers.discard_hybrid_values_after_bulk_change)
+    listen("after_bulk_delete", helpers.discard_hybrid_values_after_bulk_change)
+    listen("after_transaction_end", helpers.discard_hybrid_values)
@@ -0,0 +1,201 @@
+"""Maintenance of the `InfluencerTargetingProfile` rows
+
+The profiles are computed from the influencers, their users, instagram
+accounts, interests, information and children in a single set-based query,
+and upserted in bulk. Commits changing any of the targeted attributes
+enqueue a refresh of the profiles of the influencers involved, and the whole
+table is rebuilt nightly by
+`takumi.tasks.scheduled.targeting_profiles`, to pick up region changes.
+"""
+from sqlalchemy import String, case, cast, func, inspect, select
+from sqlalchemy.dialects.postgresql import array, insert
+
+from takumi.extensions import db, tiger
+from takumi.models import (
+    Influencer,
+    InfluencerChild,
+    InfluencerInformation,
+    InfluencerTargetingProfile,
+    InstagramAccount,
+    Region,
+    User,
+)
+from takumi.models.influencer import influencer_interests
+from takumi.session_hooks import SessionHook, delay_with_ids
+
+BATCH_SIZE = 1000
+
+SESSION_DIRTY_PROFILES_KEY = "dirty_targeting_profiles"
+
+# The attributes of each model that the profiles are computed from
+PROFILE_ATTRIBUTES = {
+    Influencer: {"state", "target_region_id", "user_id", "interests"},
+    User: {"birthday", "gender"},
+    InstagramAccount: {"followers", "influencer_id"},
+    InfluencerInformation: {
+        "influencer_id",
+        "hair_type_id",
+        "hair_colour_id",
+        "eye_colour_id",
+        "glasses",
+        "languages",
+        "tag_ids",
+    },
+    InfluencerChild: {"birthday", "gender", "influencer_information_id"},
+}
+
+
+def _profile_select(influencer_ids):
+    interests = (
+        select(
+            [
+                influencer_interests.c.influencer_id,
+                func.array_agg(influencer_interests.c.interest_id).label("interest_ids"),
+            ]
+        )
+        .where(influencer_interests.c.influencer_id.in_(influencer_ids))
+        .group_by(influencer_interests.c.influencer_id)
+        .alias("interests")
+    )
+    children = (
+        select(
+            [
+                InfluencerChild.influencer_information_id,
+                func.count(InfluencerChild.id).label("children_count"),
+                func.array_agg(InfluencerChild.birthday).label("child_birthdays"),
+                func.array_remove(func.array_agg(cast(InfluencerChild.gender, String)), None).label(
+                    "child_genders"
+                ),
+                func.min(InfluencerChild.birthday).label("oldest_child_birthday"),
+                func.max(InfluencerChild.birthday).label("youngest_child_birthday"),
+            ]
+        )
+        .where(
+            InfluencerChild.influencer_information_id.in_(
+                select([InfluencerInformation.id]).where(
+                    InfluencerInformation.influencer_id.in_(influencer_ids)
+                )
+            )
+        )
+        .group_by(InfluencerChild.influencer_information_id)
+        .alias("children")
+    )
+
+    columns = {
+        "influencer_id": Influencer.id,
+        "refreshed": func.now(),
+        "state": Influencer.state,
+        "birthday": User.birthday,
+        "gender": cast(User.gender, String),
+        "followers": InstagramAccount.followers,
+        "region_ids": case(
+            [(Region.id == None, None)],
+            else_=func.array_cat(array([Region.id]), func.coalesce(Region.path, "{}")),
+        ),
+        "interest_ids": func.coalesce(interests.c.interest_ids, "{}"),
+        "hair_type_id": InfluencerInformation.hair_type_id,
+        "hair_colour_id": InfluencerInformation.hair_colour_id,
+        "eye_colour_id": InfluencerInformation.eye_colour_id,
+        "glasses": InfluencerInformation.glasses,
+        "languages": InfluencerInformation.languages,
+        "tag_ids": InfluencerInformation.tag_ids,
+        "children_count": case(
+            [(InfluencerInformation.id == None, None)],
+            else_=func.coalesce(children.c.children_count, 0),
+        ),
+        "child_birthdays": children.c.child_birthdays,
+        "child_genders": children.c.child_genders,
+        "oldest_child_birthday": children.c.oldest_child_birthday,
+        "youngest_child_birthday": children.c.youngest_child_birthday,
+    }
+    query = (
+        select(list(columns.values()))
+        .select_from(
+            Influencer.__table__.outerjoin(User, User.id == Influencer.user_id)
+            .outerjoin(InstagramAccount, InstagramAccount.influencer_id == Influencer.id)
+            .outerjoin(Region, Region.id == Influencer.target_region_id)
+            .outerjoin(interests, interests.c.influencer_id == Influencer.id)
+            .outerjoin(InfluencerInformation, InfluencerInformation.influencer_id == Influencer.id)
+            .outerjoin(children, children.c.influencer_information_id == InfluencerInformation.id)
+        )
+        .where(Influencer.id.in_(influencer_ids))
+    )
+    return list(columns), query
+
+
+def refresh_targeting_profiles(influencer_ids):
+    """Compute and upsert the targeting profiles of the influencers"""
+    if not influencer_ids:
+        return
+
+    names, query = _profile_select(list(influencer_ids))
+    statement = insert(InfluencerTargetingProfile.__table__).from_select(names, query)
+    db.session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[InfluencerTargetingProfile.influencer_id],
+            set_={name: statement.excluded[name] for name in names if name != "influencer_id"},
+        )
+    )
+
+
+def _resolve_influencer_ids(influencer_ids=(), user_ids=(), information_ids=()):
+    influencer_ids = set(influencer_ids)
+    if user_ids:
+        influencer_ids.update(
+            influencer_id
+            for (influencer_id,) in db.session.query(Influencer.id).filter(
+                Influencer.user_id.in_(user_ids)
+            )
+        )
+    if information_ids:
+        influencer_ids.update(
+            influencer_id
+            for (influencer_id,) in db.session.query(InfluencerInformation.influencer_id).filter(
+                InfluencerInformation.id.in_(information_ids)
+            )
+        )
+    return sorted(influencer_ids)
+
+
+def refresh_in_batches(influencer_ids, batch_size=BATCH_SIZE):
+    """Refresh the targeting profiles, committing each batch"""
+    for start in range(0, len(influencer_ids), batch_size):
+        refresh_targeting_profiles(influencer_ids[start : start + batch_size])
+        db.session.commit()
+
+
+@tiger.task(unique=True)
+def refresh_influencer_targeting_profiles(influencer_ids=(), user_ids=(), information_ids=()):
+    """Refresh the targeting profiles of the influencers, and of the
+    influencers of the users and the information
+    """
+    refresh_in_batches(_resolve_influencer_ids(influencer_ids, user_ids, information_ids))
+
+
+def _changes_profile(instance):
+    state = inspect(instance)
+    return any(state.attrs[key].history.has_changes() for key in PROFILE_ATTRIBUTES[type(instance)])
+
+
+def collect_dirty_profile(session, instance, dirty):
+    if type(instance) not in PROFILE_ATTRIBUTES:
+        return
+    if instance in session.dirty and not _changes_profile(instance):
+        return
+
+    if isinstance(instance, Influencer):
+        dirty["influencer_ids"].add(instance.id)
+    elif isinstance(instance, User):
+        dirty["user_ids"].add(instance.id)
+    elif isinstance(instance, (InstagramAccount, InfluencerInformation)):
+        dirty["influencer_ids"].add(instance.influencer_id)
+    elif isinstance(instance, InfluencerChild):
+        dirty["information_ids"].add(instance.influencer_information_id)
+
+
+dirty_profiles = SessionHook(
+    SESSION_DIRTY_PROFILES_KEY,
+    on_commit=delay_with_ids(lambda: refresh_influencer_targeting_profiles),
+    collect=collect_dirty_profile,
+    default=lambda: {"influencer_ids": set(), "user_ids": set(), "information_ids": set()},
+)
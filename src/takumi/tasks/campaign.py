@@ -1,17 +1,26 @@
 import datetime as dt
 
-from sqlalchemy import or_
+from sqlalchemy import func
 
+from takumi.campaign_metrics import update_campaign_metrics
 from takumi.events.campaign import CampaignLog
 from takumi.extensions import db, tiger
-from takumi.models import Campaign, CampaignMetric, Device, Influencer, Notification, Offer, User
+from takumi.models import (
+    Campaign,
+    Device,
+    Influencer,
+    InfluencerTargetingProfile,
+    Notification,
+    Offer,
+    User,
+)
 from takumi.services import CampaignService, OfferService
 
 
 @tiger.task(unique=True)
 def create_or_update_campaign_metric(campaign_id):
     """A task that creates or updates a campaign to campaign metrics by id.
-    All properties are called here in advance to shorten the request time.
+    The metrics are computed in SQL, see `takumi.campaign_metrics`.
 
     Args:
         campaign_id (UUID): The campaign's id.
@@ -19,29 +28,7 @@ def create_or_update_campaign_metric(campaign_id):
     Note:
         Only campaigns that have the launched status are updated.
     """
-    campaign = Campaign.query.get(campaign_id)
-
-    if campaign_metric := campaign.campaign_metric:
-        if campaign.state == Campaign.STATES.LAUNCHED:
-            campaign_metric.engagement_rate_total = campaign.engagement_rate_total
-            campaign_metric.engagement_rate_static = campaign.engagement_rate_static
-            campaign_metric.engagement_rate_story = campaign.engagement_rate_story
-            campaign_metric.impressions_total = campaign.impressions_total
-            campaign_metric.reach_total = campaign.reach_total
-            campaign_metric.assets = campaign.units
-    else:
-        new_campaign_metric = CampaignMetric(
-            campaign_id=campaign_id,
-            engagement_rate_total=campaign.engagement_rate_total,
-            engagement_rate_static=campaign.engagement_rate_static,
-            engagement_rate_story=campaign.engagement_rate_story,
-            impressions_total=campaign.impressions_total,
-            reach_total=campaign.reach_total,
-            assets=campaign.units,
-        )
-        db.session.add(new_campaign_metric)
-
-    db.session.commit()
+    update_campaign_metrics([campaign_id], only_changed=False)
 
 
 @tiger.task(unique=True, lock=True, lock_key="notify_all_targeted")
@@ -50,28 +37,25 @@ def notify_all_targeted(campaign_id, not_notified_in_the_last_hours=None):
     if not campaign.public:
         return
 
+    # Users already notified about the campaign, unless it was long enough ago
+    notified = (
+        db.session.query(User.id)
+        .join(Notification, Notification.device_id == User.device_id)
+        .filter(Notification.campaign_id == campaign.id)
+        .group_by(User.id)
+        .having(func.bool_and(Notification.sent != None))
+    )
     if not_notified_in_the_last_hours:
         now = dt.datetime.now(dt.timezone.utc)
         min_last_notification_date = now - dt.timedelta(hours=not_notified_in_the_last_hours)
-
-    has_notifications = (
-        Notification.query.filter(Notification.campaign_id == campaign.id).count() > 0
-    )
+        notified = notified.having(func.max(Notification.sent) >= min_last_notification_date)
 
     devices = (
         Device.query.join(User)
         .join(Influencer)
-        .filter(Influencer.matches_campaign(campaign))
-        .filter(
-            or_(
-                Influencer.last_notification_sent(campaign) == None,
-                (Influencer.last_notification_sent(campaign) < min_last_notification_date)
-                if not_notified_in_the_last_hours
-                else False,
-            )
-            if has_notifications
-            else True
-        )
+        .join(InfluencerTargetingProfile, InfluencerTargetingProfile.influencer_id == Influencer.id)
+        .filter(InfluencerTargetingProfile.matches_campaign(campaign))
+        .filter(~User.id.in_(notified))
         .all()
     )
 
@@ -11,17 +11,26 @@ from tasktiger.retry import fixed
 
 from core.facebook.instagram import InstagramError, InstagramMediaNotFound, InstagramUnknownError
 
-from takumi.extensions import instascrape, tiger
+from takumi.extensions import db, instascrape, tiger
 from takumi.facebook_account import unlink_on_permission_error
 from takumi.ig.instascrape import InstascrapeUnavailable, NoResponse, NotFound
 from takumi.models.influencer import FacebookPageDeactivated, MissingFacebookPage
-from takumi.sentiment import CommentTooShort, SentimentAnalyser, UnsupportedLanguage
+from takumi.sentiment import (
+    CommentTooShort,
+    Sentiment,
+    SentimentAnalyser,
+    UnknownLanguage,
+    UnsupportedLanguage,
+)
 from takumi.tasks import TaskException
 from takumi.utils import has_analyzable_text
 from takumi.utils.emojis import find_emojis
 
 INDICO_SENTIMENT_URL = "https://apiv2.indico.io/sentimenthq"
 
+# The number of comments analysed by each sentiment task
+SENTIMENT_TASK_SIZE = 100
+
 
 class NoInstagramAccount(Exception):
     pass
@@ -205,8 +214,9 @@ def update_instagram_post_comments(instagram_post_id, comments):
             analyze.append(instagram_post_comment)
 
     if instagram_post.gig.post.campaign.market.sentiment_supported and len(analyze) > 0:
-        for comment in analyze:
-            update_comment_sentiment.delay(comment.id)
+        comment_ids = [comment.id for comment in analyze]
+        for start in range(0, len(comment_ids), SENTIMENT_TASK_SIZE):
+            update_comments_sentiment.delay(comment_ids[start : start + SENTIMENT_TASK_SIZE])
 
 
 @tiger.task(unique=True)
@@ -242,15 +252,39 @@ def update_comment_sentiment(comment_id):
     if comment is None:
         raise TaskException(f'InstagramPostComment with id "{comment_id}" not found')
 
-    if comment.sentiment_checked:
+    update_comments_sentiment([comment_id])
+
+
+@tiger.task(unique=True)
+def update_comments_sentiment(comment_ids):
+    """Analyse the sentiment of the comments that haven't been checked yet,
+    with batched Comprehend calls, and store them with a bulk update
+
+    Comments that can't be analysed are marked as checked, except when
+    Comprehend failed to analyse them, so they are retried later.
+    """
+    from takumi.models import InstagramPostComment
+    from takumi.services import InstagramPostCommentService
+
+    comments = (
+        db.session.query(InstagramPostComment.id, InstagramPostComment.text)
+        .filter(
+            InstagramPostComment.id.in_(comment_ids),
+            InstagramPostComment.sentiment_checked.isnot(True),
+        )
+        .all()
+    )
+    if not comments:
         return
 
-    analyser = SentimentAnalyser()
-    try:
-        sentiment = analyser.analyse(comment.text)
-    except (CommentTooShort, UnsupportedLanguage):
-        with InstagramPostCommentService(comment) as service:
-            service.set_sentiment_checked()
-    else:
-        with InstagramPostCommentService(comment) as service:
-            service.update_sentiment(sentiment)
+    results = SentimentAnalyser().analyse_batch([text for _, text in comments])
+
+    sentiments = {}
+    for (comment_id, _), result in zip(comments, results):
+        if isinstance(result, Sentiment):
+            sentiments[comment_id] = result
+        elif isinstance(result, (CommentTooShort, UnknownLanguage, UnsupportedLanguage)):
+            sentiments[comment_id] = None
+
+    InstagramPostCommentService.update_sentiments(sentiments)
+    db.session.commit()
@@ -1,11 +1,14 @@
 # flake8: noqa
 from .campaign_media import *
 from .campaign_metric import *
+from .campaign_stats import *
 from .email_cleanup import *
 from .finance import *
 from .gig_linker import *
+from .indexing import *
 from .insights import *
 from .payments import *
 from .reapers import *
 from .story_downloader import *
+from .targeting_profiles import *
 from .tiktok_updater import *
@@ -0,0 +1,40 @@
+import datetime as dt
+
+from flask import current_app
+from tasktiger.schedule import periodic
+
+from takumi.campaign_stats import (
+    ROLLUP_REFRESH_OVERLAP,
+    get_changed_months,
+    get_rollup_watermark,
+    refresh_campaign_stats_rollup,
+)
+from takumi.extensions import tiger
+
+
+@tiger.scheduled(periodic(hours=1, start_date=dt.datetime(2000, 1, 1, 0, 45)))
+def refresh_campaign_stats() -> None:
+    """Refresh the campaign stats rollup for the months that changed since
+    the last refresh. Populates the whole rollup if it's empty.
+    """
+    watermark = get_rollup_watermark()
+    if watermark is None:
+        months = None
+    else:
+        months = get_changed_months(watermark - ROLLUP_REFRESH_OVERLAP)
+
+    rows = refresh_campaign_stats_rollup(months)
+
+    statsd = current_app.config["statsd"]
+    statsd.gauge("takumi.campaign_stats.rollup.months", len(months) if months else 0)
+    statsd.gauge("takumi.campaign_stats.rollup.rows", rows)
+
+
+@tiger.scheduled(
+    periodic(hours=168, start_date=dt.datetime(2000, 1, 2, 4))
+)  # Runs at 04:00 every sunday
+def rebuild_campaign_stats() -> None:
+    """Rebuild the whole campaign stats rollup, to pick up changes to old
+    campaigns that don't leave a trace in any modified timestamp
+    """
+    refresh_campaign_stats_rollup()
@@ -0,0 +1,16 @@
+from tasktiger.schedule import periodic
+
+from takumi.extensions import redis, tiger
+from takumi.search.influencer.indexing import (
+    DIRTY_INFLUENCERS_KEY,
+    flush_dirty_influencers,
+)
+
+
+@tiger.scheduled(periodic(minutes=1))
+def sweep_dirty_influencers():
+    """Flush the influencers left in the dirty set, which the flush scheduled
+    when they were queued missed, if that flush failed or was never run
+    """
+    if redis.get_connection().scard(DIRTY_INFLUENCERS_KEY):
+        flush_dirty_influencers()
@@ -12,6 +12,7 @@ from takumi.emails import (
     NewCommentEmail,
 )
 from takumi.extensions import db, tiger
+from takumi.funds.fulfilment import get_fulfilment
 from takumi.models import (
     Campaign,
     Comment,
@@ -133,6 +134,7 @@ def offer_claimability_reaper():
             db.session.add(offer)
             db.session.commit()
 
+    campaigns = {}
     for offer in offers:
         try:
             if offer.has_all_gigs_claimable():
@@ -144,15 +146,32 @@ def offer_claimability_reaper():
                 with OfferService(offer) as service:
                     service.set_claimable()
                 fix_payable_date(offer, last_gig)
-                complete_campaign(offer.campaign)
+                campaigns[offer.campaign_id] = offer.campaign
         except Exception:
             capture_exception(exc_info=None, data={"offer_id": offer.id})
 
+    complete_campaigns(list(campaigns.values()))
 
-def complete_campaign(campaign):
-    if not campaign.is_fulfilled:
+
+def complete_campaigns(campaigns):
+    """Complete the fulfilled campaigns, evaluating the fulfilment of all of
+    them at once
+    """
+    if not campaigns:
         return
 
+    fulfilment = get_fulfilment(campaigns)
+    for campaign in campaigns:
+        if not fulfilment[campaign.id]:
+            continue
+        try:
+            complete_campaign(campaign)
+        except Exception:
+            capture_exception(exc_info=None, data={"campaign_id": campaign.id})
+
+
+def complete_campaign(campaign):
+    """Complete a fulfilled campaign once all its reserved offers are claimable"""
     if not campaign.all_claimable:
         return
 
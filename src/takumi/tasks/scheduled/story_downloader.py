@@ -1,6 +1,9 @@
 import datetime as dt
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import tasktiger
+from flask import current_app
 from sentry_sdk import capture_exception
 from tasktiger.schedule import periodic
 
@@ -17,6 +20,8 @@ from takumi.services import InstagramStoryService
 
 DAYS_PAST_DEADLINE = 180
 SECONDS_BETWEEN_CHUNKS = 5 * 60
+# The most stories fetched from the Graph API at a time
+CONCURRENT_STORY_FETCHES = 5
 
 STORIES_QUEUE = f"{MAIN_QUEUE_NAME}.stories"
 
@@ -60,51 +65,89 @@ def download_story_frames():
         )
 
 
+def fetch_stories(apis):
+    """Fetch the stories of many accounts from the Graph API at once, with at
+    most `CONCURRENT_STORY_FETCHES` requests in flight
+
+    Returns the story items or the error of each account, keyed like `apis`.
+    The requests run in threads, so they mustn't touch the database session.
+    """
+    app = current_app._get_current_object()
+
+    def fetch(api):
+        with app.app_context():
+            try:
+                return api.get_stories(), None
+            except Exception as error:
+                return None, error
+
+    with ThreadPoolExecutor(max_workers=CONCURRENT_STORY_FETCHES) as executor:
+        return dict(zip(apis, executor.map(fetch, apis.values())))
+
+
+def _handle_fetch_error(account, error):
+    try:
+        with unlink_on_permission_error(account.facebook_page):
+            raise error
+    except InstagramError:
+        pass
+    except Exception:
+        capture_exception()
+
+
+def _download_api_stories(accounts):
+    apis = {
+        ig_user_id: account.facebook_page.instagram_api
+        for ig_user_id, account in accounts.items()
+        if account.facebook_page is not None and account.facebook_page.instagram_api is not None
+    }
+
+    stories = []
+    for ig_user_id, (user_story, error) in fetch_stories(apis).items():
+        if error is not None:
+            _handle_fetch_error(accounts[ig_user_id], error)
+            continue
+
+        stories.append(
+            {"items": [{**item, "tappable_objects": []} for item in user_story], "id": ig_user_id}
+        )
+    return stories
+
+
 @tiger.task(queue=STORIES_QUEUE, unique=True)
 def download_multiple_stories(ig_user_ids):
-    config = Config.get("SCRAPE_STORIES")
-    scrape_stories = config.value is True
+    statsd = current_app.config["statsd"]
+    metric_name = "takumi.stories.download_multiple_stories"
+
+    accounts = {
+        account.ig_user_id: account
+        for account in InstagramAccount.query.filter(InstagramAccount.ig_user_id.in_(ig_user_ids))
+    }
 
-    if scrape_stories:
+    start = time.monotonic()
+    if Config.get("SCRAPE_STORIES").value is True:
         stories = instascrape.get_multiple_stories(ig_user_ids)["data"]
     else:
-        stories = []
-        for ig_user_id in ig_user_ids:
-            account = InstagramAccount.query.filter(
-                InstagramAccount.ig_user_id == ig_user_id
-            ).first()
-            if account.facebook_page is None or account.facebook_page.instagram_api is None:
-                continue
-            fb_api = account.facebook_page.instagram_api
-            try:
-                with unlink_on_permission_error(account.facebook_page):
-                    user_story = fb_api.get_stories()
-            except InstagramError:
-                continue
-
-            stories.append(
-                {
-                    "items": [
-                        {
-                            **item,
-                            "tappable_objects": [],
-                        }
-                        for item in user_story
-                    ],
-                    "id": ig_user_id,
-                }
-            )
+        stories = _download_api_stories(accounts)
+    statsd.histogram(f"{metric_name}.fetch", (time.monotonic() - start) * 1000)
 
+    start = time.monotonic()
+    errors = 0
     for story in stories:
-        ig_user_id = story["id"]
-        account = InstagramAccount.query.filter(InstagramAccount.ig_user_id == ig_user_id).first()
+        account = accounts.get(story["id"])
+        if account is None:
+            continue
 
         try:
             InstagramStoryService._create_story_frames_from_download(
                 {"data": story}, account.influencer
             )
         except Exception:
+            errors += 1
+            db.session.rollback()
             capture_exception()
+    statsd.histogram(f"{metric_name}.persist", (time.monotonic() - start) * 1000)
+    statsd.histogram(f"{metric_name}.errors", errors)
 
 
 @tiger.task(queue=STORIES_QUEUE, unique=True)
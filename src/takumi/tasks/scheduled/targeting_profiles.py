@@ -0,0 +1,20 @@
+import datetime as dt
+
+from tasktiger.schedule import periodic
+
+from takumi.extensions import db, tiger
+from takumi.models import Influencer
+from takumi.targeting_profiles import refresh_in_batches
+
+
+@tiger.scheduled(periodic(hours=24, start_date=dt.datetime(2000, 1, 1, 3, 15)))  # Run 3:15 GMT
+def rebuild_influencer_targeting_profiles():
+    """Refresh the targeting profile of every influencer, which also creates
+    the missing ones and picks up changes to the region tree
+    """
+    refresh_in_batches(
+        [
+            influencer_id
+            for (influencer_id,) in db.session.query(Influencer.id).order_by(Influencer.id)
+        ]
+    )
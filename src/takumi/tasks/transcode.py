@@ -1,13 +1,30 @@
-from time import sleep
+"""Transcoding of submitted videos
+
+Transcoding a submission only starts the conversion jobs and records them as
+pending in redis, it doesn't wait for them to finish. `check_transcoding_jobs`
+then checks every pending job, across all the submissions, every
+`WAIT_INTERVAL`, replaces the urls of the media whose job is complete and
+drops the jobs that failed or took longer than `MAX_WAIT`, until no job is
+pending. Each run only takes as long as checking the jobs, instead of holding
+a worker while waiting for them.
+"""
+import datetime as dt
+import json
+import time
+
+from sentry_sdk import capture_exception
 
 from core.tasktiger import MAIN_QUEUE_NAME
 
 from takumi.convert import Converter
-from takumi.extensions import db, tiger
+from takumi.extensions import db, redis, tiger
 from takumi.models import Media, Submission
 
 TRANSCODE_QUEUE = f"{MAIN_QUEUE_NAME}.transcode"
 
+PENDING_JOBS_KEY = "TRANSCODE:PENDING_JOBS"
+CHECK_SCHEDULED_KEY = "TRANSCODE:CHECK_SCHEDULED"
+
 
 class TranscodingError(Exception):
     pass
@@ -21,9 +38,24 @@ MAX_WAIT = 600  # seconds
 WAIT_INTERVAL = 5  # seconds
 
 
+def _decode(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def schedule_transcoding_check():
+    """Check the pending jobs in `WAIT_INTERVAL`, unless a check is already scheduled"""
+    if redis.get_connection().set(CHECK_SCHEDULED_KEY, 1, nx=True, ex=WAIT_INTERVAL):
+        tiger.tiger.delay(
+            check_transcoding_jobs,
+            queue=TRANSCODE_QUEUE,
+            unique=True,
+            when=dt.timedelta(seconds=WAIT_INTERVAL),
+        )
+
+
 @tiger.task(unique=True, queue=TRANSCODE_QUEUE)
 def transcode_submission(submission_id):
-    """Transcode the media for a submission"""
+    """Start transcoding the media for a submission"""
     submission = Submission.query.get(submission_id)
     if not submission:
         raise Exception("Submission not found")
@@ -36,42 +68,71 @@ def transcode_submission(submission_id):
         return
 
     converter = Converter()
+    submitted = time.time()
 
-    jobs = {media.id: converter.convert_media(media) for media in videos}
-
-    tries = MAX_WAIT / WAIT_INTERVAL
-    while tries:
-        print("Checking jobs...")
-        for media_id, job in jobs.items():
-            job_id = job["Id"]
-            if job["Status"] == "COMPLETE":
-                print(f"{job_id} was already complete")
-                continue
+    pending = {}
+    for media in videos:
+        job = converter.convert_media(media)
+        pending[job["Id"]] = json.dumps(
+            {"media_id": media.id, "submission_id": submission_id, "submitted": submitted}
+        )
 
-            jobs[media_id] = converter.get_job(job_id)
-            print(f"{job_id} status: {jobs[media_id]['Status']}")
+    redis.get_connection().hset(PENDING_JOBS_KEY, mapping=pending)
+    schedule_transcoding_check()
 
-        if all(job["Status"] == "COMPLETE" for job in jobs.values()):
-            break
 
-        if any(job["Status"] == "ERROR" for job in jobs.values()):
-            raise TranscodingError()
-
-        print(f"Sleeping for 5 seconds.. {tries} tries left")
-        sleep(WAIT_INTERVAL)
-        tries -= 1
-
-    if not tries:
-        raise TranscodingTimedOut()
-
-    print("Replacing the media urls")
-    for media_id, job in jobs.items():
-        print(f"Media.id: {media_id}")
-        media = Media.query.get(media_id)
-        print(f"Old media url: {media.url}")
-        new_url = converter.get_preview_output_from_job(job)
-        print(f"New media url: {new_url}")
+@tiger.task(unique=True, queue=TRANSCODE_QUEUE)
+def check_transcoding_jobs():
+    """Check every pending transcoding job and finalize the finished ones"""
+    conn = redis.get_connection()
+    # This check is running, so the jobs still pending after it need another
+    conn.delete(CHECK_SCHEDULED_KEY)
+    pending = {
+        _decode(job_id): json.loads(_decode(value))
+        for job_id, value in conn.hgetall(PENDING_JOBS_KEY).items()
+    }
+    if not pending:
+        return
 
-        media.url = new_url
+    now = time.time()
+    try:
+        converter = Converter()
+        urls = {}
+        finished = []
+        for job_id, pending_job in pending.items():
+            try:
+                job = converter.get_job(job_id)
+            except Exception:
+                # Checked again on the next run, until the job times out
+                capture_exception()
+                job = {"Status": None}
 
-    db.session.commit()
+            if job["Status"] == "COMPLETE":
+                urls[pending_job["media_id"]] = converter.get_preview_output_from_job(job)
+            elif job["Status"] == "ERROR":
+                capture_exception(
+                    TranscodingError(
+                        f"Job {job_id} of submission {pending_job['submission_id']} failed"
+                    )
+                )
+            elif now - pending_job["submitted"] > MAX_WAIT:
+                capture_exception(
+                    TranscodingTimedOut(
+                        f"Job {job_id} of submission {pending_job['submission_id']} timed out"
+                    )
+                )
+            else:
+                continue
+            finished.append(job_id)
+
+        if urls:
+            for media in Media.query.filter(Media.id.in_(list(urls))):
+                media.url = urls[media.id]
+            db.session.commit()
+
+        if finished:
+            conn.hdel(PENDING_JOBS_KEY, *finished)
+    finally:
+        # Keep polling whatever is left, even if this check failed
+        if conn.hlen(PENDING_JOBS_KEY):
+            schedule_transcoding_check()
@@ -0,0 +1,54 @@
+import csv
+from typing import Any, Iterable, Iterator, List
+
+CHUNK_ROWS = 100
+
+
+class _Echo:
+    """A file-like object that returns what is written to it, instead of
+    buffering it, so the csv writers can be used to format a single row
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def _chunked(lines: Iterator[str], chunk_rows: int) -> Iterator[str]:
+    chunk: List[str] = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= chunk_rows:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+def stream_csv(
+    rows: Iterable[List[Any]],
+    header: List[str] = None,
+    chunk_rows: int = CHUNK_ROWS,
+    **fmtparams: Any,
+) -> Iterator[str]:
+    """Format rows as csv as they're iterated, yielding chunks of `chunk_rows`
+    rows, so a response can be streamed without holding the whole file in memory
+
+    The header is yielded on its own, before any row is iterated, so the
+    response starts right away.
+    """
+    writer = csv.writer(_Echo(), **fmtparams)
+    if header is not None:
+        yield writer.writerow(header)
+    yield from _chunked((writer.writerow(row) for row in rows), chunk_rows)
+
+
+def stream_dict_csv(
+    rows: Iterable[dict],
+    fieldnames: Iterable[str],
+    chunk_rows: int = CHUNK_ROWS,
+    **fmtparams: Any,
+) -> Iterator[str]:
+    """Like `stream_csv`, for rows of dicts, starting with a header of the fieldnames"""
+    writer = csv.DictWriter(_Echo(), fieldnames=fieldnames, **fmtparams)
+    yield writer.writeheader()
+    yield from _chunked((writer.writerow(row) for row in rows), chunk_rows)
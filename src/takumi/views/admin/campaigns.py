@@ -3,47 +3,32 @@ import re
 from typing import Dict, List
 from urllib.parse import urlparse
 
-from flask import Response, jsonify
+from flask import Response, jsonify, request, stream_with_context
 
 from takumi.models import Campaign, Gig, Insight, InsightEvent
 from takumi.models.insight import STATES as INSIGHT_STATES
 from takumi.models.post import PostTypes
+from takumi.report_snapshots import get_report_snapshot
 from takumi.reporting import get_posts_gigs_stats_csv
 from takumi.services import CampaignService, InstagramPostService, InstagramStoryService
 from takumi.views.blueprint import api
 
 
-def generate_post_stats(post):
-    sentiment = post.average_sentiment()
-
-    comment_stat_count = post.comment_stat_count()
-
-    emoji_count = comment_stat_count["emojis"].most_common(5)
-    hashtag_count = comment_stat_count["hashtags"].most_common(5)
-
-    # Each value/count from collections.Counter.most_common is a tuple of (value, count)
-    emojis = [{"value": x[0], "count": x[1]} for x in emoji_count]
-    hashtags = [{"value": x[0], "count": x[1]} for x in hashtag_count]
-
-    return {
-        "caption_sentiment": {"value": sentiment["captions"]},
-        "comment_sentiment": {"value": sentiment["comments"]},
-        "hashtags": hashtags,
-        "emojis": emojis,
-    }
-
-
 @api.route("/campaigns/report/<uuid:report_token>", methods=["GET"])
 def post_report(report_token):
-    campaign = Campaign.query.filter(Campaign.report_token == report_token).first()
-    if campaign is None:
+    campaign_id = (
+        Campaign.query.filter(Campaign.report_token == report_token)
+        .with_entities(Campaign.id)
+        .scalar()
+    )
+    if campaign_id is None:
         return jsonify({"error": "Campaign not found"}), 404
 
-    def iter_post_data():
-        for post in campaign.posts:
-            yield {"id": post.id, "stats": generate_post_stats(post)}
-
-    return jsonify({"id": campaign.id, "posts": list(iter_post_data())})
+    body, etag = get_report_snapshot(campaign_id)
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 
 @api.route("/campaigns/csv/report/<uuid:report_token>", methods=["GET"])
@@ -55,15 +40,14 @@ def post_gig_stats_get(report_token):
     if len(campaign.posts) == 0:
         return jsonify({"error": "Campaign has no posts"}), 404
 
-    with get_posts_gigs_stats_csv(campaign.posts) as data:
-        return Response(
-            data,
-            mimetype="text/csv",
-            headers={
-                "content-disposition": "attachment; filename=gig_stats.csv",
-                "content-type": "text/csv",
-            },
-        )
+    return Response(
+        stream_with_context(get_posts_gigs_stats_csv(campaign.posts)),
+        mimetype="text/csv",
+        headers={
+            "content-disposition": "attachment; filename=gig_stats.csv",
+            "content-type": "text/csv",
+        },
+    )
 
 
 MediasPerPost = Dict[str, Dict[str, List[str]]]
@@ -1,4 +1,4 @@
-from flask import Response, abort
+from flask import Response, abort, stream_with_context
 from flask_login import login_required
 
 from takumi.finance.report import get_campaign_month_report_csv
@@ -12,12 +12,11 @@ def finance_campaign_report_csv(year: int, month: int) -> Response:
     if not permissions.accounting.can():
         return abort(403)
 
-    with get_campaign_month_report_csv(f"{year}-{month:02}") as data:
-        return Response(
-            data,
-            mimetype="text/csv",
-            headers={
-                "content-disposition": f"attachment; filename=campaign-report-{year}-{month:02}.csv",
-                "content-type": "text/csv",
-            },
-        )
+    return Response(
+        stream_with_context(get_campaign_month_report_csv(f"{year}-{month:02}")),
+        mimetype="text/csv",
+        headers={
+            "content-disposition": f"attachment; filename=campaign-report-{year}-{month:02}.csv",
+            "content-type": "text/csv",
+        },
+    )
@@ -1,17 +1,23 @@
+import json
 import traceback
 
 from flask import current_app, request
 from flask_graphql import GraphQLView as FlaskGraphQLView
+from flask_graphql.graphqlview import HttpError
 from flask_login import current_user
 from flask_principal import PermissionDenied
-from graphql import Source, parse, validate
+from graphql.error import GraphQLError
+from graphql.execution import ExecutionResult
+from graphql.utils.get_operation_ast import get_operation_ast
 from sentry_sdk import capture_exception, start_transaction
+from werkzeug.exceptions import BadRequest, MethodNotAllowed
 
 from core.common.exceptions import APIError
 from core.common.monitoring import TimingStats
 from core.common.sqla import CountSQLExecutions
 
 from takumi import slack
+from takumi.gql.documents import PersistedQueryError, get_document, get_persisted_query_hash
 from takumi.gql.exceptions import GraphQLException
 from takumi.gql.middlewares import (
     AuthorizationMiddleware,
@@ -144,7 +150,7 @@ class GraphQLView(FlaskGraphQLView):
                 formatted_error["errors"] = [str(e) for e in error.original_error.errors]
         return formatted_error
 
-    def validate_query_authentication(self, query):
+    def validate_query_authentication(self, query, data):
         """Validate the query when logged out
 
         If the user is not authenticted and makes an invalid query to the
@@ -152,35 +158,124 @@ class GraphQLView(FlaskGraphQLView):
         schema. If the query is valid for the private schema, raise 401
         unauthorized for the client.
         """
-        if current_user.is_authenticated or query is None:
+        if current_user.is_authenticated:
             return
 
-        source = Source(query, name="GraphQL request")
-        ast = parse(source)
         try:
-            public_validation_errors = validate(public_schema, ast)
-        except Exception as e:
-            public_validation_errors = [e]
+            persisted_hash = self.get_persisted_query_hash(data)
+        except PersistedQueryError:
+            # Reported when the query is executed
+            return
+        if query is None and persisted_hash is None:
+            return
 
-        if not public_validation_errors:
+        try:
+            public_document = self.get_document(public_schema, query, persisted_hash)
+        except PersistedQueryError:
+            return
+        except Exception:
+            public_document = None
+
+        if public_document is not None and public_document.valid:
             return
 
         # Check if the query is valid on the private schema
         try:
-            private_validation_errors = validate(schema, ast)
-        except Exception as e:
-            private_validation_errors = [e]
+            private_document = self.get_document(schema, query, persisted_hash)
+        except Exception:
+            private_document = None
 
-        if not private_validation_errors:
+        if private_document is not None and private_document.valid:
             # Private query was valid, but user not logged in
             raise APIError("Unauthorized", 401)
 
+    @staticmethod
+    def get_persisted_query_hash(data):
+        extensions = data.get("extensions")
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(BadRequest("Extensions are invalid JSON."))
+        return get_persisted_query_hash(extensions)
+
+    def get_document(self, schema, query, persisted_hash):
+        """Get the parsed and validated document, and track the cache hit rate"""
+        document, cached = get_document(schema, query, persisted_hash)
+
+        statsd = self.statsd
+        if statsd:
+            tags = [
+                "schema:{}".format("public" if schema is public_schema else "private"),
+                "persisted:{}".format("true" if persisted_hash else "false"),
+            ]
+            statsd.increment(
+                "takumi.gql.document_cache.{}".format("hit" if cached else "miss"), tags=tags
+            )
+        return document
+
+    def execute_graphql_request(self, data, query, variables, operation_name, show_graphiql=False):
+        """Execute the request with the cached document of the query
+
+        Documents that have been validated before aren't parsed or validated
+        again, see `takumi.gql.documents`.
+        """
+        try:
+            persisted_hash = self.get_persisted_query_hash(data)
+        except PersistedQueryError as e:
+            return ExecutionResult(errors=[GraphQLError(str(e))], invalid=True)
+
+        if not query and not persisted_hash:
+            if show_graphiql:
+                return None
+            raise HttpError(BadRequest("Must provide query string."))
+
+        try:
+            document = self.get_document(self.schema, query, persisted_hash)
+        except PersistedQueryError as e:
+            return ExecutionResult(errors=[GraphQLError(str(e))], invalid=True)
+        except Exception as e:
+            return ExecutionResult(errors=[e], invalid=True)
+
+        if not document.valid:
+            return ExecutionResult(errors=document.errors, invalid=True)
+
+        if request.method.lower() == "get":
+            operation_ast = get_operation_ast(document.ast, operation_name)
+            if operation_ast and operation_ast.operation != "query":
+                if show_graphiql:
+                    return None
+                raise HttpError(
+                    MethodNotAllowed(
+                        ["POST"],
+                        "Can only perform a {} operation from a POST request.".format(
+                            operation_ast.operation
+                        ),
+                    )
+                )
+
+        try:
+            return self.execute(
+                document.ast,
+                root_value=self.get_root_value(request),
+                variable_values=variables or {},
+                operation_name=operation_name,
+                context_value=self.get_context(request),
+                middleware=self.get_middleware(request),
+                executor=self.get_executor(request),
+            )
+        except Exception as e:
+            return ExecutionResult(errors=[e], invalid=True)
+
+    @property
+    def statsd(self):
+        if current_app.config["RELEASE_STAGE"] != "local":
+            return current_app.config["statsd"]
+        return None
+
     def get_response(self, request, data, show_graphiql=False):
         """Custom implementation of the get_response to handle errors differently"""
-        if current_app.config["RELEASE_STAGE"] != "local":
-            statsd = current_app.config["statsd"]
-        else:
-            statsd = None
+        statsd = self.statsd
 
         with TimingStats(statsd) as total_metric:
             with TimingStats(statsd) as parse_metric:
@@ -188,7 +283,7 @@ class GraphQLView(FlaskGraphQLView):
                 parse_metric.name = self._metric_name(operation_name, "parse")
             total_metric.name = self._metric_name(operation_name, "total")
 
-            self.validate_query_authentication(query)
+            self.validate_query_authentication(query, data)
 
             response = {}
 
@@ -0,0 +1,170 @@
+import datetime as dt
+
+import pytest
+from core.common.sqla import CountSQLExecutions
+
+from takumi.constants import WAIT_BEFORE_CLAIM_HOURS
+from takumi.funds.fulfilment import get_fulfilment, get_progress
+from takumi.models import PostInsight
+from takumi.models.gig import STATES as GIG_STATES
+from takumi.models.insight import STATES as INSIGHT_STATES
+from takumi.models.offer import STATES as OFFER_STATES
+from test.python.api.utils import _campaign, _gig, _instagram_post, _offer, _post
+
+CLAIMABLE = dt.timedelta(hours=WAIT_BEFORE_CLAIM_HOURS + 49)
+IN_REVIEW = dt.timedelta(hours=1)
+
+
+def _add_gig(
+    db_session,
+    post,
+    influencer,
+    state=GIG_STATES.APPROVED,
+    is_verified=True,
+    posted_ago=CLAIMABLE,
+    followers=1000,
+):
+    offer = _offer(post.campaign, influencer)
+    offer.state = OFFER_STATES.ACCEPTED
+    offer.followers_per_post = 500
+    gig = _gig(post, offer, state=state)
+    gig.is_verified = is_verified
+    instagram_post = _instagram_post(gig)
+    instagram_post.posted = dt.datetime.now(dt.timezone.utc) - posted_ago
+    instagram_post.followers = followers
+    instagram_post.likes = followers // 10
+    instagram_post.comments = followers // 100
+    db_session.add_all([offer, gig, instagram_post])
+    db_session.commit()
+    return gig
+
+
+def _assert_parity(campaign, expected):
+    assert campaign.fund._is_fulfilled_in_memory() is expected
+    assert campaign.fund.is_fulfilled() is expected
+
+
+@pytest.mark.parametrize(
+    "state,is_verified,posted_ago,followers,expected",
+    [
+        (GIG_STATES.APPROVED, True, CLAIMABLE, 1000, True),
+        (GIG_STATES.APPROVED, True, CLAIMABLE, 0, False),
+        (GIG_STATES.APPROVED, True, IN_REVIEW, 1000, False),
+        (GIG_STATES.APPROVED, False, CLAIMABLE, 1000, False),
+        (GIG_STATES.REPORTED, True, CLAIMABLE, 1000, False),
+        (GIG_STATES.REJECTED, False, IN_REVIEW, 1000, True),
+    ],
+)
+def test_reach_fulfilment_matches_the_gig_claimability(
+    db_session,
+    db_reach_campaign,
+    db_reach_post,
+    db_influencer,
+    state,
+    is_verified,
+    posted_ago,
+    followers,
+    expected,
+):
+    db_reach_campaign.units = 1000
+    _add_gig(db_session, db_reach_post, db_influencer, state, is_verified, posted_ago, followers)
+
+    _assert_parity(db_reach_campaign, expected)
+
+
+def test_reach_fulfilment_requires_every_post_to_be_fulfilled(
+    db_session, db_reach_campaign, db_reach_post, db_influencer_alice, db_influencer_bob
+):
+    db_reach_campaign.units = 1000
+    _add_gig(db_session, db_reach_post, db_influencer_alice)
+    _assert_parity(db_reach_campaign, True)
+
+    other_post = _post(db_reach_campaign)
+    db_session.add(other_post)
+    db_session.commit()
+    _assert_parity(db_reach_campaign, False)
+
+    _add_gig(db_session, other_post, db_influencer_bob)
+    _assert_parity(db_reach_campaign, True)
+
+
+@pytest.mark.parametrize(
+    "insight_state,expected",
+    [(None, False), (INSIGHT_STATES.SUBMITTED, False), (INSIGHT_STATES.APPROVED, True)],
+)
+def test_reach_fulfilment_requires_approved_insights(
+    db_session, db_reach_campaign, db_reach_post, db_influencer, insight_state, expected
+):
+    db_reach_campaign.units = 1000
+    db_reach_campaign.require_insights = True
+    gig = _add_gig(db_session, db_reach_post, db_influencer)
+    if insight_state is not None:
+        db_session.add(PostInsight(gig=gig, state=insight_state))
+        db_session.commit()
+
+    _assert_parity(db_reach_campaign, expected)
+
+
+def test_engagement_fulfilment_sums_the_claimable_engagement(
+    db_session, db_campaign, db_post, db_influencer_alice, db_influencer_bob
+):
+    db_campaign.reward_model = "engagement"
+    db_campaign.units = 200
+    _add_gig(db_session, db_post, db_influencer_alice)
+    _assert_parity(db_campaign, False)
+
+    _add_gig(db_session, db_post, db_influencer_bob)
+    _assert_parity(db_campaign, True)
+
+
+def test_impressions_fulfilment_uses_the_insight_impressions(
+    db_session, db_impressions_campaign, db_impressions_post, db_influencer
+):
+    db_impressions_campaign.units = 5000
+    db_impressions_campaign.require_insights = True
+    gig = _add_gig(db_session, db_impressions_post, db_influencer)
+    insight = PostInsight(gig=gig, state=INSIGHT_STATES.APPROVED, from_home_impressions=4000)
+    db_session.add(insight)
+    db_session.commit()
+    _assert_parity(db_impressions_campaign, False)
+
+    insight.from_explore_impressions = 1000
+    db_session.commit()
+    _assert_parity(db_impressions_campaign, True)
+
+
+def test_get_fulfilment_evaluates_many_campaigns_with_a_query_per_fund_type(
+    db_session, db_advertiser, db_region, db_influencer
+):
+    campaigns = []
+    for reward_model, units in [("reach", 1000), ("reach", 2000), ("assets", 1), ("cash", 1)]:
+        campaign = _campaign(db_advertiser, db_region, reward_model=reward_model, units=units)
+        post = _post(campaign)
+        db_session.add_all([campaign, post])
+        db_session.commit()
+        gig = _add_gig(db_session, post, db_influencer)
+        gig.offer.is_claimable = reward_model != "assets"
+        db_session.commit()
+        campaigns.append(campaign)
+
+    in_memory = {campaign.id: campaign.fund._is_fulfilled_in_memory() for campaign in campaigns}
+
+    with CountSQLExecutions() as sql_executions:
+        fulfilment = get_fulfilment(campaigns)
+
+    assert [fulfilment[campaign.id] for campaign in campaigns] == [True, False, False, True]
+    assert fulfilment == in_memory
+    assert sql_executions.count() == 2
+
+
+def test_get_progress_matches_the_progress_of_each_campaign(
+    db_session, db_campaign, db_reach_campaign, db_reach_post, db_influencer
+):
+    db_session.commit()
+    _add_gig(db_session, db_reach_post, db_influencer)
+
+    progress = get_progress([db_campaign, db_reach_campaign])
+
+    assert progress[db_campaign.id] == {"total": db_campaign.units, "reserved": 0, "submitted": 0}
+    assert progress[db_reach_campaign.id] == db_reach_campaign.fund.get_progress()
+    assert progress[db_reach_campaign.id]["reserved"] == 500
@@ -1,5 +1,8 @@
 import pytest
 
+from core.common.sqla import CountSQLExecutions
+
+from takumi.constants import MEDIAN_IMPRESSIONS_RATIO
 from takumi.models import Influencer, InstagramAccount, PostInsight, User
 from takumi.models.campaign import STATES as CAMPAIGN_STATES
 from takumi.models.gig import STATES as GIG_STATES
@@ -182,3 +185,31 @@ def test_impressions_fund_progress_uses_submitted_impressions(
     assert progress["total"] == 100_000
     assert progress["reserved"] == 80000
     assert progress["submitted"] == 50000
+
+
+def test_impressions_fund_remaining_reach_evaluates_the_influencers_at_once(
+    db_session,
+    db_impressions_campaign,
+    db_impressions_post,
+    db_influencer_30k,
+    db_influencer_20k,
+    db_influencer_10k,
+):
+    db_impressions_campaign.units = 100_000
+    db_impressions_campaign.state = CAMPAIGN_STATES.LAUNCHED
+    db_session.commit()
+
+    for influencer in (db_influencer_30k, db_influencer_20k, db_influencer_10k):
+        offer = OfferService.create(db_impressions_campaign.id, influencer.id, skip_targeting=True)
+        with OfferService(offer) as service:
+            service.reserve()
+    db_session.commit()
+    fund = db_impressions_campaign.fund
+    assert db_impressions_campaign.units == 100_000
+
+    with CountSQLExecutions() as sql_executions:
+        remaining_reach = fund.get_remaining_reach()
+
+    # The reserved offers with their influencers, and their estimated impressions
+    assert sql_executions.count() == 2
+    assert remaining_reach == (100_000 - 60_000) / MEDIAN_IMPRESSIONS_RATIO
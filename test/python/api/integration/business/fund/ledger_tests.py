@@ -0,0 +1,195 @@
+import threading
+
+import mock
+
+from takumi.extensions import db, redis
+from takumi.funds import AssetsFund
+from takumi.funds.ledger import LedgerChange, ReservationLedger, _apply_changes, ledger_changes
+from takumi.services.offer import OfferService
+from takumi.utils import uuid4_str
+
+CONCURRENT_RESERVATIONS = 50
+
+
+def _reserve_concurrently(app, fund, count):
+    barrier = threading.Barrier(count)
+    results = []
+
+    def reserve():
+        with app.app_context():
+            barrier.wait()
+            results.append(fund.claim_reservation(mock.Mock()))
+            # Keep the claims pending past the end of the thread's session
+            db.session.info.clear()
+
+    threads = [threading.Thread(target=reserve) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_reservations_never_overflow_the_campaign(app):
+    """A load test of many influencers reserving the same campaign at once"""
+    fund = AssetsFund(mock.Mock(id=uuid4_str(), units=10))
+    ledger = ReservationLedger(fund)
+
+    try:
+        with mock.patch.object(AssetsFund, "get_reserved_totals", return_value=(2, 2, 0)):
+            results = _reserve_concurrently(app, fund, CONCURRENT_RESERVATIONS)
+            totals = ledger.read()
+    finally:
+        redis.get_connection().delete(ledger.key)
+
+    assert results.count(True) == 8
+    assert totals.reserved_offers == 10
+
+
+def test_committed_reservation_is_applied_to_the_ledger(
+    db_session, db_campaign, db_post, db_influencer
+):
+    db_campaign.units = 10
+    db_campaign.state = "launched"
+    db_session.commit()
+    offer = OfferService.create(db_campaign.id, db_influencer.id)
+    db_session.add(offer)
+    db_session.commit()
+
+    with OfferService(offer) as service:
+        service.reserve()
+
+    ledger = ReservationLedger(db_campaign.fund)
+    assert ledger.read().reserved_offers == 1
+    assert redis.get_connection().hmget(ledger.key, "reserved_offers", "pending_offers") == [
+        "1",
+        "0",
+    ]
+
+
+def test_reservation_releases_its_claim_if_not_committed(
+    db_session, db_campaign, db_post, db_influencer
+):
+    db_campaign.units = 10
+    db_campaign.state = "launched"
+    db_session.commit()
+    offer = OfferService.create(db_campaign.id, db_influencer.id)
+    db_session.add(offer)
+    db_session.commit()
+
+    OfferService(offer).reserve()
+    ledger = ReservationLedger(db_campaign.fund)
+    assert ledger.read().reserved_offers == 1
+
+    ledger_changes.after_transaction_end(db_session, mock.Mock(parent=None))
+
+    assert ledger.read().reserved_offers == 0
+
+
+def _claim(fund):
+    """Claim a reservation in a transaction, and return its changes as they
+    are when it commits, with the offer reserved
+    """
+    assert fund.claim_reservation(mock.Mock())
+    changes = db.session.info.pop(ledger_changes.key)
+    change = changes[fund.campaign.id]
+    change.reserved_units += 1
+    change.reserved_offers += 1
+    return changes
+
+
+def _invalidate(fund):
+    _apply_changes({fund.campaign.id: LedgerChange(invalidate=True)}, committed=True)
+
+
+def test_rebuild_between_commit_and_apply_isnt_double_counted(app):
+    fund = AssetsFund(mock.Mock(id=uuid4_str(), units=10))
+    ledger = ReservationLedger(fund)
+
+    try:
+        with app.app_context(), mock.patch.object(AssetsFund, "get_reserved_totals") as totals:
+            totals.return_value = (2, 2, 0)
+            changes = _claim(fund)
+
+            # Committed to the database, and rebuilt by another transaction
+            # before the changes are applied
+            _invalidate(fund)
+            totals.return_value = (3, 3, 0)
+            assert ledger.read().reserved_offers == 4
+
+            _apply_changes(changes, committed=True)
+
+            assert ledger.read().reserved_offers == 3
+            assert redis.get_connection().hget(ledger.key, "pending_offers") == "0"
+    finally:
+        redis.get_connection().delete(ledger.key)
+
+
+def test_apply_after_the_ledger_expired_keeps_the_claims_made_since(app):
+    fund = AssetsFund(mock.Mock(id=uuid4_str(), units=10))
+    ledger = ReservationLedger(fund)
+
+    try:
+        with app.app_context(), mock.patch.object(AssetsFund, "get_reserved_totals") as totals:
+            totals.return_value = (2, 2, 0)
+            changes = _claim(fund)
+
+            redis.get_connection().delete(ledger.key)
+            other_changes = _claim(fund)
+
+            # Committed to the database and applied after the ledger expired
+            totals.return_value = (3, 3, 0)
+            _apply_changes(changes, committed=True)
+
+            assert ledger.read().reserved_offers == 4
+            assert redis.get_connection().hget(ledger.key, "pending_offers") == "1"
+
+            totals.return_value = (4, 4, 0)
+            _apply_changes(other_changes, committed=True)
+
+            assert ledger.read().reserved_offers == 4
+            assert redis.get_connection().hget(ledger.key, "pending_offers") == "0"
+    finally:
+        redis.get_connection().delete(ledger.key)
+
+
+def test_apply_without_a_rebuild_is_added_to_the_totals(app):
+    fund = AssetsFund(mock.Mock(id=uuid4_str(), units=10))
+    ledger = ReservationLedger(fund)
+
+    try:
+        with app.app_context(), mock.patch.object(
+            AssetsFund, "get_reserved_totals", return_value=(2, 2, 0)
+        ) as totals:
+            changes = _claim(fund)
+            _apply_changes(changes, committed=True)
+
+            assert ledger.read().reserved_offers == 3
+            assert totals.call_count == 1
+    finally:
+        redis.get_connection().delete(ledger.key)
+
+
+def test_ledger_with_negative_pending_claims_is_rebuilt(app):
+    fund = AssetsFund(mock.Mock(id=uuid4_str(), units=10))
+    ledger = ReservationLedger(fund)
+    conn = redis.get_connection()
+
+    try:
+        with app.app_context(), mock.patch.object(
+            AssetsFund, "get_reserved_totals", return_value=(2, 2, 0)
+        ):
+            assert ledger.read().reserved_offers == 2
+            epoch = conn.hget(ledger.key, "epoch")
+            conn.hset(ledger.key, mapping={"pending_units": -1, "pending_offers": -1})
+
+            assert ledger.read().reserved_offers == 2
+            assert conn.hget(ledger.key, "epoch") != epoch
+            assert conn.hget(ledger.key, "pending_offers") is None
+
+            conn.hset(ledger.key, mapping={"pending_units": -1, "pending_offers": -1})
+            assert fund.claim_reservation(mock.Mock())
+            assert conn.hget(ledger.key, "pending_offers") == "1"
+            db.session.info.pop(ledger_changes.key)
+    finally:
+        conn.delete(ledger.key)
@@ -0,0 +1,81 @@
+import datetime as dt
+
+from takumi.campaign_metrics import (
+    compute_campaign_metrics,
+    get_campaigns_to_update,
+    update_campaign_metrics,
+)
+from takumi.models import Campaign, InstagramStoryFrameInsight
+from takumi.models.offer import STATES as OFFER_STATES
+
+
+def _python_metrics(campaign):
+    return dict(
+        engagement_rate_total=campaign.engagement_rate_total,
+        engagement_rate_static=campaign.engagement_rate_static,
+        engagement_rate_story=campaign.engagement_rate_story,
+        impressions_total=campaign.impressions_total,
+        reach_total=campaign.reach_total,
+        assets=campaign.units,
+    )
+
+
+def test_compute_campaign_metrics_without_posts(db_campaign):
+    assert compute_campaign_metrics([db_campaign.id]) == {
+        db_campaign.id: dict(
+            engagement_rate_total=0,
+            engagement_rate_static=0,
+            engagement_rate_story=0,
+            impressions_total=0,
+            reach_total=0,
+            assets=10,
+        )
+    }
+
+
+def test_compute_campaign_metrics_matches_campaign_properties(
+    db_session,
+    db_campaign,
+    db_offer,
+    db_instagram_post_insight,
+    db_instagram_story,
+    db_story_frame,
+):
+    db_offer.state = OFFER_STATES.ACCEPTED
+    db_offer.followers_influencer = 1000
+    db_instagram_post_insight.reach = 150
+    db_story_frame.instagram_story = db_instagram_story
+    db_session.add(
+        InstagramStoryFrameInsight(
+            story_frame_id=db_story_frame.id, reach=40, impressions=60, replies=5
+        )
+    )
+    db_session.commit()
+
+    metrics = compute_campaign_metrics([db_campaign.id])[db_campaign.id]
+
+    assert metrics == _python_metrics(db_campaign)
+    assert metrics["reach_total"] == 190
+    assert metrics["impressions_total"] == 260
+
+
+def test_get_campaigns_to_update_skips_unchanged_launched_campaigns(
+    db_session, db_campaign, db_instagram_post_insight
+):
+    # Everything in the test shares one transaction, and with it the value of
+    # now(), so the timestamps are moved explicitly
+    now = dt.datetime.now(dt.timezone.utc)
+    db_campaign.state = Campaign.STATES.LAUNCHED
+    db_session.commit()
+
+    assert update_campaign_metrics([db_campaign.id]) == [db_campaign.id]
+
+    db_campaign.campaign_metric.modified = now + dt.timedelta(minutes=1)
+    db_session.commit()
+
+    assert get_campaigns_to_update([db_campaign.id]) == []
+
+    db_instagram_post_insight.modified = now + dt.timedelta(minutes=2)
+    db_session.commit()
+
+    assert get_campaigns_to_update([db_campaign.id]) == [db_campaign.id]
@@ -0,0 +1,90 @@
+import datetime as dt
+
+import mock
+
+from takumi.campaign_stats import (
+    CampaignStats,
+    get_changed_months,
+    get_rollup_watermark,
+    refresh_campaign_stats_rollup,
+)
+from takumi.models import CampaignStatsMonth
+
+MONTHLY_STATS = (
+    "budget_by_month",
+    "margin_by_month",
+    "payments_by_month",
+    "campaigns_by_month",
+    "gigs_by_month",
+    "instagram_post_impressions_by_month",
+    "instagram_story_impressions_by_month",
+    "unique_participants_by_month",
+    "new_participants_by_month",
+)
+
+
+def _monthly_stats(stats):
+    return {name: getattr(stats, name) for name in MONTHLY_STATS}
+
+
+def test_campaign_stats_rollup_matches_live_queries(
+    db_session, db_region, db_campaign, db_post, db_gig, db_payment
+):
+    db_region.supported = True
+    db_campaign.state = "launched"
+    db_post.opened = dt.datetime.now(dt.timezone.utc)
+    db_session.commit()
+
+    assert refresh_campaign_stats_rollup() > 0
+
+    stats = CampaignStats(db_region)
+    assert stats.uses_rollup
+    with mock.patch.object(
+        CampaignStats, "uses_rollup", new_callable=mock.PropertyMock, return_value=False
+    ):
+        live = _monthly_stats(stats)
+
+    rollup = _monthly_stats(stats)
+    for name in MONTHLY_STATS:
+        assert {
+            key: {month: getattr(value, "value", value) for month, value in results.items()}
+            for key, results in rollup[name].items()
+        } == {
+            key: {month: getattr(value, "value", value) for month, value in results.items()}
+            for key, results in live[name].items()
+        }, name
+
+
+def test_refresh_campaign_stats_rollup_only_replaces_the_given_months(db_session, db_region):
+    old_month = dt.date(2015, 1, 1)
+    db_session.add(CampaignStatsMonth(month=old_month, metric="gigs", key=db_region.id, value=5))
+    db_session.commit()
+
+    refresh_campaign_stats_rollup([dt.date(2015, 2, 1)])
+
+    assert CampaignStatsMonth.query.filter(CampaignStatsMonth.month == old_month).count() == 1
+    assert get_rollup_watermark() is not None
+
+
+def test_get_changed_months_includes_the_trailing_months(db_session):
+    today = dt.datetime.now(dt.timezone.utc).date()
+
+    months = get_changed_months(dt.datetime.now(dt.timezone.utc))
+
+    assert dt.date(today.year, today.month, 1) in months
+
+
+def test_get_changed_months_includes_the_months_of_changed_campaigns(
+    db_session, db_campaign, db_post
+):
+    db_post.opened = dt.datetime(2015, 3, 10, tzinfo=dt.timezone.utc)
+    db_post.modified = None
+    db_session.commit()
+    since = dt.datetime.now(dt.timezone.utc) - dt.timedelta(days=1)
+
+    assert dt.date(2015, 3, 1) not in get_changed_months(since)
+
+    db_campaign.price += 1
+    db_session.commit()
+
+    assert dt.date(2015, 3, 1) in get_changed_months(since)
@@ -1,5 +1,6 @@
 import datetime as dt
 
+import mock
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy_utils import create_database, drop_database
@@ -7,12 +8,18 @@ from sqlalchemy_utils import create_database, drop_database
 import takumi.alembic.utils as alembic_utils
 from takumi.extensions import db as _db
 from takumi.extensions import elasticsearch as _elasticsearch
+from takumi.extensions import redis
 from takumi.models import PostInsight, StoryInsight
 from takumi.models.gig import STATES as GIG_STATES
 from takumi.models.market import us_market
 from takumi.models.offer import STATES as OFFER_STATES
 from takumi.models.post import PostTypes
-from takumi.search.influencer import InfluencerIndex, update_influencer_info
+from takumi.search.influencer import (
+    DIRTY_INFLUENCERS_KEY,
+    FLUSH_SCHEDULED_KEY,
+    InfluencerIndex,
+    update_influencer_info,
+)
 
 from ..utils import (
     _address,
@@ -90,6 +97,16 @@ def db(app):
     engine.execute("CREATE EXTENSION IF NOT EXISTS unaccent;")
 
 
+@pytest.fixture(autouse=True)
+def mock_indexing_tiger():
+    """Keep the flushes of the influencers queued for indexing from being
+    scheduled, and forget the queued influencers after each test
+    """
+    with mock.patch("takumi.search.influencer.indexing.tiger") as mock_tiger:
+        yield mock_tiger
+    redis.get_connection().delete(DIRTY_INFLUENCERS_KEY, FLUSH_SCHEDULED_KEY)
+
+
 @pytest.fixture(scope="function")
 def db_session(db):
     """PostgreSQL supports nested or checkpointed commits which we can use
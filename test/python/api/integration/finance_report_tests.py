@@ -0,0 +1,73 @@
+from core.common.sqla import CountSQLExecutions
+
+from takumi.finance.prefetch import ReportPrefetch
+from takumi.finance.report import get_headers, get_rows
+from takumi.models import Campaign
+from takumi.models.offer import STATES as OFFER_STATES
+from test.python.api.utils import _campaign, _offer, _payment, _post
+
+
+def _create_campaigns(db_session, db_advertiser, db_region, db_influencer, count):
+    campaign_ids = []
+    for _ in range(count):
+        campaign = _campaign(db_advertiser, db_region)
+        offer = _offer(campaign, db_influencer)
+        offer.state = OFFER_STATES.ACCEPTED
+        offer.is_claimable = True
+        db_session.add_all([campaign, _post(campaign), _post(campaign), offer, _payment(offer)])
+        campaign_ids.append(campaign.id)
+    db_session.commit()
+    return campaign_ids
+
+
+def _count_report_queries(db_session, campaign_ids):
+    db_session.expunge_all()
+    campaigns = Campaign.query.filter(Campaign.id.in_(campaign_ids)).all()
+
+    with CountSQLExecutions() as sql_executions:
+        rows = list(get_rows(campaigns))
+
+    return len(rows), sql_executions.count()
+
+
+def test_get_rows_runs_a_fixed_number_of_queries(
+    db_session, db_advertiser, db_region, db_influencer
+):
+    """A benchmark of the queries per row, which must not grow with the number of rows"""
+    few = _create_campaigns(db_session, db_advertiser, db_region, db_influencer, 1)
+    many = _create_campaigns(db_session, db_advertiser, db_region, db_influencer, 10)
+
+    few_rows, few_queries = _count_report_queries(db_session, few)
+    many_rows, many_queries = _count_report_queries(db_session, many)
+
+    assert (few_rows, many_rows) == (1, 10)
+    assert many_queries == few_queries, (
+        f"{few_queries / few_rows:.1f} queries per row for {few_rows} row, "
+        f"{many_queries / many_rows:.1f} queries per row for {many_rows} rows"
+    )
+
+
+def test_get_rows_cells(db_session, db_campaign, db_post, db_offer):
+    db_offer.state = OFFER_STATES.ACCEPTED
+    db_session.commit()
+
+    (row,) = get_rows([db_campaign])
+    cells = dict(zip(get_headers(), row))
+
+    assert cells["Username"] == db_offer.influencer.username
+    assert cells["Payment status"] == "Not claimable"
+    assert cells["Campaign name"] == db_campaign.name
+    assert cells["Total expected"] == "1"
+    assert cells["Total posted so far"] == "0"
+
+
+def test_report_prefetch_aggregates_match_the_campaign_properties(
+    db_session, db_campaign, db_posted_gig, db_submission
+):
+    db_session.commit()
+
+    aggregates = ReportPrefetch([db_campaign]).aggregates[db_campaign.id]
+
+    assert aggregates.earliest_live_post_date == db_campaign.earliest_live_post_date
+    assert aggregates.earliest_submitted_and_claimed == db_campaign.earliest_submitted_and_claimed
+    assert aggregates.accepted_offers == 1
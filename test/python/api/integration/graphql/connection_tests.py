@@ -3,6 +3,7 @@ import base64
 from takumi import models
 from takumi.gql import types
 from takumi.gql.fields import ConnectionField
+from test.python.api.utils import _advertiser
 
 
 def test_connection_field_with_negative_limit(db_session, db_advertiser):
@@ -26,3 +27,80 @@ def test_connection_field_with_negative_limit(db_session, db_advertiser):
     )
 
     assert len(resolved.edges) == 1
+
+
+def _advertisers(db_session, db_region, names):
+    advertisers = [_advertiser(db_region) for _ in names]
+    for advertiser, name in zip(advertisers, names):
+        advertiser.name = name
+    db_session.add_all(advertisers)
+    db_session.commit()
+    return advertisers
+
+
+def test_connection_field_keyset_pages_through_query(db_session, db_region):
+    a, b, c, d = _advertisers(db_session, db_region, ["a", "b", "b", None])
+    resolver = lambda *args, **kwargs: models.Advertiser.query.order_by(models.Advertiser.name)
+    connection = ConnectionField(types.Advertiser, _keyset=True)
+
+    first_page = connection.connection_resolver(
+        resolver, types.AdvertiserConnection, "root", "info", first=2
+    )
+    second_page = connection.connection_resolver(
+        resolver,
+        types.AdvertiserConnection,
+        "root",
+        "info",
+        first=2,
+        after=first_page.page_info.end_cursor,
+    )
+
+    paged = [edge.node for edge in first_page.edges + second_page.edges]
+    assert paged[0] == a
+    assert set(paged[1:3]) == {b, c}
+    assert paged[3] == d
+    assert first_page.page_info.has_next_page
+    assert not first_page.page_info.has_previous_page
+    assert not second_page.page_info.has_next_page
+    assert second_page.page_info.has_previous_page
+    assert second_page.count() == 4
+
+
+def test_connection_field_keyset_descending_with_nulls(db_session, db_region):
+    a, b, c = _advertisers(db_session, db_region, ["a", None, "c"])
+    resolver = lambda *args, **kwargs: models.Advertiser.query.order_by(
+        models.Advertiser.name.desc()
+    )
+    connection = ConnectionField(types.Advertiser, _keyset=True)
+
+    after = None
+    paged = []
+    for _ in range(3):
+        args = dict(first=1)
+        if after:
+            args["after"] = after
+        page = connection.connection_resolver(
+            resolver, types.AdvertiserConnection, "root", "info", **args
+        )
+        paged.extend(edge.node for edge in page.edges)
+        after = page.page_info.end_cursor
+
+    assert paged == [b, c, a]
+    assert not page.page_info.has_next_page
+
+
+def test_connection_field_keyset_falls_back_to_offset_cursors(db_session, db_advertiser):
+    resolver = lambda *args, **kwargs: models.Advertiser.query.order_by(models.Advertiser.name)
+    connection = ConnectionField(types.Advertiser, _keyset=True)
+
+    resolved = connection.connection_resolver(
+        resolver,
+        types.AdvertiserConnection,
+        "root",
+        "info",
+        first=10,
+        after=base64.b64encode(b"arrayconnection:0").decode(),
+    )
+
+    assert resolved.count == 1
+    assert len(resolved.edges) == 0
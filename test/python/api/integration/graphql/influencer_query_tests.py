@@ -33,7 +33,6 @@ def setup_influencers(
     audit_factory,
     influencer_factory,
     instagram_account_factory,
-    tiger_task,
     elasticsearch,
 ):
     """Prepare influencers for this test suite
@@ -73,6 +72,7 @@ def setup_influencers(
         ("ineligible", 5, "new", 2, 500),
     )
 
+    created = []
     for username, num, state, region, followers in influencers:
         ig_account = instagram_account_factory(
             ig_username=username, ig_user_id=num, ig_media_id=num, token=num, followers=followers
@@ -84,8 +84,9 @@ def setup_influencers(
         audit = audit_factory(influencer=influencer)
         db_session.add(audit)
         db_session.add(influencer)
+        created.append(influencer)
     db_session.commit()
-    tiger_task.run_tasks([update_influencer_info])
+    update_influencer_info(*[influencer.id for influencer in created])
     elasticsearch.indices.refresh()
 
 
@@ -0,0 +1,110 @@
+import datetime as dt
+
+import mock
+from sqlalchemy import inspect
+
+from core.common.sqla import CountSQLExecutions
+
+from takumi.gql import loaders
+from takumi.gql.loaders import load_hybrid, load_relationship, load_submission_deadline
+from takumi.schedule import PostSchedule
+from test.python.api.utils import _campaign, _gig, _post
+
+
+def test_load_relationship_loads_many_to_one_for_all_objects_in_one_query(
+    db_session, db_campaign, db_offer, db_gig
+):
+    other_gig = _gig(_post(db_campaign), db_offer)
+    db_session.add(other_gig)
+    db_session.commit()
+
+    with CountSQLExecutions() as sql_executions:
+        promises = [load_relationship(gig, "offer") for gig in (db_gig, other_gig)]
+        offers = [promise.get() for promise in promises]
+
+    assert offers == [db_offer, db_offer]
+    assert sql_executions.count() == 1
+
+
+def test_load_relationship_sets_the_loaded_value(db_session, db_offer, db_gig):
+    db_session.commit()
+
+    assert "gigs" in inspect(db_offer).unloaded
+
+    assert load_relationship(db_offer, "gigs").get() == [db_gig]
+
+    assert "gigs" not in inspect(db_offer).unloaded
+    with CountSQLExecutions() as sql_executions:
+        assert db_offer.gigs == [db_gig]
+    assert sql_executions.count() == 0
+
+
+def test_load_relationship_without_related_object(db_session, db_gig):
+    db_session.commit()
+
+    assert load_relationship(db_gig, "instagram_post").get() is None
+    assert load_relationship(db_gig, "submissions").get() == []
+
+
+def test_load_relationship_falls_back_to_attributes_for_non_models():
+    class Root:
+        influencer = "influencer"
+
+    assert load_relationship(Root(), "influencer").get() == "influencer"
+    assert load_relationship(Root(), "missing").get() is None
+
+
+def test_load_hybrid_evaluates_all_objects_in_one_query(db_session, db_advertiser, db_region):
+    campaigns = [_campaign(db_advertiser, db_region) for _ in range(2)]
+    posts = [_post(campaign) for campaign in campaigns]
+    db_session.add_all(campaigns + posts)
+    db_session.commit()
+    expected = [post.deadline for post in posts]
+
+    with CountSQLExecutions() as sql_executions:
+        promises = [load_hybrid(campaign, "deadline") for campaign in campaigns]
+        deadlines = [promise.get() for promise in promises]
+
+    assert sql_executions.count() == 1
+    assert deadlines == expected
+
+
+def test_load_hybrid_falls_back_to_attributes_for_non_models():
+    class Root:
+        deadline = "deadline"
+
+    assert load_hybrid(Root(), "deadline").get() == "deadline"
+
+
+def test_load_relationship_loads_again_after_a_commit(db_session, db_campaign, db_offer, db_gig):
+    db_session.commit()
+    assert load_relationship(db_offer, "gigs").get() == [db_gig]
+
+    other_gig = _gig(_post(db_campaign), db_offer)
+    db_session.add(other_gig)
+    db_session.commit()
+
+    assert "gigs" in inspect(db_offer).unloaded
+    assert sorted(load_relationship(db_offer, "gigs").get(), key=lambda gig: gig.id) == sorted(
+        [db_gig, other_gig], key=lambda gig: gig.id
+    )
+
+
+def test_load_submission_deadline_computes_the_deadlines_of_all_posts_at_once(
+    db_session, db_campaign
+):
+    posts = [_post(db_campaign), _post(db_campaign)]
+    for days, post in enumerate(posts, start=20):
+        post.deadline = dt.datetime(2018, 2, days, tzinfo=dt.timezone.utc)
+        post.submission_deadline = None
+    db_session.add_all(posts)
+    db_session.commit()
+
+    with mock.patch.object(
+        loaders, "get_submission_deadlines", wraps=loaders.get_submission_deadlines
+    ) as mock_get_submission_deadlines:
+        promises = [load_submission_deadline(post) for post in posts]
+        deadlines = [promise.get() for promise in promises]
+
+    mock_get_submission_deadlines.assert_called_once_with(posts)
+    assert deadlines == [PostSchedule(post).submission_deadline for post in posts]
@@ -0,0 +1,60 @@
+import datetime as dt
+
+from core.common.sqla import CountSQLExecutions
+
+from takumi.models import Post
+from takumi.models.helpers import prefetch_hybrids
+from test.python.api.utils import _campaign, _post
+
+
+def test_prefetch_hybrids_evaluates_all_objects_in_one_query(db_session, db_advertiser, db_region):
+    campaigns = [_campaign(db_advertiser, db_region) for _ in range(3)]
+    posts = [_post(campaign) for campaign in campaigns]
+    db_session.add_all(campaigns + posts)
+    db_session.commit()
+    expected = [(post.deadline, post.submission_deadline) for post in posts]
+    assert all(campaign.id for campaign in campaigns)
+
+    with CountSQLExecutions() as sql_executions:
+        prefetch_hybrids(campaigns, ["deadline", "submission_deadline"])
+    assert sql_executions.count() == 1
+
+    with CountSQLExecutions() as sql_executions:
+        values = [(campaign.deadline, campaign.submission_deadline) for campaign in campaigns]
+    assert sql_executions.count() == 0
+    assert values == expected
+
+
+def test_prefetch_hybrids_with_method_arguments(db_session, db_campaign, db_influencer):
+    db_session.commit()
+    assert db_influencer.id and db_campaign.id
+
+    prefetch_hybrids([db_influencer], [("notification_count", db_campaign)])
+
+    with CountSQLExecutions() as sql_executions:
+        assert db_influencer.notification_count(db_campaign) == 0
+    assert sql_executions.count() == 0
+
+
+def test_prefetched_hybrids_are_evaluated_again_after_changes(db_session, db_campaign, db_post):
+    db_session.commit()
+    prefetch_hybrids([db_campaign], ["deadline"])
+
+    deadline = dt.datetime(2030, 1, 1, tzinfo=dt.timezone.utc)
+    db_post.deadline = deadline
+
+    assert db_campaign.deadline == deadline
+
+
+def test_prefetched_hybrids_are_evaluated_again_after_bulk_updates(
+    db_session, db_campaign, db_post
+):
+    db_session.commit()
+    prefetch_hybrids([db_campaign], ["deadline"])
+
+    deadline = dt.datetime(2030, 1, 1, tzinfo=dt.timezone.utc)
+    Post.query.filter(Post.id == db_post.id).update(
+        {"deadline": deadline}, synchronize_session=False
+    )
+
+    assert db_campaign.deadline == deadline
@@ -0,0 +1,103 @@
+import datetime as dt
+import uuid
+
+import pytest
+
+from takumi.extensions import redis
+from takumi.rate_limiter import (
+    FIXED_WINDOW,
+    SLIDING_WINDOW,
+    TOKEN_BUCKET,
+    RateLimit,
+    RateLimitReachedError,
+    check,
+    check_many,
+    check_rate_limit,
+    get_rate_limit_headers,
+)
+
+
+@pytest.fixture
+def rate_limit_key():
+    key = f"TEST:{uuid.uuid4().hex}"
+    yield key
+    conn = redis.get_connection()
+    for algorithm in (FIXED_WINDOW, SLIDING_WINDOW, TOKEN_BUCKET):
+        conn.delete(RateLimit(key, dt.timedelta(minutes=1), 1, algorithm).prefixed_key)
+
+
+@pytest.mark.parametrize("algorithm", [FIXED_WINDOW, SLIDING_WINDOW, TOKEN_BUCKET])
+def test_check_allows_the_limit_and_then_denies(app, rate_limit_key, algorithm):
+    rate_limit = RateLimit(rate_limit_key, dt.timedelta(minutes=1), 2, algorithm)
+
+    with app.test_request_context():
+        first, second, third = [check(rate_limit) for _ in range(3)]
+
+    assert (first.allowed, first.remaining) == (True, 1)
+    assert (second.allowed, second.remaining) == (True, 0)
+    assert (third.allowed, third.remaining) == (False, 0)
+    assert 0 < third.retry_after <= 60
+    assert 0 < third.reset <= 60
+
+
+def test_check_fixed_window_counts_on_from_the_existing_counter(app, rate_limit_key):
+    redis.get_connection().setex(f"RATE_LIMIT:{rate_limit_key}", 60, 1)
+    rate_limit = RateLimit(rate_limit_key, dt.timedelta(minutes=1), 2, FIXED_WINDOW)
+
+    with app.test_request_context():
+        first, second = [check(rate_limit) for _ in range(2)]
+
+    assert (first.allowed, first.remaining) == (True, 0)
+    assert (second.allowed, second.remaining) == (False, 0)
+
+
+def test_get_rate_limit_headers_from_checks(app, rate_limit_key):
+    with app.test_request_context():
+        for _ in range(2):
+            with check_rate_limit(rate_limit_key, timeframe=dt.timedelta(minutes=1), limit=3):
+                pass
+
+        headers = dict(get_rate_limit_headers())
+
+    assert headers["X-RateLimit-Limit"] == "3"
+    assert headers["X-RateLimit-Remaining"] == "1"
+    assert 0 < int(headers["X-RateLimit-Reset"]) <= 60
+    assert "Retry-After" not in headers
+
+
+def test_get_rate_limit_headers_from_denied_checks(app, rate_limit_key):
+    with app.test_request_context():
+        with check_rate_limit(rate_limit_key, timeframe=dt.timedelta(minutes=1), limit=1):
+            pass
+        with pytest.raises(RateLimitReachedError):
+            with check_rate_limit(rate_limit_key, timeframe=dt.timedelta(minutes=1), limit=1):
+                pass
+
+        headers = dict(get_rate_limit_headers())
+
+    assert headers["X-RateLimit-Remaining"] == "0"
+    assert 0 < int(headers["Retry-After"]) <= 60
+
+
+def test_get_rate_limit_headers_from_the_most_restrictive_check(app, rate_limit_key):
+    with app.test_request_context():
+        check_many(
+            [
+                RateLimit(f"{rate_limit_key}:a", dt.timedelta(minutes=1), 5),
+                RateLimit(f"{rate_limit_key}:b", dt.timedelta(minutes=1), 2),
+            ]
+        )
+
+        headers = dict(get_rate_limit_headers())
+
+    assert headers["X-RateLimit-Limit"] == "2"
+    assert headers["X-RateLimit-Remaining"] == "1"
+
+
+def test_get_rate_limit_headers_only_from_the_checks_of_the_request(app, rate_limit_key):
+    with app.test_request_context():
+        check(RateLimit(rate_limit_key, dt.timedelta(minutes=1), 2))
+        assert get_rate_limit_headers() != []
+
+    with app.test_request_context():
+        assert get_rate_limit_headers() == []
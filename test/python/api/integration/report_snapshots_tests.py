@@ -0,0 +1,117 @@
+import json
+
+import mock
+
+from takumi.models import InstagramPostComment
+from takumi.models.gig import STATES as GIG_STATES
+from takumi.report_snapshots import (
+    build_report_snapshot,
+    compute_post_stats,
+    refresh_report_snapshots,
+)
+from takumi.utils import uuid4_str
+
+
+def _comment(emojis=(), hashtags=(), sentiment=None):
+    return InstagramPostComment(
+        ig_comment_id=uuid4_str(),
+        username="username",
+        text="text",
+        emojis=list(emojis),
+        hashtags=list(hashtags),
+        sentiment=sentiment,
+    )
+
+
+def test_compute_post_stats_matches_the_post_methods(
+    db_session, db_post, post_factory, gig_factory, instagram_post_factory
+):
+    # Arrange
+    rejected = instagram_post_factory(
+        gig=gig_factory(state=GIG_STATES.REJECTED),
+        sentiment=0.0,
+        ig_comments=[_comment(emojis=["x"], hashtags=["x"], sentiment=0.0)],
+    )
+    first = instagram_post_factory(
+        sentiment=0.5,
+        ig_comments=[
+            _comment(emojis=["a", "a", "b"], hashtags=["c"], sentiment=0.2),
+            _comment(emojis=["b", "c", "d", "e", "f", "g"], sentiment=0.4),
+        ],
+    )
+    second = instagram_post_factory(
+        sentiment=0.7, ig_comments=[_comment(emojis=["a"], hashtags=["c", "d"])]
+    )
+    db_post.gigs = [rejected.gig, first.gig, second.gig]
+    empty_post = post_factory()
+    db_session.add_all([rejected, first, second, empty_post])
+    db_session.flush()
+
+    # Act
+    stats = compute_post_stats([db_post.id, empty_post.id])
+
+    # Assert
+    sentiment = db_post.average_sentiment()
+    comment_stat_count = db_post.comment_stat_count()
+    assert stats[db_post.id]["caption_sentiment"]["value"] == sentiment["captions"]
+    assert stats[db_post.id]["comment_sentiment"]["value"] == sentiment["comments"]
+    assert stats[db_post.id]["emojis"][:2] == [
+        {"value": "a", "count": 3},
+        {"value": "b", "count": 2},
+    ]
+    assert len(stats[db_post.id]["emojis"]) == 5
+    assert {value["value"]: value["count"] for value in stats[db_post.id]["hashtags"]} == dict(
+        comment_stat_count["hashtags"]
+    )
+    assert stats[empty_post.id] == {
+        "caption_sentiment": {"value": None},
+        "comment_sentiment": {"value": None},
+        "hashtags": [],
+        "emojis": [],
+    }
+
+
+def test_build_report_snapshot_only_recomputes_changed_posts(
+    db_session, db_campaign, post_factory, mock_redis_connection
+):
+    # Arrange
+    first = post_factory(campaign=db_campaign)
+    second = post_factory(campaign=db_campaign)
+    db_session.add_all([first, second])
+    db_session.flush()
+    db_session.expire(db_campaign, ["posts"])
+    first_id, second_id = [post.id for post in db_campaign.posts]
+    mock_redis_connection.hmget.return_value = ["3", json.dumps({"stored": True}), None]
+    pipeline = mock_redis_connection.pipeline.return_value
+
+    # Act
+    with mock.patch(
+        "takumi.report_snapshots.compute_post_stats",
+        side_effect=lambda post_ids: {post_id: {"stored": False} for post_id in post_ids},
+    ) as mock_compute:
+        body, etag = build_report_snapshot(db_campaign.id, post_ids=[second_id])
+
+    # Assert
+    mock_compute.assert_called_once_with([second_id])
+    assert json.loads(body) == {
+        "id": db_campaign.id,
+        "posts": [
+            {"id": first_id, "stats": {"stored": True}},
+            {"id": second_id, "stats": {"stored": False}},
+        ],
+    }
+    mapping = pipeline.hset.call_args[1]["mapping"]
+    assert mapping["body"] == body
+    assert mapping["etag"] == etag
+    assert mapping["version"] == 4
+
+
+def test_refresh_report_snapshots_skips_campaigns_without_a_snapshot(
+    db_session, db_post, mock_redis_connection
+):
+    mock_redis_connection.exists.return_value = False
+
+    with mock.patch("takumi.report_snapshots.build_report_snapshot") as mock_build:
+        refresh_report_snapshots(post_ids=[db_post.id])
+
+    assert not mock_build.called
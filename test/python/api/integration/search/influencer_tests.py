@@ -3,15 +3,21 @@ import datetime as dt
 import mock
 import pytest
 
+from takumi.extensions import redis
 from takumi.gql.generator import QueryGenerator
 from takumi.gql.types import Influencer as InfluencerGQLType
 from takumi.models import EmailLogin, Interest, User
 from takumi.search.influencer import (
+    DIRTY_INFLUENCERS_KEY,
+    FLUSH_SCHEDULED_KEY,
+    BulkIndexingResult,
     IndexingError,
     InfluencerIndex,
     InfluencerSearch,
+    flush_dirty_influencers,
     update_influencer_info,
 )
+from takumi.search.influencer.document import InfluencerDocumentBuilder
 from takumi.utils import uuid4_str
 
 
@@ -25,6 +31,38 @@ def test_influencer_info_get_source_document(db_session, db_influencer):
     assert doc["influencer"]["id"] == db_influencer.id
 
 
+def _without_random_ids(doc):
+    """Ids that are generated on every resolve, and can't be compared"""
+    doc = dict(doc)
+    doc["address"] = dict(doc["address"], id=None)
+    if doc["instagram_audience_insight"] is not None:
+        doc["instagram_audience_insight"] = dict(
+            doc["instagram_audience_insight"],
+            gender_split=[
+                dict(split, id=None) for split in doc["instagram_audience_insight"]["gender_split"]
+            ],
+            age_split=[
+                dict(split, id=None) for split in doc["instagram_audience_insight"]["age_split"]
+            ],
+        )
+    return doc
+
+
+def test_influencer_document_builder_matches_graphql_source_document(
+    db_session, db_influencer, db_offer, db_payment
+):
+    graphql_doc = InfluencerIndex.get_source_document(db_influencer.id)["influencer"]
+    doc = InfluencerDocumentBuilder([db_influencer.id]).build()[db_influencer.id]
+
+    assert _without_random_ids(doc) == _without_random_ids(graphql_doc)
+
+
+def test_influencer_document_builder_skips_missing_influencers(db_session, db_influencer):
+    docs = InfluencerDocumentBuilder([db_influencer.id, uuid4_str()]).build()
+
+    assert list(docs) == [db_influencer.id]
+
+
 def _try_to_get_field(obj, field):
     if isinstance(field, dict):
         rootkey = list(field)[0]
@@ -67,40 +105,99 @@ def test_influencer_info_get_source_document_raises_indexerror(db_session):
 
 
 def test_influencer_update_hook_on_influencer_model_update(db_session, db_influencer, monkeypatch):
-    mock_update_influencer_info = mock.Mock()
+    mock_queue_influencer_update = mock.Mock()
     monkeypatch.setattr(
-        "takumi.search.influencer.indexing.update_influencer_info", mock_update_influencer_info
+        "takumi.search.influencer.indexing.queue_influencer_update", mock_queue_influencer_update
     )
-    db_influencer.modified = dt.datetime.now(dt.timezone.utc)
+    db_influencer.disabled_reason = "Testing"
     db_session.add(db_influencer)
     db_session.commit()
-    assert mock_update_influencer_info.delay.called
+    assert mock_queue_influencer_update.called
 
 
 def test_influencer_update_hook_on_instagram_account_model_update(
     db_session, db_instagram_account, db_influencer, monkeypatch
 ):
-    mock_update_influencer_info = mock.Mock()
+    mock_queue_influencer_update = mock.Mock()
     monkeypatch.setattr(
-        "takumi.search.influencer.indexing.update_influencer_info", mock_update_influencer_info
+        "takumi.search.influencer.indexing.queue_influencer_update", mock_queue_influencer_update
     )
-    db_instagram_account.modified = dt.datetime.now(dt.timezone.utc)
+    db_instagram_account.followers += 1
     db_session.add(db_instagram_account)
     db_session.commit()
-    assert mock_update_influencer_info.delay.called
+    assert mock_queue_influencer_update.called
+
+
+def test_influencer_update_hook_ignores_updates_to_unindexed_columns(
+    db_session, db_instagram_account, db_influencer, monkeypatch
+):
+    db_session.commit()
+    mock_queue_influencer_update = mock.Mock()
+    monkeypatch.setattr(
+        "takumi.search.influencer.indexing.queue_influencer_update", mock_queue_influencer_update
+    )
+    db_influencer.modified = dt.datetime.now(dt.timezone.utc)
+    db_instagram_account.token = "new-token"
+    db_session.add_all([db_influencer, db_instagram_account])
+    db_session.commit()
+    assert not mock_queue_influencer_update.called
+
+
+def test_influencer_update_hooks_enqueue_a_single_batch_per_commit(
+    db_session, db_instagram_account, db_influencer, monkeypatch
+):
+    db_session.commit()
+    mock_queue_influencer_update = mock.Mock()
+    monkeypatch.setattr(
+        "takumi.search.influencer.indexing.queue_influencer_update", mock_queue_influencer_update
+    )
+    db_influencer.disabled_reason = "Testing"
+    db_influencer.user.full_name = "Changed Name"
+    db_instagram_account.followers += 1
+    db_session.add_all([db_influencer, db_instagram_account])
+    db_session.commit()
+
+    mock_queue_influencer_update.assert_called_once_with(db_influencer.id, source=mock.ANY)
+
+
+def test_influencer_updates_are_flushed_in_bulk_after_commit(
+    db_session, db_influencer, mock_indexing_tiger
+):
+    db_session.commit()
+    influencer_id = db_influencer.id
+    redis.get_connection().delete(DIRTY_INFLUENCERS_KEY, FLUSH_SCHEDULED_KEY)
+    mock_indexing_tiger.reset_mock()
+
+    with mock.patch(
+        "takumi.search.influencer.indexing.update_influencer_info"
+    ) as mock_update_influencer_info:
+        db_influencer.disabled_reason = "Testing"
+        db_session.commit()
+
+    assert not mock_update_influencer_info.delay.called
+    mock_indexing_tiger.tiger.delay.assert_called_once_with(
+        flush_dirty_influencers, queue=mock.ANY, unique=True, when=mock.ANY
+    )
+
+    with mock.patch.object(InfluencerIndex, "bulk_update_from_source") as mock_bulk_update:
+        mock_bulk_update.return_value = BulkIndexingResult(indexed=[influencer_id])
+        flush_dirty_influencers()
+
+    mock_bulk_update.assert_called_once_with([influencer_id])
+    assert not redis.get_connection().scard(DIRTY_INFLUENCERS_KEY)
 
 
 def test_influencer_update_hook_on_influencer_model_insert(
     db_session, influencer_factory, instagram_account, monkeypatch
 ):
     new_influencer = influencer_factory(instagram_account=instagram_account)
-    mock_update_influencer_info = mock.Mock()
+    mock_queue_influencer_update = mock.Mock()
     monkeypatch.setattr(
-        "takumi.search.influencer.indexing.update_influencer_info", mock_update_influencer_info
+        "takumi.search.influencer.indexing.queue_influencer_update", mock_queue_influencer_update
     )
     db_session.add(new_influencer)
     db_session.commit()
-    assert mock_update_influencer_info.delay.called
+    assert mock_queue_influencer_update.called
 
 
 def test_influencer_update_from_source(db_influencer):
@@ -111,7 +208,7 @@ def test_influencer_update_from_source(db_influencer):
 
 @pytest.fixture(scope="function")
 def multiple_influencers(
-    elasticsearch, tiger_task, instagram_account_factory, influencer_factory, db_session, db_region
+    elasticsearch, instagram_account_factory, influencer_factory, db_session, db_region
 ):
     influencers = [
         ("mockymock", "jabbermocky@ponty-mocky-mython.co.uk"),
@@ -136,7 +233,7 @@ def multiple_influencers(
         db_session.add_all([user, influencer, email, ig_account])
         ret.append(influencer)
     db_session.commit()
-    tiger_task.run_tasks([update_influencer_info])
+    update_influencer_info(*[influencer.id for influencer in ret])
     elasticsearch.indices.refresh()
     yield ret
 
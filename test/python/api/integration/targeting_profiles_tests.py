@@ -0,0 +1,111 @@
+import datetime as dt
+
+import mock
+import pytest
+from sqlalchemy import Date, literal
+
+from takumi.models import Influencer, InfluencerTargetingProfile, Notification
+from takumi.models.influencer_targeting_profile import born_at_any_of_ages
+from takumi.targeting_profiles import refresh_targeting_profiles
+from takumi.tasks.campaign import notify_all_targeted
+
+
+def _matches(db_session, influencer, campaign):
+    refresh_targeting_profiles([influencer.id])
+    by_profile = (
+        db_session.query(InfluencerTargetingProfile)
+        .filter(
+            InfluencerTargetingProfile.influencer_id == influencer.id,
+            InfluencerTargetingProfile.matches_campaign(campaign),
+        )
+        .count()
+        == 1
+    )
+    by_influencer = (
+        db_session.query(Influencer)
+        .filter(Influencer.id == influencer.id, Influencer.matches_campaign(campaign))
+        .count()
+        == 1
+    )
+    assert by_profile == by_influencer
+    return by_profile
+
+
+def test_profile_matches_like_the_influencer(
+    db_session, db_influencer, db_campaign, region_factory
+):
+    assert _matches(db_session, db_influencer, db_campaign)
+
+    db_campaign.targeting.regions = [region_factory()]
+    assert not _matches(db_session, db_influencer, db_campaign)
+
+
+def test_profile_of_an_influencer_without_a_region_doesnt_match(
+    db_session, db_influencer, db_campaign
+):
+    db_influencer.target_region = None
+    db_campaign.targeting.regions = []
+
+    assert not _matches(db_session, db_influencer, db_campaign)
+    assert InfluencerTargetingProfile.query.get(db_influencer.id).region_ids is None
+
+
+def test_profile_matches_the_targeted_ages_like_the_influencer(
+    db_session, db_influencer, db_campaign
+):
+    db_influencer.user.birthday = dt.date.today().replace(year=1990, day=1)
+    db_campaign.targeting.ages = [dt.date.today().year - 1990]
+    assert _matches(db_session, db_influencer, db_campaign)
+
+    db_campaign.targeting.ages = [dt.date.today().year - 1988]
+    assert not _matches(db_session, db_influencer, db_campaign)
+
+
+def test_profile_matches_the_followers_like_the_influencer(db_session, db_influencer, db_campaign):
+    db_campaign.targeting.max_followers = db_influencer.instagram_account.followers - 1
+    assert not _matches(db_session, db_influencer, db_campaign)
+
+
+@pytest.mark.parametrize(
+    "birthday,ages,expected",
+    [
+        (dt.date(1990, 6, 15), [30], True),
+        (dt.date(1990, 6, 16), [30], False),
+        (dt.date(1990, 6, 16), [29, 30], True),
+        (dt.date(2021, 1, 1), [0], True),
+    ],
+)
+def test_born_at_any_of_ages(db_session, birthday, ages, expected):
+    today = dt.date(2020, 6, 15)
+    assert (
+        db_session.query(born_at_any_of_ages(literal(birthday, Date), ages, today)).scalar()
+        is expected
+    )
+
+
+def test_profile_refresh_is_enqueued_after_commit(db_session, db_influencer):
+    db_session.commit()
+
+    with mock.patch(
+        "takumi.targeting_profiles.refresh_influencer_targeting_profiles"
+    ) as mock_refresh:
+        db_influencer.user.gender = "female"
+        db_session.commit()
+
+    mock_refresh.delay.assert_called_once_with(user_ids=[db_influencer.user.id])
+
+
+def test_notify_all_targeted_skips_influencers_already_notified(
+    db_session, db_campaign, db_influencer, db_device
+):
+    db_influencer.user.device = db_device
+    db_campaign.public = True
+    db_session.add(Notification(device=db_device, campaign=db_campaign))
+    db_session.commit()
+    refresh_targeting_profiles([db_influencer.id])
+
+    with mock.patch("takumi.services.campaign.CampaignService.notify_devices") as mock_notify:
+        notify_all_targeted(db_campaign.id)
+        notify_all_targeted(db_campaign.id, not_notified_in_the_last_hours=1)
+
+    assert [call[0][0] for call in mock_notify.call_args_list] == [[], []]
@@ -0,0 +1,135 @@
+import mock
+import pytest
+
+from takumi.extensions import redis
+from takumi.models import Video
+from takumi.tasks.transcode import (
+    CHECK_SCHEDULED_KEY,
+    MAX_WAIT,
+    PENDING_JOBS_KEY,
+    check_transcoding_jobs,
+    transcode_submission,
+)
+
+
+@pytest.fixture
+def mock_converter():
+    with mock.patch("takumi.tasks.transcode.Converter") as mock_converter:
+        converter = mock_converter.return_value
+        converter.convert_media.side_effect = lambda media: {"Id": f"job-{media.url}"}
+        converter.get_preview_output_from_job.side_effect = lambda job: f"{job['Id']}-preview"
+        yield converter
+    redis.get_connection().delete(PENDING_JOBS_KEY, CHECK_SCHEDULED_KEY)
+
+
+@pytest.fixture
+def db_video_submission(db_session, db_submission):
+    db_submission.media = [
+        Video(url=url, owner_id=db_submission.id, owner_type="submission")
+        for url in ["first", "second"]
+    ]
+    db_session.commit()
+    return db_submission
+
+
+def test_transcode_submission_returns_without_waiting_for_the_jobs(
+    db_video_submission, mock_converter
+):
+    with mock.patch("takumi.tasks.transcode.schedule_transcoding_check") as mock_schedule:
+        transcode_submission(db_video_submission.id)
+
+    assert set(redis.get_connection().hkeys(PENDING_JOBS_KEY)) == {"job-first", "job-second"}
+    assert mock_schedule.called
+    assert not mock_converter.get_job.called
+
+
+def test_check_transcoding_jobs_finalizes_the_finished_jobs(db_video_submission, mock_converter):
+    with mock.patch("takumi.tasks.transcode.schedule_transcoding_check"):
+        transcode_submission(db_video_submission.id)
+
+    statuses = {"job-first": "COMPLETE", "job-second": "PROGRESSING"}
+    mock_converter.get_job.side_effect = lambda job_id: {"Id": job_id, "Status": statuses[job_id]}
+
+    with mock.patch("takumi.tasks.transcode.schedule_transcoding_check") as mock_schedule:
+        check_transcoding_jobs()
+
+    assert sorted(media.url for media in db_video_submission.media) == [
+        "job-first-preview",
+        "second",
+    ]
+    assert redis.get_connection().hkeys(PENDING_JOBS_KEY) == ["job-second"]
+    assert mock_schedule.called
+
+    statuses["job-second"] = "ERROR"
+    with mock.patch("takumi.tasks.transcode.schedule_transcoding_check") as mock_schedule:
+        check_transcoding_jobs()
+
+    assert redis.get_connection().hkeys(PENDING_JOBS_KEY) == []
+    assert not mock_schedule.called
+
+
+def test_check_transcoding_jobs_drops_timed_out_jobs(db_video_submission, mock_converter):
+    with mock.patch("takumi.tasks.transcode.schedule_transcoding_check"):
+        transcode_submission(db_video_submission.id)
+    mock_converter.get_job.side_effect = lambda job_id: {"Id": job_id, "Status": "PROGRESSING"}
+
+    with mock.patch("takumi.tasks.transcode.time.time", return_value=10**10 + MAX_WAIT):
+        check_transcoding_jobs()
+
+    assert redis.get_connection().hkeys(PENDING_JOBS_KEY) == []
+
+
+def test_check_transcoding_jobs_keeps_checking_when_a_job_cant_be_fetched(
+    db_video_submission, mock_converter
+):
+    with mock.patch("takumi.tasks.transcode.schedule_transcoding_check"):
+        transcode_submission(db_video_submission.id)
+
+    def get_job(job_id):
+        if job_id == "job-first":
+            raise Exception("Throttled")
+        return {"Id": job_id, "Status": "COMPLETE"}
+
+    mock_converter.get_job.side_effect = get_job
+
+    with mock.patch("takumi.tasks.transcode.schedule_transcoding_check") as mock_schedule:
+        check_transcoding_jobs()
+
+    assert sorted(media.url for media in db_video_submission.media) == [
+        "first",
+        "job-second-preview",
+    ]
+    assert redis.get_connection().hkeys(PENDING_JOBS_KEY) == ["job-first"]
+    assert mock_schedule.called
+
+
+def test_check_transcoding_jobs_reschedules_when_the_check_fails(
+    db_video_submission, mock_converter
+):
+    with mock.patch("takumi.tasks.transcode.schedule_transcoding_check"):
+        transcode_submission(db_video_submission.id)
+
+    with mock.patch(
+        "takumi.tasks.transcode.Converter", side_effect=Exception("No credentials")
+    ), mock.patch("takumi.tasks.transcode.schedule_transcoding_check") as mock_schedule:
+        with pytest.raises(Exception, match="No credentials"):
+            check_transcoding_jobs()
+
+    assert mock_schedule.called
+    assert set(redis.get_connection().hkeys(PENDING_JOBS_KEY)) == {"job-first", "job-second"}
+
+
+def test_check_transcoding_jobs_schedules_the_next_check_while_its_flag_is_live(
+    db_video_submission, mock_converter
+):
+    with mock.patch("takumi.tasks.transcode.schedule_transcoding_check"):
+        transcode_submission(db_video_submission.id)
+    mock_converter.get_job.side_effect = lambda job_id: {"Id": job_id, "Status": "PROGRESSING"}
+    redis.get_connection().set(CHECK_SCHEDULED_KEY, 1)
+
+    with mock.patch("takumi.tasks.transcode.tiger") as mock_tiger:
+        check_transcoding_jobs()
+
+    mock_tiger.tiger.delay.assert_called_once_with(
+        check_transcoding_jobs, queue=mock.ANY, unique=True, when=mock.ANY
+    )
@@ -1,4 +1,6 @@
 import datetime as dt
+import threading
+import time
 
 import mock
 from freezegun import freeze_time
@@ -8,7 +10,12 @@ from takumi.models.payment import STATES as PAYMENT_STATES
 from takumi.models.post import PostTypes
 from takumi.services.exceptions import PaymentRequestFailedException
 from takumi.tasks.scheduled.payments import payment_reaper, reap_payment
-from takumi.tasks.scheduled.story_downloader import DAYS_PAST_DEADLINE, download_story_frames
+from takumi.tasks.scheduled.story_downloader import (
+    CONCURRENT_STORY_FETCHES,
+    DAYS_PAST_DEADLINE,
+    download_story_frames,
+    fetch_stories,
+)
 
 
 @freeze_time(dt.datetime(2018, 1, 10, tzinfo=dt.timezone.utc))
@@ -150,3 +157,35 @@ def test_payment_reaper_handles_failed_payments(db_session, payment_factory):
     )
     service_ctx.request_failed.assert_called_once_with("Black hole not found!")
     mock_notify.assert_called_once_with(revolut.offer)
+
+
+def test_fetch_stories_isolates_the_errors_of_each_account(app):
+    error = Exception("Unknown error")
+    working_api = mock.Mock(get_stories=mock.Mock(return_value=[{"id": "1"}]))
+    failing_api = mock.Mock(get_stories=mock.Mock(side_effect=error))
+
+    results = fetch_stories({"working": working_api, "failing": failing_api})
+
+    assert results == {"working": ([{"id": "1"}], None), "failing": (None, error)}
+
+
+def test_fetch_stories_bounds_the_concurrent_requests(app):
+    lock = threading.Lock()
+    in_flight = []
+    max_in_flight = []
+
+    def get_stories():
+        with lock:
+            in_flight.append(1)
+            max_in_flight.append(len(in_flight))
+        time.sleep(0.05)
+        with lock:
+            in_flight.pop()
+        return []
+
+    apis = {str(i): mock.Mock(get_stories=get_stories) for i in range(20)}
+
+    results = fetch_stories(apis)
+
+    assert len(results) == 20
+    assert 1 < max(max_in_flight) <= CONCURRENT_STORY_FETCHES
@@ -32,10 +32,10 @@ def _create_device(db_session, **kwargs):
 def test_post_device_inserts_new_device(db_session, db_influencer, client):
     db_influencer.user.device = None
     with client.use(db_influencer.user):
-        with mock.patch("takumi.search.influencer.indexing.update_influencer_info") as mock_update:
+        with mock.patch("takumi.search.influencer.indexing.queue_influencer_update") as mock_queue:
             response = client.post(url_for("api.create_device"), data=test_device_post_data)
     assert response.status_code == 201
-    assert mock_update.delay.called
+    assert mock_queue.called
 
     device = db_session.query(Device).first()
     assert db_influencer.device_id == device.id
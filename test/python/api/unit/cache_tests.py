@@ -0,0 +1,113 @@
+import mock
+import pytest
+
+from takumi.cache import (
+    Cache,
+    LocalCache,
+    PickleSerializer,
+    RedisCache,
+    invalidate_tags,
+    local_cache,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_local_cache():
+    local_cache.clear()
+    yield
+    local_cache.clear()
+
+
+def test_local_cache_evicts_least_recently_used():
+    cache = LocalCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_local_cache_expires_entries():
+    cache = LocalCache(ttl=10)
+
+    with mock.patch("takumi.cache.time.monotonic", return_value=100):
+        cache.set("a", 1)
+    with mock.patch("takumi.cache.time.monotonic", return_value=105):
+        assert cache.get("a") == 1
+    with mock.patch("takumi.cache.time.monotonic", return_value=111):
+        cache.get("a")
+    assert len(cache) == 0
+
+
+def test_cache_get_reads_redis_once_and_then_the_local_tier(app, mock_redis_connection):
+    mock_redis_connection.get.return_value = PickleSerializer.dumps({"value": 1})
+    cache = Cache("test")
+
+    assert cache.get("key") == {"value": 1}
+    assert cache.get("key") == {"value": 1}
+
+    mock_redis_connection.get.assert_called_once_with("CACHE:test:key")
+
+
+def test_cache_get_returns_default_on_miss(app, mock_redis_connection):
+    mock_redis_connection.get.return_value = None
+
+    assert Cache("test").get("key", default="default") == "default"
+
+
+def test_cache_get_or_set_computes_missing_value_once(app, mock_redis_connection):
+    mock_redis_connection.get.return_value = None
+    pipeline = mock_redis_connection.pipeline.return_value
+    func = mock.Mock(return_value="value")
+    cache = Cache("test", ttl=60)
+
+    assert cache.get_or_set("key", func, tags=["campaign:1"]) == "value"
+    assert cache.get_or_set("key", func, tags=["campaign:1"]) == "value"
+
+    func.assert_called_once_with()
+    pipeline.setex.assert_called_once_with("CACHE:test:key", 60, PickleSerializer.dumps("value"))
+    pipeline.sadd.assert_called_once_with("CACHE_TAG:campaign:1", "CACHE:test:key")
+
+
+def test_cache_get_or_set_uses_value_set_while_waiting_for_lock(app, mock_redis_connection):
+    mock_redis_connection.get.side_effect = [None, PickleSerializer.dumps("other value")]
+    func = mock.Mock()
+
+    assert Cache("test").get_or_set("key", func) == "other value"
+
+    assert not func.called
+    mock_redis_connection.lock.return_value.release.assert_called_once_with()
+
+
+def test_invalidate_tags_deletes_tagged_entries(app, mock_redis_connection):
+    pipeline = mock_redis_connection.pipeline.return_value
+    pipeline.execute.return_value = [{"CACHE:test:key"}]
+    local_cache.set("CACHE:test:key", "value")
+
+    invalidate_tags("campaign:1")
+
+    pipeline.smembers.assert_called_once_with("CACHE_TAG:campaign:1")
+    pipeline.delete.assert_any_call("CACHE:test:key")
+    pipeline.delete.assert_any_call("CACHE_TAG:campaign:1")
+    assert len(local_cache) == 0
+
+
+def test_redis_cache_stores_strings_under_the_old_prefix(app, mock_redis_connection):
+    pipeline = mock_redis_connection.pipeline.return_value
+
+    RedisCache("InstagramAPI", default_ttl=60).set("key", "value")
+
+    pipeline.setex.assert_called_once_with("CACHED:InstagramAPI:key", 60, "value")
+
+
+def test_cache_get_many_reads_the_missing_keys_from_redis_at_once(app, mock_redis_connection):
+    mock_redis_connection.mget.return_value = [PickleSerializer.dumps(2), None]
+    cache = Cache("test")
+    local_cache.set("CACHE:test:a", PickleSerializer.dumps(1))
+
+    assert cache.get_many(["a", "b", "c"]) == {"a": 1, "b": 2}
+
+    mock_redis_connection.mget.assert_called_once_with(["CACHE:test:b", "CACHE:test:c"])
@@ -0,0 +1,53 @@
+import datetime as dt
+
+import mock
+
+from takumi.campaign_stats import (
+    PAYMENTS_METRIC,
+    CampaignStats,
+    _rollup_rows,
+    _trailing_months,
+)
+
+
+def test_trailing_months_wraps_around_the_year():
+    assert _trailing_months(dt.date(2021, 2, 14), count=3) == [
+        dt.date(2021, 2, 1),
+        dt.date(2021, 1, 1),
+        dt.date(2020, 12, 1),
+    ]
+
+
+def test_rollup_rows_truncates_to_the_month_and_skips_empty_values():
+    results = [
+        (dt.datetime(2021, 1, 1, tzinfo=dt.timezone.utc), 10.7),
+        (dt.datetime(2021, 2, 1, tzinfo=dt.timezone.utc), None),
+    ]
+
+    assert _rollup_rows(PAYMENTS_METRIC, "GBP", results) == [
+        dict(month=dt.date(2021, 1, 1), metric=PAYMENTS_METRIC, key="GBP", value=10)
+    ]
+
+
+def test_campaign_stats_uses_rollup_only_for_supported_top_level_regions(app, region):
+    region.path = None
+    region.supported = True
+    assert CampaignStats(region).uses_rollup
+
+    region.path = ["parent-region-id"]
+    assert not CampaignStats(region).uses_rollup
+
+
+def test_campaign_stats_reads_monthly_metrics_from_the_rollup(app, region):
+    region.path = None
+    region.supported = True
+    stats = CampaignStats(region)
+
+    with mock.patch.object(
+        CampaignStats, "_rollup", return_value={region.id: {"2021-01": 3}}
+    ) as mock_rollup:
+        with mock.patch.object(CampaignStats, "_gigs_by_month_query") as mock_query:
+            assert stats.gigs_by_month == {region.name: {"2021-01": 3}}
+
+    mock_rollup.assert_called_once_with("gigs", [region.id])
+    assert not mock_query.called
@@ -25,8 +25,11 @@ def test_assets_min_followers(app, campaign):
     assert campaign.fund.min_followers == 1000
 
 
-def test_assets_fund_can_reserve_units(app):
-    fund = AssetsFund(campaign=mock.Mock(units=10, reserved_offers=[i for i in range(8)]))
+@mock.patch(
+    "takumi.funds.fund.Fund.reserved_offer_count", new_callable=mock.PropertyMock, return_value=8
+)
+def test_assets_fund_can_reserve_units(_, app):
+    fund = AssetsFund(campaign=mock.Mock(units=10))
     assert fund.is_reservable()
 
     assert fund.can_reserve_units(1)
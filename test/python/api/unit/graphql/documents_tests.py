@@ -0,0 +1,154 @@
+import graphene
+import mock
+import pytest
+from graphql.error import GraphQLSyntaxError
+
+from takumi.gql import fields
+from takumi.gql.documents import (
+    MAX_PERSISTED_QUERY_SIZE,
+    DocumentCache,
+    PersistedQueryError,
+    get_document,
+    get_persisted_query_hash,
+    hash_query,
+)
+
+
+@pytest.fixture(scope="function")
+def schema():
+    class Query(graphene.ObjectType):
+        string = fields.String()
+
+    yield graphene.Schema(query=Query)
+
+
+@pytest.fixture(autouse=True)
+def persisted_queries():
+    with mock.patch("takumi.gql.documents.persisted_queries") as mock_persisted_queries:
+        mock_persisted_queries.get.return_value = None
+        yield mock_persisted_queries
+
+
+def test_document_cache_evicts_least_recently_used():
+    cache = DocumentCache(maxsize=2)
+    cache.set("schema", "a", "document a")
+    cache.set("schema", "b", "document b")
+
+    assert cache.get("schema", "a") == "document a"
+
+    cache.set("schema", "c", "document c")
+
+    assert cache.get("schema", "b") is None
+    assert cache.get("schema", "a") == "document a"
+    assert cache.get("schema", "c") == "document c"
+
+
+def test_document_cache_is_keyed_by_schema():
+    cache = DocumentCache()
+    cache.set("public", "a", "document a")
+
+    assert cache.get("private", "a") is None
+
+
+def test_get_document_skips_parsing_and_validating_known_documents(schema):
+    document, cached = get_document(schema, "{string}")
+
+    assert document.valid
+    assert not cached
+
+    with mock.patch("takumi.gql.documents.parse") as mock_parse, mock.patch(
+        "takumi.gql.documents.validate"
+    ) as mock_validate:
+        cached_document, cached = get_document(schema, "{string}")
+
+    assert cached
+    assert cached_document is document
+    assert not mock_parse.called
+    assert not mock_validate.called
+
+
+def test_get_document_doesnt_cache_invalid_documents(schema):
+    document, _ = get_document(schema, "{invalid}")
+    assert not document.valid
+
+    _, cached = get_document(schema, "{invalid}")
+    assert not cached
+
+
+def test_get_document_registers_persisted_queries(schema, persisted_queries):
+    query = "{string}"
+
+    get_document(schema, query, persisted_hash=hash_query(query))
+
+    persisted_queries.set.assert_called_once_with(hash_query(query), query)
+
+
+def test_get_document_registers_cached_persisted_queries(schema, persisted_queries):
+    query = "{string}"
+    get_document(schema, query)
+
+    _, cached = get_document(schema, query, persisted_hash=hash_query(query))
+
+    assert cached
+    persisted_queries.set.assert_called_once_with(hash_query(query), query)
+
+
+def test_get_document_doesnt_register_invalid_persisted_queries(schema, persisted_queries):
+    query = "{invalid}"
+
+    document, _ = get_document(schema, query, persisted_hash=hash_query(query))
+
+    assert not document.valid
+    assert not persisted_queries.set.called
+
+
+def test_get_document_doesnt_register_unparseable_persisted_queries(schema, persisted_queries):
+    query = "{string"
+
+    with pytest.raises(GraphQLSyntaxError):
+        get_document(schema, query, persisted_hash=hash_query(query))
+
+    assert not persisted_queries.set.called
+
+
+def test_get_document_doesnt_register_large_persisted_queries(schema, persisted_queries):
+    query = "{string}" + " " * MAX_PERSISTED_QUERY_SIZE
+
+    document, _ = get_document(schema, query, persisted_hash=hash_query(query))
+
+    assert document.valid
+    assert not persisted_queries.set.called
+
+
+def test_get_document_raises_for_persisted_query_hash_mismatch(schema, persisted_queries):
+    with pytest.raises(PersistedQueryError, match="provided sha does not match query"):
+        get_document(schema, "{string}", persisted_hash=hash_query("{other}"))
+
+    assert not persisted_queries.set.called
+
+
+def test_get_document_raises_for_unknown_persisted_queries(schema):
+    with pytest.raises(PersistedQueryError, match="PersistedQueryNotFound"):
+        get_document(schema, persisted_hash=hash_query("{string}"))
+
+
+def test_get_document_loads_registered_persisted_queries(schema, persisted_queries):
+    query = "{ string }"
+    persisted_queries.get.return_value = query
+
+    document, cached = get_document(schema, persisted_hash=hash_query(query))
+
+    assert document.valid
+    assert not cached
+    persisted_queries.get.assert_called_once_with(hash_query(query))
+
+
+def test_get_persisted_query_hash():
+    assert get_persisted_query_hash(None) is None
+    assert get_persisted_query_hash({}) is None
+    assert (
+        get_persisted_query_hash({"persistedQuery": {"version": 1, "sha256Hash": "hash"}}) == "hash"
+    )
+
+    with pytest.raises(PersistedQueryError, match="PersistedQueryNotSupported"):
+        get_persisted_query_hash({"persistedQuery": {"version": 2, "sha256Hash": "hash"}})
@@ -0,0 +1,39 @@
+import base64
+import datetime as dt
+from decimal import Decimal
+
+import pytest
+
+from takumi.gql.exceptions import QueryException
+from takumi.gql.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trips_values():
+    values = [
+        dt.datetime(2020, 1, 1, 12, tzinfo=dt.timezone.utc),
+        dt.date(2020, 1, 1),
+        Decimal("1.50"),
+        None,
+        3,
+        "2b2a6c26-3a9b-4b2c-9d1c-0b6f9c4c7e0d",
+    ]
+
+    assert decode_cursor(encode_cursor(values)) == values
+
+
+def test_decode_cursor_returns_none_for_offset_cursors():
+    assert decode_cursor(base64.b64encode(b"arrayconnection:10").decode()) is None
+    assert decode_cursor("not base64") is None
+
+
+def test_decode_cursor_raises_for_invalid_keyset_cursors():
+    with pytest.raises(QueryException, match="Invalid cursor"):
+        decode_cursor(base64.b64encode(b"keyset:[1,").decode())
+
+
+@pytest.mark.parametrize(
+    "payload", [b"keyset:1", b"keyset:null", b'keyset:{"a":1}', b'keyset:[{"datetime":1}]']
+)
+def test_decode_cursor_raises_for_keyset_cursors_of_the_wrong_shape(payload):
+    with pytest.raises(QueryException, match="Invalid cursor"):
+        decode_cursor(base64.b64encode(payload).decode())
@@ -0,0 +1,107 @@
+import datetime as dt
+
+import mock
+import pytest
+
+from takumi.rate_limiter import (
+    FIXED_WINDOW,
+    SLIDING_WINDOW,
+    TOKEN_BUCKET,
+    RateLimit,
+    RateLimitReachedError,
+    check,
+    check_many,
+    check_rate_limit,
+    get_rate_limit_headers,
+)
+
+
+@pytest.fixture(autouse=True)
+def request_context(app):
+    with app.test_request_context():
+        yield
+
+
+def test_check_runs_a_single_script_for_the_algorithm(mock_redis_connection):
+    script = mock_redis_connection.register_script.return_value
+    script.return_value = [1, 9, 60000, 0]
+
+    result = check(RateLimit("LOGIN:ip", dt.timedelta(minutes=1), 10, algorithm=TOKEN_BUCKET))
+
+    assert result.allowed
+    assert result.remaining == 9
+    assert result.reset == 60
+    assert "HMGET" in mock_redis_connection.register_script.call_args[0][0]
+    script.assert_called_once_with(
+        keys=["RATE_LIMIT:token_bucket:LOGIN:ip"], args=(10, 60000, mock.ANY)
+    )
+    assert not mock_redis_connection.get.called
+    assert not mock_redis_connection.incr.called
+
+
+def test_rate_limit_rejects_unknown_algorithms():
+    with pytest.raises(ValueError, match="Unknown rate limit algorithm"):
+        RateLimit("LOGIN:ip", dt.timedelta(minutes=1), 10, algorithm="leaky")
+
+
+def test_check_many_pipelines_the_checks(mock_redis_connection):
+    pipeline = mock_redis_connection.pipeline.return_value
+    pipeline.execute.return_value = [[1, 4, 1000, 0], [0, 0, 30000, 5000]]
+
+    allowed, denied = check_many(
+        [
+            RateLimit("a", dt.timedelta(seconds=1), 5, algorithm=FIXED_WINDOW),
+            RateLimit("b", dt.timedelta(minutes=1), 10, algorithm=SLIDING_WINDOW),
+        ]
+    )
+
+    assert allowed.allowed and allowed.remaining == 4
+    assert not denied.allowed and denied.retry_after == 5
+    script = mock_redis_connection.register_script.return_value
+    assert all(call[1]["client"] is pipeline for call in script.call_args_list)
+    pipeline.execute.assert_called_once_with()
+
+
+def test_check_rate_limit_raises_when_the_limit_is_reached(mock_redis_connection):
+    mock_redis_connection.register_script.return_value.return_value = [0, 0, 30000, 5000]
+
+    with pytest.raises(RateLimitReachedError):
+        with check_rate_limit("LOGIN:ip", timeframe=dt.timedelta(minutes=1), limit=10):
+            pass
+
+
+def test_check_rate_limit_without_a_limit_doesnt_check(mock_redis_connection):
+    with check_rate_limit("LOGIN:ip"):
+        pass
+
+    assert not mock_redis_connection.register_script.called
+
+
+def test_get_rate_limit_headers_uses_the_most_restrictive_limit(mock_redis_connection):
+    mock_redis_connection.pipeline.return_value.execute.return_value = [
+        [1, 4, 1000, 0],
+        [0, 0, 30500, 5500],
+    ]
+    check_many(
+        [
+            RateLimit("a", dt.timedelta(seconds=1), 5),
+            RateLimit("b", dt.timedelta(minutes=1), 10),
+        ]
+    )
+
+    assert get_rate_limit_headers() == [
+        ("X-RateLimit-Limit", "10"),
+        ("X-RateLimit-Remaining", "0"),
+        ("X-RateLimit-Reset", "31"),
+        ("Retry-After", "6"),
+    ]
+
+
+def test_check_rate_limit_defaults_to_a_fixed_window(mock_redis_connection):
+    mock_redis_connection.register_script.return_value.return_value = [1, 9, 60000, 0]
+
+    with check_rate_limit("LOGIN:ip", timeframe=dt.timedelta(minutes=1), limit=10):
+        pass
+
+    script = mock_redis_connection.register_script.return_value
+    script.assert_called_once_with(keys=["RATE_LIMIT:LOGIN:ip"], args=(10, 60000, mock.ANY))
@@ -0,0 +1,101 @@
+import datetime as dt
+
+import mock
+import pytest
+
+from core.workingday import WorkingDay
+
+from takumi.schedule import WorkingTimeCalendar, get_calendar
+
+
+@pytest.mark.parametrize(
+    "start,expected",
+    [
+        # Saturday afternoon
+        (dt.datetime(2015, 11, 28, 13, 30), dt.datetime(2015, 12, 2, 0, 0)),
+        # Christmas, boxing day, a sunday and the boxing day shift
+        (dt.datetime(2015, 12, 25, 13, 30), dt.datetime(2015, 12, 31, 0, 0)),
+        # Monday afternoon
+        (dt.datetime(2015, 11, 30, 13, 30), dt.datetime(2015, 12, 2, 13, 30)),
+        # Friday afternoon
+        (dt.datetime(2015, 11, 27, 14, 30), dt.datetime(2015, 12, 1, 14, 30)),
+        # New year's eve, across the year
+        (dt.datetime(2014, 12, 31, 13, 30), dt.datetime(2015, 1, 5, 13, 30)),
+    ],
+)
+def test_working_time_calendar_add_working_hours(start, expected):
+    assert WorkingTimeCalendar("en_GB").add_working_hours(start, 48) == expected
+
+
+@pytest.mark.parametrize(
+    "start",
+    [
+        # Monday afternoon
+        dt.datetime(2015, 11, 30, 13, 30),
+        # Saturday afternoon and midnight
+        dt.datetime(2015, 11, 28, 13, 30),
+        dt.datetime(2015, 11, 28, 0, 0),
+        # Sunday afternoon
+        dt.datetime(2015, 11, 29, 15, 30),
+        # Christmas, boxing day and the boxing day shift
+        dt.datetime(2015, 12, 25, 13, 30),
+        dt.datetime(2015, 12, 26, 9, 0),
+        dt.datetime(2015, 12, 28, 13, 30),
+        # New year's day, a friday
+        dt.datetime(2016, 1, 1, 0, 0),
+        dt.datetime(2016, 1, 1, 13, 30),
+    ],
+)
+@pytest.mark.parametrize("hours", [24, 48, 120])
+def test_working_time_calendar_matches_working_day(start, hours):
+    calendar = WorkingTimeCalendar("en_GB")
+    working_day = WorkingDay("en_GB")
+
+    assert calendar.add_working_hours(start, hours) == working_day.add_working_hours(start, hours)
+    assert calendar.subtract_working_hours(start, hours) == working_day.subtract_working_hours(
+        start, hours
+    )
+
+
+def test_working_time_calendar_matches_working_day_every_day():
+    calendar = WorkingTimeCalendar("en_GB")
+    working_day = WorkingDay("en_GB")
+    for day in range(60):
+        for start in (
+            dt.datetime(2015, 11, 15) + dt.timedelta(days=day),
+            dt.datetime(2015, 11, 15, 13, 30) + dt.timedelta(days=day),
+        ):
+            for hours in (24, 48, 120):
+                assert calendar.add_working_hours(start, hours) == working_day.add_working_hours(
+                    start, hours
+                )
+                assert calendar.subtract_working_hours(
+                    start, hours
+                ) == working_day.subtract_working_hours(start, hours)
+
+
+def test_working_time_calendar_keeps_the_timezone():
+    start = dt.datetime(2015, 11, 30, 13, 30, tzinfo=dt.timezone.utc)
+
+    assert WorkingTimeCalendar("en_GB").subtract_working_hours(start, 24) == dt.datetime(
+        2015, 11, 27, 13, 30, tzinfo=dt.timezone.utc
+    )
+
+
+def test_working_time_calendar_evaluates_the_holidays_once_per_year():
+    calendar = WorkingTimeCalendar("en_GB")
+    with mock.patch("takumi.schedule.calendar.WorkingDay", wraps=WorkingDay) as mock_working_day:
+        results = calendar.add_working_hours_many(
+            [dt.datetime(2015, 11, 27, 14, 30), dt.datetime(2015, 12, 30, 14, 0)], 48
+        )
+        calendar.subtract_working_hours(dt.datetime(2015, 1, 2, 12, 0), 48)
+        calendar.add_working_hours(dt.datetime(2015, 6, 1), 24)
+
+    assert results == [dt.datetime(2015, 12, 1, 14, 30), dt.datetime(2016, 1, 4, 14, 0)]
+    # 2015, 2016 for the deadline after new year's day and 2014 for the one before
+    assert mock_working_day.call_count == 3
+
+
+def test_get_calendar_is_shared_per_locale():
+    assert get_calendar("en_GB") is get_calendar("en_GB")
+    assert get_calendar("en_GB") is not get_calendar("de_DE")
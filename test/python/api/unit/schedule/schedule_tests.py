@@ -1,6 +1,6 @@
 import datetime as dt
 
-from takumi.schedule import PostSchedule
+from takumi.schedule import PostSchedule, get_submission_deadlines
 
 start = dt.datetime(2018, 1, 1, 0, 0, tzinfo=dt.timezone.utc)
 deadline = dt.datetime(2018, 2, 1, 0, 0, tzinfo=dt.timezone.utc)
@@ -153,3 +153,30 @@ def test_post_schedule_get_schedule_for_post_no_brand_safety(post):
     schedule = PostSchedule(post)
 
     assert schedule.external_review_deadline == schedule.internal_review_deadline
+
+
+def test_get_submission_deadlines_matches_the_post_schedules(post):
+    post.campaign.brand_safety = True
+    post.submission_deadline = None
+    post.deadline = deadline
+
+    assert get_submission_deadlines([post]) == {post.id: PostSchedule(post).submission_deadline}
+
+
+def test_get_submission_deadlines_keeps_the_supplied_submission_deadlines(post):
+    submission_deadline = dt.datetime(2018, 1, 12, 0, 0, tzinfo=dt.timezone.utc)
+    post.submission_deadline = submission_deadline
+    post.deadline = deadline
+
+    assert get_submission_deadlines([post]) == {post.id: submission_deadline}
+
+
+def test_post_schedule_uses_a_precomputed_submission_deadline(post):
+    post.submission_deadline = None
+    post.deadline = deadline
+    submission_deadline = get_submission_deadlines([post])[post.id]
+
+    schedule = PostSchedule(post, submission_deadline=submission_deadline)
+
+    assert schedule.submission_deadline == PostSchedule(post).submission_deadline
+    assert schedule.internal_review_deadline == PostSchedule(post).internal_review_deadline
@@ -3,6 +3,11 @@ import pytest
 
 from takumi.models import Audit, Influencer, InstagramAccount, Offer, User
 from takumi.search.influencer import (
+    DIRTY_INFLUENCERS_KEY,
+    SESSION_DIRTY_INFLUENCERS_KEY,
+    InfluencerIndex,
+    dirty_influencers,
+    queue_influencer_update,
     trigger_influencer_info_update,
     trigger_influencer_info_update_for_audit,
     trigger_influencer_info_update_for_instagram_account,
@@ -10,6 +15,8 @@ from takumi.search.influencer import (
     trigger_influencer_info_update_for_user,
 )
 from takumi.search.influencer import update_influencer_info as real_update_influencer_info
+from takumi.search.influencer.document import add_derived_fields
+from takumi.utils import uuid4_str
 
 
 @pytest.fixture(autouse=True, scope="module")
@@ -18,22 +25,22 @@ def load_app(app):
 
 
 @pytest.fixture(autouse=True, scope="function")
-def update_influencer_info():
-    with mock.patch("takumi.search.influencer.update_influencer_info") as m:
+def mark_influencer_dirty():
+    with mock.patch("takumi.search.influencer.indexing.mark_influencer_dirty") as m:
         yield m
 
 
-def test_trigger_influencer_info_update_from_audit(update_influencer_info):
+def test_trigger_influencer_info_update_from_audit(mark_influencer_dirty):
     ig_acc = InstagramAccount()
     influencer = Influencer(id="test-456", instagram_account=ig_acc)
     audit = Audit(influencer=influencer)
 
     ig_acc.influencer = influencer
     trigger_influencer_info_update_for_audit(None, None, audit)
-    assert update_influencer_info.delay.called_with(influencer.id, "audit")
+    mark_influencer_dirty.assert_called_once_with(audit, influencer.id, source="audit")
 
 
-def test_trigger_influencer_info_update_from_user(monkeypatch, update_influencer_info):
+def test_trigger_influencer_info_update_from_user(monkeypatch, mark_influencer_dirty):
     ig_acc = InstagramAccount()
     user = User(id="test-123")
     influencer = Influencer(id="test-456", user=user, instagram_account=ig_acc)
@@ -41,61 +48,65 @@ def test_trigger_influencer_info_update_from_user(monkeypatch, update_influencer
     user.influencer = influencer
     ig_acc.influencer = influencer
     trigger_influencer_info_update_for_user(None, None, user)
-    assert update_influencer_info.delay.called_with(influencer.id, "device")
+    mark_influencer_dirty.assert_called_once_with(user, influencer.id, source="user")
 
 
-def test_trigger_influencer_info_update_from_instagram_account(update_influencer_info):
+def test_trigger_influencer_info_update_from_instagram_account(mark_influencer_dirty):
     ig_acc = InstagramAccount()
     influencer = Influencer(id="test-123", instagram_account=ig_acc)
     ig_acc.influencer = influencer
     trigger_influencer_info_update_for_instagram_account(None, None, ig_acc)
-    assert update_influencer_info.delay.called_with(influencer.id, "instagram_account")
+    mark_influencer_dirty.assert_called_once_with(ig_acc, influencer.id, source="instagram_account")
 
 
 def test_trigger_influencer_info_update_from_instagram_account_without_influencer(
-    update_influencer_info,
+    mark_influencer_dirty,
 ):
     ig_acc = InstagramAccount()
     with mock.patch(
         "takumi.search.influencer.indexing.capture_exception"
     ) as mock_capture_exception:
         trigger_influencer_info_update_for_instagram_account(None, None, ig_acc)
-    assert not update_influencer_info.delay.called
+    assert not mark_influencer_dirty.called
     assert not mock_capture_exception.called
 
 
-def test_trigger_influencer_info_update_from_influencer(update_influencer_info):
+def test_trigger_influencer_info_update_from_influencer(mark_influencer_dirty):
     ig_acc = InstagramAccount()
     influencer = Influencer(id="test-123", instagram_account=ig_acc)
     ig_acc.influencer = influencer
     trigger_influencer_info_update(None, None, influencer)
-    assert update_influencer_info.delay.called_with(influencer.id, "influencer")
+    mark_influencer_dirty.assert_called_once_with(influencer, influencer.id, source="influencer")
 
 
-def test_trigger_influencer_info_update_from_influencer_without_instagram_account(
-    update_influencer_info,
-):
-    influencer = Influencer(id="test-123")
-    trigger_influencer_info_update(None, None, influencer)
-    assert not update_influencer_info.delay.called
-
-
-def test_trigger_influencer_info_update_from_offer(update_influencer_info):
+def test_trigger_influencer_info_update_from_offer(mark_influencer_dirty):
     ig_acc = InstagramAccount()
     influencer = Influencer(id="test-123", instagram_account=ig_acc)
     ig_acc.influencer = influencer
     offer = Offer(influencer=influencer)
     trigger_influencer_info_update_for_offer(None, None, offer)
-    assert update_influencer_info.delay.called_with(influencer.id, "offer")
+    mark_influencer_dirty.assert_called_once_with(offer, influencer.id, source="offer")
 
 
-def test_trigger_influencer_info_update_from_offer_without_influencer_instagram_account(
-    update_influencer_info,
-):
-    influencer = Influencer(id="test-123")
-    offer = Offer(influencer=influencer)
-    trigger_influencer_info_update_for_offer(None, None, offer)
-    assert not update_influencer_info.delay.called
+def test_enqueue_dirty_influencers_enqueues_a_single_batch_per_commit():
+    session = mock.Mock(
+        info={SESSION_DIRTY_INFLUENCERS_KEY: {"id-1": "offer", "id-2": "user", "id-3": "offer"}}
+    )
+    with mock.patch("takumi.search.influencer.indexing.queue_influencer_update") as mock_queue:
+        dirty_influencers.after_commit(session)
+
+    mock_queue.assert_called_once_with("id-1", "id-2", "id-3", source="offer+user")
+    assert SESSION_DIRTY_INFLUENCERS_KEY not in session.info
+
+
+def test_discard_dirty_influencers_only_discards_when_the_outermost_transaction_ends():
+    session = mock.Mock(info={SESSION_DIRTY_INFLUENCERS_KEY: {"id-1": "offer"}})
+
+    dirty_influencers.after_transaction_end(session, mock.Mock(parent=mock.Mock()))
+    assert SESSION_DIRTY_INFLUENCERS_KEY in session.info
+
+    dirty_influencers.after_transaction_end(session, mock.Mock(parent=None))
+    assert SESSION_DIRTY_INFLUENCERS_KEY not in session.info
 
 
 def test_trigger_influencer_info_update_metric_emission(app):
@@ -108,3 +119,158 @@ def test_trigger_influencer_info_update_metric_emission(app):
     call = app.config["statsd"].timing.call_args_list[-2]
     assert call[0][0] == "takumi.search.influencer.update_influencer_info"
     assert call[1]["tags"][0] == "source:testing"
+
+
+def test_influencer_index_get_source_documents_reports_badly_formed_ids():
+    with mock.patch("takumi.search.influencer.indexing.InfluencerDocumentBuilder") as mock_builder:
+        documents, errors = InfluencerIndex.get_source_documents(["not-a-uuid"])
+
+    assert documents == {}
+    assert list(errors) == ["not-a-uuid"]
+    assert not mock_builder.called
+
+
+def test_influencer_index_get_source_documents_reports_per_document_build_errors():
+    influencer_ids = [uuid4_str(), uuid4_str(), uuid4_str()]
+    built, broken, missing = influencer_ids
+
+    def build_document(influencer):
+        if influencer.id == broken:
+            raise ValueError("broken")
+        return {"id": influencer.id}
+
+    with mock.patch("takumi.search.influencer.indexing.InfluencerDocumentBuilder") as mock_builder:
+        mock_builder.return_value.load.return_value = [Influencer(id=built), Influencer(id=broken)]
+        mock_builder.return_value.build_document.side_effect = build_document
+        documents, errors = InfluencerIndex.get_source_documents(influencer_ids)
+
+    assert documents == {built: {"id": built}, missing: None}
+    assert errors == {broken: "broken"}
+
+
+def test_influencer_index_bulk_update_from_source_reports_per_document_errors(app):
+    documents = {"id-1": {"id": "id-1"}, "id-2": {"id": "id-2"}, "id-3": None}
+    response = {
+        "items": [
+            {"index": {"_id": "id-1", "status": 201}},
+            {
+                "index": {
+                    "_id": "id-2",
+                    "status": 400,
+                    "error": {"type": "mapper_parsing_exception"},
+                }
+            },
+        ]
+    }
+    with mock.patch.object(
+        InfluencerIndex, "get_source_documents", return_value=(documents, {"id-4": "broken"})
+    ), mock.patch("takumi.search.influencer.indexing.get_migration_index", return_value=None):
+        with mock.patch("takumi.search.influencer.indexing.elasticsearch") as mock_elasticsearch:
+            mock_elasticsearch.bulk.return_value = response
+            result = InfluencerIndex.bulk_update_from_source(["id-1", "id-2", "id-3", "id-4"])
+
+    body = mock_elasticsearch.bulk.call_args[1]["body"]
+    assert body == [
+        {"index": {"_id": "id-1"}},
+        add_derived_fields({"id": "id-1"}),
+        {"index": {"_id": "id-2"}},
+        add_derived_fields({"id": "id-2"}),
+    ]
+    assert result.indexed == ["id-1"]
+    assert result.skipped == ["id-3"]
+    assert result.errors == {"id-2": {"type": "mapper_parsing_exception"}, "id-4": "broken"}
+
+
+def test_influencer_index_bulk_update_from_source_writes_to_the_migration_index_too(app):
+    documents = {"id-1": {"id": "id-1"}, "id-2": {"id": "id-2"}}
+    live_response = {"items": [{"index": {"_id": "id-1"}}, {"index": {"_id": "id-2"}}]}
+    migration_response = {
+        "items": [
+            {"index": {"_id": "id-1"}},
+            {
+                "index": {
+                    "_id": "id-2",
+                    "status": 409,
+                    "error": {"type": "version_conflict_engine_exception"},
+                }
+            },
+        ]
+    }
+    with mock.patch.object(
+        InfluencerIndex, "get_source_documents", return_value=(documents, {})
+    ), mock.patch(
+        "takumi.search.influencer.indexing.get_migration_index", return_value="influencer_v2"
+    ):
+        with mock.patch("takumi.search.influencer.indexing.elasticsearch") as mock_elasticsearch:
+            mock_elasticsearch.bulk.side_effect = [live_response, migration_response]
+            result = InfluencerIndex.bulk_update_from_source(["id-1", "id-2"])
+
+    live, migration = mock_elasticsearch.bulk.call_args_list
+    assert live[1]["index"] == app.config["ELASTICSEARCH_INFLUENCER_INDEX"]
+    assert live[1]["body"][0] == {"index": {"_id": "id-1"}}
+    assert migration[1]["index"] == "influencer_v2"
+    assert migration[1]["body"][0]["index"]["version_type"] == "external_gte"
+    assert result.indexed == ["id-1", "id-2"]
+    assert result.errors == {}
+
+
+def test_influencer_index_delete_is_versioned_in_the_migration_index(app):
+    with mock.patch(
+        "takumi.search.influencer.indexing.get_migration_index", return_value="influencer_v2"
+    ), mock.patch(
+        "takumi.search.influencer.indexing._document_version", return_value=1234
+    ), mock.patch(
+        "takumi.search.influencer.indexing.elasticsearch"
+    ) as mock_elasticsearch:
+        InfluencerIndex.delete("id-1")
+
+    migration, live = mock_elasticsearch.delete.call_args_list
+    assert migration == mock.call(
+        index="influencer_v2",
+        doc_type=InfluencerIndex._doc,
+        id="id-1",
+        version=1234,
+        version_type="external_gte",
+        ignore=[404, 409],
+    )
+    assert live == mock.call(id="id-1")
+
+
+def test_add_derived_fields_counts_campaigns_and_children():
+    document = {
+        "participating_campaign_ids": ["campaign-1", "campaign-2"],
+        "invited_campaign_ids": None,
+        "birthday": "1990-05-17",
+        "information": {"children": [{"id": "child-1"}]},
+    }
+
+    derived = add_derived_fields(document)
+
+    assert derived["participating_campaign_count"] == 2
+    assert derived["invited_campaign_count"] == 0
+    assert derived["birth_year"] == 1990
+    assert derived["information"]["child_count"] == 1
+    assert "child_count" not in document["information"]
+
+
+def test_add_derived_fields_without_birthday_or_information():
+    derived = add_derived_fields({"id": "id-1", "birthday": None, "information": None})
+
+    assert derived["birth_year"] is None
+    assert derived["information"] is None
+
+
+def test_queue_influencer_update_schedules_a_single_flush_per_window(app):
+    conn = mock.Mock()
+    conn.set.side_effect = [True, None]
+    with mock.patch("takumi.search.influencer.indexing.redis") as mock_redis:
+        mock_redis.get_connection.return_value = conn
+        with mock.patch("takumi.search.influencer.indexing.tiger") as mock_tiger:
+            queue_influencer_update("id-1", "id-2", source="offer")
+            queue_influencer_update("id-3", source="offer")
+
+    assert conn.sadd.call_args_list == [
+        mock.call(DIRTY_INFLUENCERS_KEY, "id-1", "id-2"),
+        mock.call(DIRTY_INFLUENCERS_KEY, "id-3"),
+    ]
+    assert mock_tiger.tiger.delay.call_count == 1
@@ -0,0 +1,150 @@
+import mock
+import pytest
+
+from takumi.gql.fields import InfluencerConnectionField
+from takumi.search.influencer import InfluencerSearch, TracedInfluencerSearch
+
+RESPONSE = {
+    "hits": {"total": 42, "hits": [{"_source": {"id": str(i)}} for i in range(10, 15)]},
+    "aggregations": {"count_by_gender": {"buckets": [{"key": "female", "doc_count": 42}]}},
+}
+
+
+@pytest.fixture
+def mock_elasticsearch():
+    with mock.patch("takumi.search.influencer.search.elasticsearch") as mock_elasticsearch:
+        mock_elasticsearch.search.return_value = RESPONSE
+        yield mock_elasticsearch
+
+
+def test_fetch_page_requests_the_hits_total_and_aggregations_at_once(mock_elasticsearch):
+    search = InfluencerSearch().add_count_by_aggregation("gender")
+
+    page = search.fetch_page(10, 5)
+
+    assert [hit.id for hit in page] == ["10", "11", "12", "13", "14"]
+    assert search.count() == 42
+    assert search.aggregations() == RESPONSE["aggregations"]
+    assert search[11:13] == page[1:3]
+
+    body = mock_elasticsearch.search.call_args[1]["body"]
+    assert body["from"] == 10
+    assert body["size"] == 5
+    assert body["track_total_hits"] is True
+    assert "count_by_gender" in body["aggs"]
+    assert mock_elasticsearch.search.call_count == 1
+
+
+def test_fetch_page_is_not_shared_with_clones(mock_elasticsearch):
+    search = InfluencerSearch()
+    search.fetch_page(0, 5)
+
+    assert search.filter_verified()._page is None
+
+
+def test_adding_aggregations_forgets_the_executed_search(mock_elasticsearch):
+    search = InfluencerSearch()
+    search.fetch_page(0, 5)
+    result_set = search.execute()
+
+    search.add_count_by_aggregation("gender").sum("followers")
+
+    assert search._page is None
+    assert search.execute() is not result_set
+
+    search.fetch_page(0, 5)
+    search.add_count_by_followers()
+    search.fetch_page(0, 5)
+
+    body = mock_elasticsearch.search.call_args[1]["body"]
+    assert set(body["aggs"]) == {"count_by_gender", "sum_followers", "count_by_followers"}
+    assert mock_elasticsearch.search.call_count == 3
+
+
+def test_influencer_connection_field_resolves_a_page_with_one_request(mock_elasticsearch):
+    field = InfluencerConnectionField(mock.Mock())
+    search = InfluencerSearch().add_count_by_aggregation("gender")
+    connection_type = mock.Mock(Edge=mock.Mock())
+
+    connection = field.connection_resolver(
+        lambda root, info: search, connection_type, None, None, first=5
+    )
+
+    assert connection.count == 42
+    assert connection.count_by[0]["field"] == "gender"
+    assert mock_elasticsearch.search.call_count == 1
+
+
+def test_traced_influencer_search_counts_the_funnel_with_one_request(mock_elasticsearch):
+    mock_elasticsearch.search.return_value = {
+        "aggregations": {"funnel": {"buckets": {"0": {"doc_count": 30}, "1": {"doc_count": 20}}}}
+    }
+
+    search = TracedInfluencerSearch().filter_verified().filter_signed_up()
+
+    assert search.tracing == [("filter_verified", 30), ("filter_signed_up", 20)]
+    assert search.tracing == [("filter_verified", 30), ("filter_signed_up", 20)]
+
+    body = mock_elasticsearch.search.call_args[1]["body"]
+    filters = body["aggs"]["funnel"]["filters"]["filters"]
+    assert filters["0"] == {"bool": {"filter": [{"term": {"state": "verified"}}]}}
+    assert len(filters["1"]["bool"]["filter"]) == 2
+    assert body["size"] == 0
+    assert mock_elasticsearch.search.call_count == 1
+
+
+def test_campaign_count_and_child_count_searches_use_the_derived_fields():
+    search = (
+        InfluencerSearch()
+        .filter_participating_campaign_count(1, 10)
+        .filter_information_child_count(min_count=2)
+        .sort_by_participating_campaign_count(desc=True)
+        .add_count_by_participating_campaign_count()
+    )
+    search.add_statistics_aggregations()
+
+    body = search.to_dict()
+
+    assert "script" not in str(body)
+    assert {"range": {"participating_campaign_count": {"gte": 1, "lte": 10}}} in body["query"][
+        "bool"
+    ]["filter"]
+    assert body["sort"] == [{"participating_campaign_count": {"order": "desc"}}]
+    assert (
+        body["aggs"]["participating_campaign_count_histogram"]["histogram"]["field"]
+        == "participating_campaign_count"
+    )
+
+
+def test_count_by_age_aggregates_the_year_of_birth():
+    with mock.patch("takumi.search.influencer.search.dt") as mock_dt:
+        mock_dt.datetime.now.return_value.year = 2020
+        search = InfluencerSearch().add_count_by_age()
+
+    age = search.to_dict()["aggs"]["count_by_age"]["range"]
+
+    assert age["field"] == "birth_year"
+    assert age["ranges"][0] == {"key": "0.0-20.0", "from": 2001, "to": 2021}
+    assert age["ranges"][1] == {"key": "20.0-25.0", "from": 1996, "to": 2001}
+    assert age["ranges"][-1] == {"key": "60.0-*", "to": 1961}
+
+
+def test_count_by_age_buckets_are_in_the_order_of_the_ages(mock_elasticsearch):
+    keys = ["0.0-20.0", "20.0-25.0", "25.0-30.0", "30.0-35.0", "35.0-40.0", "40.0-50.0"]
+    keys += ["50.0-60.0", "60.0-*"]
+    mock_elasticsearch.search.return_value = {
+        "hits": {"total": 0, "hits": []},
+        "aggregations": {
+            "count_by_age": {"buckets": [{"key": key, "doc_count": 1} for key in reversed(keys)]}
+        },
+    }
+    search = InfluencerSearch().add_count_by_age()
+    search.fetch_page(0, 5)
+
+    buckets = search.aggregations()["count_by_age"]["buckets"]
+
+    assert [bucket["key"] for bucket in buckets] == keys
+    assert [
+        age_range["key"]
+        for age_range in search.to_dict()["aggs"]["count_by_age"]["range"]["ranges"]
+    ] == keys
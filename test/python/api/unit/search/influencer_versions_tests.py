@@ -0,0 +1,119 @@
+import mock
+import pytest
+
+from takumi.search.influencer.indexing import MIGRATION_INDEX_KEY, BulkIndexingResult, IndexingError
+from takumi.search.influencer.versions import (
+    get_index_versions,
+    migrate_influencer_index,
+    swap_influencer_index,
+    verify_influencer_index,
+)
+
+
+@pytest.fixture(autouse=True)
+def alias(app):
+    with mock.patch.dict(app.config, {"ELASTICSEARCH_INFLUENCER_INDEX": "influencer"}):
+        yield "influencer"
+
+
+@pytest.fixture
+def mock_elasticsearch():
+    with mock.patch("takumi.search.influencer.versions.elasticsearch") as mock_elasticsearch:
+        yield mock_elasticsearch
+
+
+def test_get_index_versions_ignores_other_indices(mock_elasticsearch):
+    mock_elasticsearch.indices.get.return_value = {
+        "influencer_v2": {},
+        "influencer_v10": {},
+        "influencer_v1_old": {},
+    }
+
+    assert get_index_versions() == [2, 10]
+    mock_elasticsearch.indices.get.assert_called_with(index="influencer_v*")
+
+
+def test_swap_influencer_index_moves_the_alias_in_one_request(mock_elasticsearch):
+    mock_elasticsearch.indices.exists_alias.return_value = True
+    mock_elasticsearch.indices.get_alias.return_value = {"influencer_v1": {}}
+
+    previous = swap_influencer_index("influencer_v2")
+
+    assert previous == ["influencer_v1"]
+    mock_elasticsearch.indices.update_aliases.assert_called_once_with(
+        body={
+            "actions": [
+                {"remove": {"index": "influencer_v1", "alias": "influencer"}},
+                {"add": {"index": "influencer_v2", "alias": "influencer"}},
+            ]
+        }
+    )
+
+
+def test_swap_influencer_index_replaces_an_index_named_like_the_alias(mock_elasticsearch):
+    mock_elasticsearch.indices.exists_alias.return_value = False
+    mock_elasticsearch.indices.exists.return_value = True
+
+    assert swap_influencer_index("influencer_v1") == []
+    mock_elasticsearch.indices.update_aliases.assert_called_once_with(
+        body={
+            "actions": [
+                {"remove_index": {"index": "influencer"}},
+                {"add": {"index": "influencer_v1", "alias": "influencer"}},
+            ]
+        }
+    )
+
+
+def test_verify_influencer_index_compares_the_document_count(mock_elasticsearch):
+    mock_elasticsearch.count.return_value = {"count": 8}
+    with mock.patch("takumi.search.influencer.versions.db") as mock_db:
+        mock_db.session.query.return_value.scalar.return_value = 10
+
+        verify_influencer_index("influencer_v2", max_difference=2)
+        with pytest.raises(IndexingError):
+            verify_influencer_index("influencer_v2", max_difference=1)
+
+
+def test_migrate_influencer_index_backfills_verifies_and_swaps(
+    mock_elasticsearch, mock_redis_connection
+):
+    mock_elasticsearch.indices.get.return_value = {"influencer_v1": {}}
+    with mock.patch(
+        "takumi.search.influencer.versions.backfill_influencer_index",
+        return_value=(BulkIndexingResult(indexed=["id-1"]), 1.0),
+    ) as mock_backfill, mock.patch(
+        "takumi.search.influencer.versions.verify_influencer_index"
+    ) as mock_verify, mock.patch(
+        "takumi.search.influencer.versions.swap_influencer_index", return_value=["influencer_v1"]
+    ) as mock_swap:
+        migrate_influencer_index(workers=8, batch_size=500)
+
+    mock_elasticsearch.indices.create.assert_called_once()
+    assert mock_elasticsearch.indices.create.call_args[1]["index"] == "influencer_v2"
+    mock_redis_connection.set.assert_called_once_with(
+        MIGRATION_INDEX_KEY, "influencer_v2", ex=mock.ANY
+    )
+    assert mock_backfill.call_args[1]["workers"] == 8
+    assert mock_backfill.call_args[1]["batch_size"] == 500
+    mock_verify.assert_called_once_with("influencer_v2", max_difference=0)
+    mock_swap.assert_called_once_with("influencer_v2")
+    mock_redis_connection.delete.assert_called_once_with(MIGRATION_INDEX_KEY)
+    mock_elasticsearch.indices.delete.assert_called_once_with(index="influencer_v1")
+
+
+def test_migrate_influencer_index_keeps_the_alias_when_the_backfill_fails(
+    mock_elasticsearch, mock_redis_connection
+):
+    mock_elasticsearch.indices.get.return_value = {}
+    with mock.patch(
+        "takumi.search.influencer.versions.backfill_influencer_index",
+        return_value=(BulkIndexingResult(errors={"id-1": "broken"}), 1.0),
+    ), mock.patch("takumi.search.influencer.versions.swap_influencer_index") as mock_swap:
+        with pytest.raises(IndexingError):
+            migrate_influencer_index()
+
+    assert mock_elasticsearch.indices.create.call_args[1]["index"] == "influencer_v1"
+    assert not mock_swap.called
+    mock_redis_connection.delete.assert_called_once_with(MIGRATION_INDEX_KEY)
+    assert not mock_elasticsearch.indices.delete.called
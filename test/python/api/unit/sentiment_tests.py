@@ -1,4 +1,15 @@
-from takumi.sentiment import SentimentAnalyser
+import mock
+import pytest
+
+from takumi.sentiment import (
+    CommentTooShort,
+    FakeComprehendClient,
+    SentimentAnalyser,
+    SentimentException,
+    UnknownLanguage,
+    UnsupportedLanguage,
+    text_hash,
+)
 
 
 def test_sentiment_analyser_clean_up_text():
@@ -8,3 +19,69 @@ def test_sentiment_analyser_clean_up_text():
     assert analyser.clean_up_text("hello there #ad #follow #me #PLEASE") == "hello there"
     assert analyser.clean_up_text("❤️❤️❤️") == ""
     assert analyser.clean_up_text("hey @djamm I love IT ❤️❤️") == "hey I love IT"
+
+
+@pytest.fixture
+def language_cache():
+    cache = {}
+
+    def get_many(keys):
+        return {key: cache[key] for key in keys if key in cache}
+
+    with mock.patch("takumi.sentiment.language_cache") as mock_cache:
+        mock_cache.get_many.side_effect = get_many
+        mock_cache.set_many.side_effect = cache.update
+        yield cache
+
+
+def test_sentiment_analyser_analyse_batch_calls_comprehend_per_batch(language_cache):
+    client = FakeComprehendClient()
+    analyser = SentimentAnalyser(client=client)
+    texts = [f"I love this picture number {i}" for i in range(30)]
+
+    results = analyser.analyse_batch(texts)
+
+    assert [result.sentiment for result in results] == ["POSITIVE"] * 30
+    assert client.calls == {"batch_detect_dominant_language": 2, "batch_detect_sentiment": 2}
+
+
+def test_sentiment_analyser_analyse_batch_explains_the_skipped_texts(language_cache):
+    analyser = SentimentAnalyser(client=FakeComprehendClient())
+
+    too_short, unsupported, negative = analyser.analyse_batch(
+        ["#ad ❤️", "hej hej vad fint", "the worst picture ever"]
+    )
+
+    assert isinstance(too_short, CommentTooShort)
+    assert isinstance(unsupported, UnsupportedLanguage)
+    assert negative.sentiment == "NEGATIVE"
+    assert negative.language_code == "en"
+
+
+def test_sentiment_analyser_analyse_batch_caches_the_languages(language_cache):
+    client = FakeComprehendClient()
+    analyser = SentimentAnalyser(client=client)
+
+    analyser.analyse_batch(["What a great picture"])
+    analyser.analyse_batch(["what a GREAT   picture", "What a great picture"])
+
+    assert language_cache == {text_hash("What a great picture"): ("en", 0.99)}
+    assert client.calls["batch_detect_dominant_language"] == 1
+    assert client.calls["batch_detect_sentiment"] == 2
+
+
+def test_sentiment_analyser_analyse_batch_retries_texts_comprehend_failed_on(language_cache):
+    client = FakeComprehendClient()
+    client.batch_detect_dominant_language = mock.Mock(
+        return_value={
+            "ResultList": [{"Index": 1, "Languages": []}],
+            "ErrorList": [{"Index": 0, "ErrorCode": "INTERNAL_SERVER_ERROR", "ErrorMessage": ""}],
+        }
+    )
+    analyser = SentimentAnalyser(client=client)
+
+    failed, unknown = analyser.analyse_batch(["What a great picture", "1234 5678 9012"])
+
+    assert type(failed) is SentimentException
+    assert isinstance(unknown, UnknownLanguage)
+    assert language_cache == {text_hash("1234 5678 9012"): None}
@@ -68,6 +68,9 @@ def test_offer_service_force_reserve_fails_if_deadline_passed(monkeypatch, offer
 def test_offer_service_force_reserve_success(monkeypatch, offer, post):
     # Arrange
     monkeypatch.setattr("takumi.funds.assets.AssetsFund.is_reservable", lambda *args: True)
+    monkeypatch.setattr(
+        "takumi.funds.assets.AssetsFund.claim_reservation", lambda *args, **kwargs: True
+    )
     offer.state = STATES.REJECTED
     offer.campaign.state = CAMPAIGN_STATES.LAUNCHED
     post.deadline = dt.datetime.now(dt.timezone.utc) + dt.timedelta(days=1)
@@ -80,6 +83,23 @@ def test_offer_service_force_reserve_success(monkeypatch, offer, post):
     assert offer.state == STATES.ACCEPTED
 
 
+def test_offer_service_force_reserve_fails_if_reservation_not_claimed(monkeypatch, offer, post):
+    # Arrange
+    monkeypatch.setattr("takumi.funds.assets.AssetsFund.is_reservable", lambda *args: True)
+    monkeypatch.setattr(
+        "takumi.funds.assets.AssetsFund.claim_reservation", lambda *args, **kwargs: False
+    )
+    offer.state = STATES.REJECTED
+    offer.campaign.state = CAMPAIGN_STATES.LAUNCHED
+    post.deadline = dt.datetime.now(dt.timezone.utc) + dt.timedelta(days=1)
+
+    # Act & Assert
+    service = OfferService(offer)
+    with pytest.raises(CampaignFullyReservedException):
+        service.force_reserve()
+    assert offer.state == STATES.REJECTED
+
+
 def test_offer_service_set_claimable_raises_if_state_not_accepted(offer):
     offer.state = STATES.INVITED
 
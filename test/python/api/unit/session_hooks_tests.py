@@ -0,0 +1,101 @@
+import mock
+
+from takumi.session_hooks import SessionHook, delay_with_ids, listen
+
+
+def _session(**info):
+    return mock.Mock(info=info, new=[], dirty=[], deleted=[])
+
+
+def test_session_hook_collects_every_changed_instance_on_flush():
+    session = _session()
+    session.new, session.dirty, session.deleted = ["new"], ["dirty"], ["deleted"]
+    hook = SessionHook(
+        "key",
+        on_commit=mock.Mock(),
+        collect=lambda session, instance, collected: collected.add(instance),
+        default=set,
+    )
+
+    hook.after_flush(session, None)
+
+    assert session.info["key"] == {"new", "dirty", "deleted"}
+
+
+def test_session_hook_hands_over_what_was_collected_on_commit():
+    session = _session(key={"id-1": "offer"})
+    on_commit = mock.Mock()
+    hook = SessionHook("key", on_commit=on_commit)
+
+    hook.after_commit(session)
+    hook.after_commit(session)
+
+    on_commit.assert_called_once_with({"id-1": "offer"})
+    assert "key" not in session.info
+
+
+def test_session_hook_only_discards_when_the_outermost_transaction_ends():
+    session = _session(key={"id-1": "offer"})
+    on_rollback = mock.Mock()
+    hook = SessionHook("key", on_commit=mock.Mock(), on_rollback=on_rollback)
+
+    hook.after_transaction_end(session, mock.Mock(parent=mock.Mock()))
+    assert "key" in session.info
+    assert not on_rollback.called
+
+    hook.after_transaction_end(session, mock.Mock(parent=None))
+    assert "key" not in session.info
+    on_rollback.assert_called_once_with({"id-1": "offer"})
+
+
+def test_session_hook_registers_its_listeners_once():
+    hook = SessionHook("key", on_commit=mock.Mock(), collect=mock.Mock())
+
+    with mock.patch("takumi.session_hooks.event") as mock_event:
+        hook.register()
+        hook.register()
+
+    assert [call[0][1] for call in mock_event.listen.call_args_list] == [
+        "after_flush",
+        "after_commit",
+        "after_transaction_end",
+    ]
+
+
+def test_listen_only_listens_once():
+    listener = mock.Mock()
+
+    with mock.patch("takumi.session_hooks.event") as mock_event:
+        mock_event.contains.side_effect = [False, True]
+        listen("after_commit", listener)
+        listen("after_commit", listener)
+
+    mock_event.listen.assert_called_once_with(mock.ANY, "after_commit", listener)
+
+
+def test_delay_with_ids_leaves_out_the_empty_sets():
+    task = mock.Mock()
+
+    delay_with_ids(lambda: task)(
+        {"post_ids": {"b", "a", None}, "gig_ids": {None}, "user_ids": set()}
+    )
+
+    task.delay.assert_called_once_with(post_ids=["a", "b"])
+
+
+def test_delay_with_ids_without_ids_doesnt_delay():
+    task = mock.Mock()
+
+    delay_with_ids(lambda: task)({"post_ids": {None}})
+
+    assert not task.delay.called
+
+
+def test_delay_with_ids_looks_up_the_task_on_commit():
+    tasks = {"task": mock.Mock()}
+    on_commit = delay_with_ids(lambda: tasks["task"])
+    tasks["task"] = mock.Mock()
+
+    on_commit({"post_ids": {"a"}})
+
+    tasks["task"].delay.assert_called_once_with(post_ids=["a"])
@@ -0,0 +1,23 @@
+import mock
+
+from takumi.search.influencer.indexing import DIRTY_INFLUENCERS_KEY
+from takumi.tasks.scheduled.indexing import sweep_dirty_influencers
+
+
+def test_sweep_dirty_influencers_flushes_a_non_empty_dirty_set(mock_redis_connection):
+    mock_redis_connection.scard.return_value = 3
+
+    with mock.patch("takumi.tasks.scheduled.indexing.flush_dirty_influencers") as mock_flush:
+        sweep_dirty_influencers()
+
+    mock_redis_connection.scard.assert_called_once_with(DIRTY_INFLUENCERS_KEY)
+    mock_flush.assert_called_once_with()
+
+
+def test_sweep_dirty_influencers_skips_an_empty_dirty_set(mock_redis_connection):
+    mock_redis_connection.scard.return_value = 0
+
+    with mock.patch("takumi.tasks.scheduled.indexing.flush_dirty_influencers") as mock_flush:
+        sweep_dirty_influencers()
+
+    assert not mock_flush.called
@@ -0,0 +1,29 @@
+import csv
+
+from takumi.utils.streaming import stream_csv, stream_dict_csv
+
+
+def test_stream_csv_yields_the_header_before_iterating_rows():
+    def rows():
+        raise AssertionError("Rows iterated before the header was sent")
+        yield
+
+    assert next(stream_csv(rows(), header=["a", "b"])) == "a,b\r\n"
+
+
+def test_stream_csv_yields_chunks_of_rows():
+    chunks = list(stream_csv(([i, i * 2] for i in range(5)), chunk_rows=2, delimiter=";"))
+
+    assert chunks == ["0;0\r\n1;2\r\n", "2;4\r\n3;6\r\n", "4;8\r\n"]
+
+
+def test_stream_csv_quotes_like_the_csv_writer():
+    chunks = stream_csv([["a;b", "c"]], delimiter=";", quotechar="|", quoting=csv.QUOTE_MINIMAL)
+
+    assert "".join(chunks) == "|a;b|;c\r\n"
+
+
+def test_stream_dict_csv_starts_with_the_fieldnames():
+    data = "".join(stream_dict_csv([{"a": 1}, {"b": 2}], fieldnames=("a", "b")))
+
+    assert data == "a,b\r\n1,\r\n,2\r\n"
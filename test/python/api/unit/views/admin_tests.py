@@ -170,3 +170,29 @@ def test_get_gig_media_urls_returns_empty_media_urls(
     # Assert
     assert response.status_code == 200
     assert response.json == {gig.offer.influencer.username: []}
+
+
+def test_post_report_returns_the_snapshot_with_an_etag(monkeypatch, client):
+    # Arrange
+    campaign_id = uuid4_str()
+    mock_campaign = mock.Mock()
+    mock_campaign.query.filter.return_value.with_entities.return_value.scalar.return_value = (
+        campaign_id
+    )
+    monkeypatch.setattr("takumi.views.admin.campaigns.Campaign", mock_campaign)
+    monkeypatch.setattr(
+        "takumi.views.admin.campaigns.get_report_snapshot",
+        mock.Mock(return_value=('{"id": "campaign", "posts": []}', "etag")),
+    )
+    url = url_for("api.post_report", report_token=uuid4_str())
+
+    # Act
+    response = client.get(url)
+    cached_response = client.get(url, headers={"If-None-Match": '"etag"'})
+
+    # Assert
+    assert response.status_code == 200
+    assert response.json == {"id": "campaign", "posts": []}
+    assert response.headers["ETag"] == '"etag"'
+    assert cached_response.status_code == 304
+    assert cached_response.data == b""
@@ -166,7 +166,7 @@ def test_graphql_authentication_middleware_with_anonymous_user(client, monkeypat
 
 
 def test_graphql_validate_query_permission_doesnt_do_anything_if_logged_in(
-    private_schema, public_schema, monkeypatch
+    app, private_schema, public_schema, monkeypatch
 ):
     monkeypatch.setattr("takumi.views.gql.schema", private_schema)
     monkeypatch.setattr("takumi.views.gql.public_schema", public_schema)
@@ -177,14 +177,14 @@ def test_graphql_validate_query_permission_doesnt_do_anything_if_logged_in(
 
     query = "{publicString}"
 
-    with mock.patch("takumi.views.gql.validate") as mock_validate:
-        view.validate_query_authentication(query)
+    with mock.patch("takumi.gql.documents.validate") as mock_validate:
+        view.validate_query_authentication(query, {})
 
     assert not mock_validate.called
 
 
 def test_graphql_validate_query_permission_doesnt_raise_401_if_public_query_valid(
-    private_schema, public_schema, monkeypatch
+    app, private_schema, public_schema, monkeypatch
 ):
     monkeypatch.setattr("takumi.views.gql.schema", private_schema)
     monkeypatch.setattr("takumi.views.gql.public_schema", public_schema)
@@ -195,14 +195,14 @@ def test_graphql_validate_query_permission_doesnt_raise_401_if_public_query_vali
 
     query = "{publicString}"
 
-    with mock.patch("takumi.views.gql.validate") as mock_validate:
-        view.validate_query_authentication(query)
+    with mock.patch("takumi.gql.documents.validate") as mock_validate:
+        view.validate_query_authentication(query, {})
 
     assert mock_validate.called
 
 
 def test_graphql_validate_query_permission_does_raise_401_if_public_query_invalid_but_private_valid(
-    private_schema, public_schema, monkeypatch
+    app, private_schema, public_schema, monkeypatch
 ):
     monkeypatch.setattr("takumi.views.gql.schema", private_schema)
     monkeypatch.setattr("takumi.views.gql.public_schema", public_schema)
@@ -214,11 +214,11 @@ def test_graphql_validate_query_permission_does_raise_401_if_public_query_invali
     query = "{privateString}"
 
     with pytest.raises(APIError, match="Unauthorized"):
-        view.validate_query_authentication(query)
+        view.validate_query_authentication(query, {})
 
 
 def test_graphql_validate_query_permission_doesnt_raise_401_if_public_query_invalid_and_private_invalid(
-    private_schema, public_schema, monkeypatch
+    app, private_schema, public_schema, monkeypatch
 ):
     monkeypatch.setattr("takumi.views.gql.schema", private_schema)
     monkeypatch.setattr("takumi.views.gql.public_schema", public_schema)
@@ -229,4 +229,4 @@ def test_graphql_validate_query_permission_doesnt_raise_401_if_public_query_inva
 
     query = "{invalidQuery}"
 
-    view.validate_query_authentication(query)
+    view.validate_query_authentication(query, {})